@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 class CatalogsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.catalogs'
\ No newline at end of file
+    name = 'apps.catalogs'
+
+    def ready(self):
+        """Import signals when app is ready"""
+        import apps.catalogs.signals
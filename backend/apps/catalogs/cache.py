@@ -0,0 +1,57 @@
+"""
+Caché de catálogos (proveedores, bancos, tipos de embarque, aduanas,
+servicios y tarifario).
+
+Los catálogos se leen en casi todas las peticiones (nombres en los listados,
+dropdowns del frontend) y cambian muy poco. Se guardan en un TwoTierCache
+(apps.core.cache): LRU en el proceso delante del caché compartido. Cualquier
+cambio en un catálogo invalida el namespace completo en todos los workers
+(ver apps.catalogs.signals).
+"""
+
+from django.conf import settings
+from rest_framework.response import Response
+
+from apps.core.cache import TwoTierCache
+
+catalog_cache = TwoTierCache(
+    'catalogs',
+    timeout=getattr(settings, 'CACHE_TIMEOUTS', {}).get('catalogs', 60 * 60),
+    local_ttl=60,
+)
+
+
+def catalog_names(model):
+    """
+    ``{id: nombre}`` de un catálogo, incluidos los registros inactivos o
+    eliminados (los documentos viejos los siguen referenciando).
+    """
+    return catalog_cache.get(
+        f'names:{model._meta.label_lower}',
+        lambda: dict(model._base_manager.values_list('pk', 'name')),
+    )
+
+
+def names_of(model):
+    """Mapa para ``CachedLookup`` (apps.core.values_serializers)."""
+    def mapping():
+        return catalog_names(model)
+    return mapping
+
+
+class CachedCatalogListMixin:
+    """
+    Cachea la respuesta de ``list`` (por parámetros de consulta). La respuesta
+    de los catálogos no depende del usuario, sólo de los filtros.
+    """
+
+    def list(self, request, *args, **kwargs):
+        query = '&'.join(f'{k}={v}' for k, v in sorted(request.query_params.items()))
+        return self.cached_response(
+            f'list:{self.basename}:{query}',
+            lambda: super(CachedCatalogListMixin, self).list(request, *args, **kwargs),
+        )
+
+    def cached_response(self, key, build):
+        """``Response`` con los datos de ``build()`` (una Response) cacheados en ``key``."""
+        return Response(catalog_cache.get(key, lambda: build().data))
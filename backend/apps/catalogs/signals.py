@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from apps.clients.models import Client
+
+from .cache import catalog_cache
+from .models import Bank, ClientServicePrice, Customs, CustomsAgent, Provider, ProviderCategory, Service, ShipmentType
+
+# Client: su nombre aparece en el tarifario (ClientServicePrice)
+CACHED_MODELS = (
+    Provider, ProviderCategory, CustomsAgent, Bank, ShipmentType, Customs,
+    Service, ClientServicePrice, Client,
+)
+
+
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Invalida ya (para que esta misma petición lea los datos nuevos) y otra vez
+    al hacer commit, por si otro worker recargó el catálogo antes del commit.
+    """
+    catalog_cache.invalidate()
+    transaction.on_commit(catalog_cache.invalidate)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(invalidate_catalog_cache, sender=model, dispatch_uid=f'catalog_cache_{model.__name__}_save')
+    post_delete.connect(invalidate_catalog_cache, sender=model, dispatch_uid=f'catalog_cache_{model.__name__}_delete')
@@ -1,3 +1,69 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.users.models import User
+
+from .cache import catalog_cache, catalog_names
+from .models import Bank, Provider
+
+
+class CatalogCacheTests(APITestCase):
+    """Los catálogos se sirven desde el caché y se invalidan al modificarse."""
+
+    def setUp(self):
+        catalog_cache.invalidate()
+        self.admin = User.objects.create_user(username='catalog_admin', password='x', role='admin')
+        self.client.force_authenticate(user=self.admin)
+        Bank.objects.create(name='Banco Agrícola')
+
+    def test_listado_cacheado_no_consulta_la_bd(self):
+        first = self.client.get('/api/catalogs/banks/')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get('/api/catalogs/banks/')
+
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_cambios_en_el_catalogo_invalidan_el_listado(self):
+        self.client.get('/api/catalogs/banks/')
+
+        Bank.objects.create(name='Banco Cuscatlán')
+        response = self.client.get('/api/catalogs/banks/')
+
+        self.assertEqual(
+            [bank['name'] for bank in response.data],
+            ['Banco Agrícola', 'Banco Cuscatlán'],
+        )
+
+    def test_nombres_incluyen_inactivos_y_se_actualizan(self):
+        provider = Provider.objects.create(name='Naviera Uno', is_active=False)
+        self.assertEqual(catalog_names(Provider)[provider.pk], 'Naviera Uno')
+
+        provider.name = 'Naviera Renombrada'
+        provider.save()
+
+        self.assertEqual(catalog_names(Provider)[provider.pk], 'Naviera Renombrada')
+
+    def test_listado_de_gastos_resuelve_nombres_desde_el_cache(self):
+        from apps.transfers.models import Transfer
+
+        provider = Provider.objects.create(name='Proveedor Caché')
+        Transfer.objects.create(
+            transfer_type='admin', provider=provider, amount=Decimal('10.00'),
+            description='Gasto', transaction_date=date(2026, 1, 15), created_by=self.admin,
+        )
+        response = self.client.get('/api/transfers/transfers/')
+        self.assertEqual(response.data[0]['provider_name'], 'Proveedor Caché')
+
+        provider.name = 'Proveedor Renombrado'
+        provider.save()
+
+        response = self.client.get('/api/transfers/transfers/')
+        self.assertEqual(response.data[0]['provider_name'], 'Proveedor Renombrado')
@@ -12,6 +12,8 @@ from .serializers import (
     ServiceSerializer, ClientServicePriceSerializer
 )
 from .permissions import IsAdminOrReadOnly
+from .cache import CachedCatalogListMixin
+from apps.core.db_routing import read_replica
 from apps.users.permissions import IsAdminUser, IsOperativo
 
 class ProviderCategoryViewSet(viewsets.ModelViewSet):
@@ -180,150 +182,167 @@ class ProviderViewSet(viewsets.ModelViewSet):
         return Response(data)
 
     @action(detail=True, methods=['get'], permission_classes=[IsOperativo])
+    @read_replica
     def account_statement(self, request, pk=None):
+        """
+        Estado de cuenta del proveedor (Transfers + ProviderInvoices).
+
+        Todo el cálculo ocurre en la base de datos:
+        - Deuda y antigüedad: una agregación condicional por origen, sin
+          recorrer las filas pendientes en Python.
+        - Historial: un único UNION de ambos orígenes ordenado en SQL. Acepta
+          ?limit= y ?offset= para paginarlo sin cargar el resto.
+        - Los montos se mantienen en Decimal de punta a punta.
+        """
         from apps.transfers.models import Transfer, ProviderInvoice
-        from django.db.models import Sum, F
-        from datetime import datetime
+        from django.db.models import Sum, Count, F, Q, Value, CharField, DecimalField, ExpressionWrapper
+        from django.db.models.functions import Coalesce
+        from datetime import datetime, timedelta
+        from decimal import Decimal
 
         provider = self.get_object()
         
         # Filtros: Si year viene vacío (?year=), es "Todo el tiempo". Si no viene, default al actual.
         year_param = request.query_params.get('year')
         year = int(year_param) if year_param and year_param.isdigit() else (datetime.now().year if year_param is None else None)
-        
-        # ========== TRANSFERS (Gastos terceros, propios, admin) ==========
-        unpaid_transfers_qs = Transfer.objects.filter(
-            provider=provider,
-            status__in=['pendiente', 'aprobado', 'provisionada', 'parcial']
-        )
-        
-        if year:
-            unpaid_transfers_qs = unpaid_transfers_qs.filter(transaction_date__year=year)
-            
-        unpaid_transfers = unpaid_transfers_qs.order_by('transaction_date')
-        transfer_debt = unpaid_transfers.aggregate(Sum('balance'))['balance__sum'] or 0
-        
-        # ========== PROVIDER INVOICES (Costos Directos / Tercerizados) ==========
-        unpaid_invoices_qs = ProviderInvoice.objects.filter(
-            provider=provider,
-            payment_status__in=['pendiente', 'parcial']
-        )
-        
-        if year:
-            unpaid_invoices_qs = unpaid_invoices_qs.filter(issue_date__year=year)
-            
-        unpaid_invoices = unpaid_invoices_qs.order_by('issue_date')
-        
-        # Calcular balance de facturas de proveedor (total - pagado)
-        invoice_debt = sum(
-            float(inv.total_amount) - float(inv.paid_amount)
-            for inv in unpaid_invoices
-        )
-        
-        total_debt = float(transfer_debt) + invoice_debt
-        
-        # Historial - TRANSFERS
+
+        limit_param = request.query_params.get('limit')
+        offset_param = request.query_params.get('offset')
+        limit = int(limit_param) if limit_param and limit_param.isdigit() else None
+        offset = int(offset_param) if offset_param and offset_param.isdigit() else 0
+
         transfers_qs = Transfer.objects.filter(provider=provider)
-        if year:
-            transfers_qs = transfers_qs.filter(transaction_date__year=year)
-        history_transfers = transfers_qs.select_related('service_order').order_by('-transaction_date')
-        
-        # Historial - PROVIDER INVOICES
         invoices_qs = ProviderInvoice.objects.filter(provider=provider)
         if year:
+            transfers_qs = transfers_qs.filter(transaction_date__year=year)
             invoices_qs = invoices_qs.filter(issue_date__year=year)
-        history_invoices = invoices_qs.select_related('service_order').order_by('-issue_date')
-        
-        # Aging Analysis (combinado)
+
+        money = DecimalField(max_digits=15, decimal_places=2)
+        invoice_balance = ExpressionWrapper(F('total_amount') - F('paid_amount'), output_field=money)
+        today = datetime.now().date()
+
+        # Aging Analysis: los tramos se expresan como rangos de fecha para que
+        # la base de datos los sume con FILTER (o CASE en SQLite).
+        aging_buckets = (
+            ('current', None, 30),  # 0-30 días
+            ('1-30', 30, 60),       # 31-60 días (1-30 vencido)
+            ('31-60', 60, 90),      # 61-90 días
+            ('61-90', 90, 120),     # 91-120 días
+            ('90+', 120, None),     # > 120 días
+        )
+
+        def aging_aggregates(date_field, amount, unpaid):
+            aggregates = {'rows': Count('id')}
+            for bucket, min_age, max_age in aging_buckets:
+                condition = unpaid
+                if max_age is not None:
+                    condition &= Q(**{f'{date_field}__gte': today - timedelta(days=max_age)})
+                if min_age is not None:
+                    condition &= Q(**{f'{date_field}__lt': today - timedelta(days=min_age)})
+                aggregates[bucket] = Coalesce(
+                    Sum(amount, filter=condition), Value(Decimal('0.00')), output_field=money
+                )
+            return aggregates
+
+        transfer_stats = transfers_qs.aggregate(**aging_aggregates(
+            'transaction_date', F('balance'),
+            Q(status__in=['pendiente', 'aprobado', 'provisionada', 'parcial']),
+        ))
+        invoice_stats = invoices_qs.aggregate(**aging_aggregates(
+            'issue_date', invoice_balance,
+            Q(payment_status__in=['pendiente', 'parcial']),
+        ))
+
         aging = {
-            'current': 0.0,  # 0-30 días
-            '1-30': 0.0,     # 31-60 días (1-30 vencido)
-            '31-60': 0.0,    # 61-90 días
-            '61-90': 0.0,    # 91-120 días
-            '90+': 0.0       # > 120 días
+            bucket: transfer_stats[bucket] + invoice_stats[bucket]
+            for bucket, _, _ in aging_buckets
         }
-        
-        today = datetime.now().date()
-        
-        # Aging de Transfers
-        for transfer in unpaid_transfers:
-            age_days = (today - transfer.transaction_date).days
-            amount = float(transfer.balance)
-            
-            if age_days <= 30:
-                aging['current'] += amount
-            elif age_days <= 60:
-                aging['1-30'] += amount
-            elif age_days <= 90:
-                aging['31-60'] += amount
-            elif age_days <= 120:
-                aging['61-90'] += amount
-            else:
-                aging['90+'] += amount
-        
-        # Aging de ProviderInvoices (costos directos)
-        for inv in unpaid_invoices:
-            age_days = (today - inv.issue_date).days
-            amount = float(inv.total_amount) - float(inv.paid_amount)
-            
-            if age_days <= 30:
-                aging['current'] += amount
-            elif age_days <= 60:
-                aging['1-30'] += amount
-            elif age_days <= 90:
-                aging['31-60'] += amount
-            elif age_days <= 120:
-                aging['61-90'] += amount
-            else:
-                aging['90+'] += amount
-        
-        # Construir lista unificada de "transfers" (gastos a pagar)
+        total_debt = sum(aging.values(), Decimal('0.00'))
+
+        # Historial unificado: ambas consultas exponen las mismas columnas en el
+        # mismo orden para poder combinarse con UNION ALL.
+        transfer_rows = transfers_qs.order_by().annotate(
+            row_source=Value('transfer', output_field=CharField()),
+            row_date=F('transaction_date'),
+            row_order_number=F('service_order__order_number'),
+            row_order_id=F('service_order_id'),
+            row_purchase_order=F('service_order__purchase_order'),
+            row_type=F('transfer_type'),
+            row_amount=F('amount'),
+            row_paid=F('paid_amount'),
+            row_balance=F('balance'),
+            row_status=F('status'),
+            row_description=F('description'),
+            row_invoice_number=F('invoice_number'),
+            row_invoice_file=F('invoice_file'),
+        )
+        invoice_rows = invoices_qs.order_by().annotate(
+            row_source=Value('provider_invoice', output_field=CharField()),
+            row_date=F('issue_date'),
+            row_order_number=F('service_order__order_number'),
+            row_order_id=F('service_order_id'),
+            row_purchase_order=F('service_order__purchase_order'),
+            row_type=Value('', output_field=CharField()),
+            row_amount=F('total_amount'),
+            row_paid=F('paid_amount'),
+            row_balance=invoice_balance,
+            row_status=F('payment_status'),
+            row_description=F('notes'),
+            row_invoice_number=F('invoice_number'),
+            row_invoice_file=F('invoice_file'),
+        )
+        columns = [
+            'id', 'row_source', 'row_date', 'row_order_number', 'row_order_id',
+            'row_purchase_order', 'row_type', 'row_amount', 'row_paid', 'row_balance',
+            'row_status', 'row_description', 'row_invoice_number', 'row_invoice_file',
+        ]
+        # Fecha descendente; a igual fecha los Transfers van antes que las
+        # facturas de proveedor, como en el listado original.
+        history = transfer_rows.values(*columns).union(
+            invoice_rows.values(*columns), all=True
+        ).order_by('-row_date', '-row_source', '-id')
+        if limit is not None:
+            history = history[offset:offset + limit]
+        elif offset:
+            history = history[offset:]
+
+        transfer_types = dict(Transfer.TYPE_CHOICES)
+        transfer_statuses = dict(Transfer.STATUS_CHOICES)
+        invoice_statuses = dict(ProviderInvoice.PAYMENT_STATUS_CHOICES)
+        transfer_storage = Transfer._meta.get_field('invoice_file').storage
+        invoice_storage = ProviderInvoice._meta.get_field('invoice_file').storage
+
         transfers_data = []
-        
-        # Agregar Transfers normales
-        for t in history_transfers:
-            transfers_data.append({
-                'id': t.id,
-                'source': 'transfer',  # Para identificar el origen
-                'transaction_date': t.transaction_date,
-                'service_order': t.service_order.order_number if t.service_order else 'Gastos Admin',
-                'service_order_id': t.service_order.id if t.service_order else None,
-                'purchase_order': t.service_order.purchase_order if t.service_order else '',
-                'type': t.get_transfer_type_display(),
-                'amount': float(t.amount),
-                'balance': float(t.balance),
-                'paid_amount': float(t.paid_amount),
-                'status': t.status,
-                'status_display': t.get_status_display(),
-                'description': t.description,
-                'invoice_number': t.invoice_number or 'S/N',
-                'invoice_file': t.invoice_file.url if t.invoice_file else None
-            })
-        
-        # Agregar ProviderInvoices (costos directos)
-        for inv in history_invoices:
-            balance = float(inv.total_amount) - float(inv.paid_amount)
+        for row in history:
+            is_transfer = row['row_source'] == 'transfer'
+            storage = transfer_storage if is_transfer else invoice_storage
+            if is_transfer:
+                type_display = transfer_types.get(row['row_type'], row['row_type'])
+                status_display = transfer_statuses.get(row['row_status'], row['row_status'])
+                description = row['row_description']
+            else:
+                type_display = 'Costo Directo'  # Tipo especial para costos tercerizados
+                status_display = invoice_statuses.get(row['row_status'], row['row_status'])
+                description = row['row_description'] or f"Factura {row['row_invoice_number']}"
+
             transfers_data.append({
-                'id': inv.id,
-                'source': 'provider_invoice',  # Para identificar el origen
-                'transaction_date': inv.issue_date,
-                'service_order': inv.service_order.order_number if inv.service_order else 'Sin OS',
-                'service_order_id': inv.service_order.id if inv.service_order else None,
-                'purchase_order': inv.service_order.purchase_order if inv.service_order else '',
-                'type': 'Costo Directo',  # Tipo especial para costos tercerizados
-                'amount': float(inv.total_amount),
-                'balance': balance,
-                'paid_amount': float(inv.paid_amount),
-                'status': inv.payment_status,
-                'status_display': dict(ProviderInvoice.PAYMENT_STATUS_CHOICES).get(inv.payment_status, inv.payment_status),
-                'description': inv.notes or f'Factura {inv.invoice_number}',
-                'invoice_number': inv.invoice_number or 'S/N',
-                'invoice_file': inv.invoice_file.url if inv.invoice_file else None
+                'id': row['id'],
+                'source': row['row_source'],  # Para identificar el origen
+                'transaction_date': row['row_date'],
+                'service_order': row['row_order_number'] or ('Gastos Admin' if is_transfer else 'Sin OS'),
+                'service_order_id': row['row_order_id'],
+                'purchase_order': row['row_purchase_order'] or '',
+                'type': type_display,
+                'amount': row['row_amount'],
+                'balance': row['row_balance'],
+                'paid_amount': row['row_paid'],
+                'status': row['row_status'],
+                'status_display': status_display,
+                'description': description,
+                'invoice_number': row['row_invoice_number'] or 'S/N',
+                'invoice_file': storage.url(row['row_invoice_file']) if row['row_invoice_file'] else None
             })
-        
-        # Ordenar por fecha descendente
-        transfers_data.sort(key=lambda x: x['transaction_date'], reverse=True)
-        
+
         return Response({
             'provider': {
                 'id': provider.id,
@@ -333,10 +352,12 @@ class ProviderViewSet(viewsets.ModelViewSet):
             'total_debt': total_debt,
             'aging': aging,
             'transfers': transfers_data,
+            'transfers_count': transfer_stats['rows'] + invoice_stats['rows'],
             'year': year
         })
 
     @action(detail=True, methods=['get'], permission_classes=[IsOperativo])
+    @read_replica
     def export_statement_excel(self, request, pk=None):
         """Exportar estado de cuenta del proveedor a Excel"""
         from apps.transfers.models import Transfer, ProviderInvoice
@@ -562,7 +583,7 @@ class CustomsAgentViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(is_active=True)
         return queryset.order_by('name')
 
-class BankViewSet(viewsets.ModelViewSet):
+class BankViewSet(CachedCatalogListMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de bancos"""
     queryset = Bank.objects.all()
     serializer_class = BankSerializer
@@ -577,7 +598,7 @@ class BankViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(is_active=True)
         return queryset.order_by('name')
 
-class ShipmentTypeViewSet(viewsets.ModelViewSet):
+class ShipmentTypeViewSet(CachedCatalogListMixin, viewsets.ModelViewSet):
     queryset = ShipmentType.objects.all()
     serializer_class = ShipmentTypeSerializer
     permission_classes = [IsAdminOrReadOnly]
@@ -590,7 +611,7 @@ class ShipmentTypeViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(is_active=True)
         return queryset.order_by('name')
 
-class CustomsViewSet(viewsets.ModelViewSet):
+class CustomsViewSet(CachedCatalogListMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de aduanas"""
     queryset = Customs.objects.all()
     serializer_class = CustomsSerializer
@@ -619,7 +640,7 @@ class SubClientViewSet(viewsets.ModelViewSet):
         return queryset.order_by('name')
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(CachedCatalogListMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de servicios"""
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
@@ -640,12 +661,13 @@ class ServiceViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def activos(self, request):
         """Endpoint para obtener solo servicios activos (para dropdowns)"""
-        services = self.queryset.filter(is_active=True).order_by('name')
-        serializer = self.get_serializer(services, many=True)
-        return Response(serializer.data)
+        def build():
+            services = self.queryset.filter(is_active=True).order_by('name')
+            return Response(self.get_serializer(services, many=True).data)
+        return self.cached_response('services:activos', build)
 
 
-class ClientServicePriceViewSet(viewsets.ModelViewSet):
+class ClientServicePriceViewSet(CachedCatalogListMixin, viewsets.ModelViewSet):
     """ViewSet para tarifario personalizado de clientes"""
     queryset = ClientServicePrice.objects.select_related('client', 'service').all()
     serializer_class = ClientServicePriceSerializer
@@ -664,9 +686,10 @@ class ClientServicePriceViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], url_path='by-client/(?P<client_id>[^/.]+)')
     def by_client(self, request, client_id=None):
         """Obtener todos los precios personalizados de un cliente específico"""
-        prices = self.queryset.filter(client_id=client_id, is_active=True)
-        serializer = self.get_serializer(prices, many=True)
-        return Response(serializer.data)
+        def build():
+            prices = self.queryset.filter(client_id=client_id, is_active=True)
+            return Response(self.get_serializer(prices, many=True).data)
+        return self.cached_response(f'client-service-prices:by-client:{client_id}', build)
 
     @action(detail=False, methods=['post'])
     def bulk_create(self, request):
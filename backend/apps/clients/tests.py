@@ -121,3 +121,25 @@ class ClientFinancialConsistencyTests(APITestCase):
 		self.assertEqual(response.data['total_paid'], 70.0)
 		self.assertEqual(response.data['total_collected'], 90.0)
 		self.assertEqual(response.data['total_pending'], 110.0)
+
+	def test_account_statement_aging_buckets_by_days_overdue(self):
+		from datetime import timedelta
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+
+		today = date.today()
+		for days_overdue, amount in ((-5, '10.00'), (10, '20.00'), (45, '30.00'), (75, '40.00'), (120, '50.00')):
+			invoice = self._create_invoice(issue_date=today, total_amount=amount)
+			Invoice.objects.filter(pk=invoice.pk).update(due_date=today - timedelta(days=days_overdue))
+
+		url = reverse('client-account-statement', kwargs={'pk': self.client_company.id})
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(url, {'year': today.year})
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data['aging'], {
+			'current': 10.0, '1-30': 20.0, '31-60': 30.0, '61-90': 40.0, '90+': 50.0,
+		})
+		self.assertEqual(response.data['credit_used'], 150.0)
+		aggregate_queries = [q for q in ctx.captured_queries if 'SUM' in q['sql'].upper()]
+		self.assertEqual(len(aggregate_queries), 1)
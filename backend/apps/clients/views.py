@@ -5,6 +5,7 @@ from django.db.models import Sum, Q, F, ExpressionWrapper, DecimalField
 from django.http import HttpResponse
 from .models import Client
 from .serializers import ClientSerializer, ClientListSerializer
+from apps.core.db_routing import read_replica
 from apps.users.permissions import IsOperativo, IsOperativo2, IsAdminUser
 from apps.orders.models import ServiceOrder
 from apps.transfers.models import Transfer
@@ -220,25 +221,18 @@ class ClientViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'], permission_classes=[IsOperativo])
+    @read_replica
     def account_statement(self, request, pk=None):
         """Estado de cuenta detallado de un cliente con facturas y pagos"""
         from apps.orders.models import Invoice, InvoicePayment
         from apps.orders.serializers import InvoiceListSerializer
+        from apps.core.summary import SummaryBuilder
 
         client = self.get_object()
 
         # Get year filter
         year = request.query_params.get('year', datetime.now().year)
 
-        # Calculate Credit Used: Sum of balances from unpaid invoices
-        unpaid_invoices = Invoice.objects.filter(
-            service_order__client=client,
-            balance__gt=0
-        ).exclude(status__in=['paid', 'cancelled'])
-
-        credit_used = unpaid_invoices.aggregate(Sum('balance'))['balance__sum'] or 0
-        available_credit = max(0, float(client.credit_limit) - float(credit_used))
-
         # Get all invoices for the client (optionally filtered by year)
         invoices_qs = Invoice.objects.filter(
             service_order__client=client
@@ -253,76 +247,74 @@ class ClientViewSet(viewsets.ModelViewSet):
         # Serializar facturas con información completa
         invoices_data = InvoiceListSerializer(invoices_qs, many=True).data
 
+        today = datetime.now().date()
+
+        # Facturas con saldo (crédito usado y antigüedad). Siempre están dentro de
+        # invoices_qs: el filtro por año incluye toda factura con saldo pendiente.
+        unpaid = Q(balance__gt=0) & ~Q(status__in=['paid', 'cancelled'])
         # Facturas válidas para métricas financieras (excluye anuladas)
-        valid_invoices_qs = invoices_qs.exclude(status='cancelled')
+        valid = ~Q(status='cancelled')
+        open_valid = valid & Q(balance__gt=0) & ~Q(status='paid')
 
         collected_expression = ExpressionWrapper(
             F('total_amount') - F('balance'),
             output_field=DecimalField(max_digits=15, decimal_places=2)
         )
 
-        # Calcular estadísticas de facturas
-        total_invoiced = valid_invoices_qs.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        total_paid = valid_invoices_qs.aggregate(Sum('paid_amount'))['paid_amount__sum'] or 0
-        total_collected = valid_invoices_qs.aggregate(
-            total_collected=Sum(collected_expression)
-        )['total_collected'] or 0
-        total_pending = valid_invoices_qs.filter(
-            status__in=['pending', 'partial', 'overdue']
-        ).aggregate(Sum('balance'))['balance__sum'] or 0
+        # Todas las métricas en una sola consulta
+        summary = SummaryBuilder()
+        summary.sum('credit_used', 'balance', unpaid)
+        summary.sum('total_invoiced', 'total_amount', valid)
+        summary.sum('total_paid', 'paid_amount', valid)
+        summary.sum('total_collected', collected_expression, valid)
+        summary.sum('total_pending', 'balance', valid & Q(status__in=['pending', 'partial', 'overdue']))
+        invoice_statuses = ['pending', 'partial', 'paid', 'overdue', 'cancelled']
+        for status_code in invoice_statuses:
+            summary.count(f'status_{status_code}', Q(status=status_code))
+        summary.count('overdue_count', open_valid & Q(due_date__lt=today))
+        summary.count('upcoming_due_count', open_valid & Q(
+            due_date__gte=today, due_date__lte=today + timedelta(days=7)
+        ))
+
+        # Aging Analysis (Antigüedad de Saldos) sobre facturas con saldo pendiente:
+        # días de vencido = hoy - fecha de vencimiento (sin fecha = corriente)
+        summary.sum('aging_current', 'balance', unpaid & (Q(due_date__isnull=True) | Q(due_date__gte=today)))
+        summary.sum('aging_1_30', 'balance', unpaid & Q(
+            due_date__lt=today, due_date__gte=today - timedelta(days=30)
+        ))
+        summary.sum('aging_31_60', 'balance', unpaid & Q(
+            due_date__lt=today - timedelta(days=30), due_date__gte=today - timedelta(days=60)
+        ))
+        summary.sum('aging_61_90', 'balance', unpaid & Q(
+            due_date__lt=today - timedelta(days=60), due_date__gte=today - timedelta(days=90)
+        ))
+        summary.sum('aging_90_plus', 'balance', unpaid & Q(due_date__lt=today - timedelta(days=90)))
+        totals = summary.aggregate(invoices_qs)
+
+        credit_used = totals['credit_used']
+        available_credit = max(0, float(client.credit_limit) - float(credit_used))
+        total_invoiced = totals['total_invoiced']
+        total_paid = totals['total_paid']
+        total_collected = totals['total_collected']
+        total_pending = totals['total_pending']
 
         # Facturas por estado
         invoices_by_status = {
-            'pending': invoices_qs.filter(status='pending').count(),
-            'partial': invoices_qs.filter(status='partial').count(),
-            'paid': invoices_qs.filter(status='paid').count(),
-            'overdue': invoices_qs.filter(status='overdue').count(),
-            'cancelled': invoices_qs.filter(status='cancelled').count(),
+            status_code: totals[f'status_{status_code}'] for status_code in invoice_statuses
         }
 
         # Facturas vencidas y próximas a vencer
-        today = datetime.now().date()
-        overdue_invoices = valid_invoices_qs.filter(
-            due_date__lt=today,
-            balance__gt=0
-        ).exclude(status='paid').count()
-
-        upcoming_due = valid_invoices_qs.filter(
-            due_date__gte=today,
-            due_date__lte=today + timedelta(days=7),
-            balance__gt=0
-        ).exclude(status='paid').count()
-
-        # Aging Analysis (Antigüedad de Saldos)
+        overdue_invoices = totals['overdue_count']
+        upcoming_due = totals['upcoming_due_count']
+
         aging = {
-            'current': 0.0,  # Corriente (No vencido)
-            '1-30': 0.0,     # 1 a 30 días de vencido
-            '31-60': 0.0,    # 31 a 60 días
-            '61-90': 0.0,    # 61 a 90 días
-            '90+': 0.0       # Más de 90 días
+            'current': float(totals['aging_current']),  # Corriente (No vencido)
+            '1-30': float(totals['aging_1_30']),        # 1 a 30 días de vencido
+            '31-60': float(totals['aging_31_60']),      # 31 a 60 días
+            '61-90': float(totals['aging_61_90']),      # 61 a 90 días
+            '90+': float(totals['aging_90_plus']),      # Más de 90 días
         }
 
-        # Iterar sobre facturas con saldo pendiente para calcular aging
-        # Usamos unpaid_invoices que ya filtramos arriba (balance > 0, no pagadas/anuladas)
-        for inv in unpaid_invoices:
-            bal = float(inv.balance)
-            if not inv.due_date:
-                aging['current'] += bal
-                continue
-
-            days_overdue = (today - inv.due_date).days
-
-            if days_overdue <= 0:
-                aging['current'] += bal
-            elif days_overdue <= 30:
-                aging['1-30'] += bal
-            elif days_overdue <= 60:
-                aging['31-60'] += bal
-            elif days_overdue <= 90:
-                aging['61-90'] += bal
-            else:
-                aging['90+'] += bal
-
         # Historial de pagos recientes (últimos 10)
         recent_payments = InvoicePayment.objects.filter(
             invoice__service_order__client=client
@@ -391,6 +383,7 @@ class ClientViewSet(viewsets.ModelViewSet):
         return Response(data)
     
     @action(detail=True, methods=['get'], permission_classes=[IsOperativo])
+    @read_replica
     def export_statement_excel(self, request, pk=None):
         """Exportar estado de cuenta completo a Excel con facturas y pagos"""
         from apps.orders.models import Invoice, InvoicePayment
@@ -670,6 +663,7 @@ class ClientViewSet(viewsets.ModelViewSet):
         return response
 
     @action(detail=False, methods=['get'], permission_classes=[IsOperativo])
+    @read_replica
     def export_clients_excel(self, request):
         """Exportar listado de clientes a Excel"""
         # Filtros
@@ -0,0 +1,178 @@
+"""
+Mantenimiento incremental de montos pagados (``paid_amount``/``balance``).
+
+Antes, cada alta o anulación de un pago (InvoicePayment, TransferPayment,
+ProviderInvoicePayment) volvía a leer y sumar TODOS los pagos del documento y
+luego llamaba a ``save()`` del padre, con toda su lógica (cargos de la
+factura, cliente, señales). Con cientos de abonos, registrar uno más costaba
+proporcional al historial. Ahora:
+
+- ``paid_delta`` calcula cuánto cambia el monto pagado efectivo al guardar el
+  pago (alta: +monto, anulación: -monto, edición: diferencia). El estado
+  anterior del pago se lee con la fila del padre ya bloqueada (y la del pago
+  con ``select_for_update``): dos anulaciones o ediciones simultáneas del
+  mismo pago se serializan y la segunda ve lo que dejó la primera, en lugar
+  de restar el monto dos veces.
+- ``apply_paid_delta`` bloquea la fila del padre, suma el delta y recalcula
+  los campos derivados con ``apply_payment_state()`` del modelo padre (la misma
+  regla que usa su ``save()``). Si no cambia ninguno de
+  ``PAYMENT_SIGNAL_FIELDS`` se persiste con un solo ``UPDATE`` con
+  ``F('paid_amount') + delta``; si cambia (p. ej. un gasto que pasa a
+  "pagado", que notifica al solicitante) se usa ``save()``.
+- ``recalculate_paid_amount`` es el recálculo completo: se usa si un pago cambia
+  de documento y en la conciliación (``manage.py reconcile_paid_amounts``).
+
+El padre debe definir ``PAYMENT_STATE_FIELDS`` y ``apply_payment_state()``.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+ZERO = Decimal('0.00')
+
+
+def paid_delta(payment, parent_field):
+    """
+    Variación del monto pagado del padre que produce guardar ``payment``
+    (antes de llamar a ``save()``, dentro de una transacción con el padre
+    bloqueado; ver ``update_parent_paid_amount``).
+
+    Returns:
+        tuple ``(delta, previous_parent_id)``; ``delta`` es None si el pago
+        cambió de documento (recálculo completo de ambos).
+    """
+    attname = payment._meta.get_field(parent_field).attname
+    effective = ZERO if payment.is_deleted else payment.amount
+    if payment._state.adding:
+        return effective, None
+
+    previous = type(payment).all_objects.select_for_update().filter(pk=payment.pk).values(
+        'amount', 'is_deleted', attname
+    ).first()
+    if previous is None:
+        return effective, None
+    if previous[attname] != getattr(payment, attname):
+        return None, previous[attname]
+    return effective - (ZERO if previous['is_deleted'] else previous['amount']), previous[attname]
+
+
+def apply_paid_delta(payment, parent_field, delta):
+    """
+    Suma ``delta`` al ``paid_amount`` del documento de ``payment`` con la fila
+    bloqueada y actualiza sus campos derivados.
+
+    Returns:
+        la instancia del padre con los valores nuevos.
+    """
+    field = payment._meta.get_field(parent_field)
+    parent_model = field.related_model
+    parent_id = getattr(payment, field.attname)
+    state_fields = parent_model.PAYMENT_STATE_FIELDS
+    signal_fields = getattr(parent_model, 'PAYMENT_SIGNAL_FIELDS', ())
+
+    with transaction.atomic():
+        parent = parent_model._base_manager.select_for_update().get(pk=parent_id)
+        before = {name: getattr(parent, name) for name in state_fields}
+        parent.paid_amount += delta
+        parent.apply_payment_state()
+        changed = [name for name in state_fields if getattr(parent, name) != before[name]]
+
+        if any(name in signal_fields for name in changed):
+            parent.save()
+        else:
+            updates = {name: getattr(parent, name) for name in changed}
+            updates['paid_amount'] = F('paid_amount') + delta
+            if any(f.name == 'updated_at' for f in parent_model._meta.concrete_fields):
+                updates['updated_at'] = parent.updated_at = timezone.now()
+            parent_model._base_manager.filter(pk=parent_id).update(**updates)
+
+    _sync_cached_parent(payment, field, parent, state_fields)
+    return parent
+
+
+def recalculate_paid_amount(payment_model, parent_field, parent_id):
+    """Recálculo completo: suma los pagos activos y guarda el padre con ``save()``."""
+    field = payment_model._meta.get_field(parent_field)
+    parent_model = field.related_model
+
+    with transaction.atomic():
+        parent = parent_model._base_manager.select_for_update().get(pk=parent_id)
+        parent.paid_amount = payment_model.all_objects.filter(
+            **{field.attname: parent_id, 'is_deleted': False}
+        ).aggregate(total=Sum('amount'))['total'] or ZERO
+        parent.save()
+    return parent
+
+
+def update_parent_paid_amount(payment, parent_field, save):
+    """
+    Guarda ``payment`` con ``save()`` y refleja el cambio en su documento.
+    Es el cuerpo común de ``save()`` de los modelos de pago.
+    """
+    field = payment._meta.get_field(parent_field)
+    with transaction.atomic():
+        if not payment._state.adding:
+            # Padre antes que pago: el mismo orden en que lo bloquean las vistas
+            # y ``apply_paid_delta``, y el delta se calcula ya serializado
+            list(
+                field.related_model._base_manager.select_for_update()
+                .filter(pk=getattr(payment, field.attname))
+                .values_list('pk', flat=True)
+            )
+        delta, previous_parent_id = paid_delta(payment, parent_field)
+        save()
+
+        if delta is None:
+            # Cambió de documento: se recalculan ambos
+            recalculate_paid_amount(type(payment), parent_field, previous_parent_id)
+            parent = recalculate_paid_amount(type(payment), parent_field, getattr(payment, field.attname))
+            _sync_cached_parent(payment, field, parent, parent.PAYMENT_STATE_FIELDS)
+        elif delta:
+            apply_paid_delta(payment, parent_field, delta)
+
+
+def paid_amount_drift(parent_model, payment_model, parent_field, balance_mismatch=None):
+    """
+    Documentos cuyo ``paid_amount`` (o saldo, según ``balance_mismatch``) no
+    coincide con la suma de sus pagos activos. Una sola consulta; cada fila
+    trae ``computed_paid``.
+
+    Args:
+        balance_mismatch: Q opcional sobre el padre (puede usar
+            ``computed_paid``) que detecta un saldo mal calculado.
+    """
+    field = payment_model._meta.get_field(parent_field)
+    paid = payment_model.all_objects.filter(
+        **{field.attname: OuterRef('pk'), 'is_deleted': False}
+    ).order_by().values(field.attname).annotate(total=Sum('amount')).values('total')
+
+    mismatch = ~Q(paid_amount=F('computed_paid'))
+    if balance_mismatch is not None:
+        mismatch |= balance_mismatch
+
+    return parent_model._base_manager.annotate(
+        computed_paid=Coalesce(
+            Subquery(paid, output_field=DecimalField(max_digits=15, decimal_places=2)),
+            Value(ZERO),
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        )
+    ).filter(mismatch)
+
+
+def _sync_cached_parent(payment, field, parent, state_fields):
+    """
+    Copia los valores nuevos al padre ya cargado en ``payment`` (el objeto que
+    tiene quien llamó), como cuando se guardaba con ``payment.invoice.save()``.
+    """
+    if not field.is_cached(payment):
+        field.set_cached_value(payment, parent)
+        return
+    cached = field.get_cached_value(payment)
+    if cached is None or cached is parent:
+        return
+    for name in ('paid_amount',) + tuple(state_fields):
+        setattr(cached, name, getattr(parent, name))
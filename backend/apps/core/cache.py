@@ -17,12 +17,19 @@ Uso de Cache:
     @cache_response(timeout=300, key_prefix='dashboard')
     def get_dashboard_metrics(request):
         ...
+
+Uso de TwoTierCache (datos calientes que casi no cambian, p. ej. catálogos):
+    catalogs = TwoTierCache('catalogs', timeout=3600)
+    names = catalogs.get('names:bank', lambda: dict(Bank.objects.values_list('pk', 'name')))
+    catalogs.invalidate()   # al modificar un catálogo (todos los workers)
 """
 
 import functools
 import hashlib
+import threading
 import time
 import logging
+from collections import OrderedDict
 from contextlib import contextmanager
 from typing import Optional, Callable, Any
 
@@ -385,3 +392,152 @@ class CacheManager:
 
 # Instancia global para uso conveniente
 cache_manager = CacheManager()
+
+
+# ============================================
+# TWO-TIER CACHE (LRU local + caché compartido)
+# ============================================
+
+_MISSING = object()
+
+
+class LocalLRUCache:
+    """LRU acotado en la memoria del proceso, con TTL por entrada (thread-safe)."""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= now:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache:
+    """
+    Caché de dos niveles para datos que se leen en casi todas las peticiones y
+    cambian poco (catálogos):
+
+    1. LRU en memoria del proceso (``local_ttl`` segundos): sin red.
+    2. Caché compartido (Redis en producción): lo comparten los workers.
+    3. ``loader()``: la consulta a la BD, sólo si no está en ninguno.
+
+    Invalidación entre workers por versión: las claves compartidas incluyen
+    la versión del namespace (``tt:<namespace>:version``) e ``invalidate()``
+    la incrementa. Cada proceso relee la versión como máximo cada
+    ``version_check_interval`` segundos, así que un cambio se ve en los demás
+    workers con ese retraso. Con LocMemCache (desarrollo) el caché
+    "compartido" es por proceso.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        timeout: int = 3600,
+        local_ttl: float = 60,
+        version_check_interval: float = 2,
+        max_entries: int = 512,
+        cache_alias: str = 'default',
+    ):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.local_ttl = local_ttl
+        self.version_check_interval = version_check_interval
+        self.cache_alias = cache_alias
+        self.local = LocalLRUCache(max_entries)
+        self._version = None
+        self._version_checked_at = 0.0
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias]
+
+    @property
+    def version_key(self) -> str:
+        return f"tt:{self.namespace}:version"
+
+    def get_version(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._version_checked_at < self.version_check_interval:
+            return self._version
+
+        try:
+            version = self.shared.get(self.version_key)
+            if version is None:
+                # Versión inicial basada en la hora: si Redis pierde la clave,
+                # no se reutiliza una versión vieja con valores obsoletos.
+                self.shared.add(self.version_key, int(time.time() * 1000), None)
+                version = self.shared.get(self.version_key)
+        except Exception as e:
+            logger.warning(f"TwoTierCache {self.namespace}: caché compartido no disponible ({e})")
+            version = None
+
+        if version is None:
+            version = self._version if self._version is not None else 0
+        self._version = version
+        self._version_checked_at = now
+        return version
+
+    def get(self, key: str, loader: Callable = None, timeout: int = None) -> Any:
+        """Valor de ``key``; si no está en ningún nivel, lo calcula con ``loader()``."""
+        version = self.get_version()
+        local_key = (version, key)
+        value = self.local.get(local_key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        shared_key = f"tt:{self.namespace}:v{version}:{key}"
+        try:
+            value = self.shared.get(shared_key, _MISSING)
+        except Exception as e:
+            logger.warning(f"TwoTierCache {self.namespace}: error leyendo {key} ({e})")
+            value = _MISSING
+
+        if value is _MISSING:
+            if loader is None:
+                return None
+            value = loader()
+            try:
+                self.shared.set(shared_key, value, timeout or self.timeout)
+            except Exception as e:
+                logger.warning(f"TwoTierCache {self.namespace}: error guardando {key} ({e})")
+
+        self.local.set(local_key, value, self.local_ttl)
+        return value
+
+    def invalidate(self):
+        """Descarta todo el namespace en este proceso y en los demás workers."""
+        try:
+            try:
+                self.shared.incr(self.version_key)
+            except ValueError:
+                # La clave no existe (expulsada o nunca creada)
+                self.shared.add(self.version_key, int(time.time() * 1000), None)
+        except Exception as e:
+            logger.warning(f"TwoTierCache {self.namespace}: no se pudo invalidar ({e})")
+        self.local.clear()
+        self._version = None
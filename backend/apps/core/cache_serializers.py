@@ -0,0 +1,163 @@
+"""
+Serializador binario compacto para la caché en Redis.
+
+``django_redis.serializers.json.JSONSerializer`` guardaba los payloads grandes
+(dashboard, estados de cuenta) como JSON verboso y convertía ``Decimal`` y
+``date`` en cadenas, así que el valor leído de la caché no era igual al que se
+guardó. ``CompactSerializer``:
+
+- Usa msgpack (si está instalado) con tipos de extensión para ``Decimal``,
+  ``date``, ``datetime``, ``time`` y ``UUID``. Si el valor tiene tipos que
+  msgpack no representa (sets, instancias de modelos...), o msgpack no está
+  instalado, usa pickle.
+- Comprime con zlib (o lz4 si está instalado y se pide) los payloads mayores
+  a ``COMPRESS_MIN_LENGTH`` bytes.
+- El primer byte indica formato y compresión, así que ``loads`` lee cualquier
+  combinación sin depender de la configuración actual.
+- Los valores que dejó ``JSONSerializer`` (sin cabecera: empiezan con ``{``,
+  ``[``, ``"``, un dígito...) se leen como JSON. Además ``settings.CACHES``
+  sube ``VERSION`` junto con el cambio de serializador, así que en la práctica
+  las claves viejas ni se consultan; esto cubre un rollback o una ``VERSION``
+  fijada a mano.
+
+Se selecciona por alias de caché, en ``OPTIONS``::
+
+    'OPTIONS': {
+        'SERIALIZER': 'apps.core.cache_serializers.CompactSerializer',
+        'COMPRESS_MIN_LENGTH': 1024,    # opcional
+        'COMPRESSION': 'zlib',          # 'zlib' | 'lz4' | 'none'
+    }
+
+La compresión la hace el serializador: el ``COMPRESSOR`` de django-redis debe
+quedar en el valor por defecto (identidad).
+
+Nota: msgpack convierte las tuplas en listas.
+"""
+
+import json
+import pickle
+import uuid
+import zlib
+from datetime import date, datetime, time
+from decimal import Decimal
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependencia opcional
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover - dependencia opcional
+    lz4_frame = None
+
+
+# Primer byte: formato (nibble alto) | compresión (nibble bajo)
+FORMAT_MSGPACK = 0x10
+FORMAT_PICKLE = 0x20
+COMPRESSION_NONE = 0x00
+COMPRESSION_ZLIB = 0x01
+COMPRESSION_LZ4 = 0x02
+HEADERS = {
+    fmt | compression
+    for fmt in (FORMAT_MSGPACK, FORMAT_PICKLE)
+    for compression in (COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_LZ4)
+}
+# Número mágico de un frame lz4; distingue pickle+lz4 (0x22) de un string JSON (``"``)
+LZ4_FRAME_MAGIC = b'\x04\x22\x4d\x18'
+
+# Códigos de extensión de msgpack
+EXT_DECIMAL = 1
+EXT_DATE = 2
+EXT_DATETIME = 3
+EXT_TIME = 4
+EXT_UUID = 5
+
+
+def _encode_ext(obj):
+    # datetime antes que date: datetime es subclase de date
+    if isinstance(obj, Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(obj).encode())
+    if isinstance(obj, datetime):
+        return msgpack.ExtType(EXT_DATETIME, obj.isoformat().encode())
+    if isinstance(obj, date):
+        return msgpack.ExtType(EXT_DATE, obj.isoformat().encode())
+    if isinstance(obj, time):
+        return msgpack.ExtType(EXT_TIME, obj.isoformat().encode())
+    if isinstance(obj, uuid.UUID):
+        return msgpack.ExtType(EXT_UUID, obj.bytes)
+    raise TypeError(f'Tipo no soportado por msgpack: {type(obj).__name__}')
+
+
+def _decode_ext(code, data):
+    if code == EXT_DECIMAL:
+        return Decimal(data.decode())
+    if code == EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == EXT_DATE:
+        return date.fromisoformat(data.decode())
+    if code == EXT_TIME:
+        return time.fromisoformat(data.decode())
+    if code == EXT_UUID:
+        return uuid.UUID(bytes=data)
+    return msgpack.ExtType(code, data)
+
+
+class CompactSerializer:
+    """Serializador para django-redis (interfaz ``dumps``/``loads``)."""
+
+    def __init__(self, options=None):
+        options = options or {}
+        self.min_length = int(options.get('COMPRESS_MIN_LENGTH', 1024))
+        self.level = int(options.get('COMPRESS_LEVEL', 6))
+        compression = options.get('COMPRESSION', 'zlib')
+        if compression == 'lz4' and lz4_frame is not None:
+            self.compression = COMPRESSION_LZ4
+        elif compression == 'none':
+            self.compression = COMPRESSION_NONE
+        else:
+            self.compression = COMPRESSION_ZLIB
+        self.use_msgpack = msgpack is not None and options.get('FORMAT', 'msgpack') == 'msgpack'
+
+    def dumps(self, value):
+        fmt = FORMAT_PICKLE
+        payload = None
+        if self.use_msgpack:
+            try:
+                payload = msgpack.packb(value, default=_encode_ext, use_bin_type=True, datetime=False)
+                fmt = FORMAT_MSGPACK
+            except (TypeError, ValueError, OverflowError):
+                payload = None
+        if payload is None:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+        compression = COMPRESSION_NONE
+        if self.compression != COMPRESSION_NONE and len(payload) >= self.min_length:
+            compression = self.compression
+            if compression == COMPRESSION_LZ4:
+                payload = lz4_frame.compress(payload)
+            else:
+                payload = zlib.compress(payload, self.level)
+
+        return bytes([fmt | compression]) + payload
+
+    def loads(self, value):
+        header, payload = value[0], value[1:]
+        if header not in HEADERS or (
+            header == FORMAT_PICKLE | COMPRESSION_LZ4 and not payload.startswith(LZ4_FRAME_MAGIC)
+        ):
+            # Valor anterior, escrito por JSONSerializer
+            return json.loads(value)
+        compression = header & 0x0F
+        if compression == COMPRESSION_ZLIB:
+            payload = zlib.decompress(payload)
+        elif compression == COMPRESSION_LZ4:
+            if lz4_frame is None:
+                raise ValueError('Valor comprimido con lz4, pero lz4 no está instalado')
+            payload = lz4_frame.decompress(payload)
+
+        if header & 0xF0 == FORMAT_MSGPACK:
+            if msgpack is None:
+                raise ValueError('Valor serializado con msgpack, pero msgpack no está instalado')
+            return msgpack.unpackb(payload, ext_hook=_decode_ext, raw=False, strict_map_key=False)
+        return pickle.loads(payload)
@@ -0,0 +1,242 @@
+"""
+Lecturas de reportes en la réplica de lectura.
+
+El dashboard, los resúmenes, los estados de cuenta, las exportaciones a Excel
+y los listados de documentos corrían sobre la base principal, compitiendo con
+las transacciones de pagos y facturación (``select_for_update``). Si hay una
+réplica configurada (``READ_REPLICA_ALIAS``):
+
+- ``ReplicaReadMixin`` (vistas/viewsets) y ``read_replica`` (decorador de
+  vistas o acciones) ejecutan las peticiones GET/HEAD/OPTIONS dentro de
+  ``use_replica()``.
+- ``ReadReplicaRouter`` envía a la réplica las lecturas hechas dentro de ese
+  contexto. Las escrituras, las lecturas dentro de una transacción de la
+  principal y todo lo demás siguen en ``default``.
+
+Se vuelve a la principal (sin error) si:
+
+- el retraso de la réplica supera ``READ_REPLICA_MAX_LAG`` segundos o no se
+  puede medir (réplica caída). La medición se reutiliza durante
+  ``READ_REPLICA_LAG_CHECK_INTERVAL`` segundos por proceso;
+- el usuario escribió hace menos de ``READ_REPLICA_MAX_LAG`` segundos
+  (``ReplicaPinMiddleware``), para que vea sus propios cambios;
+- el código necesita datos frescos para luego escribir (``use_primary()``,
+  p. ej. el barrido de alertas o la reconstrucción de KPIs).
+"""
+
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_KEY = 'replica:pin:{}'
+
+_state = threading.local()
+
+# PostgreSQL en recuperación (standby): segundos desde la última transacción
+# aplicada; 0 si ya aplicó todo lo recibido. En un servidor que no es standby
+# las funciones devuelven NULL.
+POSTGRES_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def replica_alias():
+    """Alias de la réplica si está configurada (None si no)."""
+    alias = getattr(settings, 'READ_REPLICA_ALIAS', None)
+    if alias and alias in settings.DATABASES:
+        return alias
+    return None
+
+
+class _LagMonitor:
+    """Retraso medido por alias, reutilizado ``READ_REPLICA_LAG_CHECK_INTERVAL`` s."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._measured = {}
+
+    def lag(self, alias):
+        interval = getattr(settings, 'READ_REPLICA_LAG_CHECK_INTERVAL', 5)
+        now = time.monotonic()
+        with self._lock:
+            measured = self._measured.get(alias)
+            if measured and now - measured[0] < interval:
+                return measured[1]
+        lag = self.measure(alias)
+        with self._lock:
+            self._measured[alias] = (now, lag)
+        return lag
+
+    def measure(self, alias):
+        """Segundos de retraso; None si la réplica no responde."""
+        connection = connections[alias]
+        try:
+            if connection.vendor != 'postgresql':
+                connection.ensure_connection()
+                return 0.0
+            with connection.cursor() as cursor:
+                cursor.execute(POSTGRES_LAG_SQL)
+                return float(cursor.fetchone()[0] or 0)
+        except Exception as e:
+            logger.warning(f"Read replica '{alias}' unavailable: {e}")
+            return None
+
+    def reset(self):
+        with self._lock:
+            self._measured.clear()
+
+
+lag_monitor = _LagMonitor()
+
+
+def _user_id(request):
+    user = getattr(request, 'user', None)
+    if user is not None and getattr(user, 'is_authenticated', False):
+        return user.pk
+    return None
+
+
+def is_pinned(request):
+    """El usuario escribió hace poco: sus lecturas van a la principal."""
+    user_id = _user_id(request)
+    if user_id is None:
+        return False
+    try:
+        return bool(cache.get(PIN_KEY.format(user_id)))
+    except Exception:
+        return False
+
+
+def pin_to_primary(request):
+    user_id = _user_id(request)
+    if user_id is None:
+        return
+    try:
+        cache.set(PIN_KEY.format(user_id), True, getattr(settings, 'READ_REPLICA_MAX_LAG', 30))
+    except Exception as e:
+        logger.warning(f"Replica pin unavailable: {e}")
+
+
+def choose_read_alias(request=None):
+    """Alias para las lecturas de la petición: la réplica o None (principal)."""
+    alias = replica_alias()
+    if alias is None:
+        return None
+    if request is not None and (request.method not in SAFE_METHODS or is_pinned(request)):
+        return None
+    lag = lag_monitor.lag(alias)
+    if lag is None or lag > getattr(settings, 'READ_REPLICA_MAX_LAG', 30):
+        return None
+    return alias
+
+
+@contextmanager
+def read_scope(alias=None):
+    """Las lecturas del bloque van a ``alias`` (None: la principal)."""
+    previous = getattr(_state, 'read_alias', None)
+    _state.read_alias = alias
+    try:
+        yield alias
+    finally:
+        _state.read_alias = previous
+
+
+def use_replica(request=None):
+    """Las lecturas del bloque van a la réplica si está disponible."""
+    return read_scope(choose_read_alias(request))
+
+
+def use_primary():
+    """Las lecturas del bloque van a la principal aunque haya réplica activa."""
+    return read_scope(None)
+
+
+def current_read_alias():
+    return getattr(_state, 'read_alias', None)
+
+
+class ReadReplicaRouter:
+    """Ver docstring del módulo. Registrado en ``DATABASE_ROUTERS``."""
+
+    def db_for_read(self, model, **hints):
+        alias = current_read_alias()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Misma base de datos lógica: la réplica es copia de la principal
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == getattr(settings, 'READ_REPLICA_ALIAS', None):
+            return False
+        return None
+
+
+def read_replica(view):
+    """
+    Decorador de vistas de función o acciones de viewset: las lecturas de las
+    peticiones seguras van a la réplica.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next((arg for arg in args if hasattr(arg, 'method') and hasattr(arg, 'META')), None)
+        with use_replica(request):
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaReadMixin:
+    """
+    Mixin de APIView/ViewSet: las peticiones seguras se atienden con lecturas
+    en la réplica. En viewsets, ``replica_actions`` limita las acciones
+    (por defecto, todas). La réplica se elige después de autenticar, para
+    respetar ``is_pinned``.
+    """
+    replica_actions = None
+
+    def dispatch(self, request, *args, **kwargs):
+        with read_scope(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.replica_actions is None or getattr(self, 'action', None) in self.replica_actions:
+            _state.read_alias = choose_read_alias(request)
+
+
+class ReplicaPinMiddleware:
+    """
+    Tras una escritura exitosa (POST/PUT/PATCH/DELETE), las lecturas del
+    usuario van a la principal durante ``READ_REPLICA_MAX_LAG`` segundos.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            replica_alias() is not None
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        ):
+            pin_to_primary(request)
+        return response
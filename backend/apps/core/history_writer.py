@@ -0,0 +1,206 @@
+"""
+Escritura diferida (al hacer commit) de historial y auditoría.
+
+Los receivers de señales (apps/orders/signals.py, apps/transfers/signals.py)
+y varias vistas insertaban una fila de ``OrderHistory`` / ``AuditLog`` por
+evento, de forma síncrona, dentro de la transacción de quien guardaba el
+modelo y mientras éste mantenía sus bloqueos de fila. Con ``record()`` los
+eventos se acumulan y se insertan con un solo ``bulk_create`` cuando la
+transacción hace commit:
+
+    from apps.core.history_writer import record
+
+    record(OrderHistory, service_order=order, user=user,
+           event_type='updated', description='...', metadata={})
+
+Garantías:
+
+- Si la transacción (o el savepoint donde se registró el evento) hace
+  rollback, el evento se descarta: cada grupo de eventos se agenda con
+  ``transaction.on_commit()``, y Django elimina esos callbacks en el rollback.
+- Se respeta el orden de registro. Los eventos se agrupan por nivel de
+  savepoint (al entrar o salir de un ``atomic()`` anidado empieza un grupo
+  nuevo) y los grupos se insertan en el orden en que se crearon.
+- Fuera de una transacción (autocommit) el evento se escribe al momento.
+
+Con ``HISTORY_WRITER_BACKGROUND = True`` los eventos confirmados se entregan a
+un hilo local que los inserta fuera de la petición. Una caída del proceso
+puede perder los eventos aún en cola, por eso está desactivado por defecto.
+
+Nota: los eventos se construyen al insertar, así que ``auto_now_add``
+(``created_at``) refleja el momento del commit, no el del ``record()``.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import close_old_connections, router, transaction
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+# ESCRITURA
+# ============================================
+
+def write_events(events):
+    """
+    Inserta ``[(modelo, campos), ...]`` con un ``bulk_create`` por modelo,
+    en orden. Si el lote falla (p. ej. la OS referenciada se borró en la misma
+    transacción) se reintenta fila por fila para no perder el resto.
+    """
+    by_model = OrderedDict()
+    for model, fields in events:
+        by_model.setdefault(model, []).append(model(**fields))
+
+    for model, objects in by_model.items():
+        using = router.db_for_write(model)
+        try:
+            with transaction.atomic(using=using):
+                model.objects.using(using).bulk_create(objects)
+        except Exception:
+            logger.exception(f"Error inserting {len(objects)} {model.__name__} events in bulk; retrying one by one")
+            for obj in objects:
+                try:
+                    with transaction.atomic(using=using):
+                        obj.save(using=using)
+                except Exception:
+                    logger.exception(f"Dropping {model.__name__} event: {obj.__dict__}")
+
+
+class _BackgroundWriter:
+    """Hilo local que inserta en lotes los eventos ya confirmados."""
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, events):
+        self._ensure_started()
+        for event in events:
+            self.queue.put(event)
+
+    def wait(self):
+        """Bloquea hasta que todo lo encolado se haya insertado."""
+        self.queue.join()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='history-writer', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                close_old_connections()
+                write_events(batch)
+            except Exception:
+                logger.exception('History writer failed to write a batch')
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+
+background_writer = _BackgroundWriter(
+    batch_size=getattr(settings, 'HISTORY_WRITER_BATCH_SIZE', 500)
+)
+
+
+@atexit.register
+def _drain_background_writer():
+    # Al terminar el proceso, dar tiempo a que se escriba lo ya encolado
+    if background_writer._thread is not None and background_writer._thread.is_alive():
+        background_writer.wait()
+
+
+def _dispatch(events):
+    if getattr(settings, 'HISTORY_WRITER_BACKGROUND', False):
+        background_writer.submit(events)
+    else:
+        write_events(events)
+
+
+# ============================================
+# BUFFER POR TRANSACCIÓN
+# ============================================
+
+class _EventGroup:
+    """Eventos registrados en un mismo nivel de savepoint de una transacción."""
+
+    def __init__(self, savepoint_ids):
+        self.savepoint_ids = savepoint_ids
+        self.events = []
+
+    def flush(self):
+        events, self.events = self.events, []
+        if events:
+            _dispatch(events)
+
+
+_state = threading.local()
+
+
+def _current_group(connection):
+    """
+    Grupo al que se agrega el próximo evento, o uno nuevo si cambió el nivel
+    de savepoint o si el callback del grupo ya no está agendado (ya hizo
+    commit o se descartó por rollback).
+    """
+    groups = getattr(_state, 'groups', None)
+    if groups is None:
+        groups = _state.groups = {}
+
+    savepoint_ids = tuple(connection.savepoint_ids)
+    group = groups.get(connection.alias)
+    if (
+        group is not None
+        and group.savepoint_ids == savepoint_ids
+        # run_on_commit: callbacks pendientes de la transacción en curso
+        and any(func == group.flush for _, func, _ in connection.run_on_commit)
+    ):
+        return group
+
+    group = _EventGroup(savepoint_ids)
+    groups[connection.alias] = group
+    transaction.on_commit(group.flush, using=connection.alias, robust=True)
+    return group
+
+
+def record(model, **fields):
+    """
+    Registra una fila de ``model`` (OrderHistory, AuditLog...) que se
+    insertará al hacer commit la transacción actual.
+    """
+    using = router.db_for_write(model)
+    connection = transaction.get_connection(using)
+
+    if not connection.in_atomic_block:
+        _dispatch([(model, fields)])
+        return
+
+    _current_group(connection).events.append((model, fields))
+
+
+def flush_pending(using='default'):
+    """
+    Escribe ya los eventos pendientes de la transacción actual (p. ej. antes de
+    leer el historial dentro de la misma transacción).
+    """
+    group = getattr(_state, 'groups', {}).get(using)
+    if group is not None:
+        group.flush()
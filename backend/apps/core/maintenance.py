@@ -0,0 +1,272 @@
+"""
+Marco común de los comandos de mantenimiento por lotes (``recalculate_totals``,
+``fix_retention_balances``, ``fix_transfer_status``,
+``fix_orphan_third_party_charges``).
+
+Antes cada comando recorría ``Model.objects.all()`` y corregía fila por fila,
+cada una con sus propias consultas (cargos, gastos, ``refresh_from_db``) y su
+propia transacción; en una base grande tardaba mucho y sus bloqueos chocaban
+con los usuarios. Aquí una tarea (``MaintenanceTask``) define qué filas revisar
+y cómo recalcularlas por lote, y ``run_task``:
+
+1. Recorre los candidatos por keyset (``pk > último``, ``ORDER BY pk``,
+   ``LIMIT chunk_size``): sin OFFSET ni cursores abiertos.
+2. En una transacción corta por lote bloquea sólo esas filas
+   (``select_for_update(of=('self',))``), las recalcula con consultas
+   agregadas sobre el lote (``recompute``) y escribe las que cambiaron con un
+   ``bulk_update``. El checkpoint se guarda en la misma transacción.
+3. En modo simulación (``dry_run``) no bloquea ni escribe: sólo informa la
+   diferencia campo por campo.
+4. Con ``workers > 1`` divide el rango de ids en tramos contiguos y procesa
+   cada uno en un hilo con su propia conexión (en SQLite, en secuencia).
+5. ``sleep`` pausa entre lotes para no saturar la base en horario laboral.
+6. Si una corrida se interrumpe, ``resume=True`` continúa desde el último lote
+   confirmado de cada tramo (``MaintenanceCheckpoint``).
+
+``bulk_update`` no dispara ``save()`` ni señales: ``after_update`` de cada
+tarea programa lo que corresponda (alertas, KPIs).
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+CHUNK_SIZE = 500
+
+
+class MaintenanceTask:
+    """
+    Corrección por lotes de un modelo.
+
+    Las subclases definen ``name`` (clave del checkpoint), ``model``,
+    ``fields`` (campos que puede modificar) y ``recompute(rows)``, que
+    actualiza en memoria los objetos del lote.
+    """
+    name = ''
+    label = ''
+    model = None
+    fields = ()
+
+    def candidates(self):
+        """Filas a revisar; se recorren por ``pk``."""
+        return self.model._base_manager.all()
+
+    def recompute(self, rows):
+        raise NotImplementedError
+
+    def describe(self, obj):
+        return f'#{obj.pk}'
+
+    def after_update(self, rows):
+        """Filas ya escritas (dentro de la transacción del lote)."""
+
+
+class Diff:
+    """Cambios ``{campo: (antes, después)}`` de una fila."""
+
+    def __init__(self, task, obj, changes):
+        self.obj = obj
+        self.label = task.describe(obj)
+        self.changes = changes
+
+    def __str__(self):
+        return f"{self.label}: " + ', '.join(
+            f'{field} {old} -> {new}' for field, (old, new) in self.changes.items()
+        )
+
+
+class Result:
+    def __init__(self):
+        self.scanned = 0
+        self.changed = 0
+        self.chunks = 0
+        self._lock = threading.Lock()
+
+    def add(self, scanned, changed):
+        with self._lock:
+            self.scanned += scanned
+            self.changed += changed
+            self.chunks += 1
+
+
+class MaintenanceInterrupted(Exception):
+    """Falló un lote; lo confirmado queda en el checkpoint."""
+
+    def __init__(self, task, errors):
+        self.task = task
+        self.errors = errors
+        super().__init__('; '.join(str(error) for error in errors))
+
+
+def split_ranges(queryset, workers):
+    """Tramos ``(desde, hasta)`` de ids (inclusive) de igual amplitud."""
+    bounds = queryset.order_by().aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    low, high = bounds['low'], bounds['high']
+    step = max(1, -(-(high - low + 1) // max(1, workers)))
+    return [(start, min(start + step - 1, high)) for start in range(low, high + 1, step)]
+
+
+def _auto_now_fields(model):
+    return [
+        field.name for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+    ]
+
+
+def process_chunk(task, pks, dry_run=False, checkpoint=None):
+    """
+    Recalcula y (salvo ``dry_run``) guarda las filas ``pks``.
+
+    Returns:
+        lista de ``Diff`` de las filas que cambiaron.
+    """
+    with transaction.atomic():
+        rows = task.candidates().filter(pk__in=pks).order_by('pk')
+        if not dry_run:
+            rows = rows.select_for_update(of=('self',))
+        rows = list(rows)
+
+        before = [{field: getattr(obj, field) for field in task.fields} for obj in rows]
+        task.recompute(rows)
+
+        diffs = []
+        for obj, old in zip(rows, before):
+            changes = {
+                field: (old[field], getattr(obj, field))
+                for field in task.fields
+                if getattr(obj, field) != old[field]
+            }
+            if changes:
+                diffs.append(Diff(task, obj, changes))
+
+        if diffs and not dry_run:
+            changed_fields = {field for diff in diffs for field in diff.changes}
+            fields = [field for field in task.fields if field in changed_fields]
+            now = timezone.now()
+            for name in _auto_now_fields(task.model):
+                fields.append(name)
+                for diff in diffs:
+                    setattr(diff.obj, name, now)
+            task.model._base_manager.bulk_update([diff.obj for diff in diffs], fields)
+            task.after_update([diff.obj for diff in diffs])
+
+        if checkpoint is not None and not dry_run:
+            checkpoint.last_pk = pks[-1]
+            checkpoint.changed += len(diffs)
+            checkpoint.save(update_fields=['last_pk', 'changed', 'updated_at'])
+
+    return diffs
+
+
+def _run_range(task, checkpoint, lower, upper, after, options, result, report):
+    """Keyset sobre ``lower <= pk <= upper`` a partir de ``after``."""
+    try:
+        while True:
+            queryset = task.candidates().filter(pk__gte=lower, pk__lte=upper)
+            if after is not None:
+                queryset = queryset.filter(pk__gt=after)
+            take = options['chunk_size']
+            if options['limit']:
+                take = min(take, options['limit'] - result.scanned)
+                if take <= 0:
+                    break
+            pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:take])
+            if not pks:
+                break
+
+            diffs = process_chunk(task, pks, options['dry_run'], checkpoint)
+            result.add(len(pks), len(diffs))
+            for diff in diffs:
+                report(diff)
+            after = pks[-1]
+
+            if len(pks) < take:
+                break
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        if checkpoint is not None and not (options['limit'] and result.scanned >= options['limit']):
+            checkpoint.delete()
+    finally:
+        if options['parallel']:
+            connection.close()
+
+
+def run_task(task, chunk_size=CHUNK_SIZE, dry_run=False, workers=1, sleep=0, resume=False, limit=0, report=None):
+    """
+    Ejecuta ``task`` por lotes (ver docstring del módulo).
+
+    Args:
+        limit: máximo de filas a revisar (0 = todas); el checkpoint queda
+            para continuar con ``resume``.
+        report: callable que recibe cada ``Diff`` (se llama desde los hilos
+            con ``workers > 1``; las llamadas se serializan).
+
+    Returns:
+        ``Result`` con filas revisadas, corregidas y lotes.
+
+    Raises:
+        MaintenanceInterrupted si falló algún lote.
+    """
+    from apps.core.models import MaintenanceCheckpoint
+
+    lock = threading.Lock()
+
+    def locked_report(diff):
+        if report is not None:
+            with lock:
+                report(diff)
+
+    options = {
+        'chunk_size': max(1, chunk_size),
+        'dry_run': dry_run,
+        'workers': max(1, workers),
+        'sleep': sleep,
+        'limit': max(0, limit or 0),
+    }
+    result = Result()
+
+    checkpoints = []
+    if resume and not dry_run:
+        checkpoints = list(MaintenanceCheckpoint.objects.filter(task=task.name).order_by('worker'))
+    if checkpoints:
+        ranges = [(cp, cp.lower_pk, cp.upper_pk, cp.last_pk) for cp in checkpoints]
+    else:
+        if not dry_run:
+            MaintenanceCheckpoint.objects.filter(task=task.name).delete()
+        ranges = []
+        for worker, (lower, upper) in enumerate(split_ranges(task.candidates(), options['workers'])):
+            checkpoint = None
+            if not dry_run:
+                checkpoint = MaintenanceCheckpoint.objects.create(
+                    task=task.name, worker=worker, lower_pk=lower, upper_pk=upper,
+                )
+            ranges.append((checkpoint, lower, upper, None))
+
+    # SQLite admite un solo escritor: los tramos se procesan en secuencia
+    options['parallel'] = len(ranges) > 1 and options['workers'] > 1 and connection.vendor != 'sqlite'
+    if options['parallel']:
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [
+                executor.submit(_run_range, task, checkpoint, lower, upper, after, options, result, locked_report)
+                for checkpoint, lower, upper, after in ranges
+            ]
+        errors = [future.exception() for future in futures if future.exception()]
+    else:
+        errors = []
+        for checkpoint, lower, upper, after in ranges:
+            try:
+                _run_range(task, checkpoint, lower, upper, after, options, result, locked_report)
+            except Exception as e:
+                errors.append(e)
+                break
+
+    if errors:
+        raise MaintenanceInterrupted(task, errors)
+    return result
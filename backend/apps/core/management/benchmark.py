@@ -0,0 +1,130 @@
+"""
+Base común de los comandos ``benchmark_*``.
+
+- ``--username``: usuario con el que se ejecutan las vistas.
+- ``--seed N``: crea N registros sintéticos por listado dentro de una
+  transacción que se revierte al terminar (no deja datos).
+- ``--repeat``: repeticiones por variante; se reporta la mediana.
+"""
+
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+
+class _Rollback(Exception):
+    pass
+
+
+class BenchmarkCommand(BaseCommand):
+    default_repeat = 3
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            type=str,
+            help='Usuario con el que se ejecutan las vistas (por defecto, el primer admin activo)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Crear N registros sintéticos por listado (se revierten al terminar)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=self.default_repeat,
+            help='Repeticiones por variante (se reporta la mediana)',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1 or options['seed'] < 0:
+            raise CommandError('--repeat >= 1 y --seed >= 0')
+
+        try:
+            with transaction.atomic():
+                user = self.get_user(options['username'], create=bool(options['seed']))
+                if options['seed']:
+                    self.seed(options['seed'], user)
+                self.run(user, options['repeat'])
+                if options['seed']:
+                    raise _Rollback()
+        except _Rollback:
+            self.stdout.write('Datos sintéticos revertidos.')
+
+    def run(self, user, repeat):
+        raise NotImplementedError
+
+    @staticmethod
+    def median_time(func, repeat):
+        """Mediana en segundos de ``repeat`` ejecuciones; devuelve (segundos, último resultado)."""
+        samples = []
+        result = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            samples.append(time.perf_counter() - started)
+        return statistics.median(samples), result
+
+    def get_user(self, username, create):
+        from apps.users.models import User
+
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'No existe el usuario {username}')
+
+        user = User.objects.filter(role='admin', is_active=True).first()
+        if user is None and create:
+            user = User.objects.create_user(username='benchmark_admin', password=None, role='admin')
+        if user is None:
+            raise CommandError('No hay usuarios admin; use --username o --seed')
+        return user
+
+    def seed(self, count, user):
+        """Datos sintéticos vía bulk_create (sin señales ni numeración)."""
+        from datetime import date, timedelta
+        from apps.catalogs.models import Provider, ShipmentType
+        from apps.clients.models import Client
+        from apps.orders.models import Invoice, InvoicePayment, ServiceOrder
+        from apps.transfers.models import Transfer
+
+        client = Client.objects.create(name='Cliente Benchmark')
+        shipment = ShipmentType.objects.create(name='Benchmark')
+        provider = Provider.objects.create(name='Proveedor Benchmark')
+
+        orders = ServiceOrder.objects.bulk_create([
+            ServiceOrder(
+                order_number=f'{i + 1}-9999', client=client, shipment_type=shipment,
+                provider=provider, customs_agent=user, created_by=user,
+                purchase_order=f'PO-{i}', eta=date(2099, 1, 1),
+            )
+            for i in range(count)
+        ])
+        invoices = Invoice.objects.bulk_create([
+            Invoice(
+                service_order=order, invoice_number=f'BENCH-{i:06d}',
+                total_amount=Decimal('113.00'), balance=Decimal('103.00'),
+                paid_amount=Decimal('10.00'), due_date=date.today() - timedelta(days=i % 60),
+                created_by=user,
+            )
+            for i, order in enumerate(orders)
+        ])
+        InvoicePayment.objects.bulk_create([
+            InvoicePayment(invoice=invoice, amount=Decimal('10.00'), payment_method='transferencia', created_by=user)
+            for invoice in invoices
+        ])
+        Transfer.objects.bulk_create([
+            Transfer(
+                transfer_type='cargos', service_order=order, provider=provider,
+                amount=Decimal('25.00'), balance=Decimal('25.00'),
+                description=f'Gasto benchmark {i}', created_by=user,
+            )
+            for i, order in enumerate(orders)
+        ])
+        self.stdout.write(f'Sembrados {count} registros por listado.')
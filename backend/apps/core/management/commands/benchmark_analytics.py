@@ -0,0 +1,177 @@
+"""
+Django Management Command: Benchmark de reportes analíticos
+
+Compara los reportes de apps/dashboard/analytics.py (columnas con
+values_list + agregaciones vectorizadas en pandas) con el cálculo por objeto
+que hacían los scripts ad hoc: recorrer las facturas y, por cada una, sus
+cargos, la asignación de costo de cada cargo, el servicio y el cliente.
+
+Con --seed crea N facturas sintéticas (dos cargos por factura, uno con costo
+asignado, y un gasto propio por OS) dentro de una transacción que se revierte
+al terminar. Verifica además que ambos cálculos den los mismos montos.
+
+USO:
+    python manage.py benchmark_analytics --seed 2000
+    python manage.py benchmark_analytics --start 2025-01-01 --end 2025-12-31 --repeat 5
+"""
+
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from apps.core.management.benchmark import BenchmarkCommand
+from apps.dashboard.analytics import build_reports, default_period
+
+
+class _Rollback(Exception):
+    pass
+
+
+def per_object_margins(start, end):
+    """Margen por cliente y por servicio recorriendo los modelos (referencia)."""
+    from apps.orders.models import Invoice
+    from apps.transfers.models import Transfer
+
+    by_client = defaultdict(lambda: {'revenue': Decimal('0'), 'direct_cost': Decimal('0')})
+    by_service = defaultdict(lambda: {'revenue': Decimal('0'), 'direct_cost': Decimal('0')})
+    invoices = Invoice.objects.filter(issue_date__gte=start, issue_date__lte=end).exclude(status='cancelled')
+    for invoice in invoices:
+        client = invoice.service_order.client
+        for charge in invoice.charges.filter(is_deleted=False):
+            cost = charge.get_cost()
+            by_client[client.name]['revenue'] += charge.subtotal
+            by_client[client.name]['direct_cost'] += cost
+            by_service[charge.service.name]['revenue'] += charge.subtotal
+            by_service[charge.service.name]['direct_cost'] += cost
+
+    transfers = Transfer.objects.filter(
+        transfer_type__in=['costos', 'propios'], transaction_date__gte=start, transaction_date__lte=end,
+    )
+    for transfer in transfers:
+        if transfer.service_order and transfer.service_order.client:
+            by_client[transfer.service_order.client.name]['direct_cost'] += transfer.amount
+    return by_client, by_service
+
+
+class Command(BaseCommand):
+    help = 'Compara los reportes analíticos vectorizados con el cálculo por objeto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Facturas sintéticas (se revierten al terminar)')
+        parser.add_argument('--start', type=date.fromisoformat, help='Inicio del periodo (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Fin del periodo (YYYY-MM-DD)')
+        parser.add_argument('--repeat', type=int, default=3, help='Repeticiones (se reporta la mediana)')
+
+    def handle(self, *args, **options):
+        if options['seed'] < 0 or options['repeat'] < 1:
+            raise CommandError('--seed >= 0 y --repeat >= 1')
+
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self.seed(options['seed'])
+                self.measure(*default_period(options['start'], options['end']), options['repeat'])
+                if options['seed']:
+                    raise _Rollback()
+        except _Rollback:
+            self.stdout.write('Datos sintéticos revertidos.')
+
+    def measure(self, start, end, repeat):
+        variants = (
+            ('por objeto', lambda: per_object_margins(start, end)),
+            ('pandas', lambda: build_reports(('margin_by_client', 'margin_by_service'), start, end)[2]),
+        )
+        results = {}
+        for name, func in variants:
+            # Contador propio: el registro de consultas de Django se limita a 9000
+            queries = [0]
+
+            def count(execute, sql, params, many, context):
+                queries[0] += 1
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count):
+                func()
+            seconds, results[name] = BenchmarkCommand.median_time(func, repeat)
+            self.stdout.write(f'  {name:<12} {seconds * 1000:10.2f}ms  {queries[0]:6d} consultas')
+
+        by_client, by_service = results['por objeto']
+        frames = results['pandas']
+        mismatches = self.compare(by_client, frames['margin_by_client'], 'client_name')
+        mismatches += self.compare(by_service, frames['margin_by_service'], 'service_name')
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f'{mismatches} diferencia(s) entre ambos cálculos'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Ambos cálculos coinciden.'))
+
+    def compare(self, expected, frame, key):
+        rows = {row[key]: row for row in frame.to_dict(orient='records')}
+        mismatches = 0
+        for name, values in expected.items():
+            row = rows.get(name)
+            if row is None or any(
+                abs(Decimal(str(row[field])) - values[field]) > Decimal('0.01') for field in ('revenue', 'direct_cost')
+            ):
+                mismatches += 1
+                self.stdout.write(f'  {key} {name}: esperado {dict(values)}, pandas {row}')
+        return mismatches
+
+    def seed(self, count):
+        """Facturas con dos cargos (uno con costo asignado) y un gasto propio por OS."""
+        from apps.catalogs.models import Provider, Service, ShipmentType
+        from apps.clients.models import Client
+        from apps.orders.models import Invoice, OrderCharge, ServiceOrder
+        from apps.transfers.models import DirectCostAllocation, ProviderInvoice, Transfer
+
+        today = date.today()
+        clients = [Client.objects.create(name=f'Cliente Analítica {i}') for i in range(10)]
+        services = [
+            Service.objects.create(name=f'Servicio Analítica {i}', default_price=Decimal('100.00')) for i in range(5)
+        ]
+        shipment = ShipmentType.objects.create(name='Benchmark Analítica')
+        provider = Provider.objects.create(name='Proveedor Benchmark Analítica')
+
+        orders = ServiceOrder.objects.bulk_create([
+            ServiceOrder(
+                order_number=f'{i + 1}-9998', client=clients[i % len(clients)],
+                shipment_type=shipment, provider=provider,
+            )
+            for i in range(count)
+        ])
+        invoices = Invoice.objects.bulk_create([
+            Invoice(
+                service_order=order, invoice_number=f'ANALYTICS-{i:06d}',
+                issue_date=today - timedelta(days=i % 360),
+                total_amount=Decimal('226.00'), balance=Decimal('113.00'),
+            )
+            for i, order in enumerate(orders)
+        ])
+        charges = OrderCharge.objects.bulk_create([
+            OrderCharge(
+                service_order=invoice.service_order, invoice=invoice, service=services[(i + j) % len(services)],
+                quantity=1, unit_price=Decimal('100.00'), subtotal=Decimal('100.00'),
+                iva_amount=Decimal('13.00'), total=Decimal('113.00'), is_third_party_service=(j == 0),
+            )
+            for i, invoice in enumerate(invoices)
+            for j in range(2)
+        ])
+        provider_invoice = ProviderInvoice.objects.create(
+            invoice_number='BENCH-ANALYTICS', provider=provider, service_order=orders[0],
+            total_amount=Decimal('40.00') * count,
+        )
+        DirectCostAllocation.objects.bulk_create([
+            DirectCostAllocation(provider_invoice=provider_invoice, order_charge=charge, cost_amount=Decimal('40.00'))
+            for charge in charges if charge.is_third_party_service
+        ])
+        Transfer.objects.bulk_create([
+            Transfer(
+                transfer_type='propios', service_order=order, provider=provider, amount=Decimal('15.00'),
+                balance=Decimal('15.00'), description='Gasto benchmark analítica',
+                transaction_date=today - timedelta(days=i % 360),
+            )
+            for i, order in enumerate(orders)
+        ])
+        self.stdout.write(f'Sembradas {count} facturas.')
@@ -0,0 +1,103 @@
+"""
+Django Management Command: Benchmark de serializadores de caché
+
+Toma los payloads que se guardan en caché (dashboard y estados de cuenta del
+cliente y proveedor con más movimientos) y compara tamaño y tiempo de ida y
+vuelta (dumps + loads) entre el JSONSerializer de django-redis, pickle
+(PickleSerializer) y CompactSerializer (apps/core/cache_serializers.py).
+También verifica si el valor leído es igual al original (JSON convierte
+Decimal/date en cadenas).
+
+USO:
+    python manage.py benchmark_cache_serializer --username admin
+    python manage.py benchmark_cache_serializer --seed 2000 --repeat 20
+"""
+
+import json
+import pickle
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.core.cache_serializers import CompactSerializer, msgpack
+from apps.core.management.benchmark import BenchmarkCommand
+
+
+class _JSONSerializer:
+    """Equivalente a django_redis.serializers.json.JSONSerializer."""
+
+    def dumps(self, value):
+        return json.dumps(value, cls=DjangoJSONEncoder).encode()
+
+    def loads(self, value):
+        return json.loads(value.decode())
+
+
+class _PickleSerializer:
+    """Equivalente a django_redis.serializers.pickle.PickleSerializer."""
+
+    def dumps(self, value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, value):
+        return pickle.loads(value)
+
+
+class Command(BenchmarkCommand):
+    help = 'Compara tamaño y tiempo de los serializadores de caché con payloads reales'
+    default_repeat = 10
+
+    def run(self, user, repeat):
+        if msgpack is None:
+            self.stdout.write(self.style.WARNING(
+                'msgpack no está instalado: CompactSerializer usa pickle.'
+            ))
+
+        serializers = [
+            ('json', _JSONSerializer()),
+            ('pickle', _PickleSerializer()),
+            ('compact', CompactSerializer()),
+            ('compact sin zlib', CompactSerializer({'COMPRESSION': 'none'})),
+        ]
+
+        for label, data in self.collect_payloads(user):
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            for name, serializer in serializers:
+                dumps_time, raw = self.median_time(lambda: serializer.dumps(data), repeat)
+                loads_time, restored = self.median_time(lambda: serializer.loads(raw), repeat)
+                same = restored == data
+                self.stdout.write(
+                    f"  {name:<18} {len(raw) / 1024:9.1f}KB dumps={dumps_time * 1000:7.2f}ms "
+                    f"loads={loads_time * 1000:7.2f}ms  "
+                    + ('idéntico' if same else self.style.WARNING('cambia tipos'))
+                )
+
+    def collect_payloads(self, user):
+        from apps.catalogs.models import Provider
+        from apps.catalogs.views import ProviderViewSet
+        from apps.clients.models import Client
+        from apps.clients.views import ClientViewSet
+        from apps.dashboard.views import DashboardView
+
+        factory = APIRequestFactory()
+
+        def call(view, **kwargs):
+            request = factory.get('/', kwargs.pop('params', {}))
+            force_authenticate(request, user=user)
+            return view(request, **kwargs).data
+
+        yield 'Dashboard (mes actual)', call(DashboardView.as_view())
+        yield 'Dashboard (histórico)', call(DashboardView.as_view(), params={'year': 0})
+
+        client = Client.objects.annotate(n=Count('serviceorder__invoices')).order_by('-n').first()
+        if client:
+            yield 'Estado de cuenta cliente', call(
+                ClientViewSet.as_view({'get': 'account_statement'}), pk=client.pk
+            )
+
+        provider = Provider.objects.annotate(n=Count('transfer')).order_by('-n').first()
+        if provider:
+            yield 'Estado de cuenta proveedor', call(
+                ProviderViewSet.as_view({'get': 'account_statement'}), pk=provider.pk
+            )
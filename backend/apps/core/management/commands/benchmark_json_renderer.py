@@ -0,0 +1,75 @@
+"""
+Django Management Command: Benchmark del renderer JSON
+
+Toma las respuestas más grandes del API (listados de OS, facturas y gastos y
+los estados de cuenta del cliente/proveedor con más movimientos) y mide el
+render con el JSONRenderer de DRF contra FastJSONRenderer
+(apps/core/renderers.py), verificando que ambos produzcan el mismo JSON.
+
+USO:
+    python manage.py benchmark_json_renderer --username admin
+    python manage.py benchmark_json_renderer --seed 2000 --repeat 10
+"""
+
+import json
+
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.core.management.benchmark import BenchmarkCommand
+from apps.core.renderers import FastJSONRenderer, orjson
+
+
+class Command(BenchmarkCommand):
+    help = 'Mide el render JSON de las respuestas más grandes con DRF vs FastJSONRenderer'
+    default_repeat = 5
+
+    def run(self, user, repeat):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson no está instalado: FastJSONRenderer usa el renderer de DRF.'
+            ))
+
+        drf_renderer = JSONRenderer()
+        fast_renderer = FastJSONRenderer()
+
+        for label, data in self.collect_responses(user):
+            drf_time, drf_body = self.median_time(lambda: drf_renderer.render(data), repeat)
+            fast_time, fast_body = self.median_time(lambda: fast_renderer.render(data), repeat)
+
+            same = json.loads(drf_body) == json.loads(fast_body)
+            speedup = drf_time / fast_time if fast_time else 0
+            self.stdout.write(
+                f"{label:<30} {len(drf_body) / 1024:9.1f}KB drf={drf_time * 1000:8.1f}ms "
+                f"fast={fast_time * 1000:8.1f}ms  x{speedup:.1f}  "
+                + ('idéntico' if same else self.style.ERROR('DIFERENTE'))
+            )
+
+    def collect_responses(self, user):
+        from apps.catalogs.models import Provider
+        from apps.catalogs.views import ProviderViewSet
+        from apps.clients.models import Client
+        from apps.clients.views import ClientViewSet
+        from apps.orders.views import ServiceOrderViewSet
+        from apps.orders.views_invoices import InvoiceViewSet
+        from apps.transfers.views import TransferViewSet
+
+        factory = APIRequestFactory()
+
+        def call(viewset, action, **kwargs):
+            request = factory.get('/')
+            force_authenticate(request, user=user)
+            return viewset.as_view({'get': action})(request, **kwargs).data
+
+        yield 'Listado de OS', call(ServiceOrderViewSet, 'list')
+        yield 'Listado de facturas', call(InvoiceViewSet, 'list')
+        yield 'Listado de gastos', call(TransferViewSet, 'list')
+
+        provider = Provider.objects.annotate(n=Count('transfer')).order_by('-n').first()
+        if provider:
+            yield 'Estado de cuenta proveedor', call(ProviderViewSet, 'account_statement', pk=provider.pk)
+
+        client = Client.objects.annotate(n=Count('serviceorder__invoices')).order_by('-n').first()
+        if client:
+            yield 'Estado de cuenta cliente', call(ClientViewSet, 'account_statement', pk=client.pk)
@@ -0,0 +1,57 @@
+"""
+Django Management Command: Benchmark de serialización de listados
+
+Compara, para los listados de OS, facturas y gastos, el serializer DRF
+original contra el serializer values() (apps/core/values_serializers.py),
+midiendo la vista completa (consulta + serialización + render JSON).
+
+USO:
+    # Sobre los datos existentes, con un usuario admin:
+    python manage.py benchmark_list_serializers --username admin
+
+    # Con N registros sintéticos por listado (se crean en una transacción
+    # que se revierte al terminar; no deja datos):
+    python manage.py benchmark_list_serializers --seed 2000 --repeat 5
+"""
+
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.core.management.benchmark import BenchmarkCommand
+
+
+class Command(BenchmarkCommand):
+    help = 'Mide el listado de OS/facturas/gastos con el serializer DRF vs el serializer values()'
+
+    def run(self, user, repeat):
+        from apps.orders.views import ServiceOrderViewSet
+        from apps.orders.views_invoices import InvoiceViewSet
+        from apps.transfers.views import TransferViewSet
+
+        endpoints = (
+            ('Órdenes de servicio', ServiceOrderViewSet),
+            ('Facturas', InvoiceViewSet),
+            ('Gastos', TransferViewSet),
+        )
+        factory = APIRequestFactory()
+
+        for label, viewset in endpoints:
+            timings = {}
+            rows = 0
+            for variant, values_serializer in (('drf', None), ('values', viewset.values_serializer_class)):
+                view = viewset.as_view({'get': 'list'}, values_serializer_class=values_serializer)
+
+                def call():
+                    request = factory.get('/')
+                    force_authenticate(request, user=user)
+                    response = view(request)
+                    response.render()
+                    return response
+
+                timings[variant], response = self.median_time(call, repeat)
+                rows = len(response.data)
+
+            speedup = timings['drf'] / timings['values'] if timings['values'] else 0
+            self.stdout.write(
+                f"{label:<22} filas={rows:<7} drf={timings['drf'] * 1000:9.1f}ms "
+                f"values={timings['values'] * 1000:9.1f}ms  x{speedup:.1f}"
+            )
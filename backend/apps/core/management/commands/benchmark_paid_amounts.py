@@ -0,0 +1,130 @@
+"""
+Django Management Command: Benchmark de actualización de montos pagados
+
+Crea una factura, un gasto y una factura de proveedor con N pagos cada uno y
+mide registrar y anular un pago más:
+
+- delta: ``save()``/``delete()`` del pago (apps/core/balances.py).
+- recálculo completo: sumar todos los pagos y guardar el documento, como
+  se hacía antes en cada alta/anulación.
+
+Todo se ejecuta en una transacción que se revierte al terminar.
+
+USO:
+    python manage.py benchmark_paid_amounts
+    python manage.py benchmark_paid_amounts --payments 1000 --repeat 20
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.core.balances import recalculate_paid_amount
+from apps.core.management.benchmark import BenchmarkCommand
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compara la actualización incremental de paid_amount con el recálculo completo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payments', type=int, default=500, help='Pagos existentes por documento')
+        parser.add_argument('--repeat', type=int, default=10, help='Repeticiones (se reporta la mediana)')
+
+    def handle(self, *args, **options):
+        if options['payments'] < 0 or options['repeat'] < 1:
+            raise CommandError('--payments >= 0 y --repeat >= 1')
+
+        try:
+            with transaction.atomic():
+                for label, payment_model, parent_field, make_payment in self.seed(options['payments']):
+                    self.measure(label, payment_model, parent_field, make_payment, options['repeat'])
+                raise _Rollback()
+        except _Rollback:
+            self.stdout.write('Datos sintéticos revertidos.')
+
+    def measure(self, label, payment_model, parent_field, make_payment, repeat):
+        parent_id = getattr(make_payment(), f'{parent_field}_id')
+
+        def delta():
+            payment = make_payment()
+            payment.save()
+            payment.delete()
+
+        def full():
+            payment = make_payment()
+            # Alta + anulación con el recálculo completo en cada paso
+            payment.save_base()
+            recalculate_paid_amount(payment_model, parent_field, parent_id)
+            payment.is_deleted = True
+            payment.save_base()
+            recalculate_paid_amount(payment_model, parent_field, parent_id)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        for name, func in (('delta', delta), ('recálculo completo', full)):
+            with CaptureQueriesContext(connection) as ctx:
+                func()
+            seconds, _ = BenchmarkCommand.median_time(func, repeat)
+            self.stdout.write(
+                f'  {name:<20} {seconds * 1000:8.2f}ms  {len(ctx.captured_queries):3d} consultas (alta + anulación)'
+            )
+
+    def seed(self, count):
+        """Documentos con ``count`` pagos vía bulk_create (paid_amount ya cuadrado)."""
+        from apps.catalogs.models import Provider, ShipmentType
+        from apps.clients.models import Client
+        from apps.orders.models import Invoice, InvoicePayment, ServiceOrder
+        from apps.transfers.models import ProviderInvoice, ProviderInvoicePayment, Transfer, TransferPayment
+
+        amount = Decimal('1.00')
+        paid = amount * count
+        big = paid + Decimal('1000000.00')
+
+        client = Client.objects.create(name='Cliente Benchmark Pagos')
+        shipment = ShipmentType.objects.create(name='Benchmark Pagos')
+        provider = Provider.objects.create(name='Proveedor Benchmark Pagos')
+        order = ServiceOrder.objects.create(client=client, shipment_type=shipment, provider=provider)
+
+        invoice = Invoice.objects.create(service_order=order, total_amount=big)
+        InvoicePayment.objects.bulk_create([
+            InvoicePayment(invoice=invoice, amount=amount, payment_method='transferencia')
+            for _ in range(count)
+        ])
+        Invoice.objects.filter(pk=invoice.pk).update(paid_amount=paid, balance=big - paid, status='partial')
+
+        transfer = Transfer.objects.create(
+            transfer_type='cargos', service_order=order, provider=provider,
+            amount=big, description='Gasto benchmark pagos', transaction_date=date.today(),
+        )
+        TransferPayment.objects.bulk_create([
+            TransferPayment(transfer=transfer, amount=amount, payment_method='transferencia')
+            for _ in range(count)
+        ])
+        Transfer.objects.filter(pk=transfer.pk).update(
+            paid_amount=paid, balance=big - paid, status='parcial' if count else 'aprobado',
+        )
+
+        provider_invoice = ProviderInvoice.objects.create(
+            invoice_number='BENCH-PAGOS', provider=provider, service_order=order, total_amount=big,
+        )
+        ProviderInvoicePayment.objects.bulk_create([
+            ProviderInvoicePayment(provider_invoice=provider_invoice, amount=amount)
+            for _ in range(count)
+        ])
+        ProviderInvoice.objects.filter(pk=provider_invoice.pk).update(paid_amount=paid)
+
+        self.stdout.write(f'Sembrados {count} pagos por documento.')
+        return [
+            ('Factura (InvoicePayment)', InvoicePayment, 'invoice',
+             lambda: InvoicePayment(invoice_id=invoice.pk, amount=amount, payment_method='transferencia')),
+            ('Gasto (TransferPayment)', TransferPayment, 'transfer',
+             lambda: TransferPayment(transfer_id=transfer.pk, amount=amount, payment_method='transferencia')),
+            ('Factura de proveedor (ProviderInvoicePayment)', ProviderInvoicePayment, 'provider_invoice',
+             lambda: ProviderInvoicePayment(provider_invoice_id=provider_invoice.pk, amount=amount)),
+        ]
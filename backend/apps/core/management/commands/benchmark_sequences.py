@@ -0,0 +1,150 @@
+"""
+Django Management Command: Benchmark de contención de correlativos
+
+Lanza N hilos que piden correlativos de una misma serie en paralelo, cada
+uno en su propia transacción (como una petición que crea una OS), y reporta
+rendimiento, latencia y si la numeración quedó sin duplicados ni huecos.
+
+Variantes:
+- contador: apps.core.sequences.next_number (UPDATE ... RETURNING).
+- contador+escaneo: además ejecuta el escaneo de la tabla dentro del lock en
+  cada asignación, como hacía la versión anterior.
+- sequence: SEQUENCE nativo de PostgreSQL (sólo en PostgreSQL; admite huecos).
+
+Usa una serie temporal que se elimina al terminar. En SQLite los escritores
+se serializan a nivel de base de datos, así que las cifras sólo son
+representativas en PostgreSQL.
+
+USO:
+    python manage.py benchmark_sequences
+    python manage.py benchmark_sequences --threads 16 --allocations 100 --hold-ms 20
+"""
+
+import statistics
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from apps.core.models import DocumentSequence
+from apps.core.sequences import next_number, scan_current_max, sequence_name
+
+
+class Command(BaseCommand):
+    help = 'Mide la contención al asignar correlativos desde varios hilos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Hilos concurrentes')
+        parser.add_argument('--allocations', type=int, default=50, help='Correlativos por hilo')
+        parser.add_argument(
+            '--hold-ms',
+            type=int,
+            default=5,
+            help='Milisegundos que cada transacción sigue abierta tras reservar el número',
+        )
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['allocations'] < 1:
+            raise CommandError('--threads y --allocations deben ser >= 1')
+
+        year = timezone.now().year
+        variants = [
+            ('contador', lambda key: next_number(key)),
+            ('contador+escaneo', self._next_with_scan(year)),
+        ]
+        if connection.vendor == 'postgresql':
+            variants.append(('sequence', lambda key: next_number(key)))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'{connection.vendor}: se omite la variante sequence (sólo PostgreSQL).'
+            ))
+
+        for label, allocate in variants:
+            series = f'bench_{uuid.uuid4().hex[:8]}'
+            key = f'{series}:{year}'
+            allow_gaps = (series,) if label == 'sequence' else ()
+            try:
+                with override_settings(DOCUMENT_SEQUENCES_ALLOW_GAPS=allow_gaps):
+                    self._run(label, key, allocate, options)
+            finally:
+                self._cleanup(key)
+
+    def _next_with_scan(self, year):
+        def allocate(key):
+            number = next_number(key)
+            # El escaneo que antes se hacía en cada asignación, con la fila
+            # contador ya bloqueada
+            scan_current_max(f'service_order:{year}')
+            return number
+        return allocate
+
+    def _run(self, label, key, allocate, options):
+        threads_count = options['threads']
+        allocations = options['allocations']
+        hold = options['hold_ms'] / 1000
+
+        numbers = []
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads_count)
+
+        # Crear el contador antes de medir
+        with transaction.atomic():
+            first = allocate(key)
+
+        def worker():
+            local_numbers, local_latencies = [], []
+            try:
+                barrier.wait()
+                for _ in range(allocations):
+                    started = time.perf_counter()
+                    try:
+                        with transaction.atomic():
+                            local_numbers.append(allocate(key))
+                            local_latencies.append(time.perf_counter() - started)
+                            time.sleep(hold)
+                    except Exception as e:
+                        with lock:
+                            errors.append(str(e))
+            finally:
+                with lock:
+                    numbers.extend(local_numbers)
+                    latencies.extend(local_latencies)
+                connections.close_all()
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker) for _ in range(threads_count)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        unique = set(numbers)
+        expected = set(range(first + 1, first + 1 + len(numbers)))
+        duplicates = len(numbers) - len(unique)
+        gaps = len(expected - unique)
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(
+            f'  {len(numbers)} números en {elapsed:.2f}s ({len(numbers) / elapsed:,.0f}/s)  '
+            f'latencia p50={statistics.median(latencies) * 1000 if latencies else 0:.2f}ms '
+            f'p95={p95 * 1000:.2f}ms'
+        )
+        status = f'  duplicados={duplicates} huecos={gaps} errores={len(errors)}'
+        self.stdout.write(self.style.SUCCESS(status) if not (duplicates or errors) else self.style.WARNING(status))
+        if errors:
+            self.stdout.write(f'  primer error: {errors[0]}')
+
+    def _cleanup(self, key):
+        DocumentSequence.objects.filter(key=key).delete()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP SEQUENCE IF EXISTS {sequence_name(key)}')
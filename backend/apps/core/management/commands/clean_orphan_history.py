@@ -1,22 +1,80 @@
 from django.core.management.base import BaseCommand
-from apps.orders.models import OrderHistory, ServiceOrder
+from apps.orders.models import InvoiceEditHistory, OrderHistory, ServiceOrder, Invoice
+
 
 class Command(BaseCommand):
-    help = 'Limpia registros huérfanos de OrderHistory'
+    help = (
+        'Limpia registros huérfanos de OrderHistory y, con --archive, mueve los '
+        'eventos más antiguos que la retención a las tablas de archivo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archive',
+            action='store_true',
+            help='Archivar (y compactar) los eventos anteriores a la retención',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Días de historial a conservar en la tabla viva (por defecto HISTORY_RETENTION_DAYS)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Eventos por lote/transacción al archivar',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostrar lo que se haría sin modificar datos',
+        )
 
     def handle(self, *args, **options):
-        # Obtener todos los IDs válidos de ServiceOrder
-        valid_ids = set(ServiceOrder.all_objects.values_list('id', flat=True))
+        dry_run = options['dry_run']
+        prefix = '[DRY RUN] ' if dry_run else ''
+
+        # Huérfanos: una sola consulta por tabla en lugar de recorrer el historial
+        orphans = OrderHistory.objects.exclude(
+            service_order_id__in=ServiceOrder.all_objects.values('id')
+        )
+        edit_orphans = InvoiceEditHistory.objects.exclude(
+            invoice_id__in=Invoice.objects.values('id')
+        )
+        if dry_run:
+            orphans_count = orphans.count()
+            edit_orphans_count = edit_orphans.count()
+        else:
+            orphans_count = orphans.delete()[0]
+            edit_orphans_count = edit_orphans.delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Se eliminaron {orphans_count} registros huérfanos de OrderHistory '
+            f'y {edit_orphans_count} de InvoiceEditHistory'
+        ))
+
+        if not options['archive']:
+            return
+
+        from apps.orders.history_archive import (
+            archive_invoice_edit_history,
+            archive_order_history,
+            retention_cutoff,
+        )
 
-        # Obtener todos los OrderHistory
-        all_history = OrderHistory.objects.all()
+        cutoff = retention_cutoff(options['days'])
+        batch_size = max(1, options['batch_size'])
+        self.stdout.write(f'{prefix}Archivando eventos anteriores a {cutoff:%Y-%m-%d %H:%M}')
 
-        # Encontrar huérfanos
-        orphans_count = 0
-        for history in all_history:
-            if history.service_order_id not in valid_ids:
-                self.stdout.write(f'Eliminando huérfano: OrderHistory ID={history.id}, service_order_id={history.service_order_id}')
-                history.delete()
-                orphans_count += 1
+        result = archive_order_history(cutoff, batch_size=batch_size, dry_run=dry_run)
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}OrderHistory: {result['moved']} eventos archivados "
+            f"en {result['archived']} filas compactadas"
+        ))
 
-        self.stdout.write(self.style.SUCCESS(f'Se eliminaron {orphans_count} registros huérfanos'))
+        result = archive_invoice_edit_history(cutoff, batch_size=batch_size, dry_run=dry_run)
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}InvoiceEditHistory: {result['moved']} ediciones archivadas"
+        ))
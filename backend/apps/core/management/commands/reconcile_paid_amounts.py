@@ -0,0 +1,76 @@
+"""
+Django Management Command: Conciliar montos pagados
+
+Los pagos actualizan ``paid_amount``/``balance`` del documento de forma
+incremental (apps/core/balances.py). Este comando verifica, con una consulta
+por tipo de documento, que esos campos coincidan con la suma de los pagos
+activos, y con ``--fix`` recalcula los que no cuadren.
+
+Conviene programarlo (cron) a diario y ejecutarlo tras correcciones manuales
+en la base de datos.
+
+USO:
+    python manage.py reconcile_paid_amounts
+    python manage.py reconcile_paid_amounts --fix
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from apps.core.balances import paid_amount_drift, recalculate_paid_amount
+from apps.orders.models import Invoice, InvoicePayment
+from apps.transfers.models import ProviderInvoice, ProviderInvoicePayment, Transfer, TransferPayment
+
+# (etiqueta, modelo del documento, modelo del pago, FK del pago, saldo mal calculado)
+LEDGERS = (
+    (
+        'Facturas (CxC)', Invoice, InvoicePayment, 'invoice',
+        ~Q(status='cancelled') & ~Q(balance=F('total_amount') - F('computed_paid') - F('credited_amount')),
+    ),
+    (
+        'Gastos (CxP)', Transfer, TransferPayment, 'transfer',
+        ~Q(balance=F('amount') - F('computed_paid')),
+    ),
+    (
+        'Facturas de proveedor', ProviderInvoice, ProviderInvoicePayment, 'provider_invoice',
+        None,
+    ),
+)
+
+
+class Command(BaseCommand):
+    help = 'Verifica (y con --fix corrige) paid_amount/balance contra los pagos registrados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Recalcular los documentos que no cuadran',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for label, parent_model, payment_model, parent_field, balance_mismatch in LEDGERS:
+            drift = list(
+                paid_amount_drift(parent_model, payment_model, parent_field, balance_mismatch)
+                .values('pk', 'paid_amount', 'computed_paid')
+            )
+            total += len(drift)
+            style = self.style.WARNING if drift else self.style.SUCCESS
+            self.stdout.write(style(f'{label}: {len(drift)} documento(s) descuadrado(s)'))
+
+            for row in drift:
+                self.stdout.write(
+                    f"  #{row['pk']}: paid_amount={row['paid_amount']} pagos={row['computed_paid']}"
+                )
+                if options['fix']:
+                    try:
+                        recalculate_paid_amount(payment_model, parent_field, row['pk'])
+                    except Exception as e:
+                        total -= 1
+                        self.stdout.write(self.style.ERROR(f"  #{row['pk']}: no se pudo recalcular: {e}"))
+
+        if total and not options['fix']:
+            self.stdout.write('Ejecute con --fix para recalcularlos.')
+        elif total:
+            self.stdout.write(self.style.SUCCESS(f'{total} documento(s) recalculado(s).'))
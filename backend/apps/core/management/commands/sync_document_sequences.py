@@ -0,0 +1,48 @@
+"""
+Django Management Command: Sincronizar contadores de correlativos
+
+El contador de cada serie (DocumentSequence) es la fuente de verdad y ya no
+escanea la tabla en cada asignación. Si se cargaron documentos por fuera de la
+aplicación (importaciones, SQL manual) el contador puede quedar atrás; este
+comando ejecuta una vez el escaneo de cada serie y adelanta los contadores.
+
+USO:
+    python manage.py sync_document_sequences
+    python manage.py sync_document_sequences --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.core.models import DocumentSequence
+from apps.core.sequences import observe_number, scan_current_max
+
+
+class Command(BaseCommand):
+    help = 'Adelanta los contadores de correlativos que quedaron por detrás de la tabla'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostrar lo que se haría sin modificar datos',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        prefix = '[DRY RUN] ' if dry_run else ''
+        behind = 0
+
+        for counter in DocumentSequence.objects.order_by('key'):
+            current_max = scan_current_max(counter.key)
+            if current_max <= counter.last_number:
+                continue
+            behind += 1
+            self.stdout.write(
+                f'{prefix}{counter.key}: {counter.last_number} -> {current_max}'
+            )
+            if not dry_run:
+                observe_number(counter.key, current_max)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{behind} contador(es) adelantado(s)'
+        ))
@@ -0,0 +1,84 @@
+"""
+Base común de los comandos de mantenimiento por lotes (ver
+apps/core/maintenance.py).
+
+- ``--apply`` / ``--dry-run``: según ``apply_by_default`` el comando escribe
+  por defecto o sólo muestra la diferencia.
+- ``--chunk-size``: filas por lote (una transacción corta por lote).
+- ``--workers N``: tramos de ids procesados en paralelo.
+- ``--sleep S``: pausa en segundos entre lotes.
+- ``--resume``: continúa la corrida interrumpida desde su checkpoint.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.maintenance import CHUNK_SIZE, MaintenanceInterrupted, run_task
+
+
+class MaintenanceCommand(BaseCommand):
+    apply_by_default = True
+
+    def add_arguments(self, parser):
+        if self.apply_by_default:
+            parser.add_argument(
+                '--dry-run',
+                action='store_true',
+                help='Solo mostrar qué cambiaría, sin guardar',
+            )
+        else:
+            parser.add_argument(
+                '--apply',
+                action='store_true',
+                help='Aplicar los cambios (por defecto solo muestra qué cambiaría)',
+            )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Filas por lote')
+        parser.add_argument('--workers', type=int, default=1, help='Tramos de ids procesados en paralelo')
+        parser.add_argument('--sleep', type=float, default=0, help='Pausa en segundos entre lotes')
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continuar la corrida interrumpida desde su último lote confirmado',
+        )
+
+    def get_tasks(self, options):
+        raise NotImplementedError
+
+    def is_dry_run(self, options):
+        if self.apply_by_default:
+            return options['dry_run']
+        return not options['apply']
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1 or options['workers'] < 1 or options['sleep'] < 0:
+            raise CommandError('--chunk-size >= 1, --workers >= 1 y --sleep >= 0')
+        dry_run = self.is_dry_run(options)
+        if dry_run:
+            self.stdout.write(self.style.WARNING('Modo simulación: no se guardarán cambios.'))
+
+        for task in self.get_tasks(options):
+            self.stdout.write(task.label or task.name)
+            try:
+                result = run_task(
+                    task,
+                    chunk_size=options['chunk_size'],
+                    dry_run=dry_run,
+                    workers=options['workers'],
+                    sleep=options['sleep'],
+                    resume=options['resume'],
+                    limit=options.get('limit') or 0,
+                    report=lambda diff: self.stdout.write(f'  {diff}'),
+                )
+            except MaintenanceInterrupted as e:
+                raise CommandError(
+                    f'{task.name}: {e}. Lo confirmado se conserva; continúe con --resume.'
+                )
+
+            verb = 'a corregir' if dry_run else 'corregido(s)'
+            style = self.style.WARNING if dry_run and result.changed else self.style.SUCCESS
+            self.stdout.write(style(
+                f'  {result.scanned} revisado(s) en {result.chunks} lote(s), {result.changed} {verb}.'
+            ))
+
+        if dry_run:
+            hint = '--apply' if not self.apply_by_default else 'sin --dry-run'
+            self.stdout.write(f'Ejecute {hint} para aplicar los cambios.')
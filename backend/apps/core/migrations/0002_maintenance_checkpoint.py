@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaintenanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=100, verbose_name='Tarea')),
+                ('worker', models.PositiveSmallIntegerField(default=0, verbose_name='Worker')),
+                ('lower_pk', models.BigIntegerField(verbose_name='Desde id')),
+                ('upper_pk', models.BigIntegerField(verbose_name='Hasta id')),
+                ('last_pk', models.BigIntegerField(blank=True, null=True, verbose_name='Último id procesado')),
+                ('changed', models.PositiveIntegerField(default=0, verbose_name='Registros corregidos')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Actualizado el')),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de Mantenimiento',
+                'verbose_name_plural': 'Checkpoints de Mantenimiento',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='maintenancecheckpoint',
+            constraint=models.UniqueConstraint(fields=('task', 'worker'), name='unique_maintenance_checkpoint'),
+        ),
+    ]
@@ -50,6 +50,30 @@ class DocumentSequence(models.Model):
     def __str__(self):
         return f"{self.key} -> {self.last_number}"
 
+class MaintenanceCheckpoint(models.Model):
+    """
+    Avance de una tarea de mantenimiento por lotes en un rango de ids
+    (uno por worker). Permite reanudarla con ``--resume``. Ver
+    apps/core/maintenance.py.
+    """
+    task = models.CharField(max_length=100, verbose_name="Tarea")
+    worker = models.PositiveSmallIntegerField(default=0, verbose_name="Worker")
+    lower_pk = models.BigIntegerField(verbose_name="Desde id")
+    upper_pk = models.BigIntegerField(verbose_name="Hasta id")
+    last_pk = models.BigIntegerField(null=True, blank=True, verbose_name="Último id procesado")
+    changed = models.PositiveIntegerField(default=0, verbose_name="Registros corregidos")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Actualizado el")
+
+    class Meta:
+        verbose_name = "Checkpoint de Mantenimiento"
+        verbose_name_plural = "Checkpoints de Mantenimiento"
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'worker'], name='unique_maintenance_checkpoint'),
+        ]
+
+    def __str__(self):
+        return f"{self.task}[{self.worker}] -> {self.last_pk}"
+
 class TimeStampedModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Creado el")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Actualizado el")
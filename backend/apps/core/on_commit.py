@@ -0,0 +1,74 @@
+"""
+Trabajo acumulado por transacción y procesado al confirmarla.
+
+Varios receivers de señales programan trabajo derivado (refresco de alertas,
+reconstrucción de KPIs) por cada registro guardado. Para no repetirlo por
+fila, ``CommitBatch`` acumula lo de una transacción y lo procesa una sola vez
+con ``transaction.on_commit``:
+
+    class _PendingRefresh(CommitBatch):
+        def __init__(self):
+            self.ids = set()
+
+        def run(self):
+            refresh(self.ids)
+
+    with _PendingRefresh.collect() as pending:
+        pending.ids.add(pk)
+
+- Dentro de una transacción, ``collect()`` devuelve el acumulador de esa
+  transacción (uno por subclase y por hilo) y ``run()`` se llama al hacer
+  commit. Si hace rollback, Django descarta el callback y el siguiente
+  ``collect()`` empieza un acumulador nuevo.
+- Fuera de una transacción (autocommit) ``run()`` se llama al salir del
+  bloque ``with``.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+_state = threading.local()
+
+
+def _batches():
+    batches = getattr(_state, 'batches', None)
+    if batches is None:
+        batches = _state.batches = {}
+    return batches
+
+
+class CommitBatch:
+    """Base de los acumuladores; las subclases definen ``run()``."""
+
+    def run(self):
+        raise NotImplementedError
+
+    def flush(self):
+        batches = _batches()
+        if batches.get(type(self)) is self:
+            del batches[type(self)]
+        self.run()
+
+    def is_scheduled(self):
+        # run_on_commit: callbacks pendientes de la transacción en curso (se
+        # vacía en el commit y pierde los del rollback)
+        return any(entry[1] == self.flush for entry in connection.run_on_commit)
+
+    @classmethod
+    @contextmanager
+    def collect(cls):
+        """Acumulador de la transacción en curso (ver docstring del módulo)."""
+        if not connection.in_atomic_block:
+            batch = cls()
+            yield batch
+            batch.flush()
+            return
+
+        batches = _batches()
+        batch = batches.get(cls)
+        if batch is None or not batch.is_scheduled():
+            batch = batches[cls] = cls()
+            transaction.on_commit(batch.flush)
+        yield batch
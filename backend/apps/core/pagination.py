@@ -0,0 +1,66 @@
+"""
+Paginación por clave (keyset) para listados que crecen sin límite, como el
+historial de una OS.
+
+A diferencia de ``?page=N`` (OFFSET), cada página filtra a partir de la última
+fila entregada usando el índice ``(dueño, -created_at)``, así que el costo de
+una página no depende de cuántos eventos hay antes ni del tamaño de la tabla.
+El cursor es opaco para el cliente: se devuelve como ``next_cursor`` y se
+envía tal cual en ``?cursor=``.
+"""
+
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+def encode_cursor(obj):
+    raw = json.dumps([obj.created_at.isoformat(), obj.pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValidationError({'cursor': 'Cursor inválido'})
+    if created_at is None:
+        raise ValidationError({'cursor': 'Cursor inválido'})
+    return created_at, pk
+
+
+def parse_limit(request, default=50, maximum=200):
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except (TypeError, ValueError):
+        raise ValidationError({'limit': 'Debe ser un número entero'})
+    return max(1, min(limit, maximum))
+
+
+def keyset_page(queryset, request, default_limit=50, max_limit=200):
+    """
+    Página de ``queryset`` ordenada por ``(-created_at, -id)``.
+
+    Returns:
+        tuple ``(items, next_cursor)``; ``next_cursor`` es None en la última página.
+    """
+    limit = parse_limit(request, default_limit, max_limit)
+    cursor = request.query_params.get('cursor')
+
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        )
+
+    # Se pide una fila extra para saber si hay otra página sin hacer COUNT
+    items = list(queryset.order_by('-created_at', '-pk')[:limit + 1])
+    if len(items) > limit:
+        items = items[:limit]
+        return items, encode_cursor(items[-1])
+    return items, None
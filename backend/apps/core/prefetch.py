@@ -0,0 +1,135 @@
+"""
+Requisitos de precarga declarados por los serializers.
+
+Varios serializers resolvían relaciones fila por fila (``TransferPayment`` por
+lote, ``ProviderCreditNote`` por gasto...) y dependían de que el ViewSet
+recordara hacer el ``prefetch_related`` correcto. Cuando no lo hacía, el
+listado degeneraba en N+1 sin que nada lo advirtiera.
+
+Aquí el serializer declara lo que necesita y el ViewSet lo aplica solo:
+
+    class BatchPaymentSerializer(PrefetchAwareSerializerMixin, serializers.ModelSerializer):
+        class Meta:
+            model = BatchPayment
+            fields = [...]
+            select_related = ('provider', 'bank')
+            prefetch_related = (
+                Prefetch('transfer_payments', queryset=..., to_attr='active_transfer_payments'),
+            )
+
+    class BatchPaymentViewSet(PrefetchAwareViewSetMixin, viewsets.ModelViewSet):
+        ...
+
+Con ``settings.SERIALIZER_QUERY_GUARD`` activo (DEBUG y tests), cualquier
+consulta que un campo dispare al serializar una fila dentro de ``many=True``
+lanza ``SerializerQueryError`` indicando serializer y campo.
+"""
+
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+
+
+class SerializerQueryError(AssertionError):
+    """Un campo consultó la base de datos dentro de una serialización many=True."""
+    pass
+
+
+def get_serializer_prefetches(serializer_class):
+    """
+    Devuelve ``(select_related, prefetch_related)`` declarados en el Meta del
+    serializer (tuplas vacías si no declara nada).
+    """
+    meta = getattr(serializer_class, 'Meta', None)
+    return (
+        tuple(getattr(meta, 'select_related', ())),
+        tuple(getattr(meta, 'prefetch_related', ())),
+    )
+
+
+def apply_serializer_prefetches(queryset, serializer_class):
+    """
+    Aplica al queryset los requisitos declarados por ``serializer_class``.
+
+    Las precargas que el queryset ya tiene (mismo destino) se omiten: Django
+    rechaza dos Prefetch con queryset sobre el mismo atributo.
+    """
+    select, prefetch = get_serializer_prefetches(serializer_class)
+
+    if select:
+        queryset = queryset.select_related(*select)
+
+    if prefetch:
+        existing = {
+            getattr(lookup, 'prefetch_to', lookup)
+            for lookup in queryset._prefetch_related_lookups
+        }
+        missing = [
+            lookup for lookup in prefetch
+            if getattr(lookup, 'prefetch_to', lookup) not in existing
+        ]
+        if missing:
+            queryset = queryset.prefetch_related(*missing)
+
+    return queryset
+
+
+class PrefetchAwareViewSetMixin:
+    """
+    Aplica a ``get_queryset()`` las precargas que declara el serializer de la
+    acción en curso (``get_serializer_class()``).
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return apply_serializer_prefetches(queryset, self.get_serializer_class())
+
+
+class PrefetchAwareSerializerMixin:
+    """
+    Serializer que declara sus precargas en ``Meta.select_related`` y
+    ``Meta.prefetch_related`` y que, con el guard activo, falla ruidosamente
+    si algún campo consulta la base de datos dentro de un ``many=True``.
+    """
+
+    def to_representation(self, instance):
+        if not (getattr(settings, 'SERIALIZER_QUERY_GUARD', False)
+                and isinstance(self.parent, serializers.ListSerializer)):
+            return super().to_representation(instance)
+
+        # Mismo recorrido que Serializer.to_representation, pero cada campo se
+        # resuelve con las consultas bloqueadas para poder nombrar al culpable.
+        ret = {}
+        for field in self._readable_fields:
+            with self._block_queries(field):
+                try:
+                    attribute = field.get_attribute(instance)
+                except SkipField:
+                    continue
+
+                check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+                if check_for_none is None:
+                    ret[field.field_name] = None
+                else:
+                    ret[field.field_name] = field.to_representation(attribute)
+
+        return ret
+
+    def _block_queries(self, field):
+        serializer_name = self.__class__.__name__
+
+        def blocker(execute, sql, params, many, context):
+            raise SerializerQueryError(
+                f"{serializer_name}.{field.field_name} ejecutó una consulta dentro de una "
+                f"serialización many=True (N+1). Declárela en Meta.select_related / "
+                f"Meta.prefetch_related. SQL: {sql}"
+            )
+
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(blocker))
+        return stack
@@ -0,0 +1,51 @@
+"""
+Renderer JSON del proyecto.
+
+Misma salida que ``rest_framework.renderers.JSONRenderer`` pero codificada con
+orjson cuando está instalado (varias veces más rápido en respuestas grandes:
+listados, estados de cuenta, dashboard). Sin orjson se usa el renderer de DRF
+tal cual.
+
+Tipos soportados de forma nativa, para que las vistas puedan devolver los
+valores crudos sin convertirlos a mano:
+
+- ``Decimal``  -> número JSON (``float``), igual que el encoder de DRF.
+- ``date`` / ``datetime`` -> ISO 8601; UTC como ``Z``, igual que DRF.
+- ``UUID``     -> cadena.
+
+Cualquier otro tipo no nativo (lazy strings, sets, querysets...) se delega al
+``JSONEncoder`` de DRF, de modo que el resultado es idéntico en ambos caminos.
+"""
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+
+_drf_encoder = JSONEncoder()
+
+
+def _default(obj):
+    return _drf_encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer compatible con DRF que usa orjson si está disponible."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Con indentación solicitada (API navegable, ?indent) se mantiene DRF
+        if self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        return orjson.dumps(
+            data,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z,
+        )
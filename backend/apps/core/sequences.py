@@ -11,9 +11,66 @@ quedaba encolada hasta agotar el `statement_timeout` y moría con
 
 Aquí se bloquea únicamente la fila contador de la serie, nunca los documentos
 ya emitidos.
+
+El contador es la fuente de verdad:
+
+- El máximo existente en la tabla (``current_max``, un escaneo con regex) se
+  consulta sólo al crear el contador de la serie, no en cada asignación.
+- Los números que no salen del contador (OS manuales, pre-facturas editadas)
+  se registran al insertarse con ``observe_number``, que adelanta el contador
+  con un UPDATE condicional.
+- ``manage.py sync_document_sequences`` recorre las series y corrige los
+  contadores que hayan quedado atrás (cargas masivas, SQL manual).
+
+Cada asignación es un solo ``UPDATE ... RETURNING`` sobre la fila de la serie.
+La fila queda bloqueada hasta el commit de la transacción que pidió el número:
+es el precio de no dejar huecos. Las series que admiten huecos
+(``DOCUMENT_SEQUENCES_ALLOW_GAPS``) usan en PostgreSQL un ``SEQUENCE`` nativo,
+cuyo ``nextval`` no bloquea a nadie pero no se devuelve en un rollback.
 """
 
-from django.db import IntegrityError, transaction
+import re
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+# Serie -> callable(sufijo) con el mayor correlativo ya emitido
+# (por ejemplo 'service_order' -> máximo de las OS del año ``sufijo``)
+_scanners = {}
+
+# Secuencias de PostgreSQL que ya se sabe que existen (por proceso)
+_known_sequences = set()
+
+
+def register_series(series, current_max):
+    """
+    Registra el escaneo que devuelve el mayor correlativo emitido de una
+    serie. Se usa para inicializar el contador y en ``sync_document_sequences``.
+    """
+    _scanners[series] = current_max
+
+
+def split_key(key):
+    """``'service_order:2026'`` -> ``('service_order', '2026')``."""
+    series, _, suffix = key.partition(':')
+    return series, suffix
+
+
+def scan_current_max(key):
+    """Mayor correlativo emitido de la serie ``key`` según su escaneo registrado."""
+    series, suffix = split_key(key)
+    scanner = _scanners.get(series)
+    return (scanner(suffix) or 0) if scanner else 0
+
+
+def uses_database_sequence(key):
+    """La serie admite huecos y la BD tiene SEQUENCE nativo."""
+    series, _ = split_key(key)
+    return (
+        connection.vendor == 'postgresql'
+        and series in getattr(settings, 'DOCUMENT_SEQUENCES_ALLOW_GAPS', ())
+    )
 
 
 def next_number(key, current_max=None):
@@ -23,36 +80,133 @@ def next_number(key, current_max=None):
     Args:
         key: identificador de la serie, por ejemplo ``'service_order:2026'``.
         current_max: callable opcional que devuelve el mayor correlativo ya
-            presente en la tabla. Se consulta SIN bloqueo y sirve para respetar
-            números ingresados manualmente que el contador aún no conoce.
+            presente en la tabla. Sólo se consulta al crear el contador; si no
+            se indica, se usa el escaneo registrado con ``register_series``.
 
     Returns:
         int: el número reservado (ya persistido en el contador).
+    """
+    if uses_database_sequence(key):
+        return _sequence_next(key, current_max)
+    return next_numbers(key, 1, current_max)[0]
+
 
-    La reserva es exclusiva entre peticiones concurrentes porque el contador se
-    lee con ``select_for_update()``, pero el bloqueo afecta a una sola fila de
-    ``DocumentSequence`` y no a los documentos existentes.
+def next_numbers(key, count, current_max=None):
     """
-    from .models import DocumentSequence
+    Reserva ``count`` correlativos consecutivos de una vez (altas masivas).
+
+    Returns:
+        range: los números reservados.
+    """
+    if count < 1:
+        return range(0)
 
     with transaction.atomic():
-        counter = DocumentSequence.objects.select_for_update().filter(key=key).first()
-
-        if counter is None:
-            # Primera vez que se usa la serie. El savepoint permite recuperarse
-            # si otra petición concurrente creó la misma fila primero.
-            try:
-                with transaction.atomic():
-                    DocumentSequence.objects.create(key=key, last_number=0)
-            except IntegrityError:
-                pass
-            counter = DocumentSequence.objects.select_for_update().get(key=key)
-
-        last_number = counter.last_number
-        if current_max is not None:
-            last_number = max(last_number, current_max() or 0)
-
-        counter.last_number = last_number + 1
-        counter.save(update_fields=['last_number', 'updated_at'])
-
-        return counter.last_number
+        last_number = _increment(key, count)
+        if last_number is None:
+            _create_counter(key, current_max)
+            last_number = _increment(key, count)
+
+    return range(last_number - count + 1, last_number + 1)
+
+
+def observe_number(key, number):
+    """
+    Registra un correlativo asignado fuera del contador (OS manual...), para
+    que el contador no lo vuelva a proponer. No bloquea si el contador ya va
+    por delante.
+    """
+    from .models import DocumentSequence
+
+    if uses_database_sequence(key):
+        name = _ensure_sequence(key, None)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT setval(%s, GREATEST(%s, (SELECT last_value FROM {name})))',
+                [name, number],
+            )
+        return
+
+    updated = DocumentSequence.objects.filter(key=key, last_number__lt=number).update(
+        last_number=number, updated_at=timezone.now(),
+    )
+    if not updated and not DocumentSequence.objects.filter(key=key).exists():
+        # Sin contador todavía: se inicializa con el escaneo, que ya incluye
+        # el número recién insertado.
+        _create_counter(key, lambda: max(scan_current_max(key), number))
+
+
+def _increment(key, count):
+    """Suma ``count`` al contador y devuelve el nuevo valor (None si no existe)."""
+    from .models import DocumentSequence
+
+    if connection.features.can_return_columns_from_insert:
+        # PostgreSQL y SQLite >= 3.35: una sola sentencia, sin SELECT previo
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {qn(DocumentSequence._meta.db_table)} '
+                f'SET last_number = last_number + %s, updated_at = %s '
+                f'WHERE {qn("key")} = %s RETURNING last_number',
+                [count, connection.ops.adapt_datetimefield_value(timezone.now()), key],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    counter = DocumentSequence.objects.select_for_update().filter(key=key).first()
+    if counter is None:
+        return None
+    counter.last_number += count
+    counter.save(update_fields=['last_number', 'updated_at'])
+    return counter.last_number
+
+
+def _create_counter(key, current_max):
+    """
+    Crea el contador de la serie partiendo del mayor número ya emitido. El
+    savepoint permite recuperarse si otra petición lo creó primero.
+    """
+    from .models import DocumentSequence
+
+    seed = current_max() if current_max is not None else scan_current_max(key)
+    try:
+        with transaction.atomic():
+            DocumentSequence.objects.create(key=key, last_number=seed or 0)
+    except IntegrityError:
+        pass
+
+
+def sequence_name(key):
+    """Nombre del SEQUENCE de PostgreSQL de una serie."""
+    return 'docseq_' + re.sub(r'[^a-z0-9]+', '_', key.lower())
+
+
+def _ensure_sequence(key, current_max):
+    """Crea (si falta) el SEQUENCE de la serie partiendo del máximo emitido."""
+    from .models import DocumentSequence
+
+    name = sequence_name(key)
+    if name in _known_sequences:
+        return name
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_class WHERE relkind = 'S' AND relname = %s", [name])
+        if cursor.fetchone() is None:
+            counter = DocumentSequence.objects.filter(key=key).values_list('last_number', flat=True).first()
+            seed = max(
+                counter or 0,
+                current_max() if current_max is not None else scan_current_max(key),
+            )
+            cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {name} START WITH {int(seed) + 1}')
+            # El CREATE se revierte junto con la transacción
+            transaction.on_commit(lambda: _known_sequences.add(name))
+            return name
+    _known_sequences.add(name)
+    return name
+
+
+def _sequence_next(key, current_max):
+    name = _ensure_sequence(key, current_max)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [name])
+        return cursor.fetchone()[0]
@@ -0,0 +1,95 @@
+"""
+Resúmenes (KPIs) con una sola consulta de agregación.
+
+Los endpoints de resumen calculaban cada métrica con su propio
+``filter(...).count()`` / ``aggregate(Sum(...))`` sobre el mismo queryset, lo
+que escala con el número de estados/tipos. Aquí cada métrica se declara como
+(agregado, filtro) y todas se resuelven en un único ``aggregate()`` con
+agregados condicionales (``Sum(..., filter=Q(...))``):
+
+    summary = SummaryBuilder()
+    summary.count('total')
+    summary.sum('total_amount', 'amount')
+    summary.sum('pending', 'balance', filter=Q(balance__gt=0))
+    summary.by_choices('by_status', 'status', Transfer.STATUS_CHOICES, amount='amount')
+
+    data = summary.aggregate(queryset)
+    data['pending']               # Decimal('0') si no hay filas
+    data['by_status']['pagado']   # {'label': 'Pagado', 'count': 3, 'amount': Decimal(...)}
+"""
+
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+
+
+class SummaryBuilder:
+    """Acumula métricas (nombre, agregado, valor por defecto) y las resuelve juntas."""
+
+    def __init__(self):
+        self._aggregates = {}
+        self._defaults = {}
+        # Orden de salida: ('metric', nombre) o ('group', nombre, miembros)
+        self._layout = []
+
+    def add(self, name, aggregate, default=None):
+        """Registra un agregado arbitrario (ya con su ``filter=`` si aplica)."""
+        if name in self._aggregates:
+            raise ValueError(f'Métrica duplicada: {name}')
+        self._aggregates[name] = aggregate
+        self._defaults[name] = default
+        self._layout.append(('metric', name, None))
+        return self
+
+    def sum(self, name, expression, filter=None, default=Decimal('0')):
+        """Suma de ``expression`` (campo o expresión) sobre las filas que cumplen ``filter``."""
+        return self.add(name, Sum(expression, filter=filter), default)
+
+    def count(self, name, filter=None):
+        """Cantidad de filas que cumplen ``filter``."""
+        return self.add(name, Count('pk', filter=filter), 0)
+
+    def by_choices(self, name, field, choices, amount=None, filter=None):
+        """
+        Un grupo ``{código: {'label', 'count'[, 'amount']}}`` por cada choice
+        de ``field``, como los desgloses por estado/tipo de los resúmenes.
+        """
+        members = []
+        start = len(self._layout)
+        for code, label in choices:
+            condition = Q(**{field: code})
+            if filter is not None:
+                condition &= filter
+            count_key = f'{name}_{code}_count'
+            self.count(count_key, condition)
+            amount_key = None
+            if amount is not None:
+                amount_key = f'{name}_{code}_amount'
+                self.sum(amount_key, amount, condition)
+            members.append((code, label, count_key, amount_key))
+        # Las métricas del grupo se presentan anidadas, no sueltas
+        self._layout[start:] = [('group', name, members)]
+        return self
+
+    def aggregate(self, queryset):
+        """Ejecuta todas las métricas en UNA consulta y devuelve el diccionario."""
+        raw = queryset.aggregate(**self._aggregates) if self._aggregates else {}
+
+        data = {}
+        for kind, name, members in self._layout:
+            if kind == 'metric':
+                data[name] = self._value(raw, name)
+                continue
+            data[name] = {
+                code: {
+                    'label': label,
+                    'count': self._value(raw, count_key),
+                    **({'amount': self._value(raw, amount_key)} if amount_key else {}),
+                }
+                for code, label, count_key, amount_key in members
+            }
+        return data
+
+    def _value(self, raw, name):
+        value = raw.get(name)
+        return self._defaults[name] if value is None else value
@@ -0,0 +1,38 @@
+"""
+Runner de pruebas del proyecto (``settings.TEST_RUNNER``).
+
+Agrega el alias ``TEST_REPLICA_ALIAS``, una segunda base de datos que hace de
+réplica de lectura en los tests del enrutador (apps/core/db_routing.py). Se
+declara aquí y no en settings.py para no mezclar la configuración de pruebas
+con la de producción.
+
+Es una base independiente (no ``MIRROR`` de ``default``) para que los tests
+distingan de dónde se leyó cada dato; por eso sí recibe las migraciones. Los
+tests la activan con ``override_settings(READ_REPLICA_ALIAS=TEST_REPLICA_ALIAS)``.
+"""
+
+import copy
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+
+TEST_REPLICA_ALIAS = 'test_replica'
+
+
+def add_test_replica():
+    """Registra el alias de la réplica de pruebas, con el motor de ``default``."""
+    if TEST_REPLICA_ALIAS in settings.DATABASES:
+        return
+    replica = copy.deepcopy(connections.settings[DEFAULT_DB_ALIAS])
+    replica['NAME'] = f"{replica['NAME']}_replica"
+    # SQLite: base en memoria; otros motores: test_<NAME>_replica
+    replica['TEST'] = {**replica.get('TEST', {}), 'NAME': None, 'MIRROR': None}
+    connections.settings[TEST_REPLICA_ALIAS] = replica
+    settings.DATABASES[TEST_REPLICA_ALIAS] = replica
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        add_test_replica()
+        super().setup_test_environment(**kwargs)
@@ -7,18 +7,26 @@ Regresiones de la contención de bloqueos que provocaba
 al crear/editar facturas de forma concurrente.
 """
 
+import io
+import shutil
+import tempfile
 from decimal import Decimal
+from unittest import skipUnless
 
+from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.db import OperationalError
-from django.test import SimpleTestCase, TestCase
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
 
 from apps.catalogs.models import ShipmentType
 from apps.clients.models import Client
 from apps.core.exceptions import custom_exception_handler
-from apps.core.models import DocumentSequence
-from apps.core.sequences import next_number
+from apps.core.models import DocumentSequence, MaintenanceCheckpoint
+from apps.core.sequences import next_number, next_numbers, observe_number
 from apps.core.storage import stage_upload
+from apps.core.test_runner import TEST_REPLICA_ALIAS
 from apps.orders.models import Invoice, InvoicePayment, ServiceOrder
 
 
@@ -41,6 +49,58 @@ class NextNumberTests(TestCase):
         # Ya registrado en el contador: no vuelve atrás aunque el máximo baje.
         self.assertEqual(next_number('demo:2026', lambda: 0), 42)
 
+    def test_el_maximo_solo_se_escanea_al_crear_el_contador(self):
+        calls = []
+
+        def current_max():
+            calls.append(1)
+            return 7
+
+        self.assertEqual(next_number('demo:2026', current_max), 8)
+        self.assertEqual(next_number('demo:2026', current_max), 9)
+        self.assertEqual(len(calls), 1)
+
+    def test_reserva_en_bloque(self):
+        next_number('demo:2026')
+        self.assertEqual(list(next_numbers('demo:2026', 3)), [2, 3, 4])
+        self.assertEqual(next_number('demo:2026'), 5)
+
+    def test_numero_manual_adelanta_el_contador(self):
+        next_number('demo:2026')
+        observe_number('demo:2026', 30)
+        self.assertEqual(next_number('demo:2026'), 31)
+        # Un número menor al contador no lo hace retroceder
+        observe_number('demo:2026', 5)
+        self.assertEqual(next_number('demo:2026'), 32)
+
+    def test_os_manual_no_se_repite_en_la_numeracion_automatica(self):
+        client = Client.objects.create(name='Cliente Manual', payment_condition='contado')
+        shipment = ShipmentType.objects.create(name='Aereo Manual')
+        year = timezone.now().year
+
+        ServiceOrder.objects.create(client=client, shipment_type=shipment)
+        ServiceOrder.objects.create(
+            client=client, shipment_type=shipment, is_manual_os=True, order_number=f'050-{year}',
+        )
+        order = ServiceOrder.objects.create(client=client, shipment_type=shipment)
+
+        self.assertEqual(order.order_number, f'051-{year}')
+
+    def test_sincronizar_adelanta_contadores_atrasados(self):
+        client = Client.objects.create(name='Cliente Sync', payment_condition='contado')
+        shipment = ShipmentType.objects.create(name='Terrestre Sync')
+        year = timezone.now().year
+
+        ServiceOrder.objects.create(client=client, shipment_type=shipment)
+        # Documento insertado por fuera de la aplicación (sin pasar por save)
+        ServiceOrder.objects.bulk_create([
+            ServiceOrder(order_number=f'120-{year}', client=client, shipment_type=shipment),
+        ])
+
+        call_command('sync_document_sequences', stdout=io.StringIO())
+
+        self.assertEqual(DocumentSequence.objects.get(key=f'service_order:{year}').last_number, 120)
+
 
 class InvoiceNumberingTests(TestCase):
     def setUp(self):
@@ -58,6 +118,24 @@ class InvoiceNumberingTests(TestCase):
         self.assertEqual(len(set(numbers)), 5)
         self.assertTrue(all(n.startswith('PRE-') for n in numbers))
 
+    def test_prefactura_manual_adelanta_el_contador(self):
+        year = timezone.now().year
+        auto = Invoice.objects.create(service_order=self._order(), total_amount=Decimal('10.00'))
+        manual = Invoice.objects.create(
+            service_order=self._order(), total_amount=Decimal('10.00'),
+            invoice_number=f'PRE-{int(auto.invoice_number.split("-")[1]) + 1:05d}-{year}',
+        )
+        following = Invoice.objects.create(service_order=self._order(), total_amount=Decimal('10.00'))
+        self.assertNotEqual(following.invoice_number, manual.invoice_number)
+
+        # Editar el número también lo registra
+        manual.invoice_number = f'PRE-00090-{year}'
+        manual.save()
+        self.assertEqual(
+            Invoice.objects.create(service_order=self._order(), total_amount=Decimal('10.00')).invoice_number,
+            f'PRE-00091-{year}',
+        )
+
     def test_correlativos_de_os_no_se_repiten(self):
         numbers = [self._order().order_number for _ in range(5)]
         self.assertEqual(len(set(numbers)), 5)
@@ -67,6 +145,10 @@ class StageUploadTests(TestCase):
     """La subida ocurre fuera de la transacción y no se repite al guardar."""
 
     def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+
         client_obj = Client.objects.create(name='Cliente Upload', payment_condition='contado')
         shipment = ShipmentType.objects.create(name='Aereo Upload')
         order = ServiceOrder.objects.create(client=client_obj, shipment_type=shipment)
@@ -135,3 +217,637 @@ class LockContentionResponseTests(SimpleTestCase):
         response = self._handle('08006')
         self.assertEqual(response.status_code, 500)
         self.assertEqual(response.data['code'], 'internal_server_error')
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """FastJSONRenderer debe producir el mismo JSON que el renderer de DRF."""
+
+    def test_misma_salida_que_drf_para_tipos_no_nativos(self):
+        import datetime
+        import json
+        import uuid
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        from apps.core.renderers import FastJSONRenderer
+
+        data = {
+            'total': Decimal('1234.50'),
+            'cero': Decimal('0.00'),
+            'fecha': datetime.date(2026, 3, 1),
+            'creado': datetime.datetime(2026, 3, 1, 10, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'local': datetime.datetime(2026, 3, 1, 10, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=-6))),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'etiqueta': gettext_lazy('Pendiente'),
+            'montos_por_mes': {1: Decimal('10.10'), 2: Decimal('20.20')},
+            'filas': [{'saldo': Decimal('-5.25'), 'nombre': 'Cliente ñandú'}],
+        }
+
+        expected = json.loads(JSONRenderer().render(data))
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), expected)
+        self.assertEqual(expected['creado'], '2026-03-01T10:30:15.123456Z')
+        self.assertEqual(expected['total'], 1234.5)
+
+    def test_indentacion_usa_renderer_de_drf(self):
+        from apps.core.renderers import FastJSONRenderer
+
+        body = FastJSONRenderer().render({'a': 1}, 'application/json; indent=2')
+        self.assertEqual(body, b'{\n  "a": 1\n}')
+
+
+class HistoryWriterTests(TestCase):
+    """El historial se inserta en bloque al hacer commit y se descarta en rollback."""
+
+    def setUp(self):
+        from apps.orders.models import OrderHistory
+
+        self.OrderHistory = OrderHistory
+        client = Client.objects.create(name='Cliente Historial')
+        shipment = ShipmentType.objects.create(name='Marítimo Historial')
+        self.order = ServiceOrder.objects.create(client=client, shipment_type=shipment)
+        OrderHistory.objects.all().delete()
+
+    def _record(self, description):
+        from apps.core.history_writer import record
+        record(
+            self.OrderHistory,
+            service_order=self.order,
+            event_type='updated',
+            description=description,
+        )
+
+    def _descriptions(self):
+        return list(self.OrderHistory.objects.order_by('id').values_list('description', flat=True))
+
+    def test_inserta_en_un_solo_bulk_al_hacer_commit(self):
+        from django.db import connection, transaction
+        from django.test.utils import CaptureQueriesContext
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                for i in range(5):
+                    self._record(f'evento {i}')
+                self.assertEqual(self._descriptions(), [])
+
+        self.assertEqual(len(callbacks), 1)
+        with CaptureQueriesContext(connection) as ctx:
+            callbacks[0]()
+
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(self._descriptions(), [f'evento {i}' for i in range(5)])
+
+    def test_rollback_descarta_eventos_y_conserva_el_orden(self):
+        from django.db import transaction
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self._record('antes')
+                try:
+                    with transaction.atomic():
+                        self._record('descartado')
+                        raise ValueError
+                except ValueError:
+                    pass
+                with transaction.atomic():
+                    self._record('savepoint confirmado')
+                self._record('después')
+
+        self.assertEqual(self._descriptions(), ['antes', 'savepoint confirmado', 'después'])
+
+    def test_rollback_de_la_transaccion_descarta_todo(self):
+        from django.db import transaction
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self._record('descartado')
+                    raise ValueError
+            except ValueError:
+                pass
+            with transaction.atomic():
+                self._record('siguiente transacción')
+
+        self.assertEqual(self._descriptions(), ['siguiente transacción'])
+
+
+class PaymentVoidConcurrencyTests(TransactionTestCase):
+    """Anular dos veces el mismo pago (doble clic) resta su monto una sola vez."""
+
+    def setUp(self):
+        client_obj = Client.objects.create(name='Cliente Anulación', payment_condition='credito')
+        shipment = ShipmentType.objects.create(name='Aéreo Anulación')
+        order = ServiceOrder.objects.create(client=client_obj, shipment_type=shipment)
+        self.invoice = Invoice.objects.create(service_order=order, total_amount=Decimal('100.00'))
+        self.payment = InvoicePayment.objects.create(
+            invoice=self.invoice, amount=Decimal('40.00'),
+            payment_date='2026-01-01', payment_method='transferencia',
+        )
+
+    def _assert_voided_once(self):
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.paid_amount, Decimal('0.00'))
+        self.assertEqual(self.invoice.balance, Decimal('100.00'))
+
+    def test_anulacion_con_instancia_desactualizada(self):
+        stale = InvoicePayment.objects.get(pk=self.payment.pk)
+        self.payment.delete()
+        stale.delete()
+        self._assert_voided_once()
+
+    @skipUnless(connection.features.has_select_for_update, 'requiere SELECT ... FOR UPDATE')
+    def test_anulaciones_simultaneas(self):
+        import threading
+        from django.db import connections
+
+        barrier = threading.Barrier(2)
+        errors = []
+
+        def void():
+            try:
+                payment = InvoicePayment.objects.get(pk=self.payment.pk)
+                barrier.wait()
+                payment.delete()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=void) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+
+        self.assertEqual(errors, [])
+        self._assert_voided_once()
+
+
+class CommitBatchTests(TestCase):
+    """Lo acumulado en una transacción se procesa una vez al confirmarla."""
+
+    def _batch_class(self):
+        from apps.core.on_commit import CommitBatch
+
+        runs = []
+
+        class Batch(CommitBatch):
+            def __init__(self):
+                self.items = []
+
+            def run(self):
+                runs.append(self.items)
+
+        return Batch, runs
+
+    def test_una_transaccion_un_solo_proceso(self):
+        from django.db import transaction
+
+        Batch, runs = self._batch_class()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for item in ('a', 'b'):
+                    with Batch.collect() as batch:
+                        batch.items.append(item)
+                self.assertEqual(runs, [])
+        self.assertEqual(runs, [['a', 'b']])
+
+    def test_rollback_descarta_y_empieza_de_nuevo(self):
+        from django.db import transaction
+
+        Batch, runs = self._batch_class()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    with Batch.collect() as batch:
+                        batch.items.append('descartado')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            with Batch.collect() as batch:
+                batch.items.append('confirmado')
+        self.assertEqual(runs, [['confirmado']])
+
+
+class HistoryWriterBackgroundTests(TransactionTestCase):
+    """Con HISTORY_WRITER_BACKGROUND los eventos confirmados los escribe un hilo local."""
+
+    def test_hilo_escribe_eventos_confirmados(self):
+        from django.db import transaction
+        from django.test import override_settings
+        from apps.core.history_writer import background_writer, record
+        from apps.orders.models import OrderHistory
+
+        client = Client.objects.create(name='Cliente Hilo')
+        shipment = ShipmentType.objects.create(name='Aéreo Hilo')
+        order = ServiceOrder.objects.create(client=client, shipment_type=shipment)
+        OrderHistory.objects.all().delete()
+
+        with override_settings(HISTORY_WRITER_BACKGROUND=True):
+            with transaction.atomic():
+                for i in range(3):
+                    record(OrderHistory, service_order=order, event_type='updated', description=f'evento {i}')
+            background_writer.wait()
+
+        self.assertEqual(
+            list(OrderHistory.objects.order_by('id').values_list('description', flat=True)),
+            ['evento 0', 'evento 1', 'evento 2'],
+        )
+
+
+class CompactSerializerTests(SimpleTestCase):
+    """El serializador de caché conserva Decimal/fechas y comprime lo grande."""
+
+    def _payload(self):
+        import datetime
+        import uuid
+
+        return {
+            'total': Decimal('1234.50'),
+            'negativo': Decimal('-0.01'),
+            'fecha': datetime.date(2026, 3, 1),
+            'creado': datetime.datetime(2026, 3, 1, 10, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'ingenuo': datetime.datetime(2026, 3, 1, 10, 30),
+            'hora': datetime.time(8, 15),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'montos_por_mes': {1: Decimal('10.10'), 2: Decimal('20.20')},
+            'filas': [{'saldo': Decimal('-5.25'), 'nombre': 'Cliente ñandú', 'pagado': None}],
+        }
+
+    def test_ida_y_vuelta_conserva_tipos(self):
+        from apps.core.cache_serializers import CompactSerializer
+
+        serializer = CompactSerializer()
+        data = self._payload()
+        restored = serializer.loads(serializer.dumps(data))
+
+        self.assertEqual(restored, data)
+        self.assertIsInstance(restored['total'], Decimal)
+        self.assertEqual(str(restored['total']), '1234.50')
+        self.assertEqual(restored['creado'].tzinfo, data['creado'].tzinfo)
+
+    def test_comprime_sobre_el_umbral(self):
+        from apps.core.cache_serializers import COMPRESSION_NONE, COMPRESSION_ZLIB, CompactSerializer
+
+        serializer = CompactSerializer({'COMPRESS_MIN_LENGTH': 512})
+        small = serializer.dumps({'a': 1})
+        large_data = {'filas': [self._payload() for _ in range(200)]}
+        large = serializer.dumps(large_data)
+        uncompressed = CompactSerializer({'COMPRESSION': 'none'}).dumps(large_data)
+
+        self.assertEqual(small[0] & 0x0F, COMPRESSION_NONE)
+        self.assertEqual(large[0] & 0x0F, COMPRESSION_ZLIB)
+        self.assertLess(len(large), len(uncompressed) / 5)
+        self.assertEqual(serializer.loads(large), large_data)
+
+    def test_tipos_no_soportados_usan_pickle(self):
+        from apps.core.cache_serializers import FORMAT_PICKLE, CompactSerializer
+
+        serializer = CompactSerializer()
+        raw = serializer.dumps({'ids': {1, 2, 3}})
+
+        self.assertEqual(raw[0] & 0xF0, FORMAT_PICKLE)
+        self.assertEqual(serializer.loads(raw), {'ids': {1, 2, 3}})
+
+    def test_lee_valores_escritos_con_otra_configuracion(self):
+        from apps.core.cache_serializers import CompactSerializer
+
+        data = {'filas': [self._payload() for _ in range(50)]}
+        raw = CompactSerializer({'COMPRESSION': 'none', 'FORMAT': 'pickle'}).dumps(data)
+
+        self.assertEqual(CompactSerializer().loads(raw), data)
+
+    def test_lee_valores_escritos_por_json_serializer(self):
+        import json
+        from apps.core.cache_serializers import CompactSerializer
+
+        serializer = CompactSerializer()
+        for value in ({'total': '10.00', 'filas': [1, 2]}, [1, 'a'], 'texto', 'x' * 2000, 42, None, True):
+            raw = json.dumps(value).encode()
+            self.assertEqual(serializer.loads(raw), value)
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    """LRU local delante del caché compartido, con invalidación por versión."""
+
+    def _cache(self, **kwargs):
+        from django.core.cache import caches
+        from apps.core.cache import TwoTierCache
+
+        caches['default'].clear()
+        kwargs.setdefault('version_check_interval', 0)
+        return TwoTierCache('pruebas', **kwargs)
+
+    def test_lru_descarta_el_menos_usado_y_expira(self):
+        from apps.core.cache import LocalLRUCache
+
+        lru = LocalLRUCache(max_entries=2)
+        lru.set('a', 1, ttl=60)
+        lru.set('b', 2, ttl=60)
+        lru.get('a')
+        lru.set('c', 3, ttl=60)
+
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        lru.set('d', 4, ttl=0)
+        self.assertIsNone(lru.get('d'))
+
+    def test_loader_se_ejecuta_una_vez_por_version(self):
+        cache = self._cache()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return {1: 'Banco Uno'}
+
+        self.assertEqual(cache.get('bancos', loader), {1: 'Banco Uno'})
+        self.assertEqual(cache.get('bancos', loader), {1: 'Banco Uno'})
+        self.assertEqual(len(calls), 1)
+
+        # Otro worker: no tiene el valor local pero lo lee del caché compartido
+        from apps.core.cache import TwoTierCache
+        other = TwoTierCache('pruebas', version_check_interval=0)
+        self.assertEqual(other.get('bancos', loader), {1: 'Banco Uno'})
+        self.assertEqual(len(calls), 1)
+
+    def test_invalidar_en_un_worker_afecta_a_los_demas(self):
+        from apps.core.cache import TwoTierCache
+
+        cache = self._cache()
+        other = TwoTierCache('pruebas', version_check_interval=0)
+        self.assertEqual(other.get('tasa', lambda: 'vieja'), 'vieja')
+
+        cache.invalidate()
+
+        self.assertEqual(other.get('tasa', lambda: 'nueva'), 'nueva')
+
+    def test_version_se_relee_segun_el_intervalo(self):
+        from apps.core.cache import TwoTierCache
+
+        cache = self._cache()
+        other = TwoTierCache('pruebas', version_check_interval=3600)
+        self.assertEqual(other.get('tasa', lambda: 'vieja'), 'vieja')
+
+        cache.invalidate()
+
+        # Hasta el próximo chequeo de versión, el otro worker sirve su copia local
+        self.assertEqual(other.get('tasa', lambda: 'nueva'), 'vieja')
+
+
+class MaintenanceFrameworkTests(TestCase):
+    """Comandos de corrección por lotes: keyset, diferencia, checkpoint y reanudación."""
+
+    def setUp(self):
+        from apps.catalogs.models import Provider, Service
+
+        self.client_obj = Client.objects.create(name='Gran Contribuyente', taxpayer_type='grande')
+        shipment = ShipmentType.objects.create(name='Marítimo Mantenimiento')
+        self.provider = Provider.objects.create(name='Proveedor Mantenimiento')
+        self.service = Service.objects.create(name='Flete Mantenimiento', default_price=Decimal('100.00'))
+        self.order = ServiceOrder.objects.create(client=self.client_obj, shipment_type=shipment)
+
+        self.invoices = [self._invoice(price) for price in ('150.00', '80.00', '333.33')]
+
+    def _invoice(self, price):
+        from apps.orders.models import OrderCharge
+        from apps.transfers.models import Transfer
+
+        invoice = Invoice.objects.create(service_order=self.order, total_amount=Decimal('0.00'))
+        OrderCharge.objects.create(
+            service_order=self.order, service=self.service, quantity=1, unit_price=Decimal(price),
+            iva_type='gravado', invoice=invoice,
+        )
+        Transfer.objects.create(
+            transfer_type='terceros', provider=self.provider, service_order=self.order,
+            amount=Decimal('10.00'), description='Gasto', invoice=invoice,
+            customer_markup_percentage=Decimal('12.50'), customer_iva_type='gravado',
+        )
+        invoice.calculate_totals()
+        return invoice
+
+    def _totals(self):
+        from apps.orders.maintenance import InvoiceTotalsTask
+
+        return list(Invoice.objects.order_by('pk').values_list(*InvoiceTotalsTask.fields))
+
+    def _corrupt(self):
+        Invoice.objects.update(
+            subtotal_services=Decimal('0.00'), total_third_party=Decimal('0.00'),
+            total_amount=Decimal('1.00'), retencion=Decimal('0.00'), balance=Decimal('1.00'),
+        )
+
+    def test_recalculate_totals_reproduce_calculate_totals(self):
+        expected = self._totals()
+        self._corrupt()
+
+        out = io.StringIO()
+        call_command('recalculate_totals', chunk_size=2, stdout=out)
+
+        self.assertEqual(self._totals(), expected)
+        self.assertIn('3 revisado(s) en 2 lote(s), 3 corregido(s)', out.getvalue())
+        self.assertGreater(Invoice.objects.get(pk=self.invoices[0].pk).retencion, Decimal('0.00'))
+
+    def test_dry_run_informa_diferencia_sin_guardar(self):
+        self._corrupt()
+        corrupted = self._totals()
+
+        out = io.StringIO()
+        call_command('recalculate_totals', dry_run=True, stdout=out)
+
+        self.assertEqual(self._totals(), corrupted)
+        self.assertIn(f'{self.invoices[0].invoice_number}: subtotal_services 0.00 -> 150.00', out.getvalue())
+        self.assertFalse(MaintenanceCheckpoint.objects.exists())
+
+    def test_consultas_por_lote_no_dependen_de_las_filas(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.core.maintenance import run_task
+        from apps.orders.maintenance import InvoiceTotalsTask
+
+        self._corrupt()
+        with CaptureQueriesContext(connection) as small:
+            run_task(InvoiceTotalsTask(), chunk_size=10)
+        for price in ('10.00', '20.00', '30.00'):
+            self._invoice(price)
+        self._corrupt()
+        with CaptureQueriesContext(connection) as large:
+            result = run_task(InvoiceTotalsTask(), chunk_size=10)
+
+        self.assertEqual(result.changed, 6)
+        self.assertEqual(len(small), len(large))
+
+    def test_reanuda_desde_el_ultimo_lote_confirmado(self):
+        from apps.core.maintenance import MaintenanceInterrupted, run_task
+        from apps.transfers.maintenance import TransferStatusTask
+        from apps.transfers.models import Transfer
+
+        transfers = list(Transfer.objects.order_by('pk'))
+        Transfer.objects.update(paid_amount=Decimal('10.00'), status='pendiente')
+        failing = transfers[1].pk
+
+        class FailingTask(TransferStatusTask):
+            def recompute(self, rows):
+                if any(row.pk == failing for row in rows):
+                    raise RuntimeError('caída simulada')
+                super().recompute(rows)
+
+        with self.assertRaises(MaintenanceInterrupted):
+            run_task(FailingTask(), chunk_size=1)
+
+        checkpoint = MaintenanceCheckpoint.objects.get(task='fix_transfer_status')
+        self.assertEqual(checkpoint.last_pk, transfers[0].pk)
+        statuses = dict(Transfer.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[transfers[0].pk], 'pagado')
+        self.assertEqual(statuses[failing], 'pendiente')
+
+        result = run_task(TransferStatusTask(), chunk_size=1, resume=True)
+
+        self.assertEqual(result.scanned, len(transfers) - 1)
+        self.assertEqual(set(Transfer.objects.values_list('status', flat=True)), {'pagado'})
+        self.assertFalse(MaintenanceCheckpoint.objects.exists())
+
+    def test_fix_orphan_third_party_charges_vista_previa_y_apply(self):
+        from apps.orders.models import OrderCharge
+
+        charge = OrderCharge.objects.filter(invoice=self.invoices[0]).get()
+        OrderCharge.objects.filter(pk=charge.pk).update(is_third_party_service=True)
+
+        out = io.StringIO()
+        call_command('fix_orphan_third_party_charges', stdout=out)
+        self.assertIn(f'Charge #{charge.pk}', out.getvalue())
+        self.assertTrue(OrderCharge.objects.get(pk=charge.pk).is_third_party_service)
+
+        call_command('fix_orphan_third_party_charges', apply=True, stdout=io.StringIO())
+        self.assertFalse(OrderCharge.objects.get(pk=charge.pk).is_third_party_service)
+
+    def test_workers_dividen_el_rango_de_ids(self):
+        from apps.core.maintenance import split_ranges
+        from apps.transfers.models import Transfer
+
+        pks = list(Transfer.objects.order_by('pk').values_list('pk', flat=True))
+        self.assertEqual(split_ranges(Transfer.objects.all(), 2), [(pks[0], pks[1]), (pks[2], pks[2])])
+        Transfer.objects.update(paid_amount=Decimal('10.00'), status='pendiente')
+
+        out = io.StringIO()
+        call_command('fix_transfer_status', workers=3, chunk_size=1, stdout=out)
+
+        self.assertEqual(set(Transfer.objects.values_list('status', flat=True)), {'pagado'})
+        self.assertIn('3 revisado(s) en 3 lote(s), 3 corregido(s)', out.getvalue())
+        self.assertFalse(MaintenanceCheckpoint.objects.exists())
+
+
+@skipUnless(TEST_REPLICA_ALIAS in settings.DATABASES, 'requiere apps.core.test_runner.TestRunner')
+class ReadReplicaRoutingTests(TransactionTestCase):
+    """
+    Las lecturas de reportes van a la réplica (en pruebas, la base
+    ``TEST_REPLICA_ALIAS`` con datos distintos) y vuelven a la principal
+    cuando corresponde.
+    """
+    databases = {'default', TEST_REPLICA_ALIAS}
+
+    def setUp(self):
+        from django.core.cache import cache
+        from rest_framework.test import APIClient
+        from apps.core.db_routing import lag_monitor
+        from apps.users.models import User
+
+        cache.clear()
+        lag_monitor.reset()
+        self.addCleanup(lag_monitor.reset)
+        self.addCleanup(cache.clear)
+
+        self._snapshot('default', 'principal')
+        self._snapshot(TEST_REPLICA_ALIAS, 'replica')
+
+        self.user = User.objects.create_user(username='replica', password='x', role='admin')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def _snapshot(self, alias, key):
+        from apps.dashboard.models import AlertSnapshot
+
+        AlertSnapshot.objects.using(alias).create(
+            key=key, alert_type='test', severity='info', severity_rank=3, source='order',
+            object_id=1, message=key, link='/', computed_on=timezone.localdate(),
+        )
+
+    def _alert_keys(self):
+        response = self.api.get('/api/dashboard/alerts/')
+        self.assertEqual(response.status_code, 200)
+        return [alert['id'] for alert in response.json()]
+
+    def test_sin_replica_configurada_lee_la_principal(self):
+        self.assertEqual(self._alert_keys(), ['principal'])
+
+    def test_vista_de_reportes_lee_la_replica(self):
+        from django.test import override_settings
+
+        with override_settings(READ_REPLICA_ALIAS=TEST_REPLICA_ALIAS):
+            self.assertEqual(self._alert_keys(), ['replica'])
+
+    def test_decorador_en_accion_de_viewset(self):
+        from django.test import override_settings
+
+        client = Client.objects.create(name='Cliente Principal')
+        Client.objects.using(TEST_REPLICA_ALIAS).create(pk=client.pk, name='Cliente Réplica')
+
+        with override_settings(READ_REPLICA_ALIAS=TEST_REPLICA_ALIAS):
+            response = self.api.get(f'/api/clients/{client.pk}/account_statement/')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Cliente Réplica', response.content.decode())
+
+            # Las acciones sin decorar siguen en la principal
+            response = self.api.get(f'/api/clients/{client.pk}/')
+            self.assertEqual(response.json()['name'], 'Cliente Principal')
+
+    def test_escrituras_transacciones_y_use_primary_van_a_la_principal(self):
+        from django.db import transaction
+        from django.test import override_settings
+        from apps.core.db_routing import use_primary, use_replica
+        from apps.dashboard.models import AlertSnapshot
+
+        with override_settings(READ_REPLICA_ALIAS=TEST_REPLICA_ALIAS):
+            with use_replica():
+                self.assertEqual(AlertSnapshot.objects.get().key, 'replica')
+                Client.objects.create(name='Escrito en la principal')
+                with transaction.atomic():
+                    self.assertEqual(AlertSnapshot.objects.get().key, 'principal')
+                with use_primary():
+                    self.assertEqual(AlertSnapshot.objects.get().key, 'principal')
+
+        self.assertTrue(Client.objects.using('default').filter(name='Escrito en la principal').exists())
+        self.assertFalse(Client.objects.using(TEST_REPLICA_ALIAS).exists())
+
+    def test_tras_una_escritura_el_usuario_lee_la_principal(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory, override_settings
+        from apps.core.db_routing import ReplicaPinMiddleware
+
+        middleware = ReplicaPinMiddleware(lambda request: HttpResponse(status=201))
+        request = RequestFactory().post('/api/orders/')
+        request.user = self.user
+
+        with override_settings(READ_REPLICA_ALIAS=TEST_REPLICA_ALIAS):
+            self.assertEqual(self._alert_keys(), ['replica'])
+            middleware(request)
+            self.assertEqual(self._alert_keys(), ['principal'])
+
+    def test_replica_atrasada_vuelve_a_la_principal(self):
+        import time
+        from django.test import override_settings
+        from apps.core.db_routing import lag_monitor
+
+        with override_settings(READ_REPLICA_ALIAS=TEST_REPLICA_ALIAS, READ_REPLICA_MAX_LAG=30):
+            lag_monitor._measured[TEST_REPLICA_ALIAS] = (time.monotonic(), 120.0)
+            self.assertEqual(self._alert_keys(), ['principal'])
+            # Réplica sin respuesta: también la principal
+            lag_monitor._measured[TEST_REPLICA_ALIAS] = (time.monotonic(), None)
+            self.assertEqual(self._alert_keys(), ['principal'])
+
+    def test_la_replica_no_recibe_migraciones(self):
+        from django.test import override_settings
+        from apps.core.db_routing import ReadReplicaRouter
+
+        router = ReadReplicaRouter()
+        with override_settings(READ_REPLICA_ALIAS=TEST_REPLICA_ALIAS):
+            self.assertFalse(router.allow_migrate(TEST_REPLICA_ALIAS, 'orders'))
+            self.assertIsNone(router.allow_migrate('default', 'orders'))
@@ -0,0 +1,421 @@
+"""
+Serialización de solo lectura basada en ``QuerySet.values()``.
+
+En los listados grandes (OS, facturas, gastos) el costo dominante ya no es la
+base de datos sino la maquinaria de DRF: instanciar un modelo por fila y
+recorrer una docena de campos/``SerializerMethodField`` por cada una. Para las
+acciones ``list`` se usa esta capa, que lee las columnas necesarias con
+``values()`` (incluyendo anotaciones del queryset) y arma cada fila con
+conversores precompilados, produciendo el MISMO JSON que el serializer DRF
+equivalente (ver tests de paridad en cada app).
+
+    class InvoiceListValuesSerializer(ValuesSerializer):
+        client_name = ModelValue('service_order__client__name')
+        status_display = ChoiceDisplay('status')
+        is_editable = Computed(lambda row, ctx: not row['is_dte_issued'], 'is_dte_issued')
+
+        class Meta:
+            model = Invoice
+            fields = ['id', 'invoice_number', 'client_name', 'status_display', 'is_editable', ...]
+
+    class InvoiceViewSet(ValuesListMixin, viewsets.ModelViewSet):
+        values_serializer_class = InvoiceListValuesSerializer
+
+Los campos listados en ``Meta.fields`` que no se declaran explícitamente se
+leen de la columna del modelo con el mismo nombre (``ModelValue(nombre)``).
+"""
+
+import copy
+import decimal
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import models
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework.response import Response
+
+
+# Valor centinela: la clave se omite en la fila, igual que DRF cuando un campo
+# read-only sin allow_null apunta a una relación inexistente (SkipField).
+SKIP = object()
+
+
+# ============================================
+# CONVERSORES (mismo formato que los campos DRF)
+# ============================================
+
+def _decimal_converter(model_field):
+    """Equivalente a DecimalField.to_representation con COERCE_DECIMAL_TO_STRING."""
+    exponent = decimal.Decimal('.1') ** model_field.decimal_places
+    context = decimal.getcontext().copy()
+    context.prec = model_field.max_digits
+
+    def convert(value, context_):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(exponent, context=context))
+    return convert
+
+
+def _date_converter(model_field):
+    def convert(value, context_):
+        return value if isinstance(value, str) else value.isoformat()
+    return convert
+
+
+def _datetime_converter(model_field):
+    """Equivalente a DateTimeField.to_representation (ISO 8601, 'Z' para UTC)."""
+    def convert(value, context_):
+        if isinstance(value, str):
+            return value
+        if settings.USE_TZ:
+            field_timezone = timezone.get_current_timezone()
+            if timezone.is_aware(value):
+                value = value.astimezone(field_timezone)
+            else:
+                value = timezone.make_aware(value, field_timezone)
+        elif timezone.is_aware(value):
+            value = timezone.make_naive(value, datetime.timezone.utc)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def _file_converter(model_field):
+    """Equivalente a FileField.to_representation con UPLOADED_FILES_USE_URL."""
+    storage = model_field.storage
+
+    def convert(value, context_):
+        if not value:
+            return None
+        url = storage.url(value)
+        request = context_.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+    return convert
+
+
+def _uuid_converter(model_field):
+    def convert(value, context_):
+        return str(value)
+    return convert
+
+
+def _identity(value, context_):
+    return value
+
+
+def converter_for(model_field):
+    """Conversor de salida para el valor crudo de ``model_field``."""
+    if model_field is None or model_field.is_relation:
+        return _identity
+    if isinstance(model_field, models.DecimalField):
+        return _decimal_converter(model_field)
+    if isinstance(model_field, models.DateTimeField):
+        return _datetime_converter(model_field)
+    if isinstance(model_field, models.DateField):
+        return _date_converter(model_field)
+    if isinstance(model_field, models.FileField):
+        return _file_converter(model_field)
+    if isinstance(model_field, models.UUIDField):
+        return _uuid_converter(model_field)
+    return _identity
+
+
+def resolve_lookup(model, lookup):
+    """
+    Devuelve el campo de modelo al final de ``lookup`` ('service_order__client__name').
+    Si el lookup es una anotación o no se puede resolver, devuelve None.
+    """
+    field = None
+    for part in lookup.split('__'):
+        if model is None:
+            return None
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        model = field.related_model if field.is_relation else None
+    return field
+
+
+# ============================================
+# CAMPOS
+# ============================================
+
+class ValuesField:
+    """Clave de salida: qué columnas lee de ``values()`` y cómo las convierte."""
+
+    lookups = ()
+
+    def bind(self, name, model):
+        self.field_name = name
+
+    def to_representation(self, row, context):
+        raise NotImplementedError
+
+
+class ModelValue(ValuesField):
+    """
+    Una columna (del modelo, de una relación o anotada) con el formato del
+    campo DRF que le corresponde.
+
+    ``allow_null=False`` replica a los campos ``source='rel.campo'`` de DRF sin
+    ``allow_null``: si la relación no existe, la clave se omite.
+    """
+
+    def __init__(self, lookup=None, allow_null=True, converter=None):
+        self.lookup = lookup
+        self.allow_null = allow_null
+        self.converter = converter
+
+    def bind(self, name, model):
+        super().bind(name, model)
+        self.lookup = self.lookup or name
+        self.lookups = (self.lookup,)
+        if self.converter is None:
+            self.converter = converter_for(resolve_lookup(model, self.lookup))
+
+    def to_representation(self, row, context):
+        value = row[self.lookup]
+        if value is None:
+            return None if self.allow_null else SKIP
+        return self.converter(value, context)
+
+
+class ChoiceDisplay(ValuesField):
+    """Equivalente a ``source='get_<campo>_display'``."""
+
+    def __init__(self, lookup):
+        self.lookup = lookup
+
+    def bind(self, name, model):
+        super().bind(name, model)
+        self.lookups = (self.lookup,)
+        self.choices = dict(resolve_lookup(model, self.lookup).flatchoices)
+
+    def to_representation(self, row, context):
+        value = row[self.lookup]
+        display = self.choices.get(value, value)
+        return None if display is None else str(display)
+
+
+class Computed(ValuesField):
+    """Valor calculado en Python a partir de la fila: ``func(row, context)``."""
+
+    def __init__(self, func, *lookups):
+        self.func = func
+        self.lookups = lookups
+
+    def to_representation(self, row, context):
+        return self.func(row, context)
+
+
+class CachedLookup(ValuesField):
+    """
+    Resuelve una FK con un mapa ``{id: valor}`` cacheado (p. ej. nombres de
+    catálogos, ver apps.catalogs.cache) en lugar de un JOIN. ``mapping()`` se
+    llama una vez por serialización.
+    """
+
+    def __init__(self, lookup, mapping):
+        self.lookup = lookup
+        self.mapping = mapping
+
+    def bind(self, name, model):
+        super().bind(name, model)
+        self.lookups = (self.lookup,)
+
+    def to_representation(self, row, context):
+        value = row[self.lookup]
+        if value is None:
+            return None
+        cache_key = ('cached_lookup', self.lookup, self.mapping)
+        mapping = context.get(cache_key)
+        if mapping is None:
+            mapping = context[cache_key] = self.mapping()
+        return mapping.get(value)
+
+
+class Nested(ValuesField):
+    """
+    Filas hijas (relación inversa) serializadas con otro ``ValuesSerializer``.
+
+    Se resuelven con UNA consulta por listado (``<fk>__in=ids``), igual que un
+    ``prefetch_related``. ``queryset`` define el filtro y el orden de las hijas.
+    Con ``null_if_empty`` se devuelve None en lugar de una lista vacía.
+
+    No se serializa fila a fila: ``ValuesSerializer.serialize_rows`` llama a
+    ``fetch()`` y ``to_representation`` toma de ahí las hijas de cada fila.
+    """
+
+    def __init__(self, serializer_class, fk, queryset, null_if_empty=False):
+        self.serializer_class = serializer_class
+        self.fk = fk
+        self.queryset = queryset
+        self.null_if_empty = null_if_empty
+        self.lookups = ('pk',)
+
+    def fetch(self, rows, context):
+        """Devuelve {pk del padre: [filas hijas serializadas]}."""
+        parent_ids = [row['pk'] for row in rows]
+        grouped = defaultdict(list)
+        if not parent_ids:
+            return grouped
+
+        child = self.serializer_class(context=context)
+        queryset = self.queryset.filter(**{f'{self.fk}__in': parent_ids})
+        child_rows = list(child.values_queryset(queryset, extra=(self.fk,)))
+        for child_row, data in zip(child_rows, child.serialize_rows(child_rows)):
+            grouped[child_row[self.fk]].append(data)
+        return grouped
+
+
+# ============================================
+# SERIALIZER
+# ============================================
+
+class ValuesSerializer:
+    """
+    Serializer de solo lectura compilado a partir de ``Meta.model`` y
+    ``Meta.fields`` / ``Meta.exclude`` (mismas reglas que ModelSerializer).
+    """
+
+    _declared_fields = {}
+    _compiled = None
+
+    class Meta:
+        model = None
+        fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        declared = dict(getattr(cls, '_declared_fields', {}))
+        for name, value in list(vars(cls).items()):
+            if isinstance(value, ValuesField):
+                declared[name] = value
+        cls._declared_fields = declared
+        cls._compiled = None
+
+    def __init__(self, context=None):
+        self.context = context or {}
+
+    # -- compilación --------------------------------------------------------
+
+    @classmethod
+    def _default_field_names(cls, model):
+        """Mismo orden que ModelSerializer: pk, declarados, campos y relaciones."""
+        opts = model._meta
+        names = [opts.pk.name] + list(cls._declared_fields)
+        concrete = [field for field in opts.concrete_fields if field.serialize]
+        for field in [f for f in concrete if not f.is_relation] + [f for f in concrete if f.is_relation]:
+            if field.name not in names:
+                names.append(field.name)
+        return names
+
+    @classmethod
+    def compile(cls):
+        if cls._compiled is not None:
+            return cls._compiled
+
+        meta = cls.Meta
+        model = meta.model
+        fields = getattr(meta, 'fields', None)
+        exclude = getattr(meta, 'exclude', None)
+
+        if fields == '__all__' or fields is None:
+            names = cls._default_field_names(model)
+        else:
+            names = list(fields)
+        if exclude:
+            names = [name for name in names if name not in exclude]
+
+        bound = []
+        for name in names:
+            field = cls._declared_fields.get(name)
+            if field is None:
+                field = ModelValue(name)
+            else:
+                # Cada subclase compila su propia copia del campo declarado
+                field = copy.copy(field)
+            field.bind(name, model)
+            bound.append(field)
+
+        lookups = []
+        for field in bound:
+            for lookup in field.lookups:
+                if lookup not in lookups:
+                    lookups.append(lookup)
+
+        cls._compiled = (bound, lookups)
+        return cls._compiled
+
+    # -- ejecución ----------------------------------------------------------
+
+    def values_queryset(self, queryset, extra=()):
+        """``queryset.values()`` con todas las columnas que necesita el serializer."""
+        fields, lookups = self.compile()
+        columns = list(lookups)
+        for lookup in extra:
+            if lookup not in columns:
+                columns.append(lookup)
+        # values() no admite prefetch; las relaciones inversas las resuelve Nested
+        return queryset.prefetch_related(None).values(*columns)
+
+    def to_representation(self, row, nested):
+        fields, _ = self.compile()
+        context = self.context
+        data = {}
+        for field in fields:
+            if isinstance(field, Nested):
+                children = nested[field.field_name].get(row['pk'], [])
+                data[field.field_name] = None if (field.null_if_empty and not children) else children
+                continue
+            value = field.to_representation(row, context)
+            if value is not SKIP:
+                data[field.field_name] = value
+        return data
+
+    def serialize_rows(self, rows):
+        """Serializa filas ya leídas con ``values_queryset()``."""
+        rows = list(rows)
+        fields, _ = self.compile()
+        nested = {
+            field.field_name: field.fetch(rows, self.context)
+            for field in fields
+            if isinstance(field, Nested)
+        }
+        return [self.to_representation(row, nested) for row in rows]
+
+    def serialize(self, queryset):
+        return self.serialize_rows(self.values_queryset(queryset))
+
+
+# ============================================
+# VIEWSET
+# ============================================
+
+class ValuesListMixin:
+    """
+    Usa ``values_serializer_class`` para la acción ``list``. El filtrado,
+    búsqueda, ordenamiento y paginación siguen siendo los del ViewSet.
+    """
+
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if self.values_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+
+        serializer = self.values_serializer_class(context=self.get_serializer_context())
+        rows = serializer.values_queryset(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize_rows(page))
+        return Response(serializer.serialize_rows(rows))
@@ -0,0 +1,299 @@
+"""
+Motor de alertas del dashboard.
+
+Antes, ``AlertsView`` ejecutaba en cada consulta un queryset por regla (ETA
+próximo, ETA vencido, cierre pendiente, OS abiertas, facturas vencidas, pagos
+aprobados sin pagar) y armaba cada alerta fila por fila. Ahora:
+
+- ``evaluate_alerts`` evalúa todas las reglas con tres consultas ``values()``
+  (órdenes, facturas, gastos), cada una con el OR de las condiciones de sus
+  reglas, y clasifica las filas en Python.
+- El resultado se guarda en ``AlertSnapshot`` (una fila por alerta). La vista
+  sólo lee esa tabla.
+- Los cambios en OS, facturas y gastos programan un refresco incremental de
+  esos registros al confirmar la transacción (ver ``apps.dashboard.signals``).
+- Las reglas dependen de la fecha (los días de atraso cambian cada día), así
+  que además se hace un barrido completo periódico con el comando
+  ``refresh_alerts`` (cron). La vista nunca lo ejecuta: sólo lee la tabla.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.db.utils import OperationalError, ProgrammingError
+from django.utils import timezone
+
+from apps.core.db_routing import use_primary
+from apps.core.on_commit import CommitBatch
+
+logger = logging.getLogger(__name__)
+
+SOURCE_ORDER = 'service_order'
+SOURCE_INVOICE = 'invoice'
+SOURCE_TRANSFER = 'transfer'
+SOURCES = (SOURCE_ORDER, SOURCE_INVOICE, SOURCE_TRANSFER)
+
+# Orden de presentación (menor = más urgente)
+SEVERITY_RANK = {'high': 0, 'medium': 1, 'warning': 2}
+
+SWEEP_MARKER_KEY = 'alerts:last_sweep'
+
+# Campos de la alerta que se comparan para decidir si una fila cambió
+SNAPSHOT_FIELDS = (
+    'alert_type', 'severity', 'severity_rank', 'source', 'object_id',
+    'message', 'client', 'order', 'link', 'date',
+)
+
+
+def _alert(key, severity, alert_type, source, object_id, message, client, link, date, order=''):
+    return {
+        'key': key,
+        'alert_type': alert_type,
+        'severity': severity,
+        'severity_rank': SEVERITY_RANK[severity],
+        'source': source,
+        'object_id': object_id,
+        'message': message,
+        'client': client or '',
+        'order': order or '',
+        'link': link,
+        'date': date,
+    }
+
+
+def _order_alerts(today, now, ids=None):
+    from apps.orders.models import ServiceOrder
+
+    soon_limit = today + timedelta(days=2)
+    closure_limit = now - timedelta(days=7)
+    stale_limit = now - timedelta(days=30)
+
+    rules = (
+        Q(status='en_transito', eta__gte=today, eta__lte=soon_limit)
+        | Q(status__in=['en_transito', 'pendiente'], eta__lt=today)
+        | Q(status='finalizada', updated_at__lte=closure_limit)
+        | (Q(created_at__lte=stale_limit) & ~Q(status='cerrada'))
+    )
+    queryset = ServiceOrder.objects.filter(rules)
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+
+    rows = queryset.order_by().values(
+        'id', 'order_number', 'status', 'eta', 'created_at', 'updated_at', 'client__name'
+    )
+    for row in rows:
+        pk, number, status, eta = row['id'], row['order_number'], row['status'], row['eta']
+        link = f"/service-orders/{pk}"
+
+        def order_alert(key, severity, alert_type, message, date):
+            return _alert(
+                key, severity, alert_type, SOURCE_ORDER, pk,
+                f"OS-{number}: {message}", row['client__name'], link, date, order=number,
+            )
+
+        if status == 'en_transito' and eta and today <= eta <= soon_limit:
+            days = (eta - today).days
+            msg = f"Llega {'hoy' if days == 0 else 'mañana' if days == 1 else 'en 2 días'}"
+            yield order_alert(f'eta_soon_{pk}', 'medium', 'eta_soon', msg, eta)
+
+        if status in ('en_transito', 'pendiente') and eta and eta < today:
+            days = (today - eta).days
+            yield order_alert(f'eta_missed_{pk}', 'high', 'eta_missed', f"ETA vencido hace {days} días", eta)
+
+        if status == 'finalizada' and row['updated_at'] <= closure_limit:
+            yield order_alert(
+                f'closure_{pk}', 'warning', 'closure_pending',
+                "Finalizada hace >7 días sin cerrar", row['updated_at'].date(),
+            )
+
+        if status != 'cerrada' and row['created_at'] <= stale_limit:
+            created = row['created_at'].date()
+            days_open = (today - created).days
+            yield order_alert(
+                f'stale_os_{pk}', 'warning', 'stale_order',
+                f"Creada hace {days_open} días y sigue abierta", created,
+            )
+
+
+def _invoice_alerts(today, ids=None):
+    from apps.orders.models import Invoice
+
+    queryset = Invoice.objects.filter(
+        Q(status='overdue') |
+        (Q(balance__gt=0) & Q(due_date__lt=today) & ~Q(status__in=['paid', 'cancelled']))
+    )
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+
+    rows = queryset.order_by().values(
+        'id', 'invoice_number', 'due_date', 'balance', 'service_order__client__name'
+    )
+    for row in rows:
+        due_date = row['due_date']
+        days = max((today - due_date).days, 0) if due_date else 0
+        yield _alert(
+            f"cxc_overdue_{row['id']}", 'high', 'invoice_overdue', SOURCE_INVOICE, row['id'],
+            f"Factura {row['invoice_number']}: Vencida hace {days} días (${row['balance']})",
+            row['service_order__client__name'], "/invoicing", due_date,
+        )
+
+
+def _transfer_alerts(today, ids=None):
+    from apps.transfers.models import Transfer
+
+    queryset = Transfer.objects.filter(
+        status='aprobado',
+        transaction_date__lte=today - timedelta(days=15),
+    )
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+
+    rows = queryset.order_by().values('id', 'transaction_date', 'balance', 'provider__name')
+    for row in rows:
+        provider_name = row['provider__name'] or "Proveedor N/A"
+        yield _alert(
+            f"cxp_stale_{row['id']}", 'warning', 'payment_stale', SOURCE_TRANSFER, row['id'],
+            f"Pago a {provider_name}: Aprobado hace >15 días (${row['balance']})",
+            # Se reutiliza el campo client para el proveedor (así lo muestra la UI)
+            provider_name, "/transfers", row['transaction_date'],
+        )
+
+
+def evaluate_alerts(today=None, now=None, sources=SOURCES, ids=None):
+    """
+    Evalúa las reglas de alerta y devuelve la lista de alertas (dicts con los
+    campos de ``AlertSnapshot``).
+
+    Args:
+        sources: orígenes a evaluar (``SOURCES`` por defecto).
+        ids: si se indica, limita la evaluación a esos ids (de todos los
+            orígenes pedidos). Se usa en el refresco incremental.
+    """
+    today = today or timezone.localdate()
+    now = now or timezone.now()
+    alerts = []
+
+    if SOURCE_ORDER in sources:
+        alerts.extend(_order_alerts(today, now, ids))
+    if SOURCE_INVOICE in sources:
+        try:
+            alerts.extend(_invoice_alerts(today, ids))
+        except (ProgrammingError, OperationalError):
+            # Esquema de facturas desactualizado en producción; se omiten
+            logger.warning("Invoice alerts skipped: schema not up to date")
+    if SOURCE_TRANSFER in sources:
+        alerts.extend(_transfer_alerts(today, ids))
+    return alerts
+
+
+def _sync(existing_qs, alerts, today):
+    """Deja ``existing_qs`` igual a ``alerts``: borra, actualiza y crea lo justo."""
+    from .models import AlertSnapshot
+
+    wanted = {alert['key']: alert for alert in alerts}
+    existing = {row.key: row for row in existing_qs}
+
+    stale = [row.pk for key, row in existing.items() if key not in wanted]
+    to_update = []
+    to_create = []
+    for key, alert in wanted.items():
+        row = existing.get(key)
+        if row is None:
+            to_create.append(AlertSnapshot(computed_on=today, **alert))
+            continue
+        if any(getattr(row, field) != alert[field] for field in SNAPSHOT_FIELDS) or row.computed_on != today:
+            for field in SNAPSHOT_FIELDS:
+                setattr(row, field, alert[field])
+            row.computed_on = today
+            to_update.append(row)
+
+    with transaction.atomic():
+        if stale:
+            AlertSnapshot.objects.filter(pk__in=stale).delete()
+        if to_update:
+            AlertSnapshot.objects.bulk_update(
+                to_update, SNAPSHOT_FIELDS + ('computed_on',), batch_size=500
+            )
+        if to_create:
+            AlertSnapshot.objects.bulk_create(to_create, batch_size=500)
+
+    return {'created': len(to_create), 'updated': len(to_update), 'deleted': len(stale)}
+
+
+@use_primary()
+def refresh_alert_snapshot(today=None, now=None):
+    """Barrido completo: recalcula todas las alertas y sincroniza la tabla."""
+    from .models import AlertSnapshot
+
+    today = today or timezone.localdate()
+    alerts = evaluate_alerts(today, now)
+    return _sync(AlertSnapshot.objects.all(), alerts, today)
+
+
+@use_primary()
+def refresh_alerts_for(source, ids):
+    """Refresco incremental de las alertas de ``ids`` de un origen."""
+    from .models import AlertSnapshot
+
+    ids = list(ids)
+    if not ids:
+        return {'created': 0, 'updated': 0, 'deleted': 0}
+    today = timezone.localdate()
+    alerts = evaluate_alerts(today, sources=(source,), ids=ids)
+    return _sync(AlertSnapshot.objects.filter(source=source, object_id__in=ids), alerts, today)
+
+
+class _PendingRefresh(CommitBatch):
+    """Ids modificados en la transacción actual, agrupados por origen."""
+
+    def __init__(self):
+        self.ids = {source: set() for source in SOURCES}
+
+    def run(self):
+        for source, ids in self.ids.items():
+            if not ids:
+                continue
+            try:
+                refresh_alerts_for(source, ids)
+            except Exception as e:
+                # El barrido periódico corrige lo que no se pudo refrescar
+                logger.warning(f"Could not refresh {source} alerts: {e}")
+
+
+def schedule_refresh(source, pk):
+    """
+    Programa el refresco de las alertas de un registro al confirmar la
+    transacción. Los cambios de una misma transacción se refrescan juntos.
+    """
+    with _PendingRefresh.collect() as pending:
+        pending.ids[source].add(pk)
+
+
+def ensure_fresh_snapshot():
+    """
+    Lanza el barrido completo si pasó ``ALERTS_SWEEP_INTERVAL`` segundos desde
+    el último (``refresh_alerts --if-due``). ``cache.add`` es atómico: si el
+    cron corre en varias instancias, sólo una hace el barrido. Si la caché no
+    responde no se barre: queda la tabla actual hasta la próxima corrida.
+    """
+    interval = getattr(settings, 'ALERTS_SWEEP_INTERVAL', 15 * 60)
+    try:
+        if not cache.add(SWEEP_MARKER_KEY, timezone.now().isoformat(), interval):
+            return False
+    except Exception as e:
+        logger.warning(f"Alerts sweep marker unavailable: {e}")
+        return False
+
+    try:
+        refresh_alert_snapshot()
+    except Exception:
+        try:
+            cache.delete(SWEEP_MARKER_KEY)
+        except Exception as e:
+            logger.warning(f"Alerts sweep marker unavailable: {e}")
+        raise
+    return True
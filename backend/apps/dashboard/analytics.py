@@ -0,0 +1,296 @@
+"""
+Reportes analíticos (márgenes y DSO) sobre facturas, cargos, gastos y
+asignaciones de costo, calculados con pandas.
+
+Antes estos reportes se armaban con scripts que recorrían las facturas una a
+una (``verify_period_match.py``) y leían cargos, asignaciones y clientes por
+objeto. Aquí:
+
+1. ``load_ledger`` lee sólo las columnas necesarias con ``values_list`` en
+   bloques de ``CHUNK_SIZE`` filas y las convierte a arreglos numpy tipados
+   (float64 para montos, int64 para ids, datetime64 para fechas): una
+   consulta por tabla, sin instanciar modelos.
+2. Cada reporte es una agregación vectorizada (``groupby``/``pivot``) sobre
+   esos DataFrames.
+3. ``export_reports`` escribe los reportes a Excel (una hoja por reporte) o
+   Parquet (requiere ``pyarrow``).
+
+Reglas (las mismas que ``OrderCharge.get_profit`` y los costos directos de la OS):
+
+- Ingreso por servicios: ``subtotal`` de los cargos facturados, por fecha de
+  emisión de la factura (sin facturas anuladas).
+- Costo directo: ``cost_amount`` de la asignación del cargo
+  (DirectCostAllocation) más los gastos ``costos``/``propios`` por fecha de
+  transacción, atribuidos al cliente de su OS.
+- DSO: saldo por cobrar / facturado del periodo * días del periodo.
+
+El comando ``benchmark_analytics`` compara estos reportes con el cálculo por
+objeto.
+"""
+
+import io
+from datetime import timedelta
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+
+REPORTS = ('margin_by_client', 'margin_by_service', 'margin_by_month', 'dso')
+EXPORT_FORMATS = ('xlsx', 'parquet')
+
+AMOUNT = 'float64'
+ID = 'int64'
+NULLABLE_ID = 'float64'  # NaN para FK nulas; se convierte a Int64 de pandas
+DATE = 'datetime64[D]'
+
+INVOICE_COLUMNS = (
+    ('invoice_id', 'id', ID),
+    ('client_id', 'service_order__client_id', ID),
+    ('issue_date', 'issue_date', DATE),
+    ('total_amount', 'total_amount', AMOUNT),
+    ('balance', 'balance', AMOUNT),
+    ('total_third_party', 'total_third_party', AMOUNT),
+)
+CHARGE_COLUMNS = (
+    ('charge_id', 'id', ID),
+    ('invoice_id', 'invoice_id', ID),
+    ('service_id', 'service_id', ID),
+    ('subtotal', 'subtotal', AMOUNT),
+)
+ALLOCATION_COLUMNS = (
+    ('charge_id', 'order_charge_id', ID),
+    ('cost_amount', 'cost_amount', AMOUNT),
+)
+TRANSFER_COLUMNS = (
+    ('transfer_id', 'id', ID),
+    ('client_id', 'service_order__client_id', NULLABLE_ID),
+    ('transaction_date', 'transaction_date', DATE),
+    ('amount', 'amount', AMOUNT),
+)
+
+
+class AnalyticsError(ValueError):
+    """Reporte o formato inválido, o dependencia de exportación no instalada."""
+
+
+def read_frame(queryset, columns, chunk_size=CHUNK_SIZE):
+    """
+    DataFrame con ``columns`` (``(nombre, lookup, dtype)``) leído con
+    ``values_list`` en bloques de ``chunk_size`` filas.
+    """
+    lookups = [lookup for _, lookup, _ in columns]
+    parts = {name: [] for name, _, _ in columns}
+    rows = queryset.order_by().values_list(*lookups).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        for index, (name, _, dtype) in enumerate(columns):
+            parts[name].append(np.array([row[index] for row in chunk], dtype=dtype))
+
+    data = {}
+    for name, _, dtype in columns:
+        data[name] = np.concatenate(parts[name]) if parts[name] else np.array([], dtype=dtype)
+    frame = pd.DataFrame(data)
+    for name, _, dtype in columns:
+        if dtype == NULLABLE_ID:
+            frame[name] = frame[name].astype('Int64')
+    return frame
+
+
+def default_period(start=None, end=None):
+    """Periodo ``[start, end]``; por defecto los últimos 365 días."""
+    end = end or timezone.localdate()
+    start = start or end - timedelta(days=364)
+    if start > end:
+        raise AnalyticsError('La fecha inicial debe ser anterior a la final')
+    return start, end
+
+
+def load_ledger(start, end, chunk_size=CHUNK_SIZE):
+    """
+    DataFrames ``invoices``, ``charges`` (con su costo asignado), ``transfers``
+    (costos/propios) y los nombres de clientes y servicios del periodo.
+    """
+    from apps.catalogs.models import Service
+    from apps.clients.models import Client
+    from apps.orders.models import Invoice, OrderCharge
+    from apps.transfers.models import DirectCostAllocation, Transfer
+
+    invoices_qs = Invoice.objects.filter(issue_date__gte=start, issue_date__lte=end).exclude(status='cancelled')
+    charges_qs = OrderCharge.objects.filter(invoice__in=invoices_qs, is_deleted=False)
+
+    invoices = read_frame(invoices_qs, INVOICE_COLUMNS, chunk_size)
+    charges = read_frame(charges_qs, CHARGE_COLUMNS, chunk_size)
+    allocations = read_frame(
+        DirectCostAllocation.objects.filter(order_charge__in=charges_qs), ALLOCATION_COLUMNS, chunk_size,
+    )
+    transfers = read_frame(
+        Transfer.objects.filter(
+            transfer_type__in=['costos', 'propios'], transaction_date__gte=start, transaction_date__lte=end,
+        ),
+        TRANSFER_COLUMNS,
+        chunk_size,
+    )
+
+    charges = charges.merge(allocations, on='charge_id', how='left')
+    charges['cost_amount'] = charges['cost_amount'].fillna(0.0)
+    charges = charges.merge(invoices[['invoice_id', 'client_id', 'issue_date']], on='invoice_id', how='left')
+
+    client_ids = set(invoices['client_id']) | set(transfers['client_id'].dropna())
+    return {
+        'invoices': invoices,
+        'charges': charges,
+        'transfers': transfers,
+        'clients': dict(Client.objects.filter(pk__in=[int(pk) for pk in client_ids]).values_list('id', 'name')),
+        'services': dict(
+            Service.objects.filter(pk__in=[int(pk) for pk in set(charges['service_id'])]).values_list('id', 'name')
+        ),
+    }
+
+
+def _with_margin(frame, revenue='revenue', cost='direct_cost'):
+    frame['margin'] = frame[revenue] - frame[cost]
+    frame['margin_pct'] = np.where(
+        frame[revenue] > 0, frame['margin'] / frame[revenue].where(frame[revenue] > 0) * 100, 0.0,
+    )
+    return frame
+
+
+def _round(frame):
+    amounts = frame.select_dtypes(include='float').columns
+    frame[amounts] = frame[amounts].round(2)
+    return frame.reset_index(drop=True)
+
+
+def margin_by_client(ledger):
+    charges, transfers = ledger['charges'], ledger['transfers']
+    services = charges.groupby('client_id').agg(
+        revenue=('subtotal', 'sum'), allocated_cost=('cost_amount', 'sum'), invoices=('invoice_id', 'nunique'),
+    )
+    own = transfers.dropna(subset=['client_id']).groupby('client_id').agg(own_cost=('amount', 'sum'))
+    own.index = own.index.astype(ID)
+
+    frame = services.join(own, how='outer').fillna(0.0)
+    frame['invoices'] = frame['invoices'].astype(ID)
+    frame['direct_cost'] = frame['allocated_cost'] + frame['own_cost']
+    frame = _with_margin(frame)
+    frame.index.name = 'client_id'
+    frame = frame.reset_index()
+    frame.insert(1, 'client_name', frame['client_id'].map(ledger['clients']).fillna('N/A'))
+    frame = frame.sort_values(['margin', 'client_id'], ascending=[False, True])
+    return _round(frame[[
+        'client_id', 'client_name', 'invoices', 'revenue', 'allocated_cost', 'own_cost',
+        'direct_cost', 'margin', 'margin_pct',
+    ]])
+
+
+def margin_by_service(ledger):
+    charges = ledger['charges']
+    frame = charges.groupby('service_id').agg(
+        charges=('charge_id', 'count'), revenue=('subtotal', 'sum'), direct_cost=('cost_amount', 'sum'),
+    )
+    frame = _with_margin(frame).reset_index()
+    frame.insert(1, 'service_name', frame['service_id'].map(ledger['services']).fillna('N/A'))
+    frame = frame.sort_values(['margin', 'service_id'], ascending=[False, True])
+    return _round(frame)
+
+
+def margin_by_month(ledger):
+    invoices, charges, transfers = ledger['invoices'], ledger['charges'], ledger['transfers']
+
+    def month(dates):
+        return dates.dt.to_period('M').astype(str)
+
+    billed = invoices.groupby(month(invoices['issue_date'])).agg(
+        billed=('total_amount', 'sum'), third_party=('total_third_party', 'sum'),
+    )
+    services = charges.groupby(month(charges['issue_date'])).agg(
+        revenue=('subtotal', 'sum'), allocated_cost=('cost_amount', 'sum'),
+    )
+    own = transfers.groupby(month(transfers['transaction_date'])).agg(own_cost=('amount', 'sum'))
+
+    frame = billed.join(services, how='outer').join(own, how='outer').fillna(0.0).sort_index()
+    frame['direct_cost'] = frame['allocated_cost'] + frame['own_cost']
+    frame = _with_margin(frame)
+    frame.index.name = 'month'
+    return _round(frame.reset_index())
+
+
+def dso(ledger, start, end):
+    """DSO por cliente y total (``client_id`` nulo) del periodo."""
+    invoices = ledger['invoices']
+    days = (end - start).days + 1
+
+    frame = invoices.groupby('client_id').agg(
+        invoices=('invoice_id', 'count'), billed=('total_amount', 'sum'), receivable=('balance', 'sum'),
+    ).reset_index()
+    total = pd.DataFrame({
+        'client_id': [pd.NA],
+        'invoices': [len(invoices)],
+        'billed': [invoices['total_amount'].sum()],
+        'receivable': [invoices['balance'].sum()],
+    })
+    frame = pd.concat([frame, total], ignore_index=True)
+    frame['client_id'] = frame['client_id'].astype('Int64')
+    frame['invoices'] = frame['invoices'].astype(ID)
+    frame['billed'] = frame['billed'].astype(AMOUNT)
+    frame['receivable'] = frame['receivable'].astype(AMOUNT)
+    frame['dso_days'] = np.where(
+        frame['billed'] > 0, frame['receivable'] / frame['billed'].where(frame['billed'] > 0) * days, 0.0,
+    )
+    frame.insert(1, 'client_name', frame['client_id'].map(ledger['clients']).astype(object).fillna('Total'))
+    return _round(frame)
+
+
+def build_reports(reports=REPORTS, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """
+    Calcula los reportes pedidos.
+
+    Returns:
+        tuple ``(start, end, {nombre: DataFrame})``.
+    """
+    unknown = set(reports) - set(REPORTS)
+    if unknown:
+        raise AnalyticsError(f"Reporte desconocido: {', '.join(sorted(unknown))}")
+    start, end = default_period(start, end)
+    ledger = load_ledger(start, end, chunk_size)
+    builders = {
+        'margin_by_client': lambda: margin_by_client(ledger),
+        'margin_by_service': lambda: margin_by_service(ledger),
+        'margin_by_month': lambda: margin_by_month(ledger),
+        'dso': lambda: dso(ledger, start, end),
+    }
+    return start, end, {name: builders[name]() for name in reports}
+
+
+def to_records(frame):
+    """Filas JSON (NaN/NA como None)."""
+    return frame.astype(object).where(frame.notna(), None).to_dict(orient='records')
+
+
+def export_reports(frames, export_format):
+    """
+    Bytes del archivo con los reportes: Excel con una hoja por reporte o
+    Parquet (un solo reporte).
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise AnalyticsError(f"Formato no soportado: {export_format}")
+
+    buffer = io.BytesIO()
+    if export_format == 'xlsx':
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            for name, frame in frames.items():
+                frame.to_excel(writer, sheet_name=name[:31], index=False)
+        return buffer.getvalue()
+
+    if len(frames) != 1:
+        raise AnalyticsError('Parquet admite un solo reporte por archivo')
+    try:
+        next(iter(frames.values())).to_parquet(buffer, index=False)
+    except ImportError:
+        raise AnalyticsError('La exportación a Parquet requiere pyarrow')
+    return buffer.getvalue()
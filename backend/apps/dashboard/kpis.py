@@ -0,0 +1,368 @@
+"""
+KPIs mensuales del dashboard.
+
+Antes, ``DashboardView`` recalculaba facturado, costos, conteo de órdenes,
+flujo de caja, composición de ingresos y desglose por cliente sobre las
+tablas de facturas, gastos y órdenes en cada consulta: unas 40 agregaciones
+para la vista anual y barridos completos para el histórico (``year=0``).
+Ahora:
+
+- ``compute_kpis`` calcula todos los KPIs de un rango de fechas con siete
+  consultas agrupadas por cliente (los totales son la suma de los grupos).
+- Los meses cerrados (anteriores al mes en curso) se guardan en
+  ``MonthlyKPISnapshot``: una fila global y una por cliente. El mes en curso
+  y los futuros se calculan siempre en vivo.
+- ``period_kpis`` lee los meses pedidos de la tabla (construye al vuelo los
+  que falten) y ``all_time_kpis`` suma todos los meses cerrados más el
+  tramo abierto.
+- Los cambios en facturas, pagos, notas de crédito, gastos, órdenes y cargos
+  de un mes cerrado programan su reconstrucción al confirmar la transacción
+  (ver ``apps.dashboard.signals``). El comando ``build_kpi_snapshots``
+  reconstruye los meses cerrados (cron nocturno) y corrige lo que haya
+  cambiado sin pasar por ``save()``.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, Min, Q, Sum, Value, When
+from django.utils import timezone
+
+from apps.core.db_routing import use_primary
+from apps.core.on_commit import CommitBatch
+
+logger = logging.getLogger(__name__)
+
+AMOUNT_FIELDS = (
+    'billed_amount', 'pending_amount', 'third_party_amount', 'pending_third_party_amount',
+    'outsourced_services_amount', 'billed_expenses_cost', 'operating_costs', 'admin_costs',
+    'orders_services_amount', 'orders_invoiced_amount',
+)
+COUNT_FIELDS = ('total_orders', 'open_orders', 'closed_orders', 'orders_charges_count')
+KPI_FIELDS = AMOUNT_FIELDS + COUNT_FIELDS
+
+
+def _empty():
+    values = {field: Decimal('0') for field in AMOUNT_FIELDS}
+    values.update({field: 0 for field in COUNT_FIELDS})
+    return values
+
+
+class PeriodKPIs:
+    """KPIs de un periodo: ``totals`` y ``clients`` (``{client_id: valores}``)."""
+
+    def __init__(self, totals=None, clients=None):
+        self.totals = totals or _empty()
+        self.clients = clients or {}
+
+    @classmethod
+    def merge(cls, items):
+        merged = cls()
+        for item in items:
+            for field in KPI_FIELDS:
+                merged.totals[field] += item.totals[field]
+            for client_id, values in item.clients.items():
+                target = merged.clients.setdefault(client_id, _empty())
+                for field in KPI_FIELDS:
+                    target[field] += values[field]
+        return merged
+
+
+def month_start(year, month):
+    return date(year, month, 1)
+
+
+def next_month(start):
+    return date(start.year + (start.month == 12), start.month % 12 + 1, 1)
+
+
+def current_period():
+    today = timezone.localdate()
+    return today.year, today.month
+
+
+def is_closed(year, month):
+    """Un mes está cerrado si es anterior al mes en curso."""
+    return (year, month) < current_period()
+
+
+def period_of(value):
+    """(año, mes) de una fecha o de un datetime (en hora local)."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        value = timezone.localtime(value) if timezone.is_aware(value) else value
+    return value.year, value.month
+
+
+def _range(field, start, end=None, is_datetime=False):
+    if is_datetime:
+        start = timezone.make_aware(datetime.combine(start, time.min))
+        end = timezone.make_aware(datetime.combine(end, time.min)) if end else None
+    condition = Q(**{f'{field}__gte': start})
+    if end:
+        condition &= Q(**{f'{field}__lt': end})
+    return condition
+
+
+def compute_kpis(start, end=None):
+    """
+    KPIs en vivo de ``[start, end)`` (sin ``end``: desde ``start`` en adelante).
+    Mismas reglas que la vista del dashboard:
+
+    - Facturado, pendiente y composición: facturas por ``issue_date`` sin anuladas.
+    - Costos operativos (costos/propios) y administrativos: gastos por ``transaction_date``.
+    - Órdenes y su total de servicios/facturado: órdenes por ``created_at``.
+    """
+    from apps.orders.models import Invoice, OrderCharge, ServiceOrder
+    from apps.transfers.models import Transfer
+
+    groups = defaultdict(_empty)
+
+    def add(rows, key, mapping):
+        for row in rows:
+            values = groups[row[key]]
+            for field, alias in mapping.items():
+                values[field] += row[alias] or 0
+
+    invoices = Invoice.objects.filter(_range('issue_date', start, end)).exclude(status='cancelled')
+    add(
+        invoices.order_by().values('service_order__client_id').annotate(
+            billed=Sum('total_amount'),
+            pending=Sum('balance'),
+            third_party=Sum('total_third_party'),
+            # Parte pendiente atribuible a gastos a terceros (como el desglose por cliente)
+            pending_third_party=Sum(
+                Case(
+                    When(total_amount__gt=0, then=F('total_third_party') * F('balance') / F('total_amount')),
+                    default=Value(0),
+                    output_field=DecimalField(),
+                )
+            ),
+        ),
+        'service_order__client_id',
+        {
+            'billed_amount': 'billed',
+            'pending_amount': 'pending',
+            'third_party_amount': 'third_party',
+            'pending_third_party_amount': 'pending_third_party',
+        },
+    )
+    add(
+        OrderCharge.objects.filter(
+            invoice__in=invoices, is_deleted=False, is_third_party_service=True,
+        ).order_by().values('invoice__service_order__client_id').annotate(total_sum=Sum('total')),
+        'invoice__service_order__client_id',
+        {'outsourced_services_amount': 'total_sum'},
+    )
+    add(
+        Transfer.objects.filter(
+            invoice__in=invoices, transfer_type__in=['cargos', 'terceros'], is_deleted=False,
+        ).order_by().values('invoice__service_order__client_id').annotate(amount_sum=Sum('amount')),
+        'invoice__service_order__client_id',
+        {'billed_expenses_cost': 'amount_sum'},
+    )
+    add(
+        Transfer.objects.filter(
+            _range('transaction_date', start, end), transfer_type__in=['costos', 'propios', 'admin'],
+        ).order_by().values('service_order__client_id').annotate(
+            operating=Sum('amount', filter=Q(transfer_type__in=['costos', 'propios'])),
+            admin=Sum('amount', filter=Q(transfer_type='admin')),
+        ),
+        'service_order__client_id',
+        {'operating_costs': 'operating', 'admin_costs': 'admin'},
+    )
+
+    orders = ServiceOrder.objects.filter(_range('created_at', start, end, is_datetime=True))
+    add(
+        orders.order_by().values('client_id').annotate(
+            orders_count=Count('id'),
+            open_count=Count('id', filter=~Q(status='cerrada')),
+            closed_count=Count('id', filter=Q(status='cerrada')),
+        ),
+        'client_id',
+        {'total_orders': 'orders_count', 'open_orders': 'open_count', 'closed_orders': 'closed_count'},
+    )
+    add(
+        OrderCharge.objects.filter(service_order__in=orders, is_deleted=False)
+        .order_by().values('service_order__client_id')
+        .annotate(charges=Count('id'), total_sum=Sum('total')),
+        'service_order__client_id',
+        {'orders_charges_count': 'charges', 'orders_services_amount': 'total_sum'},
+    )
+    add(
+        Invoice.objects.filter(service_order__in=orders).exclude(status='cancelled')
+        .order_by().values('service_order__client_id').annotate(total_sum=Sum('total_amount')),
+        'service_order__client_id',
+        {'orders_invoiced_amount': 'total_sum'},
+    )
+
+    kpis = PeriodKPIs(clients={client_id: values for client_id, values in groups.items() if client_id is not None})
+    kpis.totals = PeriodKPIs.merge([PeriodKPIs(totals=values) for values in groups.values()]).totals
+    return kpis
+
+
+@use_primary()
+def build_month(year, month):
+    """Recalcula y guarda las filas de un mes cerrado. Devuelve sus KPIs."""
+    from .models import MonthlyKPISnapshot
+
+    start = month_start(year, month)
+    kpis = compute_kpis(start, next_month(start))
+    rows = [MonthlyKPISnapshot(year=year, month=month, client_id=None, **kpis.totals)]
+    rows.extend(
+        MonthlyKPISnapshot(year=year, month=month, client_id=client_id, **values)
+        for client_id, values in kpis.clients.items()
+    )
+    # Dos peticiones pueden construir el mismo mes a la vez (primera carga del
+    # dashboard, reconstrucción tras un cambio): la que choca con las filas que
+    # la otra confirmó entre su DELETE y su INSERT vuelve a intentarlo, así la
+    # última en calcular es la que queda. Si aun así choca, se responde con
+    # lo calculado y el comando nocturno corrige la tabla.
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                MonthlyKPISnapshot.objects.filter(year=year, month=month).delete()
+                MonthlyKPISnapshot.objects.bulk_create(rows, batch_size=500)
+            break
+        except IntegrityError:
+            if attempt:
+                logger.warning(f"KPI snapshot {month:02d}/{year} built concurrently; serving live values")
+    return kpis
+
+
+def _load_snapshots(periods):
+    from .models import MonthlyKPISnapshot
+
+    wanted = set(periods)
+    if not wanted:
+        return {}
+    years = [year for year, _ in wanted]
+    loaded = {}
+    complete = set()
+    rows = MonthlyKPISnapshot.objects.filter(year__gte=min(years), year__lte=max(years)).order_by().values(
+        'year', 'month', 'client_id', *KPI_FIELDS
+    )
+    for row in rows:
+        period = (row['year'], row['month'])
+        if period not in wanted:
+            continue
+        kpis = loaded.setdefault(period, PeriodKPIs())
+        values = {field: row[field] for field in KPI_FIELDS}
+        if row['client_id'] is None:
+            kpis.totals = values
+            complete.add(period)
+        else:
+            kpis.clients[row['client_id']] = values
+    # Un mes sólo está precalculado si tiene su fila global
+    return {period: kpis for period, kpis in loaded.items() if period in complete}
+
+
+def period_kpis(periods):
+    """
+    KPIs de cada ``(año, mes)`` pedido: los meses cerrados se leen de
+    ``MonthlyKPISnapshot`` (y se construyen si faltan), el resto en vivo.
+
+    Returns:
+        dict ``{(año, mes): PeriodKPIs}``.
+    """
+    periods = list(dict.fromkeys(periods))
+    closed = [period for period in periods if is_closed(*period)]
+    result = _load_snapshots(closed)
+    for period in closed:
+        if period not in result:
+            result[period] = build_month(*period)
+    for period in periods:
+        if period not in result:
+            start = month_start(*period)
+            result[period] = compute_kpis(start, next_month(start))
+    return result
+
+
+def first_period():
+    """Primer mes con facturas, gastos u órdenes (None si no hay datos)."""
+    from apps.orders.models import Invoice, ServiceOrder
+    from apps.transfers.models import Transfer
+
+    candidates = [
+        Invoice.objects.exclude(status='cancelled').aggregate(first=Min('issue_date'))['first'],
+        Transfer.objects.filter(
+            transfer_type__in=['costos', 'propios', 'admin']
+        ).aggregate(first=Min('transaction_date'))['first'],
+        ServiceOrder.objects.aggregate(first=Min('created_at'))['first'],
+    ]
+    periods = [period_of(value) for value in candidates if value is not None]
+    return min(periods) if periods else None
+
+
+def closed_periods(since):
+    """Meses cerrados desde ``since`` (inclusive) hasta el anterior al actual."""
+    if since is None:
+        return []
+    periods = []
+    current = month_start(*since)
+    today = month_start(*current_period())
+    while current < today:
+        periods.append((current.year, current.month))
+        current = next_month(current)
+    return periods
+
+
+def all_time_kpis():
+    """Todo el histórico: meses cerrados precalculados + tramo abierto en vivo."""
+    snapshots = period_kpis(closed_periods(first_period()))
+    live = compute_kpis(month_start(*current_period()))
+    return PeriodKPIs.merge(list(snapshots.values()) + [live])
+
+
+class _PendingRebuild(CommitBatch):
+    """Meses afectados en la transacción actual (directos o vía facturas/órdenes)."""
+
+    def __init__(self):
+        self.periods = set()
+        self.invoice_ids = set()
+        self.order_ids = set()
+
+    def resolve(self):
+        from apps.orders.models import Invoice, ServiceOrder
+
+        periods = set(self.periods)
+        if self.invoice_ids:
+            for issue_date, order_created in Invoice.objects.filter(pk__in=self.invoice_ids).values_list(
+                'issue_date', 'service_order__created_at'
+            ):
+                periods.add(period_of(issue_date))
+                periods.add(period_of(order_created))
+        if self.order_ids:
+            for created_at in ServiceOrder.all_objects.filter(pk__in=self.order_ids).values_list(
+                'created_at', flat=True
+            ):
+                periods.add(period_of(created_at))
+        return sorted(period for period in periods if period and is_closed(*period))
+
+    def run(self):
+        try:
+            periods = self.resolve()
+        except Exception as e:
+            logger.warning(f"Could not resolve KPI periods: {e}")
+            return
+        for year, month in periods:
+            try:
+                build_month(year, month)
+            except Exception as e:
+                # El comando nocturno corrige lo que no se pudo reconstruir
+                logger.warning(f"Could not rebuild KPI snapshot {month:02d}/{year}: {e}")
+
+
+def schedule_rebuild(periods=(), invoice_ids=(), order_ids=()):
+    """
+    Programa la reconstrucción de los meses cerrados afectados al confirmar
+    la transacción. Los cambios de una misma transacción se procesan juntos.
+    """
+    with _PendingRebuild.collect() as pending:
+        pending.periods.update(period for period in periods if period)
+        pending.invoice_ids.update(pk for pk in invoice_ids if pk)
+        pending.order_ids.update(pk for pk in order_ids if pk)
@@ -0,0 +1,412 @@
+"""
+Snapshots del libro (OS, cargos, facturas, pagos, NC y gastos) en Parquet
+comprimido, un archivo por entidad y periodo (mes), para análisis fuera de la
+aplicación.
+
+Las filas se leen con ``values_list(...).iterator()`` ordenadas por la fecha
+del periodo de cada entidad y se convierten en ``RecordBatch`` de Arrow de
+``BATCH_SIZE`` filas que se escriben directamente al archivo del mes: la
+memoria usada no depende del tamaño de la tabla.
+
+Estructura del directorio de salida::
+
+    <salida>/_manifest.json
+    <salida>/<entidad>/period=YYYY-MM/<corrida>.parquet
+
+- Completo: reemplaza el directorio de la entidad.
+- Incremental (``incremental=True``): escribe sólo las filas con
+  ``updated_at`` posterior a la última corrida registrada en el manifiesto,
+  como un archivo nuevo en cada mes afectado. Un mismo ``id`` puede aparecer
+  en varios archivos; la versión vigente es la de mayor ``updated_at``.
+
+``updated_at`` se asigna al guardar, no al confirmar: una transacción que
+confirma después de la lectura de la corrida deja filas con ``updated_at``
+anterior a su marca. Por eso cada incremental vuelve a leer desde
+``marca - OVERLAP`` y descarta las versiones ``(id, updated_at)`` que ya
+exportó (el manifiesto guarda las de esa ventana, ver ``RowVersions``).
+
+Se incluyen las filas eliminadas lógicamente (columna ``is_deleted``) para que
+el incremental refleje las bajas.
+
+Requiere ``pyarrow``.
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.utils import timezone
+
+BATCH_SIZE = 5000
+COMPRESSION = 'zstd'
+COMPRESSIONS = ('zstd', 'snappy', 'gzip', 'none')
+MANIFEST = '_manifest.json'
+# Ventana que cada incremental vuelve a leer antes de la marca anterior;
+# debe superar la duración de la transacción más larga que modifique el libro
+OVERLAP = timedelta(minutes=15)
+
+INT = 'int64'
+DECIMAL = 'decimal'
+DATE = 'date'
+TIMESTAMP = 'timestamp'
+STRING = 'string'
+BOOL = 'bool'
+
+
+class LedgerSnapshotError(ValueError):
+    """Entidad o periodo inválido, o pyarrow no instalado."""
+
+
+class Entity:
+    """Modelo, fecha que define el periodo y columnas ``(nombre, lookup, tipo)``."""
+
+    def __init__(self, model, period_field, columns):
+        self.model = model
+        self.period_field = period_field
+        self.columns = columns
+
+    def get_model(self):
+        from django.apps import apps
+        return apps.get_model(self.model)
+
+    def queryset(self):
+        model = self.get_model()
+        return getattr(model, 'all_objects', model.objects).all()
+
+
+AUDIT_COLUMNS = (
+    ('created_at', 'created_at', TIMESTAMP),
+    ('updated_at', 'updated_at', TIMESTAMP),
+)
+SOFT_DELETE_COLUMNS = (('is_deleted', 'is_deleted', BOOL),) + AUDIT_COLUMNS
+
+ENTITIES = {
+    'orders': Entity('orders.ServiceOrder', 'created_at', (
+        ('id', 'id', INT),
+        ('order_number', 'order_number', STRING),
+        ('client_id', 'client_id', INT),
+        ('sub_client_id', 'sub_client_id', INT),
+        ('provider_id', 'provider_id', INT),
+        ('status', 'status', STRING),
+        ('facturado', 'facturado', BOOL),
+        ('eta', 'eta', DATE),
+        ('closed_at', 'closed_at', TIMESTAMP),
+    ) + SOFT_DELETE_COLUMNS),
+    'charges': Entity('orders.OrderCharge', 'created_at', (
+        ('id', 'id', INT),
+        ('service_order_id', 'service_order_id', INT),
+        ('invoice_id', 'invoice_id', INT),
+        ('service_id', 'service_id', INT),
+        ('billing_status', 'billing_status', STRING),
+        ('is_third_party_service', 'is_third_party_service', BOOL),
+        ('quantity', 'quantity', INT),
+        ('unit_price', 'unit_price', DECIMAL),
+        ('discount', 'discount', DECIMAL),
+        ('subtotal', 'subtotal', DECIMAL),
+        ('iva_amount', 'iva_amount', DECIMAL),
+        ('total', 'total', DECIMAL),
+    ) + SOFT_DELETE_COLUMNS),
+    'invoices': Entity('orders.Invoice', 'issue_date', (
+        ('id', 'id', INT),
+        ('invoice_number', 'invoice_number', STRING),
+        ('service_order_id', 'service_order_id', INT),
+        ('client_id', 'service_order__client_id', INT),
+        ('invoice_type', 'invoice_type', STRING),
+        ('issue_date', 'issue_date', DATE),
+        ('due_date', 'due_date', DATE),
+        ('total_services', 'total_services', DECIMAL),
+        ('total_third_party', 'total_third_party', DECIMAL),
+        ('iva_total', 'iva_total', DECIMAL),
+        ('retencion', 'retencion', DECIMAL),
+        ('total_amount', 'total_amount', DECIMAL),
+        ('paid_amount', 'paid_amount', DECIMAL),
+        ('credited_amount', 'credited_amount', DECIMAL),
+        ('balance', 'balance', DECIMAL),
+        ('status', 'status', STRING),
+    ) + AUDIT_COLUMNS),
+    'invoice_payments': Entity('orders.InvoicePayment', 'payment_date', (
+        ('id', 'id', INT),
+        ('invoice_id', 'invoice_id', INT),
+        ('payment_date', 'payment_date', DATE),
+        ('amount', 'amount', DECIMAL),
+        ('payment_method', 'payment_method', STRING),
+        ('bank_id', 'bank_id', INT),
+    ) + SOFT_DELETE_COLUMNS),
+    'credit_notes': Entity('orders.CreditNote', 'issue_date', (
+        ('id', 'id', INT),
+        ('invoice_id', 'invoice_id', INT),
+        ('note_number', 'note_number', STRING),
+        ('issue_date', 'issue_date', DATE),
+        ('amount', 'amount', DECIMAL),
+    ) + SOFT_DELETE_COLUMNS),
+    'transfers': Entity('transfers.Transfer', 'transaction_date', (
+        ('id', 'id', INT),
+        ('transfer_type', 'transfer_type', STRING),
+        ('status', 'status', STRING),
+        ('service_order_id', 'service_order_id', INT),
+        ('client_id', 'client_id', INT),
+        ('provider_id', 'provider_id', INT),
+        ('amount', 'amount', DECIMAL),
+        ('paid_amount', 'paid_amount', DECIMAL),
+        ('balance', 'balance', DECIMAL),
+        ('transaction_date', 'transaction_date', DATE),
+        ('payment_date', 'payment_date', DATE),
+        ('billing_status', 'billing_status', STRING),
+        ('invoice_id', 'invoice_id', INT),
+    ) + SOFT_DELETE_COLUMNS),
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise LedgerSnapshotError('La exportación a Parquet requiere pyarrow')
+    return pyarrow
+
+
+def get_entity(name):
+    try:
+        return ENTITIES[name]
+    except KeyError:
+        raise LedgerSnapshotError(f'Entidad desconocida: {name}')
+
+
+def parse_period(value):
+    """``'YYYY-MM'`` -> ``(año, mes)``."""
+    try:
+        year, month = (int(part) for part in value.split('-'))
+        if not 1 <= month <= 12:
+            raise ValueError
+    except (AttributeError, ValueError):
+        raise LedgerSnapshotError(f'Periodo inválido: {value} (YYYY-MM)')
+    return year, month
+
+
+def period_label(value):
+    """Periodo ``YYYY-MM`` de una fecha o fecha/hora (en hora local)."""
+    if hasattr(value, 'hour') and timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return f'{value.year:04d}-{value.month:02d}'
+
+
+def select_rows(entity, period=None, since=None, until=None):
+    """
+    Queryset de la entidad ordenado por periodo; opcionalmente de un mes
+    ``(año, mes)`` y/o con ``since < updated_at <= until``.
+    """
+    queryset = entity.queryset()
+    if period:
+        year, month = period
+        queryset = queryset.filter(**{
+            f'{entity.period_field}__year': year,
+            f'{entity.period_field}__month': month,
+        })
+    if since:
+        queryset = queryset.filter(updated_at__gt=since)
+    if until:
+        queryset = queryset.filter(updated_at__lte=until)
+    return queryset.order_by(entity.period_field, 'id')
+
+
+class RowVersions:
+    """
+    Versiones ``(id, updated_at)`` exportadas dentro de la ventana de
+    solapamiento (posteriores a ``window_start``): las de la corrida anterior
+    se descartan y las de ésta se guardan para la siguiente.
+    """
+
+    def __init__(self, window_start, previous=()):
+        self.window_start = window_start
+        self.previous = {(pk, datetime.fromisoformat(updated_at)) for pk, updated_at in previous}
+        self.recent = set()
+
+    def exported(self, pk, updated_at):
+        return (pk, updated_at) in self.previous
+
+    def add(self, pk, updated_at):
+        if updated_at is not None and updated_at > self.window_start:
+            self.recent.add((pk, updated_at))
+
+    def dump(self):
+        """Versiones de la ventana para el manifiesto."""
+        kept = self.recent | {version for version in self.previous if version[1] > self.window_start}
+        return [[pk, updated_at.isoformat()] for pk, updated_at in sorted(kept)]
+
+
+def iter_batches(entity, queryset, batch_size=BATCH_SIZE, versions=None):
+    """
+    ``(periodo, {columna: [valores]})`` de hasta ``batch_size`` filas; un
+    lote nunca mezcla periodos (``queryset`` debe venir de ``select_rows``).
+    Con ``versions`` (``RowVersions``) omite las versiones ya exportadas.
+    """
+    names = [name for name, _, _ in entity.columns]
+    lookups = [lookup for _, lookup, _ in entity.columns]
+    period_index = lookups.index(entity.period_field) if entity.period_field in lookups else None
+    if period_index is None:
+        lookups.append(entity.period_field)
+        period_index = len(lookups) - 1
+    id_index, updated_index = names.index('id'), names.index('updated_at')
+
+    rows = queryset.values_list(*lookups).iterator(chunk_size=batch_size)
+    current, batch = None, []
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        for row in chunk:
+            if versions is not None:
+                if versions.exported(row[id_index], row[updated_index]):
+                    continue
+                versions.add(row[id_index], row[updated_index])
+            period = period_label(row[period_index])
+            if batch and (period != current or len(batch) >= batch_size):
+                yield current, _columns(names, batch)
+                batch = []
+            current = period
+            batch.append(row)
+    if batch:
+        yield current, _columns(names, batch)
+
+
+def _columns(names, rows):
+    return {name: [row[index] for row in rows] for index, name in enumerate(names)}
+
+
+def arrow_schema(entity):
+    pa = _pyarrow()
+    types = {
+        INT: pa.int64(),
+        DECIMAL: pa.decimal128(15, 2),
+        DATE: pa.date32(),
+        TIMESTAMP: pa.timestamp('us', tz='UTC'),
+        STRING: pa.string(),
+        BOOL: pa.bool_(),
+    }
+    return pa.schema([pa.field(name, types[kind]) for name, _, kind in entity.columns])
+
+
+def _compression(compression):
+    if compression not in COMPRESSIONS:
+        raise LedgerSnapshotError(f'Compresión no soportada: {compression}')
+    return None if compression == 'none' else compression
+
+
+def write_stream(entity, queryset, sink, batch_size=BATCH_SIZE, compression=COMPRESSION):
+    """
+    Escribe todas las filas de ``queryset`` en un solo Parquet (``sink``:
+    ruta o archivo binario). Devuelve el número de filas.
+    """
+    pa = _pyarrow()
+    schema = arrow_schema(entity)
+    rows = 0
+    with pa.parquet.ParquetWriter(sink, schema, compression=_compression(compression)) as writer:
+        for _, columns in iter_batches(entity, queryset, batch_size):
+            writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+            rows += len(columns['id'])
+    return rows
+
+
+def write_partitioned(entity, queryset, directory, run_name, batch_size=BATCH_SIZE, compression=COMPRESSION,
+                      versions=None):
+    """
+    Escribe ``queryset`` en ``directory/period=YYYY-MM/<run_name>.parquet``
+    (un archivo abierto a la vez). Devuelve ``{periodo: filas}``.
+    """
+    pa = _pyarrow()
+    schema = arrow_schema(entity)
+    compression = _compression(compression)
+    written = {}
+    writer, current = None, None
+    try:
+        for period, columns in iter_batches(entity, queryset, batch_size, versions):
+            if period != current:
+                if writer is not None:
+                    writer.close()
+                partition = os.path.join(directory, f'period={period}')
+                os.makedirs(partition, exist_ok=True)
+                writer = pa.parquet.ParquetWriter(
+                    os.path.join(partition, f'{run_name}.parquet'), schema, compression=compression,
+                )
+                current = period
+            writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+            written[period] = written.get(period, 0) + len(columns['id'])
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as manifest:
+        return json.load(manifest)
+
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as tmp:
+        json.dump(manifest, tmp, indent=2, sort_keys=True)
+    os.replace(f'{path}.tmp', path)
+
+
+def last_snapshot(manifest, name):
+    """Fecha/hora de la última corrida de la entidad (None si no hay)."""
+    value = manifest.get(name, {}).get('snapshot_at')
+    return datetime.fromisoformat(value) if value else None
+
+
+def export_snapshot(output_dir, entities=None, incremental=False, batch_size=BATCH_SIZE,
+                    compression=COMPRESSION, now=None, overlap=OVERLAP):
+    """
+    Escribe el snapshot de ``entities`` (por defecto todas) en ``output_dir``
+    y actualiza el manifiesto.
+
+    Args:
+        incremental: sólo filas con ``updated_at`` posterior a la última
+            corrida de cada entidad (sin corrida previa, se exporta todo).
+        overlap: ventana que se vuelve a leer antes de la marca anterior.
+
+    Returns:
+        ``{entidad: {periodo: filas}}``.
+    """
+    _pyarrow()
+    entities = list(entities or ENTITIES)
+    for name in entities:
+        get_entity(name)
+    _compression(compression)
+
+    now = now or timezone.now()
+    run_name = f"{'incr' if incremental else 'full'}-{now:%Y%m%dT%H%M%S}"
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+
+    results = {}
+    for name in entities:
+        entity = ENTITIES[name]
+        directory = os.path.join(output_dir, name)
+        entry = manifest.get(name, {})
+        since = last_snapshot(manifest, name) if incremental else None
+        if since is not None:
+            since -= overlap
+        if not incremental and os.path.isdir(directory):
+            shutil.rmtree(directory)
+
+        versions = RowVersions(now - overlap, entry.get('recent', []) if incremental else ())
+        queryset = select_rows(entity, since=since, until=now)
+        results[name] = write_partitioned(
+            entity, queryset, directory, run_name, batch_size, compression, versions=versions,
+        )
+
+        runs = entry.get('runs', []) if incremental else []
+        runs.append({'run': run_name, 'since': since.isoformat() if since else None,
+                     'rows': sum(results[name].values())})
+        manifest[name] = {'snapshot_at': now.isoformat(), 'runs': runs, 'recent': versions.dump()}
+        save_manifest(output_dir, manifest)
+
+    return results
@@ -0,0 +1,42 @@
+"""
+Django Management Command: KPIs mensuales del dashboard
+
+Reconstruye la tabla MonthlyKPISnapshot (ver apps/dashboard/kpis.py). Las
+señales ya reconstruyen los meses cerrados cuyos datos cambian; este comando
+se programa (cron) cada noche para construir el mes que acaba de cerrar y
+corregir cambios hechos sin pasar por save() (update masivos, correcciones
+manuales en la base de datos).
+
+USO:
+    python manage.py build_kpi_snapshots               # últimos 13 meses cerrados
+    python manage.py build_kpi_snapshots --months 3
+    python manage.py build_kpi_snapshots --all         # todo el histórico
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dashboard.kpis import build_month, closed_periods, first_period
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los KPIs mensuales precalculados del dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=13, help='Meses cerrados a reconstruir (los más recientes)')
+        parser.add_argument('--all', action='store_true', help='Reconstruir todos los meses cerrados')
+
+    def handle(self, *args, **options):
+        if options['months'] < 1:
+            raise CommandError('--months debe ser >= 1')
+
+        periods = closed_periods(first_period())
+        if not options['all']:
+            periods = periods[-options['months']:]
+
+        for year, month in periods:
+            kpis = build_month(year, month)
+            self.stdout.write(
+                f"  {month:02d}/{year}: facturado ${kpis.totals['billed_amount']:.2f}, "
+                f"{kpis.totals['total_orders']} órdenes, {len(kpis.clients)} cliente(s)"
+            )
+        self.stdout.write(self.style.SUCCESS(f'{len(periods)} mes(es) reconstruido(s).'))
@@ -0,0 +1,56 @@
+"""
+Django Management Command: Exportar reportes analíticos
+
+Escribe los reportes de apps/dashboard/analytics.py (margen por cliente, por
+servicio y por mes, y DSO) a Excel (una hoja por reporte) o a Parquet (un
+archivo por reporte; requiere pyarrow).
+
+USO:
+    python manage.py export_analytics --output reportes.xlsx
+    python manage.py export_analytics --report dso --start 2025-01-01 --end 2025-12-31 --output dso.xlsx
+    python manage.py export_analytics --format parquet --output exports/
+"""
+
+import os
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dashboard.analytics import EXPORT_FORMATS, REPORTS, AnalyticsError, build_reports, export_reports
+
+
+class Command(BaseCommand):
+    help = 'Exporta los reportes de margen y DSO a Excel o Parquet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', action='append', choices=REPORTS, help='Reporte (repetible; por defecto todos)')
+        parser.add_argument('--start', type=date.fromisoformat, help='Inicio del periodo (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Fin del periodo (YYYY-MM-DD)')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='xlsx', help='Formato del archivo')
+        parser.add_argument(
+            '--output',
+            required=True,
+            help='Archivo .xlsx, o directorio donde escribir un .parquet por reporte',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start, end, frames = build_reports(options['report'] or REPORTS, options['start'], options['end'])
+            if options['format'] == 'xlsx':
+                outputs = {options['output']: export_reports(frames, 'xlsx')}
+            else:
+                os.makedirs(options['output'], exist_ok=True)
+                outputs = {
+                    os.path.join(options['output'], f'{name}.parquet'): export_reports({name: frame}, 'parquet')
+                    for name, frame in frames.items()
+                }
+        except AnalyticsError as e:
+            raise CommandError(str(e))
+
+        for path, content in outputs.items():
+            with open(path, 'wb') as output:
+                output.write(content)
+            self.stdout.write(f'  {path}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(frames)} reporte(s) del {start:%d/%m/%Y} al {end:%d/%m/%Y} exportado(s).'
+        ))
@@ -0,0 +1,54 @@
+"""
+Django Management Command: Snapshot del libro en Parquet
+
+Escribe OS, cargos, facturas, pagos, notas de crédito y gastos en archivos
+Parquet comprimidos, uno por entidad y mes (ver
+apps/dashboard/ledger_snapshot.py). En modo incremental agrega sólo las filas
+modificadas (``updated_at``) desde la última corrida registrada en
+``_manifest.json``. Requiere pyarrow.
+
+USO:
+    python manage.py export_ledger_snapshot --output /data/ledger
+    python manage.py export_ledger_snapshot --output /data/ledger --incremental
+    python manage.py export_ledger_snapshot --output /data/ledger --entity invoices --entity invoice_payments
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dashboard.ledger_snapshot import (
+    BATCH_SIZE, COMPRESSION, COMPRESSIONS, ENTITIES, LedgerSnapshotError, export_snapshot,
+)
+
+
+class Command(BaseCommand):
+    help = 'Exporta el libro a Parquet por entidad y mes (completo o incremental)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', required=True, help='Directorio del snapshot')
+        parser.add_argument(
+            '--entity', action='append', choices=list(ENTITIES), help='Entidad (repetible; por defecto todas)',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Solo filas modificadas desde la última corrida',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Filas por lote de Arrow')
+        parser.add_argument('--compression', choices=COMPRESSIONS, default=COMPRESSION, help='Compresión Parquet')
+
+    def handle(self, *args, **options):
+        try:
+            results = export_snapshot(
+                options['output'],
+                entities=options['entity'],
+                incremental=options['incremental'],
+                batch_size=options['batch_size'],
+                compression=options['compression'],
+            )
+        except LedgerSnapshotError as e:
+            raise CommandError(str(e))
+
+        for name, periods in results.items():
+            self.stdout.write(f'  {name}: {sum(periods.values())} fila(s) en {len(periods)} periodo(s)')
+        mode = 'incremental' if options['incremental'] else 'completo'
+        self.stdout.write(self.style.SUCCESS(f'Snapshot {mode} escrito en {options["output"]}.'))
@@ -0,0 +1,51 @@
+"""
+Django Management Command: Barrido de alertas del dashboard
+
+Recalcula todas las alertas y sincroniza la tabla AlertSnapshot (ver
+apps/dashboard/alerts.py). Los cambios en OS, facturas y gastos ya refrescan
+sus alertas al guardarse; este barrido recoge lo que cambia sólo con la fecha
+(días de atraso, ETA próximos). Se programa con cron cada
+ALERTS_SWEEP_INTERVAL segundos (15 minutos por defecto); la vista de alertas
+sólo lee la tabla.
+
+USO:
+    python manage.py refresh_alerts             # barrido inmediato
+    python manage.py refresh_alerts --if-due    # sólo si pasó ALERTS_SWEEP_INTERVAL (cron en varias instancias)
+
+    # crontab:
+    */15 * * * * python manage.py refresh_alerts --if-due
+"""
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from apps.dashboard.alerts import SWEEP_MARKER_KEY, ensure_fresh_snapshot, refresh_alert_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la tabla de alertas precalculadas del dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--if-due',
+            action='store_true',
+            help='Solo barrer si pasó ALERTS_SWEEP_INTERVAL desde el último barrido',
+        )
+
+    def handle(self, *args, **options):
+        if options['if_due']:
+            if ensure_fresh_snapshot():
+                self.stdout.write(self.style.SUCCESS('Alertas sincronizadas.'))
+            else:
+                self.stdout.write('Barrido reciente (o caché no disponible); no se recalculó.')
+            return
+
+        result = refresh_alert_snapshot()
+        try:
+            cache.delete(SWEEP_MARKER_KEY)
+        except Exception:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Alertas sincronizadas: {result['created']} nuevas, "
+            f"{result['updated']} actualizadas, {result['deleted']} eliminadas"
+        ))
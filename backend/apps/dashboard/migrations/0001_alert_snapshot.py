@@ -0,0 +1,39 @@
+# Generated by Django 5.0.1 on 2026-10-19 12:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Identificador')),
+                ('alert_type', models.CharField(max_length=30, verbose_name='Tipo')),
+                ('severity', models.CharField(choices=[('high', 'Alta'), ('medium', 'Media'), ('warning', 'Advertencia')], max_length=10, verbose_name='Severidad')),
+                ('severity_rank', models.PositiveSmallIntegerField(verbose_name='Prioridad')),
+                ('source', models.CharField(choices=[('service_order', 'Orden de Servicio'), ('invoice', 'Factura'), ('transfer', 'Gasto')], max_length=20, verbose_name='Origen')),
+                ('object_id', models.PositiveIntegerField(verbose_name='ID del registro')),
+                ('message', models.CharField(max_length=255, verbose_name='Mensaje')),
+                ('client', models.CharField(blank=True, max_length=255, verbose_name='Cliente / Proveedor')),
+                ('order', models.CharField(blank=True, max_length=50, verbose_name='Orden')),
+                ('link', models.CharField(max_length=100, verbose_name='Enlace')),
+                ('date', models.DateField(blank=True, null=True, verbose_name='Fecha')),
+                ('computed_on', models.DateField(verbose_name='Calculada el')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Alerta del Dashboard',
+                'verbose_name_plural': 'Alertas del Dashboard',
+                'ordering': ['severity_rank', 'date', 'key'],
+                'indexes': [models.Index(fields=['severity_rank', 'date'], name='dashboard_a_severit_4512a9_idx'), models.Index(fields=['source', 'object_id'], name='dashboard_a_source_aaa208_idx'), models.Index(fields=['alert_type', 'severity_rank'], name='dashboard_a_alert_t_780db6_idx')],
+            },
+        ),
+    ]
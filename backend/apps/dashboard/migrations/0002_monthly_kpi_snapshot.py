@@ -0,0 +1,53 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0008_add_client_type'),
+        ('dashboard', '0001_alert_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyKPISnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='Año')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='Mes')),
+                ('billed_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Facturado')),
+                ('pending_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Pendiente de cobro')),
+                ('third_party_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Gastos a terceros facturados')),
+                ('pending_third_party_amount', models.DecimalField(decimal_places=6, default=0, max_digits=19, verbose_name='Gastos a terceros pendientes')),
+                ('outsourced_services_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Servicios tercerizados facturados')),
+                ('billed_expenses_cost', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Costo de gastos facturados')),
+                ('operating_costs', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Costos operativos')),
+                ('admin_costs', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Gastos administrativos')),
+                ('total_orders', models.PositiveIntegerField(default=0, verbose_name='Órdenes')),
+                ('open_orders', models.PositiveIntegerField(default=0, verbose_name='Órdenes abiertas')),
+                ('closed_orders', models.PositiveIntegerField(default=0, verbose_name='Órdenes cerradas')),
+                ('orders_charges_count', models.PositiveIntegerField(default=0, verbose_name='Servicios de las órdenes')),
+                ('orders_services_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Total servicios de las órdenes')),
+                ('orders_invoiced_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Total facturado de las órdenes')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Calculado el')),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='kpi_snapshots', to='clients.client', verbose_name='Cliente')),
+            ],
+            options={
+                'verbose_name': 'KPI Mensual',
+                'verbose_name_plural': 'KPIs Mensuales',
+                'ordering': ['year', 'month'],
+                'indexes': [models.Index(fields=['year', 'month'], name='dashboard_m_year_e77a38_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='monthlykpisnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(('client__isnull', True)), fields=('year', 'month'), name='unique_kpi_snapshot_period'),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlykpisnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(('client__isnull', False)), fields=('year', 'month', 'client'), name='unique_kpi_snapshot_period_client'),
+        ),
+    ]
@@ -1,3 +1,124 @@
 from django.db import models
 
-# Create your models here.
+
+class AlertSnapshot(models.Model):
+    """
+    Alerta precalculada del dashboard (una fila por alerta activa).
+    La mantiene apps.dashboard.alerts; AlertsView sólo lee esta tabla.
+    """
+    SEVERITY_CHOICES = (
+        ('high', 'Alta'),
+        ('medium', 'Media'),
+        ('warning', 'Advertencia'),
+    )
+    SOURCE_CHOICES = (
+        ('service_order', 'Orden de Servicio'),
+        ('invoice', 'Factura'),
+        ('transfer', 'Gasto'),
+    )
+
+    key = models.CharField(max_length=64, unique=True, verbose_name="Identificador")
+    alert_type = models.CharField(max_length=30, verbose_name="Tipo")
+    severity = models.CharField(max_length=10, choices=SEVERITY_CHOICES, verbose_name="Severidad")
+    severity_rank = models.PositiveSmallIntegerField(verbose_name="Prioridad")
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, verbose_name="Origen")
+    object_id = models.PositiveIntegerField(verbose_name="ID del registro")
+    message = models.CharField(max_length=255, verbose_name="Mensaje")
+    client = models.CharField(max_length=255, blank=True, verbose_name="Cliente / Proveedor")
+    order = models.CharField(max_length=50, blank=True, verbose_name="Orden")
+    link = models.CharField(max_length=100, verbose_name="Enlace")
+    date = models.DateField(null=True, blank=True, verbose_name="Fecha")
+    computed_on = models.DateField(verbose_name="Calculada el")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Alerta del Dashboard"
+        verbose_name_plural = "Alertas del Dashboard"
+        ordering = ['severity_rank', 'date', 'key']
+        indexes = [
+            models.Index(fields=['severity_rank', 'date']),
+            models.Index(fields=['source', 'object_id']),
+            models.Index(fields=['alert_type', 'severity_rank']),
+        ]
+
+    def __str__(self):
+        return self.message
+
+    def as_alert(self):
+        """Formato de la respuesta de /dashboard/alerts/."""
+        alert = {
+            'id': self.key,
+            'severity': self.severity,
+            'type': self.alert_type,
+            'message': self.message,
+            'client': self.client,
+            'link': self.link,
+            'date': self.date,
+        }
+        if self.order:
+            alert['order'] = self.order
+        return alert
+
+
+class MonthlyKPISnapshot(models.Model):
+    """
+    KPIs de un mes cerrado (anterior al mes en curso), precalculados para el
+    dashboard. Una fila global (``client`` nulo) y una por cliente con
+    movimiento. La mantiene apps.dashboard.kpis; el mes en curso se calcula
+    siempre en vivo.
+    """
+    year = models.PositiveSmallIntegerField(verbose_name="Año")
+    month = models.PositiveSmallIntegerField(verbose_name="Mes")
+    client = models.ForeignKey(
+        'clients.Client',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='kpi_snapshots',
+        verbose_name="Cliente",
+    )
+
+    # Facturas emitidas en el mes (issue_date, sin anuladas)
+    billed_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Facturado")
+    pending_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Pendiente de cobro")
+    third_party_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Gastos a terceros facturados")
+    pending_third_party_amount = models.DecimalField(max_digits=19, decimal_places=6, default=0, verbose_name="Gastos a terceros pendientes")
+    outsourced_services_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Servicios tercerizados facturados")
+    billed_expenses_cost = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Costo de gastos facturados")
+
+    # Gastos por fecha de transacción
+    operating_costs = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Costos operativos")
+    admin_costs = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Gastos administrativos")
+
+    # Órdenes creadas en el mes
+    total_orders = models.PositiveIntegerField(default=0, verbose_name="Órdenes")
+    open_orders = models.PositiveIntegerField(default=0, verbose_name="Órdenes abiertas")
+    closed_orders = models.PositiveIntegerField(default=0, verbose_name="Órdenes cerradas")
+    orders_charges_count = models.PositiveIntegerField(default=0, verbose_name="Servicios de las órdenes")
+    orders_services_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Total servicios de las órdenes")
+    orders_invoiced_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Total facturado de las órdenes")
+
+    computed_at = models.DateTimeField(auto_now=True, verbose_name="Calculado el")
+
+    class Meta:
+        verbose_name = "KPI Mensual"
+        verbose_name_plural = "KPIs Mensuales"
+        ordering = ['year', 'month']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['year', 'month'],
+                condition=models.Q(client__isnull=True),
+                name='unique_kpi_snapshot_period',
+            ),
+            models.UniqueConstraint(
+                fields=['year', 'month', 'client'],
+                condition=models.Q(client__isnull=False),
+                name='unique_kpi_snapshot_period_client',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['year', 'month']),
+        ]
+
+    def __str__(self):
+        return f"KPIs {self.month:02d}/{self.year}" + (f" - {self.client_id}" if self.client_id else "")
@@ -0,0 +1,106 @@
+"""
+Refresco incremental de las alertas del dashboard (ver apps.dashboard.alerts)
+y de los KPIs de meses cerrados (ver apps.dashboard.kpis). Los cambios se
+acumulan y se procesan juntos al confirmar la transacción.
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.orders.models import CreditNote, Invoice, InvoicePayment, OrderCharge, ServiceOrder
+from apps.transfers.models import Transfer, TransferPayment
+
+from .alerts import SOURCE_INVOICE, SOURCE_ORDER, SOURCE_TRANSFER, schedule_refresh
+from .kpis import period_of, schedule_rebuild
+
+SOURCE_BY_MODEL = {
+    ServiceOrder: SOURCE_ORDER,
+    Invoice: SOURCE_INVOICE,
+    Transfer: SOURCE_TRANSFER,
+}
+
+
+@receiver(post_save, sender=ServiceOrder)
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=Transfer)
+@receiver(post_delete, sender=ServiceOrder)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Transfer)
+def refresh_alerts_on_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_refresh(SOURCE_BY_MODEL[sender], instance.pk)
+
+
+@receiver(post_save, sender=InvoicePayment)
+@receiver(post_save, sender=TransferPayment)
+def refresh_alerts_on_payment(sender, instance, raw=False, **kwargs):
+    """Los pagos actualizan el saldo del documento sin pasar por su save()."""
+    if raw:
+        return
+    if sender is InvoicePayment:
+        schedule_refresh(SOURCE_INVOICE, instance.invoice_id)
+    else:
+        schedule_refresh(SOURCE_TRANSFER, instance.transfer_id)
+
+
+@receiver(pre_save, sender=Invoice)
+def capture_previous_invoice_period(sender, instance, raw=False, **kwargs):
+    """Mes y OS anteriores de la factura: si cambian, ambos meses se reconstruyen."""
+    if raw or not instance.pk:
+        return
+    previous = Invoice.objects.filter(pk=instance.pk).values('issue_date', 'service_order_id').first()
+    if previous:
+        instance._previous_issue_date = previous['issue_date']
+        instance._previous_service_order_id = previous['service_order_id']
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def rebuild_kpis_on_invoice(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_rebuild(
+        periods=[period_of(instance.issue_date), period_of(getattr(instance, '_previous_issue_date', None))],
+        order_ids=[instance.service_order_id, getattr(instance, '_previous_service_order_id', None)],
+    )
+
+
+@receiver(post_save, sender=InvoicePayment)
+@receiver(post_save, sender=CreditNote)
+def rebuild_kpis_on_invoice_balance(sender, instance, raw=False, **kwargs):
+    """Pagos y notas de crédito cambian el saldo pendiente del mes de la factura."""
+    if raw:
+        return
+    schedule_rebuild(invoice_ids=[instance.invoice_id])
+
+
+@receiver(post_save, sender=Transfer)
+@receiver(post_delete, sender=Transfer)
+def rebuild_kpis_on_transfer(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_rebuild(
+        periods=[
+            period_of(instance.transaction_date),
+            period_of(getattr(instance, '_previous_transaction_date', None)),
+        ],
+        invoice_ids=[instance.invoice_id, getattr(instance, '_previous_invoice_id', None)],
+    )
+
+
+@receiver(post_save, sender=ServiceOrder)
+@receiver(post_delete, sender=ServiceOrder)
+def rebuild_kpis_on_order(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_rebuild(periods=[period_of(instance.created_at)])
+
+
+@receiver(post_save, sender=OrderCharge)
+@receiver(post_delete, sender=OrderCharge)
+def rebuild_kpis_on_charge(sender, instance, raw=False, **kwargs):
+    """Total de servicios de la OS y servicios tercerizados de su factura."""
+    if raw:
+        return
+    schedule_rebuild(invoice_ids=[instance.invoice_id], order_ids=[instance.service_order_id])
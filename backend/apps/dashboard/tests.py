@@ -1,3 +1,610 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.catalogs.models import Provider, ShipmentType
+from apps.clients.models import Client
+from apps.orders.models import Invoice, InvoicePayment, ServiceOrder
+from apps.transfers.models import Transfer
+from apps.users.models import User
+
+from .alerts import SWEEP_MARKER_KEY, ensure_fresh_snapshot, evaluate_alerts, refresh_alert_snapshot
+from .kpis import all_time_kpis, compute_kpis, current_period, month_start, next_month, period_kpis
+from .models import AlertSnapshot, MonthlyKPISnapshot
+
+
+class AlertSnapshotTests(APITestCase):
+    """Las alertas se leen de la tabla precalculada y se mantienen al día."""
+
+    def setUp(self):
+        cache.delete(SWEEP_MARKER_KEY)
+        self.user = User.objects.create_user(username='alerts_user', password='x', role='admin')
+        self.client.force_authenticate(user=self.user)
+        self.company = Client.objects.create(name='Cliente Alertas', payment_condition='credito')
+        self.shipment_type = ShipmentType.objects.create(name='Marítimo')
+        self.today = timezone.localdate()
+
+    def _order(self, status_value='pendiente', eta=None, **updates):
+        order = ServiceOrder.objects.create(
+            client=self.company, shipment_type=self.shipment_type,
+            created_by=self.user, status=status_value, eta=eta,
+        )
+        if updates:
+            ServiceOrder.objects.filter(pk=order.pk).update(**updates)
+        return order
+
+    def _escenario(self):
+        now = timezone.now()
+        self.soon = self._order('en_transito', eta=self.today + timedelta(days=1))
+        self.missed = self._order('pendiente', eta=self.today - timedelta(days=3))
+        self.closure = self._order('finalizada', updated_at=now - timedelta(days=10))
+        self.stale = self._order('en_almacen', created_at=now - timedelta(days=40))
+        self.closed = self._order('cerrada', created_at=now - timedelta(days=40))
+
+        self.invoice = Invoice.objects.create(
+            service_order=self.missed, issue_date=self.today - timedelta(days=40),
+            total_amount=Decimal('100.00'), created_by=self.user,
+        )
+        Invoice.objects.filter(pk=self.invoice.pk).update(
+            due_date=self.today - timedelta(days=5), balance=Decimal('100.00'), status='pending',
+        )
+
+        provider = Provider.objects.create(name='Naviera Alertas')
+        self.transfer = Transfer.objects.create(
+            transfer_type='admin', provider=provider, amount=Decimal('50.00'),
+            description='Gasto', transaction_date=self.today - timedelta(days=20), created_by=self.user,
+        )
+        Transfer.objects.filter(pk=self.transfer.pk).update(status='aprobado', balance=Decimal('50.00'))
+
+    def test_reglas_generan_las_mismas_alertas(self):
+        self._escenario()
+        refresh_alert_snapshot()
+        response = self.client.get('/api/dashboard/alerts/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        alerts = {alert['id']: alert for alert in response.data}
+        self.assertEqual(set(alerts), {
+            f'eta_soon_{self.soon.pk}',
+            f'eta_missed_{self.missed.pk}',
+            f'closure_{self.closure.pk}',
+            f'stale_os_{self.stale.pk}',
+            f'cxc_overdue_{self.invoice.pk}',
+            f'cxp_stale_{self.transfer.pk}',
+        })
+        self.assertEqual(
+            alerts[f'eta_soon_{self.soon.pk}']['message'],
+            f'OS-{self.soon.order_number}: Llega mañana',
+        )
+        self.assertEqual(
+            alerts[f'eta_missed_{self.missed.pk}']['message'],
+            f'OS-{self.missed.order_number}: ETA vencido hace 3 días',
+        )
+        self.assertEqual(
+            alerts[f'cxc_overdue_{self.invoice.pk}']['message'],
+            f'Factura {self.invoice.invoice_number}: Vencida hace 5 días ($100.00)',
+        )
+        self.assertEqual(alerts[f'cxp_stale_{self.transfer.pk}']['client'], 'Naviera Alertas')
+        self.assertEqual(alerts[f'eta_missed_{self.missed.pk}']['order'], self.missed.order_number)
+        self.assertNotIn('order', alerts[f'cxc_overdue_{self.invoice.pk}'])
+        # Las de severidad alta primero
+        self.assertEqual(response.data[0]['severity'], 'high')
+
+    def test_evaluacion_usa_un_numero_fijo_de_consultas(self):
+        self._escenario()
+        with CaptureQueriesContext(connection) as ctx:
+            evaluate_alerts()
+        baseline = len(ctx.captured_queries)
+
+        for _ in range(5):
+            self._order('pendiente', eta=self.today - timedelta(days=2))
+        with CaptureQueriesContext(connection) as ctx:
+            alerts = evaluate_alerts()
+
+        self.assertEqual(len(ctx.captured_queries), baseline)
+        self.assertLessEqual(baseline, 3)
+        self.assertEqual(len(alerts), 11)
+
+    def test_la_vista_solo_lee_la_tabla(self):
+        self._escenario()
+        # Sin barrido la tabla está vacía: la vista no recalcula
+        self.assertEqual(self.client.get('/api/dashboard/alerts/').data, [])
+        refresh_alert_snapshot()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/dashboard/alerts/')
+
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_barrido_periodico_solo_si_corresponde(self):
+        self._escenario()
+        call_command('refresh_alerts', '--if-due', stdout=io.StringIO())
+        self.assertEqual(AlertSnapshot.objects.count(), 6)
+
+        AlertSnapshot.objects.all().delete()
+        call_command('refresh_alerts', '--if-due', stdout=io.StringIO())
+        self.assertEqual(AlertSnapshot.objects.count(), 0)
+
+        # Caché caída: no se barre (ni se oculta el error con otro de la caché)
+        cache.delete(SWEEP_MARKER_KEY)
+        with mock.patch('apps.dashboard.alerts.cache.add', side_effect=ConnectionError('redis caído')):
+            self.assertFalse(ensure_fresh_snapshot())
+        self.assertEqual(AlertSnapshot.objects.count(), 0)
+
+    def test_cambios_refrescan_las_alertas_del_registro(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._escenario()
+        refresh_alert_snapshot()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.missed.status = 'cerrada'
+            self.missed.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self._order('en_transito', eta=self.today)
+
+        keys = set(AlertSnapshot.objects.values_list('key', flat=True))
+        self.assertNotIn(f'eta_missed_{self.missed.pk}', keys)
+        self.assertEqual(
+            AlertSnapshot.objects.filter(alert_type='eta_soon').count(), 2,
+        )
+
+    def test_paginacion_y_filtros(self):
+        self._escenario()
+        refresh_alert_snapshot()
+        response = self.client.get('/api/dashboard/alerts/', {'limit': 4})
+        self.assertEqual(response.data['count'], 6)
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertEqual(response.data['next_offset'], 4)
+
+        response = self.client.get('/api/dashboard/alerts/', {'limit': 4, 'offset': 4})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNone(response.data['next_offset'])
+
+        response = self.client.get('/api/dashboard/alerts/', {'severity': 'high'})
+        self.assertEqual(
+            {alert['type'] for alert in response.data}, {'eta_missed', 'invoice_overdue'},
+        )
+
+    def test_comando_sincroniza_la_tabla(self):
+        self._escenario()
+        AlertSnapshot.objects.create(
+            key='eta_soon_999999', alert_type='eta_soon', severity='medium', severity_rank=1,
+            source='service_order', object_id=999999, message='Obsoleta', link='/', computed_on=self.today,
+        )
+
+        call_command('refresh_alerts', stdout=io.StringIO())
+
+        self.assertFalse(AlertSnapshot.objects.filter(key='eta_soon_999999').exists())
+        self.assertEqual(AlertSnapshot.objects.count(), 6)
+
+
+class MonthlyKPISnapshotTests(APITestCase):
+    """Los meses cerrados se leen de MonthlyKPISnapshot y se mantienen al día."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='kpis_user', password='x', role='admin')
+        self.client.force_authenticate(user=self.user)
+        self.company = Client.objects.create(name='Cliente KPIs')
+        self.other = Client.objects.create(name='Otro Cliente KPIs')
+        self.shipment_type = ShipmentType.objects.create(name='Aéreo KPIs')
+        self.provider = Provider.objects.create(name='Proveedor KPIs')
+
+        self.current = month_start(*current_period())
+        self.closed_start = month_start(self.current.year - 1, self.current.month)
+        self.closed = (self.closed_start.year, self.closed_start.month)
+
+    def _order(self, company, day, status_value='pendiente'):
+        order = ServiceOrder.objects.create(client=company, shipment_type=self.shipment_type, status=status_value)
+        created = timezone.make_aware(timezone.datetime(day.year, day.month, day.day, 12))
+        ServiceOrder.objects.filter(pk=order.pk).update(created_at=created)
+        order.created_at = created
+        return order
+
+    def _invoice(self, order, day, total, balance, third_party='0.00'):
+        invoice = Invoice.objects.create(service_order=order, issue_date=day, total_amount=Decimal(total))
+        Invoice.objects.filter(pk=invoice.pk).update(
+            balance=Decimal(balance), total_third_party=Decimal(third_party), status='partial',
+        )
+        return invoice
+
+    def _escenario(self):
+        day = self.closed_start + timedelta(days=9)
+        self.order = self._order(self.company, day)
+        self._order(self.other, day, status_value='cerrada')
+        self.invoice = self._invoice(self.order, day, '200.00', '50.00', third_party='80.00')
+        Transfer.objects.create(
+            transfer_type='costos', provider=self.provider, service_order=self.order,
+            amount=Decimal('30.00'), description='Costo', transaction_date=day,
+        )
+        Transfer.objects.create(
+            transfer_type='admin', provider=self.provider, amount=Decimal('12.00'),
+            description='Oficina', transaction_date=day,
+        )
+        # Movimiento del mes en curso (siempre en vivo)
+        live_order = self._order(self.company, self.current)
+        self._invoice(live_order, self.current, '100.00', '100.00')
+
+    def _closed_row(self):
+        return MonthlyKPISnapshot.objects.get(year=self.closed[0], month=self.closed[1], client=None)
+
+    def test_snapshot_coincide_con_el_calculo_en_vivo(self):
+        self._escenario()
+
+        kpis = period_kpis([self.closed])[self.closed]
+        live = compute_kpis(self.closed_start, next_month(self.closed_start))
+
+        self.assertEqual(kpis.totals, live.totals)
+        self.assertEqual(kpis.totals['billed_amount'], Decimal('200.00'))
+        self.assertEqual(kpis.totals['pending_amount'], Decimal('50.00'))
+        self.assertEqual(kpis.totals['pending_third_party_amount'], Decimal('20'))
+        self.assertEqual(kpis.totals['operating_costs'], Decimal('30.00'))
+        self.assertEqual(kpis.totals['admin_costs'], Decimal('12.00'))
+        self.assertEqual(kpis.totals['total_orders'], 2)
+        self.assertEqual(kpis.totals['closed_orders'], 1)
+        self.assertEqual(kpis.clients[self.company.pk]['orders_invoiced_amount'], Decimal('200.00'))
+        self.assertEqual(
+            MonthlyKPISnapshot.objects.filter(year=self.closed[0], month=self.closed[1]).count(), 3,
+        )
+
+        # Segunda lectura: sólo la tabla precalculada
+        with CaptureQueriesContext(connection) as ctx:
+            again = period_kpis([self.closed])[self.closed]
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(again.totals, kpis.totals)
+
+    def test_historico_suma_meses_cerrados_y_mes_en_curso(self):
+        self._escenario()
+
+        totals = all_time_kpis().totals
+
+        self.assertEqual(totals, compute_kpis(self.closed_start).totals)
+        self.assertEqual(totals['billed_amount'], Decimal('300.00'))
+        self.assertEqual(totals['total_orders'], 3)
+        self.assertFalse(
+            MonthlyKPISnapshot.objects.filter(year=self.current.year, month=self.current.month).exists()
+        )
+
+    def test_cambios_reconstruyen_el_mes_cerrado(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._escenario()
+        self.assertTrue(MonthlyKPISnapshot.objects.filter(year=self.closed[0], month=self.closed[1]).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._invoice(self.order, self.closed_start, '40.00', '40.00')
+        self.assertEqual(self._closed_row().billed_amount, Decimal('240.00'))
+
+        # Mover la factura al mes en curso la quita del mes cerrado
+        with self.captureOnCommitCallbacks(execute=True):
+            self.invoice.issue_date = self.current
+            self.invoice.save()
+        self.assertEqual(self._closed_row().billed_amount, Decimal('40.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.status = 'cerrada'
+            self.order.save()
+        self.assertEqual(self._closed_row().closed_orders, 2)
+
+    def test_dashboard_lee_los_meses_cerrados(self):
+        self._escenario()
+
+        response = self.client.get('/api/dashboard/', {'year': self.closed[0], 'month': self.closed[1]})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual(data['current_month']['billed_amount'], 200.0)
+        self.assertEqual(data['current_month']['operating_costs'], 30.0)
+        self.assertEqual(data['current_month']['admin_costs'], 12.0)
+        self.assertEqual(data['current_month']['os_cerradas_month'], 1)
+        self.assertEqual(data['cash_flow_data'][0]['cobrado'], 150.0)
+        self.assertEqual(data['revenue_composition']['gastos_terceros'], 80.0)
+        self.assertEqual(data['client_breakdown'], [{
+            'client_id': self.company.pk,
+            'client_name': 'Cliente KPIs',
+            'total_ingresos': 50.0,
+            'total_servicios': 30.0,
+            'total_prestamos': 20.0,
+        }])
+        self.assertEqual(data['top_clients'][0]['name'], 'Cliente KPIs')
+        self.assertEqual(data['top_clients'][0]['total_amount'], 200.0)
+        self.assertTrue(MonthlyKPISnapshot.objects.filter(year=self.closed[0], month=self.closed[1]).exists())
+
+        response = self.client.get('/api/dashboard/', {'year': self.closed[0], 'month': 0})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        months = {row['month']: row for row in response.data['monthly_breakdown']}
+        self.assertEqual(months[self.closed[1]]['gastos'], 42.0)
+
+    def test_construccion_concurrente_del_mismo_mes(self):
+        from django.db.models.signals import post_delete
+        from .kpis import build_month
+
+        self._escenario()
+        build_month(*self.closed)
+
+        # Otra petición confirma su fila global entre el DELETE y el INSERT
+        competing = []
+
+        def insert_competing(sender, instance, **kwargs):
+            if instance.client_id is None and not competing:
+                competing.append(MonthlyKPISnapshot.objects.create(year=instance.year, month=instance.month))
+
+        post_delete.connect(insert_competing, sender=MonthlyKPISnapshot)
+        try:
+            kpis = build_month(*self.closed)
+        finally:
+            post_delete.disconnect(insert_competing, sender=MonthlyKPISnapshot)
+
+        self.assertEqual(len(competing), 1)
+        self.assertEqual(kpis.totals['total_orders'], 2)
+        self.assertEqual(self._closed_row().total_orders, 2)
+        self.assertEqual(
+            MonthlyKPISnapshot.objects.filter(year=self.closed[0], month=self.closed[1], client=None).count(), 1,
+        )
+
+    def test_comando_construye_los_meses_cerrados(self):
+        self._escenario()
+
+        call_command('build_kpi_snapshots', '--all', stdout=io.StringIO())
+
+        self.assertEqual(
+            MonthlyKPISnapshot.objects.filter(client=None).count(), 12,
+        )
+        self.assertEqual(self._closed_row().total_orders, 2)
+
+
+class AnalyticsReportTests(APITestCase):
+    """Reportes de margen y DSO calculados con pandas sobre columnas tipadas."""
+
+    def setUp(self):
+        from apps.catalogs.models import Service
+        from apps.orders.models import OrderCharge
+        from apps.transfers.models import DirectCostAllocation, ProviderInvoice
+
+        self.user = User.objects.create_user(username='analytics_user', password='x', role='admin')
+        self.client.force_authenticate(user=self.user)
+        self.today = timezone.localdate()
+        shipment_type = ShipmentType.objects.create(name='Marítimo Analítica')
+        provider = Provider.objects.create(name='Proveedor Analítica')
+        self.acme = Client.objects.create(name='Acme')
+        self.beta = Client.objects.create(name='Beta')
+        self.freight = Service.objects.create(name='Flete', default_price=Decimal('100.00'))
+        self.customs = Service.objects.create(name='Trámite', default_price=Decimal('50.00'))
+
+        def invoice(company, total, balance, status_value='partial'):
+            order = ServiceOrder.objects.create(client=company, shipment_type=shipment_type)
+            created = Invoice.objects.create(service_order=order, issue_date=self.today, total_amount=Decimal(total))
+            Invoice.objects.filter(pk=created.pk).update(balance=Decimal(balance), status=status_value)
+            return order, created
+
+        def charge(order, invoice_obj, service, price):
+            return OrderCharge.objects.create(
+                service_order=order, service=service, quantity=1, unit_price=Decimal(price),
+                iva_type='exento', invoice=invoice_obj,
+            )
+
+        acme_order, acme_invoice = invoice(self.acme, '150.00', '60.00')
+        freight = charge(acme_order, acme_invoice, self.freight, '100.00')
+        charge(acme_order, acme_invoice, self.customs, '50.00')
+        provider_invoice = ProviderInvoice.objects.create(
+            invoice_number='CD-AN-1', provider=provider, service_order=acme_order, total_amount=Decimal('70.00'),
+        )
+        DirectCostAllocation.objects.create(
+            provider_invoice=provider_invoice, order_charge=freight, cost_amount=Decimal('70.00'),
+        )
+        Transfer.objects.create(
+            transfer_type='propios', provider=provider, service_order=acme_order, amount=Decimal('20.00'),
+            description='Propio', transaction_date=self.today,
+        )
+
+        beta_order, beta_invoice = invoice(self.beta, '50.00', '0.00', status_value='paid')
+        charge(beta_order, beta_invoice, self.customs, '50.00')
+        # Anulada: no cuenta
+        cancelled_order, cancelled = invoice(self.beta, '999.00', '999.00', status_value='cancelled')
+        charge(cancelled_order, cancelled, self.freight, '999.00')
+
+    def _reports(self, **kwargs):
+        from .analytics import build_reports
+        return build_reports(start=self.today - timedelta(days=29), end=self.today, **kwargs)[2]
+
+    def test_margenes_por_cliente_y_servicio(self):
+        reports = self._reports()
+
+        clients = {row['client_name']: row for row in reports['margin_by_client'].to_dict(orient='records')}
+        self.assertEqual(clients['Acme']['revenue'], 150.0)
+        self.assertEqual(clients['Acme']['direct_cost'], 90.0)
+        self.assertEqual(clients['Acme']['margin'], 60.0)
+        self.assertEqual(clients['Acme']['margin_pct'], 40.0)
+        self.assertEqual(clients['Beta']['revenue'], 50.0)
+        self.assertEqual(clients['Beta']['invoices'], 1)
+
+        services = {row['service_name']: row for row in reports['margin_by_service'].to_dict(orient='records')}
+        self.assertEqual(services['Flete']['margin'], 30.0)
+        self.assertEqual(services['Trámite']['charges'], 2)
+        self.assertEqual(services['Trámite']['margin_pct'], 100.0)
+
+        month = reports['margin_by_month'].iloc[0]
+        self.assertEqual(month['month'], self.today.strftime('%Y-%m'))
+        self.assertEqual(month['billed'], 200.0)
+        self.assertEqual(month['margin'], 110.0)
+
+        total = reports['dso'][reports['dso']['client_id'].isna()].iloc[0]
+        self.assertEqual(total['receivable'], 60.0)
+        self.assertEqual(total['dso_days'], 9.0)
+
+    def test_lectura_por_bloques_da_el_mismo_resultado(self):
+        import pandas as pd
+
+        for name, frame in self._reports(chunk_size=1).items():
+            pd.testing.assert_frame_equal(frame, self._reports()[name])
+
+    def test_coincide_con_el_calculo_por_objeto(self):
+        from apps.core.management.commands.benchmark_analytics import per_object_margins
+
+        by_client, by_service = per_object_margins(self.today - timedelta(days=29), self.today)
+        reports = self._reports()
+
+        for row in reports['margin_by_client'].to_dict(orient='records'):
+            self.assertEqual(Decimal(str(row['revenue'])), by_client[row['client_name']]['revenue'])
+            self.assertEqual(Decimal(str(row['direct_cost'])), by_client[row['client_name']]['direct_cost'])
+        for row in reports['margin_by_service'].to_dict(orient='records'):
+            self.assertEqual(Decimal(str(row['direct_cost'])), by_service[row['service_name']]['direct_cost'])
+
+    def test_endpoint_json_y_excel(self):
+        import openpyxl
+
+        response = self.client.get('/api/dashboard/analytics/margin_by_client/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rows'][0]['client_name'], 'Acme')
+
+        response = self.client.get('/api/dashboard/analytics/dso/', {'export': 'xlsx'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        workbook = openpyxl.load_workbook(io.BytesIO(response.content))
+        self.assertEqual(workbook.sheetnames, ['dso'])
+        self.assertEqual(workbook['dso'].max_row, 4)
+
+        self.assertEqual(self.client.get('/api/dashboard/analytics/otro/').status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/api/dashboard/analytics/dso/', {'start': '2026-13-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_endpoint_restringido_a_finanzas(self):
+        operativo = User.objects.create_user(username='analytics_op', password='x', role='operativo')
+        self.client.force_authenticate(user=operativo)
+
+        response = self.client.get('/api/dashboard/analytics/dso/')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class LedgerSnapshotTests(APITestCase):
+    """Snapshot del libro en Parquet por entidad y mes, completo o incremental."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ledger_user', password='x', role='admin')
+        self.client.force_authenticate(user=self.user)
+        shipment_type = ShipmentType.objects.create(name='Marítimo Snapshot')
+        self.acme = Client.objects.create(name='Acme Snapshot')
+        self.order = ServiceOrder.objects.create(client=self.acme, shipment_type=shipment_type)
+        self.january = [
+            Invoice.objects.create(service_order=self.order, issue_date=date(2025, 1, day), total_amount=Decimal('10.00'))
+            for day in (5, 10, 20)
+        ]
+        self.february = Invoice.objects.create(
+            service_order=self.order, issue_date=date(2025, 2, 3), total_amount=Decimal('25.00'),
+        )
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output, ignore_errors=True)
+
+    def test_lotes_por_periodo_sin_mezclar_meses(self):
+        from .ledger_snapshot import ENTITIES, iter_batches, select_rows
+
+        entity = ENTITIES['invoices']
+        batches = list(iter_batches(entity, select_rows(entity), batch_size=2))
+
+        self.assertEqual([(period, len(columns['id'])) for period, columns in batches], [
+            ('2025-01', 2), ('2025-01', 1), ('2025-02', 1),
+        ])
+        self.assertEqual(batches[0][1]['client_id'], [self.acme.id, self.acme.id])
+        self.assertEqual(batches[2][1]['total_amount'], [Decimal('25.00')])
+
+    def test_incremental_selecciona_filas_modificadas_y_bajas(self):
+        from .ledger_snapshot import ENTITIES, select_rows
+
+        payment = InvoicePayment.objects.create(
+            invoice=self.february, amount=Decimal('5.00'), payment_method='transferencia',
+        )
+        payment.delete()
+        watermark = timezone.now()
+        Invoice.objects.update(updated_at=watermark - timedelta(minutes=1))
+        Invoice.objects.filter(pk=self.january[1].pk).update(updated_at=watermark + timedelta(minutes=1))
+        InvoicePayment.all_objects.filter(pk=payment.pk).update(updated_at=watermark + timedelta(minutes=1))
+
+        changed = select_rows(ENTITIES['invoices'], since=watermark)
+        self.assertEqual(list(changed.values_list('id', flat=True)), [self.january[1].id])
+        payments = select_rows(ENTITIES['invoice_payments'], since=watermark)
+        self.assertEqual(list(payments.values_list('id', 'is_deleted')), [(payment.id, True)])
+        january = select_rows(ENTITIES['invoices'], period=(2025, 1))
+        self.assertEqual(january.count(), 3)
+
+    def test_incremental_recoge_commits_tardios_sin_duplicar(self):
+        from .ledger_snapshot import ENTITIES, OVERLAP, RowVersions, iter_batches, select_rows
+
+        entity = ENTITIES['invoices']
+        watermark = timezone.now()
+        Invoice.objects.update(updated_at=watermark - timedelta(minutes=5))
+
+        def exported(since, previous):
+            versions = RowVersions(watermark - OVERLAP, previous)
+            rows = select_rows(entity, since=since, until=watermark)
+            ids = [pk for _, columns in iter_batches(entity, rows, versions=versions) for pk in columns['id']]
+            return ids, versions.dump()
+
+        first_ids, recent = exported(None, ())
+        self.assertEqual(len(first_ids), 4)
+
+        # Transacción que confirma después de la lectura, con updated_at anterior a la marca
+        late = self.january[1]
+        Invoice.objects.filter(pk=late.pk).update(updated_at=watermark - timedelta(minutes=1))
+
+        second_ids, _ = exported(watermark - OVERLAP, recent)
+        self.assertEqual(second_ids, [late.pk])
+
+    def test_sin_pyarrow_error_claro_y_sin_manifiesto(self):
+        from .ledger_snapshot import MANIFEST
+
+        # Oculta pyarrow aunque esté instalado: ``import`` de un None falla
+        self.enterContext(mock.patch.dict('sys.modules', {'pyarrow': None, 'pyarrow.parquet': None}))
+        with self.assertRaisesMessage(CommandError, 'requiere pyarrow'):
+            call_command('export_ledger_snapshot', output=self.output, stdout=io.StringIO())
+        self.assertFalse(os.path.exists(os.path.join(self.output, MANIFEST)))
+
+        response = self.client.get('/api/dashboard/ledger-snapshot/invoices/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_entidad_o_periodo_invalido(self):
+        response = self.client.get('/api/dashboard/ledger-snapshot/clientes/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/api/dashboard/ledger-snapshot/invoices/', {'since': 'ayer'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(_has_pyarrow(), 'requiere pyarrow')
+    def test_snapshot_completo_e_incremental(self):
+        import pyarrow.parquet as pq
+
+        from .ledger_snapshot import export_snapshot, load_manifest
+
+        first = timezone.now() + timedelta(minutes=1)
+        results = export_snapshot(self.output, entities=['invoices'], now=first)
+        self.assertEqual(results, {'invoices': {'2025-01': 3, '2025-02': 1}})
+        january = pq.read_table(os.path.join(self.output, 'invoices', 'period=2025-01')).to_pydict()
+        self.assertEqual(sorted(january['id']), sorted(invoice.id for invoice in self.january))
+
+        Invoice.objects.filter(pk=self.february.pk).update(
+            balance=Decimal('0.00'), updated_at=first + timedelta(minutes=1),
+        )
+        results = export_snapshot(
+            self.output, entities=['invoices'], incremental=True, now=first + timedelta(minutes=2),
+        )
+        self.assertEqual(results, {'invoices': {'2025-02': 1}})
+        february = pq.read_table(os.path.join(self.output, 'invoices', 'period=2025-02')).to_pydict()
+        self.assertEqual(february['id'], [self.february.id, self.february.id])
+        self.assertEqual(len(load_manifest(self.output)['invoices']['runs']), 2)
@@ -1,8 +1,11 @@
 from django.urls import path
 from .views import DashboardView
 from .views_alerts import AlertsView
+from .views_analytics import AnalyticsView, LedgerSnapshotView
 
 urlpatterns = [
     path('', DashboardView.as_view(), name='dashboard-stats'),
     path('alerts/', AlertsView.as_view(), name='dashboard-alerts'),
+    path('analytics/<str:report>/', AnalyticsView.as_view(), name='dashboard-analytics'),
+    path('ledger-snapshot/<str:entity>/', LedgerSnapshotView.as_view(), name='dashboard-ledger-snapshot'),
 ]
@@ -1,13 +1,14 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Q, Value
+from django.db.models import Sum, Count, Q
 from django.conf import settings
-from apps.orders.models import ServiceOrder, Invoice, OrderCharge
+from apps.orders.models import ServiceOrder, Invoice
 from apps.transfers.models import Transfer
 from apps.clients.models import Client
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from apps.users.permissions import IsOperativo
+from apps.core.db_routing import ReplicaReadMixin
 
 # Import caching utilities (only active when Redis is configured)
 try:
@@ -18,10 +19,13 @@ except ImportError:
     CacheManager = None
 
 
-class DashboardView(APIView):
+class DashboardView(ReplicaReadMixin, APIView):
     permission_classes = [IsOperativo]
 
-    def _generate_client_breakdown(self, year, month, is_annual_view=False):
+    def _client_names(self, client_ids):
+        return dict(Client.objects.filter(pk__in=list(client_ids)).values_list('id', 'name'))
+
+    def _generate_client_breakdown(self, kpis, client_names):
         """
         Generate client-level financial breakdown for comparative table.
         Returns list of clients with:
@@ -32,186 +36,48 @@ class DashboardView(APIView):
         NOTE: 'total_servicios' is calculated as a residual to ensure strict mathematical consistency:
         Saldo Pendiente = Servicios Pendientes + Préstamos Pendientes
         """
-        from django.db.models import DecimalField, Case, When, F
-        from django.db.models.functions import Coalesce as CoalesceFunc
-        
-        # Base queryset for Invoices (Financial View)
-        if year == 0:
-            # All Time View
-            base_qs = Invoice.objects.exclude(status='cancelled')
-        elif is_annual_view:
-            base_qs = Invoice.objects.filter(
-                issue_date__year=year
-            ).exclude(status='cancelled')
-        else:
-            base_qs = Invoice.objects.filter(
-                issue_date__year=year,
-                issue_date__month=month
-            ).exclude(status='cancelled')
-
-        # Aggregate by client
-        client_data = base_qs.values(
-            'service_order__client__id',
-            'service_order__client__name'
-        ).annotate(
-            # Total Ingresos: Sum of BALANCES (Pending Payment)
-            total_ingresos=CoalesceFunc(
-                Sum('balance'),
-                Value(0),
-                output_field=DecimalField()
-            ),
-            # Total Préstamos: Pending portion of invoices attributed to Third Party Expenses
-            # Logic: (Total Third Party * Balance) / Total Amount
-            total_prestamos=CoalesceFunc(
-                Sum(
-                    Case(
-                        When(
-                            total_amount__gt=0,
-                            then=F('total_third_party') * F('balance') / F('total_amount')
-                        ),
-                        default=Value(0),
-                        output_field=DecimalField()
-                    )
-                ),
-                Value(0),
-                output_field=DecimalField()
-            )
-        ).order_by('-total_ingresos')
-
-        # Format the data
         breakdown = []
-        for item in client_data:
-            ingresos = float(item['total_ingresos'])
-            prestamos = float(item['total_prestamos'])
+        for client_id, values in kpis.clients.items():
+            # Total Ingresos: Sum of BALANCES (Pending Payment)
+            ingresos = float(values['pending_amount'])
+            # Total Préstamos: (Total Third Party * Balance) / Total Amount
+            prestamos = float(values['pending_third_party_amount'])
             # Force consistency: Servicios = Total - Préstamos
             servicios = ingresos - prestamos
 
             if ingresos > 0 or servicios > 0 or prestamos > 0:
                 breakdown.append({
-                    'client_id': item['service_order__client__id'],
-                    'client_name': item['service_order__client__name'] or 'N/A',
+                    'client_id': client_id,
+                    'client_name': client_names.get(client_id) or 'N/A',
                     'total_ingresos': ingresos,
                     'total_servicios': servicios,
                     'total_prestamos': prestamos
                 })
 
+        breakdown.sort(key=lambda item: item['total_ingresos'], reverse=True)
         return breakdown
 
-    def _generate_cash_flow_data(self, year, month, is_annual_view=False):
+    def _generate_cash_flow_data(self, periods, kpis_by_period, month_format='%b'):
         """
         Generate cash flow data: Facturado, Cobrado, Pendiente de Cobro
         """
-        from django.db.models import DecimalField
-        from django.db.models.functions import Coalesce as CoalesceFunc
-
         cash_flow = []
-
-        # Handle "All Time" view (year=0) - show last 12 months
-        if year == 0:
-            current_year = datetime.now().year
-            for m in range(1, 13):
-                facturado = Invoice.objects.filter(
-                    issue_date__year=current_year,
-                    issue_date__month=m
-                ).exclude(status='cancelled').aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-                cobrado = Invoice.objects.filter(
-                    issue_date__year=current_year,
-                    issue_date__month=m
-                ).exclude(status='cancelled').aggregate(
-                    total_paid=CoalesceFunc(
-                        Sum('total_amount') - Sum('balance'),
-                        Value(0),
-                        output_field=DecimalField()
-                    )
-                )['total_paid'] or 0
-
-                pendiente = Invoice.objects.filter(
-                    issue_date__year=current_year,
-                    issue_date__month=m
-                ).exclude(status='cancelled').aggregate(
-                    Sum('balance')
-                )['balance__sum'] or 0
-
-                month_name = datetime(current_year, m, 1).strftime('%b')
-                cash_flow.append({
-                    'month': month_name,
-                    'facturado': float(facturado),
-                    'cobrado': float(cobrado),
-                    'pendiente': float(pendiente)
-                })
-        elif is_annual_view:
-            # Generate for each month of the year
-            for m in range(1, 13):
-                # Facturado: Total de Facturas Emitidas (Invoice)
-                facturado = Invoice.objects.filter(
-                    issue_date__year=year,
-                    issue_date__month=m
-                ).exclude(status='cancelled').aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-                # Cobrado: Total de pagos recibidos en facturas del mes
-                cobrado = Invoice.objects.filter(
-                    issue_date__year=year,
-                    issue_date__month=m
-                ).exclude(status='cancelled').aggregate(
-                    total_paid=CoalesceFunc(
-                        Sum('total_amount') - Sum('balance'),
-                        Value(0),
-                        output_field=DecimalField()
-                    )
-                )['total_paid'] or 0
-
-                # Pendiente: Balance de facturas emitidas en el mes
-                pendiente = Invoice.objects.filter(
-                    issue_date__year=year,
-                    issue_date__month=m
-                ).exclude(status='cancelled').aggregate(
-                    Sum('balance')
-                )['balance__sum'] or 0
-
-                month_name = datetime(year, m, 1).strftime('%b')
-                cash_flow.append({
-                    'month': month_name,
-                    'facturado': float(facturado),
-                    'cobrado': float(cobrado),
-                    'pendiente': float(pendiente)
-                })
-        else:
-            # Single month view - just return the current month
-            facturado = Invoice.objects.filter(
-                issue_date__year=year,
-                issue_date__month=month
-            ).exclude(status='cancelled').aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-            cobrado = Invoice.objects.filter(
-                issue_date__year=year,
-                issue_date__month=month
-            ).exclude(status='cancelled').aggregate(
-                total_paid=CoalesceFunc(
-                    Sum('total_amount') - Sum('balance'),
-                    Value(0),
-                    output_field=DecimalField()
-                )
-            )['total_paid'] or 0
-
-            pendiente = Invoice.objects.filter(
-                issue_date__year=year,
-                issue_date__month=month
-            ).exclude(status='cancelled').aggregate(
-                Sum('balance')
-            )['balance__sum'] or 0
-
-            month_name = datetime(year, month, 1).strftime('%B')
+        for year, month in periods:
+            totals = kpis_by_period[(year, month)].totals
+            # Facturado: Total de Facturas Emitidas (Invoice)
+            facturado = totals['billed_amount']
+            # Pendiente: Balance de facturas emitidas en el mes
+            pendiente = totals['pending_amount']
             cash_flow.append({
-                'month': month_name,
+                'month': datetime(year, month, 1).strftime(month_format),
                 'facturado': float(facturado),
-                'cobrado': float(cobrado),
+                # Cobrado: Total de pagos recibidos en facturas del mes
+                'cobrado': float(facturado - pendiente),
                 'pendiente': float(pendiente)
             })
-
         return cash_flow
 
-    def _generate_revenue_composition(self, year, month, is_annual_view=False):
+    def _generate_revenue_composition(self, kpis):
         """
         Generate revenue composition: 
         1. Servicios Propios (Margen 100%)
@@ -220,37 +86,13 @@ class DashboardView(APIView):
         
         Based on Total Invoiced Amount (Revenue).
         """
-        # Handle "All Time" view (year=0)
-        if year == 0:
-            invoice_qs = Invoice.objects.exclude(status='cancelled')
-        elif is_annual_view:
-            invoice_qs = Invoice.objects.filter(
-                issue_date__year=year
-            ).exclude(status='cancelled')
-        else:
-            invoice_qs = Invoice.objects.filter(
-                issue_date__year=year,
-                issue_date__month=month
-            ).exclude(status='cancelled')
-
-        # 0. Calculate Totals from Invoices (Source of Truth)
-        totals = invoice_qs.aggregate(
-            total_revenue=Sum('total_amount'),
-            total_third_party=Sum('total_third_party')
-        )
-        
-        total_revenue = float(totals['total_revenue'] or 0)
-        gastos_terceros = float(totals['total_third_party'] or 0)
-        
-        # 1. Calculate Revenue from Charges (Services) that are Third Party
-        # These are services outsourced (e.g. Fletes) but billed as Services
-        charges_tercerizados = OrderCharge.objects.filter(
-            invoice__in=invoice_qs,
-            is_deleted=False,
-            is_third_party_service=True
-        ).aggregate(total=Sum('total'))['total'] or 0
+        # 0. Totals from Invoices (Source of Truth)
+        total_revenue = float(kpis.totals['billed_amount'])
+        gastos_terceros = float(kpis.totals['third_party_amount'])
 
-        servicios_tercerizados = float(charges_tercerizados)
+        # 1. Revenue from Charges (Services) that are Third Party
+        # These are services outsourced (e.g. Fletes) but billed as Services
+        servicios_tercerizados = float(kpis.totals['outsourced_services_amount'])
         
         # 2. Calculate Propios as Residual of Total Revenue
         # Formula: Total - Gastos (Transfers) - Outsourced Services
@@ -317,7 +159,15 @@ class DashboardView(APIView):
             return Response(self._generate_dashboard_data(reference_date, year))
     
     def _generate_dashboard_data(self, reference_date, year_override=None):
-        """Generate all dashboard metrics relative to reference_date"""
+        """
+        Generate all dashboard metrics relative to reference_date.
+
+        Las métricas del periodo salen de apps.dashboard.kpis: los meses
+        cerrados se leen de MonthlyKPISnapshot y sólo el mes en curso se
+        calcula sobre facturas, gastos y órdenes.
+        """
+        from apps.dashboard.kpis import PeriodKPIs, all_time_kpis, period_kpis
+
         current_month = reference_date.month
         current_year = year_override if year_override is not None else reference_date.year
         real_today = datetime.now()
@@ -325,243 +175,98 @@ class DashboardView(APIView):
         monthly_breakdown = []
         is_all_time_view = (current_year == 0)
         is_annual_view = (self.request.query_params.get('month') == '0') if hasattr(self, 'request') else False
-        
-        # Initialize variables to avoid UnboundLocalError
-        total_os_prev_month = 0
-        billed_amount_prev = 0
-        operating_costs_prev = 0
-        
-        # Override if passed from get() method context logic
-        if current_month == 1 and hasattr(self, 'request') and self.request.query_params.get('month') == '0':
-             pass
 
         if is_all_time_view:
             # === ALL TIME VIEW LOGIC ===
-            # Operational Counts
-            total_os_month = ServiceOrder.objects.count()
-
-            # INGRESOS: Invoice-based (All Time)
-            billed_amount = Invoice.objects.exclude(status='cancelled').aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-            operating_costs = Transfer.objects.filter(
-                transfer_type__in=['costos', 'propios']
-            ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-            admin_costs = Transfer.objects.filter(
-                transfer_type='admin'
-            ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-            # No trend comparison for All Time (or compare to last year?)
-            # For simplicity, set trends to 0 or compare to nothing
-            billed_amount_prev = 0
-            operating_costs_prev = 0
-            
-            # Generate breakdown by Year instead of Month? Or just last 12 months?
-            # Let's show last 12 months for utility
-            for m in range(1, 13):
-                # Using current year for graph to show something relevant
-                # Or maybe show aggregated by year? 
-                # Let's stick to current year's monthly breakdown for the graph even in all time view
-                # as showing "All Time by Month" is impossible (too many months).
-                m_billed = Invoice.objects.filter(
-                    issue_date__year=real_today.year,
-                    issue_date__month=m
-                ).exclude(status='cancelled').aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-                m_costs = Transfer.objects.filter(
-                    transfer_type__in=['costos', 'propios', 'admin'],
-                    transaction_date__year=real_today.year,
-                    transaction_date__month=m
-                ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-                m_os = ServiceOrder.objects.filter(
-                    created_at__year=real_today.year,
-                    created_at__month=m
-                ).count()
-
-                month_name = datetime(real_today.year, m, 1).strftime('%b').capitalize()
-
-                if m_billed > 0 or m_costs > 0 or m_os > 0:
-                    monthly_breakdown.append({
-                        'name': month_name,
-                        'month': m,
-                        'ingresos': float(m_billed),
-                        'gastos': float(m_costs),
-                        'total_os': m_os
-                    })
-
-            os_abiertas_month = ServiceOrder.objects.exclude(status='cerrada').count()
-            os_cerradas_month = ServiceOrder.objects.filter(status='cerrada').count()
-            top_clients_qs = ServiceOrder.objects.all()
+            # Breakdown and cash flow show the current year's months
+            # (showing "All Time by Month" is impossible: too many months)
+            breakdown_periods = [(real_today.year, m) for m in range(1, 13)]
+            kpis_by_period = period_kpis(breakdown_periods)
+            kpis = all_time_kpis()
+            # No trend comparison for All Time
+            previous = PeriodKPIs()
+            cash_flow_periods, cash_flow_format = breakdown_periods, '%b'
 
         elif is_annual_view:
             # === ANNUAL VIEW LOGIC ===
-            orders_qs = ServiceOrder.objects.filter(created_at__year=current_year)
-            total_os_month = orders_qs.count()
-
-            # FACTURACIÓN EMITIDA (Financial): Sum of Invoice.total_amount
-            # Uses issue_date for financial reporting consistency with CXC
-            billed_amount = Invoice.objects.filter(
-                issue_date__year=current_year
-            ).exclude(status='cancelled').aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-            operating_costs = Transfer.objects.filter(
-                transfer_type__in=['costos', 'propios'],
-                transaction_date__year=current_year
-            ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-            admin_costs = Transfer.objects.filter(
-                transfer_type='admin',
-                transaction_date__year=current_year
-            ).aggregate(Sum('amount'))['amount__sum'] or 0
-
+            breakdown_periods = [(current_year, m) for m in range(1, 13)]
             # Previous Year Totals (for Trend)
-            prev_year = current_year - 1
-            total_os_prev_month = ServiceOrder.objects.filter(created_at__year=prev_year).count()
-            
-            # Facturación del año anterior
-            billed_amount_prev = Invoice.objects.filter(
-                issue_date__year=prev_year
-            ).exclude(status='cancelled').aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-            operating_costs_prev = Transfer.objects.filter(
-                transfer_type__in=['costos', 'propios'],
-                transaction_date__year=prev_year
-            ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-            # Generate 12-month breakdown for Charts
-            for m in range(1, 13):
-                # Ingresos: Facturación Emitida (Invoices by issue_date)
-                m_billed = Invoice.objects.filter(
-                    issue_date__year=current_year,
-                    issue_date__month=m
-                ).exclude(status='cancelled').aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-                m_costs = Transfer.objects.filter(
-                    transfer_type__in=['costos', 'propios', 'admin'],
-                    transaction_date__year=current_year,
-                    transaction_date__month=m
-                ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-                m_os = ServiceOrder.objects.filter(
-                    created_at__year=current_year,
-                    created_at__month=m
-                ).count()
-
-                month_name = datetime(current_year, m, 1).strftime('%b').capitalize()
-
-                if m_billed > 0 or m_costs > 0 or m_os > 0:
-                    monthly_breakdown.append({
-                        'name': month_name,
-                        'month': m,
-                        'ingresos': float(m_billed),
-                        'gastos': float(m_costs),
-                        'total_os': m_os
-                    })
-            
-            os_abiertas_month = ServiceOrder.objects.filter(
-                created_at__year=current_year
-            ).exclude(status='cerrada').count()
-            os_cerradas_month = ServiceOrder.objects.filter(created_at__year=current_year, status='cerrada').count()
-            top_clients_qs = ServiceOrder.objects.filter(created_at__year=current_year)
+            previous_periods = [(current_year - 1, m) for m in range(1, 13)]
+            kpis_by_period = period_kpis(breakdown_periods + previous_periods)
+            kpis = PeriodKPIs.merge(kpis_by_period[period] for period in breakdown_periods)
+            previous = PeriodKPIs.merge(kpis_by_period[period] for period in previous_periods)
+            cash_flow_periods, cash_flow_format = breakdown_periods, '%b'
 
         else:
-            # === MONTHLY VIEW LOGIC (Existing) ===
+            # === MONTHLY VIEW LOGIC ===
             previous_month_date = reference_date - relativedelta(months=1)
-            prev_month = previous_month_date.month
-            prev_year = previous_month_date.year
-
-            total_os_month = ServiceOrder.objects.filter(
-                created_at__year=current_year,
-                created_at__month=current_month
-            ).count()
-
-            total_os_prev_month = ServiceOrder.objects.filter(
-                created_at__year=prev_year,
-                created_at__month=prev_month
-            ).count()
-
-            # FACTURACIÓN EMITIDA (Financial): Sum of Invoice.total_amount
-            # Uses issue_date for financial reporting consistency with CXC
-            billed_amount = Invoice.objects.filter(
-                issue_date__year=current_year,
-                issue_date__month=current_month
-            ).exclude(status='cancelled').aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-            # Prev Month Facturación
-            billed_amount_prev = Invoice.objects.filter(
-                issue_date__year=prev_year,
-                issue_date__month=prev_month
-            ).exclude(status='cancelled').aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-            operating_costs = Transfer.objects.filter(
-                transfer_type__in=['costos', 'propios'],
-                transaction_date__year=current_year,
-                transaction_date__month=current_month
-            ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-            operating_costs_prev = Transfer.objects.filter(
-                transfer_type__in=['costos', 'propios'],
-                transaction_date__year=prev_year,
-                transaction_date__month=prev_month
-            ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-            admin_costs = Transfer.objects.filter(
-                transfer_type='admin',
-                transaction_date__year=current_year,
-                transaction_date__month=current_month
-            ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-            os_abiertas_month = ServiceOrder.objects.filter(
-                created_at__year=current_year,
-                created_at__month=current_month
-            ).exclude(status='cerrada').count()
-
-            os_cerradas_month = ServiceOrder.objects.filter(
-                created_at__year=current_year,
-                created_at__month=current_month,
-                status='cerrada'
-            ).count()
-
-            top_clients_qs = ServiceOrder.objects.filter(
-                created_at__year=current_year,
-                created_at__month=current_month
-            )
+            period = (current_year, current_month)
+            previous_period = (previous_month_date.year, previous_month_date.month)
+            kpis_by_period = period_kpis([period, previous_period])
+            kpis = kpis_by_period[period]
+            previous = kpis_by_period[previous_period]
+            breakdown_periods = []
+            cash_flow_periods, cash_flow_format = [period], '%B'
+
+        totals = kpis.totals
+        # Operational Counts (orders created in the period)
+        total_os_month = totals['total_orders']
+        os_abiertas_month = totals['open_orders']
+        os_cerradas_month = totals['closed_orders']
+        # FACTURACIÓN EMITIDA (Financial): Sum of Invoice.total_amount by issue_date
+        billed_amount = totals['billed_amount']
+        operating_costs = totals['operating_costs']
+        admin_costs = totals['admin_costs']
+
+        total_os_prev_month = previous.totals['total_orders']
+        billed_amount_prev = previous.totals['billed_amount']
+        operating_costs_prev = previous.totals['operating_costs']
+
+        # Generate 12-month breakdown for Charts
+        for year, m in breakdown_periods:
+            month_totals = kpis_by_period[(year, m)].totals
+            m_billed = month_totals['billed_amount']
+            m_costs = month_totals['operating_costs'] + month_totals['admin_costs']
+            m_os = month_totals['total_orders']
+
+            month_name = datetime(year, m, 1).strftime('%b').capitalize()
+
+            if m_billed > 0 or m_costs > 0 or m_os > 0:
+                monthly_breakdown.append({
+                    'name': month_name,
+                    'month': m,
+                    'ingresos': float(m_billed),
+                    'gastos': float(m_costs),
+                    'total_os': m_os
+                })
 
-        # Common logic (Trends, Top Clients aggregation, etc.)
-        
         # Top 5 clientes - Calcular desde OrderCharge (servicios) como fuente primaria
         # Si no hay servicios, usar facturas como fallback
         # Esto muestra el valor real de los servicios prestados, facturados o no
-        from django.db.models import OuterRef, Subquery, DecimalField as DField
-        from django.db.models.functions import Coalesce as CoalesceFunc
-        
-        top_clients = top_clients_qs.values(
-            'client__id',
-            'client__name'
-        ).annotate(
-            total_orders=Count('id'),
-            # Calcular total de servicios (charges) como métrica principal
-            total_services=CoalesceFunc(
-                Sum('charges__total', filter=Q(charges__is_deleted=False)),
-                Value(0),
-                output_field=DField()
+        ranked_clients = sorted(
+            (
+                (
+                    client_id,
+                    values['total_orders'],
+                    values['orders_services_amount'] if values['orders_charges_count'] else values['orders_invoiced_amount'],
+                )
+                for client_id, values in kpis.clients.items()
+                if values['total_orders']
             ),
-            # Facturado como métrica secundaria
-            total_invoiced=CoalesceFunc(
-                Sum('invoices__total_amount', filter=~Q(invoices__status='cancelled')),
-                Value(0),
-                output_field=DField()
-            )
-        ).annotate(
-            # Usar el mayor entre servicios e facturado para el ranking
-            total_amount=CoalesceFunc(
-                Sum('charges__total', filter=Q(charges__is_deleted=False)),
-                Sum('invoices__total_amount', filter=~Q(invoices__status='cancelled')),
-                Value(0),
-                output_field=DField()
-            )
-        ).order_by('-total_amount')[:5]
+            key=lambda item: item[2],
+            reverse=True,
+        )[:5]
+
+        client_names = self._client_names(set(kpis.clients))
+        top_clients = [
+            {
+                'client__id': client_id,
+                'client__name': client_names.get(client_id),
+                'total_orders': total_orders,
+                'total_amount': total_amount,
+            }
+            for client_id, total_orders, total_amount in ranked_clients
+        ]
 
         # Calcular tendencias (% cambio)
         os_trend = 0
@@ -724,31 +429,19 @@ class DashboardView(APIView):
         ]
 
         # Generate client financial breakdown for comparative table
-        client_breakdown = self._generate_client_breakdown(current_year, current_month, is_annual_view)
+        client_breakdown = self._generate_client_breakdown(kpis, client_names)
 
         # Generate cash flow data (facturado vs cobrado vs pendiente)
-        cash_flow_data = self._generate_cash_flow_data(current_year, current_month, is_annual_view)
+        cash_flow_data = self._generate_cash_flow_data(cash_flow_periods, kpis_by_period, cash_flow_format)
 
         # Generate revenue composition (servicios propios vs tercerizados)
-        revenue_composition = self._generate_revenue_composition(current_year, current_month, is_annual_view)
+        revenue_composition = self._generate_revenue_composition(kpis)
 
         # Calculate profitability metrics
-        # 1. Get the Invoices for the period (same filter as billed_amount)
-        if is_all_time_view:
-            period_invoices = Invoice.objects.exclude(status='cancelled')
-        elif is_annual_view:
-            period_invoices = Invoice.objects.filter(issue_date__year=current_year).exclude(status='cancelled')
-        else:
-            period_invoices = Invoice.objects.filter(issue_date__year=current_year, issue_date__month=current_month).exclude(status='cancelled')
-
-        # 2. Calculate the COST of the billed expenses (Préstamos) included in those invoices
-        # These are Transfers (cargos/terceros) linked to the invoices.
-        # We sum 'amount' (the cost we paid to provider), NOT the billed amount (revenue).
-        billed_expenses_cost = Transfer.objects.filter(
-            invoice__in=period_invoices,
-            transfer_type__in=['cargos', 'terceros'],
-            is_deleted=False
-        ).aggregate(Sum('amount'))['amount__sum'] or 0
+        # COST of the billed expenses (Préstamos) included in the period's invoices:
+        # Transfers (cargos/terceros) linked to them. We sum 'amount' (the cost we
+        # paid to provider), NOT the billed amount (revenue).
+        billed_expenses_cost = totals['billed_expenses_cost']
 
         total_facturacion = float(billed_amount)
         # Total Costs = Operating (Overhead) + Admin + Direct Cost of Billed Expenses
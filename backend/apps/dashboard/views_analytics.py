@@ -0,0 +1,116 @@
+import tempfile
+from datetime import date, datetime
+
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.core.db_routing import ReplicaReadMixin
+from apps.users.permissions import IsOperativo2OrAdmin
+
+from .analytics import REPORTS, AnalyticsError, build_reports, export_reports, to_records
+from .ledger_snapshot import ENTITIES, LedgerSnapshotError, parse_period, select_rows, write_stream
+
+EXPORT_CONTENT_TYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def _parse_date(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: 'Formato de fecha inválido (YYYY-MM-DD)'})
+
+
+class AnalyticsView(ReplicaReadMixin, APIView):
+    """
+    Reportes de margen (por cliente, servicio y mes) y DSO
+    (ver apps/dashboard/analytics.py).
+
+    Query params:
+        start, end: periodo (YYYY-MM-DD); por defecto los últimos 365 días.
+        export: ``xlsx`` o ``parquet`` para descargar el reporte como archivo.
+    """
+    permission_classes = [IsOperativo2OrAdmin]
+
+    def get(self, request, report):
+        if report not in REPORTS:
+            raise NotFound(f'Reporte desconocido: {report}')
+
+        export_format = request.query_params.get('export')
+        try:
+            start, end, frames = build_reports(
+                (report,), _parse_date(request, 'start'), _parse_date(request, 'end'),
+            )
+            if export_format:
+                content = export_reports(frames, export_format)
+        except AnalyticsError as e:
+            raise ValidationError({'error': str(e)})
+
+        if export_format:
+            response = HttpResponse(content, content_type=EXPORT_CONTENT_TYPES[export_format])
+            response['Content-Disposition'] = (
+                f'attachment; filename=GPRO_{report}_{start:%Y%m%d}_{end:%Y%m%d}.{export_format}'
+            )
+            return response
+
+        return Response({
+            'report': report,
+            'start': start,
+            'end': end,
+            'rows': to_records(frames[report]),
+        })
+
+
+class LedgerSnapshotView(ReplicaReadMixin, APIView):
+    """
+    Descarga una entidad del libro como Parquet comprimido
+    (ver apps/dashboard/ledger_snapshot.py).
+
+    Query params:
+        period: mes ``YYYY-MM``; por defecto todos.
+        since: fecha/hora ISO; solo filas con ``updated_at`` posterior.
+    """
+    permission_classes = [IsOperativo2OrAdmin]
+
+    def get(self, request, entity):
+        if entity not in ENTITIES:
+            raise NotFound(f'Entidad desconocida: {entity}')
+
+        since = request.query_params.get('since')
+        if since:
+            try:
+                since = datetime.fromisoformat(since)
+            except ValueError:
+                raise ValidationError({'since': 'Formato de fecha/hora inválido (ISO 8601)'})
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+        period = request.query_params.get('period')
+
+        # Se escribe a un archivo temporal (no a memoria) y se envía por bloques;
+        # FileResponse lo cierra al terminar y el sistema lo borra
+        output = tempfile.TemporaryFile()
+        try:
+            rows = select_rows(ENTITIES[entity], period=parse_period(period) if period else None, since=since)
+            write_stream(ENTITIES[entity], rows, output)
+        except LedgerSnapshotError as e:
+            output.close()
+            raise ValidationError({'error': str(e)})
+        except Exception:
+            output.close()
+            raise
+        output.seek(0)
+
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=f'GPRO_{entity}_{period or "all"}.parquet',
+            content_type=EXPORT_CONTENT_TYPES['parquet'],
+        )
@@ -0,0 +1,184 @@
+"""
+Retención y archivo del historial de órdenes y facturas.
+
+``OrderHistory`` e ``InvoiceEditHistory`` reciben una fila por evento y nunca
+se depuraban. Los eventos más antiguos que ``HISTORY_RETENTION_DAYS`` se mueven
+a ``OrderHistoryArchive`` / ``InvoiceEditHistoryArchive`` con
+``clean_orphan_history --archive``, de modo que la tabla viva (la que consulta
+la pestaña de historial) sólo contiene eventos recientes.
+
+Al archivar OrderHistory se compactan las rachas de eventos consecutivos
+idénticos de una OS (mismo tipo, descripción, usuario y metadatos) en una sola
+fila con ``occurrences`` y ``last_occurred_at``. Los metadatos se guardan sin
+claves vacías.
+
+El movimiento se hace por lotes de ``batch_size`` filas, cada uno en su propia
+transacción (``bulk_create`` en el archivo + ``delete`` de los originales), así
+que el proceso puede interrumpirse y retomarse sin duplicar eventos.
+
+Nota: se usa una tabla de archivo en lugar de particionar por rango (Postgres)
+porque el proyecto también corre sobre SQLite en desarrollo y pruebas.
+"""
+
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    InvoiceEditHistory,
+    InvoiceEditHistoryArchive,
+    OrderHistory,
+    OrderHistoryArchive,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def retention_cutoff(days=None):
+    """Fecha límite: los eventos anteriores a ella se archivan."""
+    if days is None:
+        days = settings.HISTORY_RETENTION_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def compact_metadata(metadata):
+    """Quita claves sin valor (None, '', [], {}); un dict vacío queda en None."""
+    if not isinstance(metadata, dict):
+        return metadata
+    compacted = {
+        key: value for key, value in metadata.items()
+        if value not in (None, '', [], {})
+    }
+    return compacted or None
+
+
+def _event_key(event):
+    """Clave que identifica eventos repetidos dentro de una racha."""
+    return (
+        event.service_order_id,
+        event.event_type,
+        event.description,
+        event.user_id,
+        json.dumps(compact_metadata(event.metadata), sort_keys=True, default=str),
+    )
+
+
+def _next_batch(queryset, owner_field, last, batch_size):
+    """
+    Siguiente lote ordenado por (dueño, created_at, id), a partir de la última
+    fila procesada. Paginación por clave: no depende de que los originales ya
+    se hayan borrado (necesario para --dry-run).
+    """
+    if last is not None:
+        owner_id, created_at, pk = last
+        queryset = queryset.filter(
+            Q(**{f'{owner_field}__gt': owner_id})
+            | Q(**{owner_field: owner_id, 'created_at__gt': created_at})
+            | Q(**{owner_field: owner_id, 'created_at': created_at, 'id__gt': pk})
+        )
+    return list(queryset.order_by(owner_field, 'created_at', 'id')[:batch_size])
+
+
+def archive_order_history(cutoff, batch_size=1000, dry_run=False):
+    """
+    Mueve al archivo los eventos de OrderHistory anteriores a ``cutoff``.
+
+    Returns:
+        dict con ``moved`` (eventos originales) y ``archived`` (filas creadas
+        en el archivo tras compactar).
+    """
+    base = OrderHistory.objects.filter(created_at__lt=cutoff)
+    moved = archived = 0
+    last = None
+    # Última fila archivada: si la racha continúa en el lote siguiente se
+    # actualiza en lugar de crear otra.
+    open_run = None
+
+    while True:
+        batch = _next_batch(base, 'service_order_id', last, batch_size)
+        if not batch:
+            break
+        last_event = batch[-1]
+        last = (last_event.service_order_id, last_event.created_at, last_event.id)
+
+        new_rows = []
+        extended = None
+        for event in batch:
+            key = _event_key(event)
+            current = new_rows[-1] if new_rows else open_run
+            if current is not None and current[0] == key:
+                current[1].occurrences += 1
+                current[1].last_occurred_at = event.created_at
+                if current is open_run:
+                    extended = open_run[1]
+                continue
+            new_rows.append((key, OrderHistoryArchive(
+                original_id=event.id,
+                service_order_id=event.service_order_id,
+                event_type=event.event_type,
+                description=event.description,
+                user_id=event.user_id,
+                created_at=event.created_at,
+                last_occurred_at=event.created_at,
+                occurrences=1,
+                metadata=compact_metadata(event.metadata),
+            )))
+
+        moved += len(batch)
+        archived += len(new_rows)
+        if new_rows:
+            open_run = new_rows[-1]
+
+        if dry_run:
+            continue
+
+        with transaction.atomic():
+            if extended is not None and extended.pk:
+                extended.save(update_fields=['occurrences', 'last_occurred_at'])
+            OrderHistoryArchive.objects.bulk_create([row for _, row in new_rows])
+            OrderHistory.objects.filter(id__in=[event.id for event in batch]).delete()
+
+        logger.info(f"Archived {len(batch)} OrderHistory events into {len(new_rows)} rows")
+
+    return {'moved': moved, 'archived': archived}
+
+
+def archive_invoice_edit_history(cutoff, batch_size=1000, dry_run=False):
+    """Mueve al archivo las ediciones de facturas anteriores a ``cutoff`` (sin compactar)."""
+    base = InvoiceEditHistory.objects.filter(created_at__lt=cutoff)
+    moved = 0
+    last = None
+
+    while True:
+        batch = _next_batch(base, 'invoice_id', last, batch_size)
+        if not batch:
+            break
+        last_edit = batch[-1]
+        last = (last_edit.invoice_id, last_edit.created_at, last_edit.id)
+        moved += len(batch)
+
+        if dry_run:
+            continue
+
+        with transaction.atomic():
+            InvoiceEditHistoryArchive.objects.bulk_create([
+                InvoiceEditHistoryArchive(
+                    original_id=edit.id,
+                    invoice_id=edit.invoice_id,
+                    edit_type=edit.edit_type,
+                    description=edit.description,
+                    previous_values=edit.previous_values,
+                    new_values=edit.new_values,
+                    user_id=edit.user_id,
+                    created_at=edit.created_at,
+                )
+                for edit in batch
+            ])
+            InvoiceEditHistory.objects.filter(id__in=[edit.id for edit in batch]).delete()
+
+    return {'moved': moved, 'archived': moved}
@@ -0,0 +1,146 @@
+"""
+Armado de pre-facturas a partir de los cargos y gastos de una OS.
+
+Al crear una factura se vinculan los servicios (OrderCharge) y gastos
+(Transfer) seleccionados. Antes esto se hacía dentro de
+InvoiceViewSet.perform_create: el serializer recalculaba totales sobre una
+factura aún vacía, los items se vinculaban con ``update()`` (que no dispara la
+señal de Transfer que sincroniza totales), se volvía a recalcular y el
+``save()`` de la OS dejaba otro evento en el historial. El historial de la OS
+registraba además el total enviado por el frontend, no el calculado.
+
+``assemble_invoice`` hace el armado completo con un número fijo de consultas,
+sin importar cuántos items se facturen:
+
+1. Valida en una consulta por tipo que los items existan, pertenezcan a la OS y
+   no estén facturados (si alguno no cumple, se rechaza la operación).
+2. Vincula cada tipo con un único ``update()``.
+3. Calcula los totales UNA vez a partir de los items ya leídos.
+4. Registra un único evento ``invoice_generated`` con los montos finales.
+"""
+
+import logging
+
+from django.utils import timezone
+
+from apps.core.history_writer import record
+
+from .models import OrderCharge, OrderHistory, ServiceOrder
+
+logger = logging.getLogger(__name__)
+
+
+def parse_item_ids(raw, label='item_id'):
+    """
+    Normaliza una lista de IDs recibida por JSON o FormData.
+
+    Acepta enteros, cadenas, cadenas separadas por comas y listas anidadas
+    (``[1, '2', '3,4', ['5']]``). Los valores inválidos se descartan con un
+    warning. Devuelve los IDs sin duplicados, en el orden recibido.
+    """
+    if raw is None:
+        return []
+    values = raw if isinstance(raw, (list, tuple)) else [raw]
+
+    ids = []
+    for value in values:
+        if isinstance(value, (list, tuple)):
+            ids.extend(parse_item_ids(value, label))
+            continue
+        if isinstance(value, int) and not isinstance(value, bool):
+            ids.append(value)
+            continue
+        if value is None or not str(value).strip():
+            continue
+        for part in str(value).split(','):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                ids.append(int(part))
+            except ValueError:
+                logger.warning(f"Invalid {label}: {part}")
+
+    return list(dict.fromkeys(ids))
+
+
+def _claim_items(model, ids, service_order, label):
+    """
+    Items facturables de la OS (una consulta). Lanza ValueError si algún ID no
+    existe, es de otra OS o ya está vinculado a una factura.
+    """
+    if not ids:
+        return []
+
+    items = list(model.objects.filter(
+        id__in=ids,
+        service_order=service_order,
+        invoice__isnull=True,
+    ))
+    missing = sorted(set(ids) - {item.id for item in items})
+    if missing:
+        raise ValueError(
+            f"{label} no disponibles para facturar en la orden {service_order.order_number} "
+            f"(no existen, pertenecen a otra orden o ya están facturados): "
+            f"{', '.join(f'#{item_id}' for item_id in missing)}"
+        )
+    return items
+
+
+def assemble_invoice(invoice, service_order, charge_ids=(), transfer_ids=(), user=None):
+    """
+    Vincula cargos y gastos a ``invoice``, calcula sus totales y registra el
+    evento de historial. Debe ejecutarse dentro de la transacción que creó la
+    factura (y con la OS bloqueada), para que un error no deje items a medias.
+
+    Returns:
+        dict con las cantidades vinculadas: ``{'charges': n, 'transfers': n}``
+    """
+    from apps.transfers.models import Transfer
+
+    charges = _claim_items(OrderCharge, charge_ids, service_order, 'Servicios')
+    transfers = _claim_items(Transfer, transfer_ids, service_order, 'Gastos')
+
+    for model, items in ((OrderCharge, charges), (Transfer, transfers)):
+        if not items:
+            continue
+        model.objects.filter(id__in=[item.id for item in items]).update(
+            invoice=invoice,
+            billing_status='facturado',
+        )
+        for item in items:
+            item.invoice = invoice
+            item.billing_status = 'facturado'
+
+    invoice.calculate_totals(charges=charges, transfers=transfers)
+
+    # Marcar la OS como facturada (inicio de facturación). Con update() para
+    # no registrar un evento "OS actualizada" aparte del de la factura.
+    ServiceOrder.objects.filter(pk=service_order.pk).update(
+        facturado=True,
+        updated_at=timezone.now(),
+    )
+    service_order.facturado = True
+
+    record(
+        OrderHistory,
+        service_order=service_order,
+        user=user or invoice.created_by,
+        event_type='invoice_generated',
+        description=f'Factura generada: {invoice.invoice_number} - Total: ${invoice.total_amount}',
+        metadata={
+            'invoice_id': invoice.id,
+            'invoice_number': invoice.invoice_number,
+            'invoice_type': invoice.invoice_type,
+            'total_amount': float(invoice.total_amount),
+            'total_services': float(invoice.total_services),
+            'total_third_party': float(invoice.total_third_party),
+            'charge_ids': [charge.id for charge in charges],
+            'transfer_ids': [transfer.id for transfer in transfers],
+        }
+    )
+
+    logger.info(
+        f"Invoice {invoice.id} assembled with {len(charges)} charges and {len(transfers)} transfers"
+    )
+    return {'charges': len(charges), 'transfers': len(transfers)}
@@ -0,0 +1,131 @@
+"""
+Tareas de mantenimiento por lotes sobre facturas (ver apps/core/maintenance.py).
+
+- ``InvoiceTotalsTask`` (``recalculate_totals``): los mismos totales que
+  ``Invoice.calculate_totals()`` + ``save()``, leyendo cargos y gastos de todo
+  el lote con dos consultas.
+- ``RetentionBalanceTask`` (``fix_retention_balances``): saldo
+  ``total - pagado - acreditado`` de las facturas con retención.
+"""
+
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import F, Q, Sum
+
+from apps.core.maintenance import MaintenanceTask
+
+from .models import Invoice, OrderCharge
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+
+def _stored(value):
+    """Valor como lo guarda el DecimalField (2 decimales, redondeo de Decimal)."""
+    return value.quantize(CENT)
+
+
+def _refresh_derived(invoices):
+    """Alertas y KPIs de las facturas escritas con ``bulk_update``."""
+    from apps.dashboard.alerts import SOURCE_INVOICE, schedule_refresh
+    from apps.dashboard.kpis import schedule_rebuild
+
+    for invoice in invoices:
+        schedule_refresh(SOURCE_INVOICE, invoice.pk)
+    schedule_rebuild(invoice_ids=[invoice.pk for invoice in invoices])
+
+
+class InvoiceTotalsTask(MaintenanceTask):
+    name = 'recalculate_totals'
+    label = 'Totales de facturas'
+    model = Invoice
+    fields = (
+        'subtotal_services', 'iva_services', 'total_services',
+        'subtotal_third_party', 'iva_third_party', 'total_third_party',
+        'subtotal_neto', 'iva_total', 'total_amount', 'retencion', 'balance', 'status',
+    )
+
+    def candidates(self):
+        return Invoice.objects.select_related('service_order__client')
+
+    def describe(self, obj):
+        return obj.invoice_number or f'#{obj.pk}'
+
+    def recompute(self, rows):
+        from apps.transfers.models import Transfer
+
+        ids = [invoice.pk for invoice in rows]
+        charges = {
+            row['invoice_id']: row
+            for row in OrderCharge.objects.filter(invoice_id__in=ids, is_deleted=False)
+            .values('invoice_id')
+            .annotate(
+                services_subtotal=Sum('subtotal'),
+                services_iva=Sum('iva_amount'),
+                services_gravado=Sum('subtotal', filter=Q(iva_type='gravado')),
+            )
+            .order_by()
+        }
+        expenses = defaultdict(lambda: [ZERO, ZERO])
+        for transfer in Transfer.objects.filter(invoice_id__in=ids, is_deleted=False):
+            expenses[transfer.invoice_id][0] += transfer.get_customer_base_price()
+            expenses[transfer.invoice_id][1] += transfer.get_customer_iva_amount()
+
+        for invoice in rows:
+            services = charges.get(invoice.pk, {})
+            subtotal_services = services.get('services_subtotal') or ZERO
+            iva_services = services.get('services_iva') or ZERO
+            subtotal_expenses, iva_expenses = expenses[invoice.pk]
+
+            invoice.subtotal_services = _stored(subtotal_services)
+            invoice.iva_services = _stored(iva_services)
+            invoice.total_services = _stored(subtotal_services + iva_services)
+            invoice.subtotal_third_party = _stored(subtotal_expenses)
+            invoice.iva_third_party = _stored(iva_expenses)
+            invoice.total_third_party = _stored(subtotal_expenses + iva_expenses)
+            subtotal_neto = subtotal_services + subtotal_expenses
+            iva_total = iva_services + iva_expenses
+            invoice.subtotal_neto = _stored(subtotal_neto)
+            invoice.iva_total = _stored(iva_total)
+            invoice.total_amount = (subtotal_neto + iva_total).quantize(CENT, rounding=ROUND_HALF_UP)
+
+            # Retención 1% sobre la base gravada de servicios (ver Invoice.save)
+            client = invoice.service_order.client
+            gravado = services.get('services_gravado') or ZERO
+            if invoice.invoice_type == 'DTE' and client.applies_retention(gravado):
+                invoice.retencion = client.calculate_retention(gravado).quantize(CENT, rounding=ROUND_HALF_UP)
+            else:
+                invoice.retencion = ZERO
+
+            invoice.apply_payment_state()
+
+    def after_update(self, rows):
+        _refresh_derived(rows)
+
+
+class RetentionBalanceTask(MaintenanceTask):
+    name = 'fix_retention_balances'
+    label = 'Balances de facturas con retención'
+    model = Invoice
+    fields = ('balance', 'status')
+
+    def candidates(self):
+        return Invoice.objects.filter(retencion__gt=ZERO).exclude(
+            balance=F('total_amount') - F('paid_amount') - F('credited_amount')
+        ).select_related('service_order__client')
+
+    def describe(self, obj):
+        client = obj.service_order.client.name[:23] if obj.service_order and obj.service_order.client else 'N/A'
+        return f'{obj.invoice_number} ({client})'
+
+    def recompute(self, rows):
+        for invoice in rows:
+            invoice.balance = invoice.total_amount - invoice.paid_amount - invoice.credited_amount
+            if invoice.balance <= 0:
+                invoice.status = 'paid'
+            elif invoice.paid_amount > 0 or invoice.credited_amount > 0:
+                invoice.status = 'partial'
+
+    def after_update(self, rows):
+        _refresh_derived(rows)
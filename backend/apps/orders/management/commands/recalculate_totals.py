@@ -1,25 +1,24 @@
-from django.core.management.base import BaseCommand
-from apps.orders.models import Invoice
-from django.db import transaction
+"""
+Django Management Command: Recalcular totales de facturas
 
-class Command(BaseCommand):
-    help = 'Recalculate totals for all invoices'
+Recalcula servicios, gastos a terceros, IVA, retención, saldo y estado de las
+facturas por lotes (apps/orders/maintenance.py): mismas reglas que
+``Invoice.calculate_totals()``, con consultas agregadas por lote y una
+transacción corta por lote.
+
+USO:
+    python manage.py recalculate_totals
+    python manage.py recalculate_totals --dry-run
+    python manage.py recalculate_totals --chunk-size 1000 --workers 4 --sleep 0.2
+    python manage.py recalculate_totals --resume
+"""
+
+from apps.core.management.maintenance import MaintenanceCommand
+from apps.orders.maintenance import InvoiceTotalsTask
 
-    def handle(self, *args, **options):
-        invoices = Invoice.objects.all()
-        count = invoices.count()
-        
-        self.stdout.write(f'Found {count} invoices. Starting recalculation...')
-        
-        updated = 0
-        for invoice in invoices:
-            try:
-                # Calculate totals using the model method which saves the instance
-                invoice.calculate_totals()
-                updated += 1
-                if updated % 100 == 0:
-                    self.stdout.write(f'Processed {updated}/{count} invoices...')
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'Error processing invoice {invoice.id}: {str(e)}'))
 
-        self.stdout.write(self.style.SUCCESS(f'Successfully recalculated totals for {updated} invoices.'))
+class Command(MaintenanceCommand):
+    help = 'Recalculate totals for all invoices'
+
+    def get_tasks(self, options):
+        return [InvoiceTotalsTask()]
@@ -0,0 +1,351 @@
+"""
+Django Management Command: Regenerar PDFs de facturas en lote
+
+Hasta ahora un PDF perdido en el storage (o desactualizado tras un cambio de
+plantilla) sólo se reparaba de forma perezosa cuando alguien abría la factura
+(ver InvoiceViewSet.retrieve / download_pdf). Este comando los reconstruye en
+lote:
+
+- El render (ReportLab, CPU) corre en un ProcessPoolExecutor.
+- Las subidas al storage (S3, red) corren en un ThreadPoolExecutor.
+- La base de datos sólo se toca desde el proceso principal, por lotes.
+- Al terminar cada lote se escribe un checkpoint con el último id procesado
+  y los ids que fallaron; con --resume se reintentan los fallidos y se
+  retoma desde el último lote confirmado.
+
+Por defecto sólo se reparan los PDFs que faltan en el storage. Con
+--regenerate también se vuelven a generar los PDFs existentes que creó el
+propio sistema (``Invoice_<número>.pdf``, ver InvoiceViewSet.download_pdf).
+Los archivos que subió el usuario (el DTE oficial en PDF/JPG/PNG) nunca se
+reemplazan ni se borran.
+
+USO:
+    # Ver qué se repararía (dry run):
+    python manage.py render_invoice_pdfs --dry-run
+
+    # Reparar los PDFs que faltan en el storage:
+    python manage.py render_invoice_pdfs
+
+    # Regenerar los PDFs del sistema de un periodo y cliente con 8 procesos:
+    python manage.py render_invoice_pdfs --regenerate --date-from 2026-01-01 --date-to 2026-03-31 --client 12 --workers 8
+
+    # Retomar una ejecución interrumpida:
+    python manage.py render_invoice_pdfs --resume
+
+Sólo se procesan facturas que ya tienen ``pdf_file`` asignado: generar un PDF
+para una pre-factura sin archivo la marcaría como DTE emitido (ver Invoice.save).
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+
+from apps.orders.models import Invoice
+
+# Prefijo de los PDFs que genera el sistema (ver InvoiceViewSet.download_pdf)
+GENERATED_PREFIX = 'Invoice_'
+
+
+def is_generated(name):
+    """El archivo lo generó el sistema (no es un original subido por el usuario)."""
+    return os.path.basename(name or '').startswith(GENERATED_PREFIX)
+
+
+def _init_worker():
+    """
+    Inicializa un proceso del pool.
+
+    Necesario cuando el método de arranque es ``spawn`` (macOS/Windows). Con
+    ``fork`` es inocuo; el padre cierra sus conexiones antes de crear el pool
+    para que los hijos no hereden sockets abiertos y cada uno abre la suya.
+    """
+    import django
+    django.setup()
+
+
+def _render_invoice(invoice_id):
+    """
+    Renderiza el PDF de una factura. Se ejecuta dentro del pool de procesos.
+
+    Returns:
+        tuple: (invoice_id, bytes del PDF o None, mensaje de error o None)
+    """
+    from apps.orders.pdf_generator import generate_invoice_pdf
+
+    try:
+        invoice = Invoice.objects.select_related(
+            'service_order__client', 'service_order__shipment_type'
+        ).get(pk=invoice_id)
+        return invoice_id, generate_invoice_pdf(invoice).getvalue(), None
+    except Exception as exc:
+        return invoice_id, None, str(exc)
+
+
+class Command(BaseCommand):
+    help = 'Regenera en lote los PDFs de facturas (render en paralelo, subidas concurrentes, reanudable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date-from',
+            type=str,
+            help='Fecha de emisión inicial (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--date-to',
+            type=str,
+            help='Fecha de emisión final (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--client',
+            type=int,
+            help='ID del cliente',
+        )
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Solo facturas cuyo PDF no existe físicamente en el storage (por defecto)',
+        )
+        parser.add_argument(
+            '--regenerate',
+            action='store_true',
+            help='También regenerar los PDFs existentes generados por el sistema; '
+                 'los archivos subidos por el usuario nunca se reemplazan',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 2,
+            help='Procesos para renderizar (0 = renderizar en el proceso actual)',
+        )
+        parser.add_argument(
+            '--upload-workers',
+            type=int,
+            default=8,
+            help='Hilos para verificar y subir archivos al storage',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Facturas por lote (también es la granularidad del checkpoint)',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            default=str(settings.BASE_DIR / 'logs' / 'render_invoice_pdfs.checkpoint.json'),
+            help='Archivo de checkpoint',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Retomar desde el último lote confirmado en el checkpoint y reintentar las facturas fallidas',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo listar cuántas facturas se procesarían',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 0 or options['upload_workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers >= 0, --upload-workers >= 1 y --batch-size >= 1')
+        if options['missing_only'] and options['regenerate']:
+            raise CommandError('--missing-only y --regenerate son excluyentes')
+
+        filters = {
+            'date_from': options.get('date_from'),
+            'date_to': options.get('date_to'),
+            'client': options.get('client'),
+            'missing_only': not options['regenerate'],
+        }
+        queryset = self.get_queryset(filters)
+
+        checkpoint_path = options['checkpoint']
+        state = {'filters': filters, 'last_id': 0, 'rendered': 0, 'skipped': 0, 'errors': 0, 'failed': []}
+        if options['resume']:
+            state = self.load_checkpoint(checkpoint_path, filters)
+            self.stdout.write(
+                f"Retomando desde la factura id > {state['last_id']} "
+                f"(reintentando {len(state['failed'])} fallida(s))"
+            )
+
+        # Los fallidos de la corrida anterior se reintentan; si vuelven a
+        # fallar quedan de nuevo en el checkpoint
+        failed = set(state['failed'])
+        invoice_ids = list(
+            queryset.filter(Q(pk__gt=state['last_id']) | Q(pk__in=failed))
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        total = len(invoice_ids)
+        self.stdout.write(f'Facturas en alcance: {total}')
+
+        if options['dry_run'] or total == 0:
+            return
+
+        storage = Invoice._meta.get_field('pdf_file').storage
+        started = time.monotonic()
+
+        render_pool = None
+        if options['workers'] > 0:
+            # Cerrar las conexiones antes de crear el pool para que los procesos
+            # hijos no hereden sockets abiertos.
+            connections.close_all()
+            render_pool = ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker)
+        io_pool = ThreadPoolExecutor(max_workers=options['upload_workers'])
+
+        try:
+            batch_size = options['batch_size']
+            for start in range(0, total, batch_size):
+                batch = invoice_ids[start:start + batch_size]
+                names = dict(
+                    Invoice.objects.filter(pk__in=batch).values_list('pk', 'pdf_file')
+                )
+
+                exists = dict(zip(batch, io_pool.map(lambda pk: storage.exists(names[pk]), batch)))
+                to_render = [
+                    pk for pk in batch
+                    if not exists[pk] or (not filters['missing_only'] and is_generated(names[pk]))
+                ]
+                state['skipped'] += len(batch) - len(to_render)
+
+                rendered, batch_failed = self.render_batch(to_render, names, storage, render_pool, io_pool)
+                state['rendered'] += rendered
+                failed.difference_update(batch)
+                failed.update(batch_failed)
+                state['failed'] = sorted(failed)
+                state['errors'] = len(failed)
+                state['last_id'] = max(state['last_id'], batch[-1])
+                self.save_checkpoint(checkpoint_path, state)
+
+                done = min(start + batch_size, total)
+                self.stdout.write(
+                    f"Procesadas {done}/{total} | regeneradas={state['rendered']} "
+                    f"omitidas={state['skipped']} errores={state['errors']}"
+                )
+        finally:
+            io_pool.shutdown(wait=True)
+            if render_pool is not None:
+                render_pool.shutdown(wait=True)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"PDFs regenerados: {state['rendered']} | Omitidos (existentes o subidos): {state['skipped']} | "
+            f"Errores: {state['errors']} | {elapsed:.1f}s"
+        ))
+
+    def get_queryset(self, filters):
+        queryset = Invoice.objects.exclude(pdf_file='').exclude(pdf_file__isnull=True)
+
+        try:
+            if filters['date_from']:
+                queryset = queryset.filter(
+                    issue_date__gte=datetime.strptime(filters['date_from'], '%Y-%m-%d').date()
+                )
+            if filters['date_to']:
+                queryset = queryset.filter(
+                    issue_date__lte=datetime.strptime(filters['date_to'], '%Y-%m-%d').date()
+                )
+        except ValueError:
+            raise CommandError('Las fechas deben tener formato YYYY-MM-DD')
+
+        if filters['client']:
+            queryset = queryset.filter(service_order__client_id=filters['client'])
+
+        return queryset
+
+    def render_batch(self, invoice_ids, names, storage, render_pool, io_pool):
+        """
+        Renderiza y sube un lote. Cada PDF se envía a subir en cuanto termina su
+        render, de modo que CPU y red se solapan. Devuelve (regeneradas, ids fallidos).
+        """
+        if not invoice_ids:
+            return 0, []
+
+        if render_pool is not None:
+            renders = (f.result() for f in as_completed(
+                [render_pool.submit(_render_invoice, pk) for pk in invoice_ids]
+            ))
+        else:
+            renders = (_render_invoice(pk) for pk in invoice_ids)
+
+        failed = []
+        uploads = []
+        for invoice_id, content, error in renders:
+            if error:
+                failed.append(invoice_id)
+                self.stderr.write(self.style.ERROR(f'  error render invoice_id={invoice_id}: {error}'))
+                continue
+            uploads.append(io_pool.submit(self.upload, storage, names[invoice_id], invoice_id, content))
+
+        rendered = 0
+        deletes = {}
+        for future in as_completed(uploads):
+            invoice_id, old_name, new_name, error = future.result()
+            if error:
+                failed.append(invoice_id)
+                self.stderr.write(self.style.ERROR(f'  error upload invoice_id={invoice_id}: {error}'))
+                continue
+
+            if new_name != old_name:
+                # update() en lugar de save(): el nombre es lo único que cambia y
+                # no debe volver a disparar Invoice.save() ni sus señales.
+                Invoice.objects.filter(pk=invoice_id).update(pdf_file=new_name)
+                # Sólo se borra la versión anterior generada por el sistema;
+                # un original subido por el usuario se conserva siempre.
+                if is_generated(old_name):
+                    deletes[io_pool.submit(storage.delete, old_name)] = (invoice_id, old_name)
+            rendered += 1
+
+        for future in as_completed(deletes):
+            invoice_id, old_name = deletes[future]
+            if future.exception() is not None:
+                self.stderr.write(self.style.WARNING(
+                    f'  no se pudo borrar el PDF anterior {old_name} '
+                    f'(invoice_id={invoice_id}): {future.exception()}'
+                ))
+
+        return rendered, failed
+
+    @staticmethod
+    def upload(storage, old_name, invoice_id, content):
+        """Sube el PDF reutilizando el nombre actual (o uno libre si aún existe)."""
+        try:
+            new_name = storage.save(old_name, ContentFile(content))
+            return invoice_id, old_name, new_name, None
+        except Exception as exc:
+            return invoice_id, old_name, None, str(exc)
+
+    @staticmethod
+    def load_checkpoint(path, filters):
+        try:
+            with open(path, encoding='utf-8') as fh:
+                state = json.load(fh)
+        except FileNotFoundError:
+            raise CommandError(f'No existe el checkpoint {path}; ejecute sin --resume')
+
+        if state.get('filters') != filters:
+            raise CommandError(
+                'El checkpoint se generó con otros filtros '
+                f"({state.get('filters')}); ejecute sin --resume para empezar de nuevo"
+            )
+        # Checkpoints anteriores a la lista de fallidos
+        state.setdefault('failed', [])
+        return state
+
+    @staticmethod
+    def save_checkpoint(path, state):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(state, fh)
+        os.replace(tmp_path, path)
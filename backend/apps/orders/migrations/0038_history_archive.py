@@ -0,0 +1,59 @@
+# Generated by Django 5.0.1 on 2026-10-19 12:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0037_orderdocument_unique_upload_path'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceEditHistoryArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(verbose_name='ID original')),
+                ('edit_type', models.CharField(choices=[('charge_added', 'Línea de Servicio Agregada'), ('charge_edited', 'Línea de Servicio Editada'), ('charge_removed', 'Línea de Servicio Removida'), ('expense_added', 'Gasto Agregado'), ('expense_edited', 'Gasto Editado'), ('expense_removed', 'Gasto Removido'), ('markup_changed', 'Margen de Utilidad Modificado'), ('iva_type_changed', 'Tipo de IVA Modificado'), ('iva_toggle_changed', 'Aplicación de IVA Modificada'), ('totals_recalculated', 'Totales Recalculados'), ('dte_marked', 'Marcada como DTE Emitido'), ('synced_from_os', 'Sincronizado desde OS'), ('synced_to_os', 'Sincronizado hacia OS')], max_length=30, verbose_name='Tipo de Edición')),
+                ('description', models.TextField(verbose_name='Descripción del Cambio')),
+                ('previous_values', models.JSONField(blank=True, null=True, verbose_name='Valores Anteriores')),
+                ('new_values', models.JSONField(blank=True, null=True, verbose_name='Valores Nuevos')),
+                ('created_at', models.DateTimeField(verbose_name='Fecha y Hora')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Archivado el')),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_edit_history', to='orders.invoice', verbose_name='Factura')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Historial de Edición de Factura (Archivo)',
+                'verbose_name_plural': 'Historial de Ediciones de Facturas (Archivo)',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['invoice', '-created_at'], name='orders_invo_invoice_72ccee_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderHistoryArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(verbose_name='ID original')),
+                ('event_type', models.CharField(choices=[('created', 'Orden Creada'), ('updated', 'Orden Actualizada'), ('status_changed', 'Cambio de Estado'), ('charge_added', 'Cobro Agregado'), ('charge_updated', 'Cobro Actualizado'), ('charge_deleted', 'Cobro Eliminado'), ('payment_added', 'Pago a Proveedor Agregado'), ('payment_updated', 'Pago a Proveedor Actualizado'), ('payment_approved', 'Pago a Proveedor Aprobado'), ('payment_paid', 'Pago a Proveedor Ejecutado'), ('payment_deleted', 'Pago a Proveedor Eliminado'), ('document_uploaded', 'Documento Subido'), ('document_deleted', 'Documento Eliminado'), ('invoice_generated', 'Factura Generada'), ('invoice_payment', 'Pago de Cliente Recibido'), ('invoice_payment_deleted', 'Pago de Cliente Eliminado'), ('invoice_voided', 'Factura Anulada'), ('credit_note_added', 'Nota de Crédito Aplicada'), ('closed', 'Orden Cerrada'), ('reopened', 'Orden Reabierta')], max_length=30, verbose_name='Tipo de Evento')),
+                ('description', models.TextField(verbose_name='Descripción')),
+                ('created_at', models.DateTimeField(verbose_name='Fecha y Hora')),
+                ('last_occurred_at', models.DateTimeField(verbose_name='Última ocurrencia')),
+                ('occurrences', models.PositiveIntegerField(default=1, verbose_name='Ocurrencias')),
+                ('metadata', models.JSONField(blank=True, null=True, verbose_name='Metadatos')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Archivado el')),
+                ('service_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_history', to='orders.serviceorder', verbose_name='Orden de Servicio')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Historial de Orden (Archivo)',
+                'verbose_name_plural': 'Historial de Ordenes (Archivo)',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['service_order', '-created_at'], name='orders_orde_service_57f0cc_idx')],
+            },
+        ),
+    ]
@@ -5,6 +5,7 @@ from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 import os
+import re
 import uuid
 from decimal import Decimal
 from apps.clients.models import Client
@@ -12,7 +13,7 @@ from apps.catalogs.models import SubClient, ShipmentType, Provider, Bank, Custom
 from apps.validators import validate_document_file
 from apps.core.models import SoftDeleteModel
 from apps.core.constants import IVA_RATE, RETENCION_RATE, RETENCION_THRESHOLD
-from apps.core.sequences import next_number
+from apps.core.sequences import next_number, observe_number, register_series
 
 
 def order_document_upload_path(instance, filename):
@@ -103,25 +104,13 @@ class ServiceOrder(SoftDeleteModel):
             # serie (DocumentSequence). Antes se hacía con
             # select_for_update() sobre todas las OS del año, lo que dejaba
             # bloqueadas esas filas hasta el commit de la petición completa.
-            def _current_max_order_number():
-                # El regex no acota la cantidad de dígitos: con `\d{3}` el
-                # correlativo dejaba de verse a sí mismo al llegar a 1000 y
-                # reproponía ese número indefinidamente. Cualquier tope fijo
-                # solo mueve ese punto de quiebre más lejos.
-                # El máximo se calcula en Python porque Max() sobre un
-                # CharField ordena como texto, y ahí '999-2026' > '1000-2026'.
-                numbers = ServiceOrder.all_objects.filter(
-                    order_number__regex=rf'^\d+-{current_year}$'
-                ).values_list('order_number', flat=True)
-                return max(
-                    (int(n.split('-')[0]) for n in numbers),
-                    default=0
-                )
-
-            new_num = next_number(f'service_order:{current_year}', _current_max_order_number)
+            # El máximo existente (current_max_order_number) sólo se escanea
+            # al crear el contador del año.
+            new_num = next_number(f'service_order:{current_year}')
             self.order_number = f'{new_num:03d}-{current_year}'
 
         # Validaciones adicionales para OS manuales
+        manual_number = None
         if self.is_manual_os and self.order_number:
             # Validar formato con regex (1 a 4 dígitos para el número)
             if not re.match(r'^\d{1,4}-\d{4}$', self.order_number):
@@ -137,6 +126,7 @@ class ServiceOrder(SoftDeleteModel):
             if not self.pk:
                 if ServiceOrder.all_objects.filter(order_number=self.order_number).exists():
                     raise ValidationError(f"Ya existe una OS con el número {self.order_number}")
+                manual_number = int(self.order_number.split('-')[0])
 
         # Establecer el mes automáticamente
         if not self.mes:
@@ -153,6 +143,11 @@ class ServiceOrder(SoftDeleteModel):
 
         super().save(*args, **kwargs)
 
+        # El número manual no salió del contador: registrarlo para que la
+        # numeración automática no lo vuelva a proponer
+        if manual_number is not None:
+            observe_number(f'service_order:{manual_year}', manual_number)
+
     def get_total_services(self):
         """Calcula el total de servicios cobrados (USD)"""
         total = Decimal('0.00')
@@ -279,6 +274,23 @@ class ServiceOrder(SoftDeleteModel):
         
         self.save()
 
+
+def current_max_order_number(year):
+    """Mayor correlativo de OS del año (incluye manuales y eliminadas)."""
+    # El regex no acota la cantidad de dígitos: con `\d{3}` el correlativo
+    # dejaba de verse a sí mismo al llegar a 1000 y reproponía ese número
+    # indefinidamente. Cualquier tope fijo solo mueve ese punto de quiebre.
+    # El máximo se calcula en Python porque Max() sobre un CharField ordena
+    # como texto, y ahí '999-2026' > '1000-2026'.
+    numbers = ServiceOrder.all_objects.filter(
+        order_number__regex=rf'^\d+-{year}$'
+    ).values_list('order_number', flat=True)
+    return max((int(n.split('-')[0]) for n in numbers), default=0)
+
+
+register_series('service_order', current_max_order_number)
+
+
 class OrderDocument(models.Model):
     """Documentos asociados a una Orden de Servicio"""
     DOCUMENT_TYPE_CHOICES = (
@@ -493,6 +505,11 @@ class OrderCharge(SoftDeleteModel):
         self.total = self.subtotal + self.iva_amount
         super().save(*args, **kwargs)
 
+        # El resumen de rentabilidad de la factura de proveedor usa el subtotal
+        if not is_new_charge and self.is_third_party_service:
+            from apps.transfers.models import invalidate_profit_summaries
+            invalidate_profit_summaries([self.pk])
+
     def get_iva_type_display_short(self):
         """Retorna etiqueta corta para UI"""
         labels = {
@@ -684,14 +701,27 @@ class Invoice(models.Model):
     def __str__(self):
         return f"{self.invoice_number or 'SIN-NUM'} - {self.service_order.order_number}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Número con el que se cargó, para detectar ediciones en save()
+        instance._loaded_invoice_number = instance.__dict__.get('invoice_number')
+        return instance
+
     def save(self, *args, **kwargs):
         """
         Genera número de factura automático y calcula saldos.
         Aplica retención 1% para Grandes Contribuyentes con CCF si subtotal > $100.
         """
-        if not self.invoice_number:
-            from django.db.models import Max
+        # Pre-factura numerada a mano (al crear o al editar el número): no salió
+        # del contador y hay que registrarla para que no se vuelva a proponer
+        manual_number = None
+        if self.invoice_number and self.invoice_number != getattr(self, '_loaded_invoice_number', None):
+            match = PREFACTURA_NUMBER_RE.match(self.invoice_number)
+            if match:
+                manual_number = (int(match.group(1)), match.group(2))
 
+        if not self.invoice_number:
             year = timezone.now().year
 
             # El correlativo se reserva bloqueando SOLO la fila contador de la
@@ -699,20 +729,7 @@ class Invoice(models.Model):
             # bloqueaba TODAS las pre-facturas del año hasta el commit de la
             # petición, y cualquier PATCH concurrente sobre una de ellas moría
             # con "canceling statement due to statement timeout".
-            def _current_max_invoice_number():
-                result = Invoice.objects.filter(
-                    invoice_number__regex=rf'^PRE-\d{{5}}-{year}$'
-                ).aggregate(max_num=Max('invoice_number'))
-
-                if not result['max_num']:
-                    return 0
-                try:
-                    parts = result['max_num'].split('-')
-                    return int(parts[1]) if len(parts) >= 2 else 0
-                except (ValueError, IndexError):
-                    return 0
-
-            new_num = next_number(f'invoice_prefactura:{year}', _current_max_invoice_number)
+            new_num = next_number(f'invoice_prefactura:{year}')
             self.invoice_number = f"PRE-{new_num:05d}-{year}"
 
         # Auto-bloquear DTE cuando se sube el PDF de la factura
@@ -760,23 +777,43 @@ class Invoice(models.Model):
         else:
             self.retencion = Decimal('0.00')
 
-        # El saldo a pagar se reduce por los pagos y las notas de crédito
-        # NOTA: La retención NO se resta aquí porque se paga mediante un comprobante F-910
-        # que se registra como un pago normal (payment_method='retencion')
-        self.balance = self.total_amount - self.paid_amount - self.credited_amount
-
         # FIX DE PRECISIÓN: Forzar redondeo antes de guardar
         from decimal import ROUND_HALF_UP
         if self.retencion:
             self.retencion = self.retencion.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
         if self.total_amount:
             self.total_amount = self.total_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+        self.apply_payment_state()
+
+        if self.payment_condition == 'credito' and not self.due_date:
+            credit_days = getattr(client, 'credit_days', 30)
+            self.due_date = self.issue_date + timedelta(days=credit_days)
+
+        super().save(*args, **kwargs)
+        self._loaded_invoice_number = self.invoice_number
+
+        if manual_number is not None:
+            number, year = manual_number
+            observe_number(f'invoice_prefactura:{year}', number)
+
+    # Campos que dependen de paid_amount (ver apps.core.balances)
+    PAYMENT_STATE_FIELDS = ('balance', 'status')
+
+    def apply_payment_state(self):
+        """Recalcula saldo y estado a partir de los montos pagados y acreditados."""
+        from decimal import ROUND_HALF_UP
+
+        # El saldo a pagar se reduce por los pagos y las notas de crédito
+        # NOTA: La retención NO se resta aquí porque se paga mediante un comprobante F-910
+        # que se registra como un pago normal (payment_method='retencion')
+        self.balance = self.total_amount - self.paid_amount - self.credited_amount
         if self.balance:
             self.balance = self.balance.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
         # Actualizar estado
         today = timezone.localdate()
-        
+
         # PARCHE DE SEGURIDAD: Si está anulada, el balance debe ser 0 para liberar crédito
         if self.status == 'cancelled':
             self.balance = Decimal('0.00')
@@ -791,12 +828,6 @@ class Invoice(models.Model):
         elif self.status != 'cancelled':
             self.status = 'pending'
 
-        if self.payment_condition == 'credito' and not self.due_date:
-            credit_days = getattr(client, 'credit_days', 30)
-            self.due_date = self.issue_date + timedelta(days=credit_days)
-
-        super().save(*args, **kwargs)
-
     def can_delete_without_credit_note(self):
         """
         Verifica si la factura puede eliminarse sin nota de crédito.
@@ -833,20 +864,27 @@ class Invoice(models.Model):
         remaining = time_limit - now
         return remaining.total_seconds() / 3600  # Convertir a horas
 
-    def calculate_totals(self):
+    def calculate_totals(self, charges=None, transfers=None):
         """
         Calcula los totales de servicios y gastos a terceros con desglose de IVA.
         Asegura coherencia entre OS y CXC mediante cálculo atómico.
 
         AUDITORÍA #6: Ahora también recalcula la retención del 1% cuando
         cambian los cargos gravados.
+
+        Args:
+            charges / transfers: items vinculados ya leídos (p. ej. por
+                invoice_assembly); si no se indican, se consultan.
         """
         from decimal import Decimal
         from django.db import transaction
 
         with transaction.atomic():
             # 1. Sumar cargos de servicios (OrderCharge) asignados a esta factura
-            charges = self.charges.filter(is_deleted=False)
+            if charges is None:
+                charges = self.charges.filter(is_deleted=False)
+            if transfers is None:
+                transfers = self.billed_transfers.filter(is_deleted=False)
             self.subtotal_services = sum(c.subtotal for c in charges) or Decimal('0.00')
             self.iva_services = sum(c.iva_amount for c in charges) or Decimal('0.00')
             self.total_services = self.subtotal_services + self.iva_services
@@ -855,7 +893,7 @@ class Invoice(models.Model):
             subtotal_expenses = Decimal('0.00')
             iva_expenses = Decimal('0.00')
 
-            for transfer in self.billed_transfers.filter(is_deleted=False):
+            for transfer in transfers:
                 # Usar los métodos del modelo Transfer para cálculos consistentes
                 base_price = transfer.get_customer_base_price()
                 iva = transfer.get_customer_iva_amount()
@@ -934,6 +972,28 @@ class Invoice(models.Model):
         return 0
 
 
+
+PREFACTURA_NUMBER_RE = re.compile(r'^PRE-(\d+)-(\d{4})$')
+
+
+def current_max_invoice_number(year):
+    """Mayor correlativo de pre-factura (PRE-NNNNN-YYYY) del año."""
+    from django.db.models import Max
+
+    result = Invoice.objects.filter(
+        invoice_number__regex=rf'^PRE-\d{{5}}-{year}$'
+    ).aggregate(max_num=Max('invoice_number'))
+    if not result['max_num']:
+        return 0
+    try:
+        return int(result['max_num'].split('-')[1])
+    except (ValueError, IndexError):
+        return 0
+
+
+register_series('invoice_prefactura', current_max_invoice_number)
+
+
 class CreditNote(SoftDeleteModel):
     """
     Nota de Credito aplicada a una factura.
@@ -1086,21 +1146,15 @@ class InvoicePayment(SoftDeleteModel):
         return f"Pago {self.invoice.invoice_number} - ${self.amount} - {self.payment_date}"
 
     def save(self, *args, **kwargs):
-        """Actualiza el monto pagado de la factura"""
-        super().save(*args, **kwargs)
-        invoice = self.invoice
-        # Sumar solo pagos activos
-        payments = invoice.payments.filter(is_deleted=False)
-        invoice.paid_amount = sum(payment.amount for payment in payments)
-        invoice.save()
-    
-    def delete(self, *args, **kwargs):
-        """Al borrar (soft), recalcular saldo factura"""
-        super().delete(*args, **kwargs)
-        invoice = self.invoice
-        payments = invoice.payments.filter(is_deleted=False)
-        invoice.paid_amount = sum(payment.amount for payment in payments)
-        invoice.save()
+        """
+        Actualiza el monto pagado de la factura sumando/restando solo este
+        pago (el soft delete también pasa por aquí). Ver apps/core/balances.py.
+        """
+        from apps.core.balances import update_parent_paid_amount
+
+        update_parent_paid_amount(
+            self, 'invoice', lambda: super(InvoicePayment, self).save(*args, **kwargs)
+        )
     
     def get_item_allocations_summary(self):
         """
@@ -1263,6 +1317,29 @@ class PaymentItemAllocation(SoftDeleteModel):
         """Retorna el monto pendiente del item"""
         return self.get_item_total() - self.get_item_paid_amount()
 
+    @classmethod
+    def paid_totals_for_invoice(cls, invoice):
+        """
+        Monto asignado (pagado) por cada item de la factura, en UNA consulta
+        agrupada. Mismo criterio que get_item_paid_amount().
+
+        Returns:
+            ({charge_id: Decimal}, {expense_id: Decimal}); los items sin
+            asignaciones no aparecen.
+        """
+        rows = cls.objects.filter(
+            models.Q(charge__invoice=invoice) | models.Q(expense__invoice=invoice),
+            payment__is_deleted=False,
+        ).order_by().values('charge_id', 'expense_id').annotate(total=Sum('amount'))
+
+        charges, expenses = {}, {}
+        for row in rows:
+            if row['charge_id'] is not None:
+                charges[row['charge_id']] = row['total']
+            else:
+                expenses[row['expense_id']] = row['total']
+        return charges, expenses
+
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
@@ -1390,4 +1467,82 @@ class InvoiceEditHistory(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.invoice.invoice_number} - {self.get_edit_type_display()} - {self.created_at}"
\ No newline at end of file
+        return f"{self.invoice.invoice_number} - {self.get_edit_type_display()} - {self.created_at}"
+
+
+class OrderHistoryArchive(models.Model):
+    """
+    Eventos de OrderHistory más antiguos que la retención configurada
+    (HISTORY_RETENTION_DAYS), movidos por `clean_orphan_history --archive`.
+
+    La tabla viva queda acotada a los eventos recientes, que son los que se
+    consultan a diario. Al archivar se compactan las rachas de eventos
+    idénticos consecutivos de una OS (mismo tipo, descripción, usuario y
+    metadatos; p. ej. "Orden actualizada" repetido) en una sola fila con
+    `occurrences` y la fecha de la última ocurrencia.
+    """
+    original_id = models.BigIntegerField(verbose_name="ID original")
+    service_order = models.ForeignKey(
+        ServiceOrder,
+        on_delete=models.CASCADE,
+        related_name='archived_history',
+        verbose_name="Orden de Servicio"
+    )
+    event_type = models.CharField(max_length=30, choices=OrderHistory.EVENT_TYPE_CHOICES, verbose_name="Tipo de Evento")
+    description = models.TextField(verbose_name="Descripción")
+    user = models.ForeignKey(
+        'users.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        verbose_name="Usuario"
+    )
+    created_at = models.DateTimeField(verbose_name="Fecha y Hora")
+    last_occurred_at = models.DateTimeField(verbose_name="Última ocurrencia")
+    occurrences = models.PositiveIntegerField(default=1, verbose_name="Ocurrencias")
+    metadata = models.JSONField(null=True, blank=True, verbose_name="Metadatos")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="Archivado el")
+
+    class Meta:
+        verbose_name = "Historial de Orden (Archivo)"
+        verbose_name_plural = "Historial de Ordenes (Archivo)"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['service_order', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.service_order_id} - {self.get_event_type_display()} - {self.created_at} (archivado)"
+
+
+class InvoiceEditHistoryArchive(models.Model):
+    """Ediciones de pre-facturas más antiguas que la retención (ver OrderHistoryArchive)."""
+    original_id = models.BigIntegerField(verbose_name="ID original")
+    invoice = models.ForeignKey(
+        Invoice,
+        on_delete=models.CASCADE,
+        related_name='archived_edit_history',
+        verbose_name="Factura"
+    )
+    edit_type = models.CharField(max_length=30, choices=InvoiceEditHistory.EDIT_TYPE_CHOICES, verbose_name="Tipo de Edición")
+    description = models.TextField(verbose_name="Descripción del Cambio")
+    previous_values = models.JSONField(null=True, blank=True, verbose_name="Valores Anteriores")
+    new_values = models.JSONField(null=True, blank=True, verbose_name="Valores Nuevos")
+    user = models.ForeignKey(
+        'users.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        verbose_name="Usuario"
+    )
+    created_at = models.DateTimeField(verbose_name="Fecha y Hora")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="Archivado el")
+
+    class Meta:
+        verbose_name = "Historial de Edición de Factura (Archivo)"
+        verbose_name_plural = "Historial de Ediciones de Facturas (Archivo)"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['invoice', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.invoice_id} - {self.get_edit_type_display()} - {self.created_at} (archivado)"
\ No newline at end of file
@@ -1,7 +1,14 @@
+from datetime import timedelta
 from rest_framework import serializers
 from django.db.models import Sum
+from django.utils import timezone
+from apps.core.values_serializers import (
+    ValuesSerializer, ModelValue, ChoiceDisplay, Computed, Nested, SKIP, CachedLookup
+)
 from .models import ServiceOrder, OrderDocument, Invoice, InvoicePayment, OrderCharge, CreditNote
 from apps.transfers.models import Transfer
+from apps.catalogs.cache import names_of
+from apps.catalogs.models import Bank, Provider, ShipmentType
 from apps.users.models import Notification
 
 class OrderDocumentSerializer(serializers.ModelSerializer):
@@ -526,3 +533,159 @@ class InvoiceListSerializer(serializers.ModelSerializer):
         if block_code == 'DTE_LOCKED':
             return 'Factura con DTE emitido fuera de ventana de eliminación; use anulación.'
         return None
+
+
+# ============================================
+# SERIALIZERS DE LECTURA RÁPIDA (values) PARA LISTADOS
+# ============================================
+# Producen el mismo JSON que ServiceOrderListSerializer / InvoiceListSerializer
+# sin instanciar modelos (ver apps/core/values_serializers.py). Cualquier campo
+# nuevo en esos serializers debe reflejarse aquí; los tests de paridad lo exigen.
+
+
+def _full_name_or_username(prefix):
+    """get_full_name() or username de un usuario relacionado, o None."""
+    def compute(row, context):
+        if row[f'{prefix}__id'] is None:
+            return None
+        full_name = f"{row[f'{prefix}__first_name']} {row[f'{prefix}__last_name']}".strip()
+        return full_name or row[f'{prefix}__username']
+    return Computed(
+        compute,
+        f'{prefix}__id', f'{prefix}__first_name', f'{prefix}__last_name', f'{prefix}__username',
+    )
+
+
+def _as_float(lookup):
+    return Computed(lambda row, context: float(row[lookup] or 0), lookup)
+
+
+class ServiceOrderListValuesSerializer(ValuesSerializer):
+    """Equivalente values() de ServiceOrderListSerializer"""
+    client_name = ModelValue('client__name')
+    sub_client_name = ModelValue('sub_client__name')
+    # Nombres de catálogos desde el caché (sin JOIN, ver apps.catalogs.cache)
+    shipment_type_name = CachedLookup('shipment_type_id', names_of(ShipmentType))
+    provider_name = CachedLookup('provider_id', names_of(Provider))
+    customs_agent_name = _full_name_or_username('customs_agent')
+    status_display = ChoiceDisplay('status')
+
+    client_payment_condition = ModelValue('client__payment_condition')
+    client_credit_days = ModelValue('client__credit_days')
+    client_is_gran_contribuyente = ModelValue('client__is_gran_contribuyente')
+    client_type = ModelValue('client__client_type')
+
+    # Totales: requieren las anotaciones de ServiceOrderViewSet.get_queryset (list)
+    total_transfers = _as_float('annotated_total_transfers')
+    total_direct_costs = _as_float('annotated_total_direct_costs')
+    total_admin_costs = Computed(lambda row, context: 0)
+    total_expenses = _as_float('annotated_total_expenses')
+    total_amount = Computed(
+        lambda row, context: float(row['annotated_total_services']) + float(row['annotated_total_terceros']),
+        'annotated_total_services', 'annotated_total_terceros',
+    )
+    total_services = _as_float('annotated_total_services')
+    total_third_party = _as_float('annotated_total_terceros')
+    total_terceros = _as_float('annotated_total_terceros')
+    total_propios = _as_float('annotated_total_propios')
+
+    class Meta:
+        model = ServiceOrder
+        exclude = ['is_deleted', 'deleted_at']
+
+
+class InvoicePaymentValuesSerializer(ValuesSerializer):
+    """Equivalente values() de InvoicePaymentSerializer"""
+    created_by_name = Computed(
+        lambda row, context: (
+            f"{row['created_by__first_name']} {row['created_by__last_name']}".strip()
+            if row['created_by__id'] is not None else SKIP
+        ),
+        'created_by__id', 'created_by__first_name', 'created_by__last_name',
+    )
+    bank_name = CachedLookup('bank_id', names_of(Bank))
+
+    class Meta:
+        model = InvoicePayment
+        fields = '__all__'
+
+
+def _invoice_can_delete_without_credit_note(row):
+    """Invoice.can_delete_without_credit_note() sobre una fila values()"""
+    if not row['is_dte_issued']:
+        return True
+    if not row['dte_issued_at']:
+        return False
+    return timezone.now() < row['dte_issued_at'] + timedelta(hours=24)
+
+
+def _invoice_delete_block_code(row, context):
+    if row['direct_cost_items_count'] > 0:
+        return 'DIRECT_COST_LOCKED'
+    if row['is_dte_issued'] and not _invoice_can_delete_without_credit_note(row):
+        return 'DTE_LOCKED'
+    return None
+
+
+_INVOICE_DELETE_BLOCK_REASONS = {
+    'DIRECT_COST_LOCKED': 'Esta pre-factura tiene costos directos asignados y requiere reversa controlada.',
+    'DTE_LOCKED': 'Factura con DTE emitido fuera de ventana de eliminación; use anulación.',
+}
+
+
+def _invoice_days_overdue(row, context):
+    if row['due_date'] and row['balance'] > 0:
+        days = (timezone.localdate() - row['due_date']).days
+        return days if days > 0 else 0
+    return 0
+
+
+class InvoiceListValuesSerializer(ValuesSerializer):
+    """
+    Equivalente values() de InvoiceListSerializer.
+    Requiere la anotación ``direct_cost_items_count`` de InvoiceViewSet.get_queryset.
+    """
+    client_name = ModelValue('service_order__client__name')
+    client_id = ModelValue('service_order__client__id')
+    client_is_gran_contribuyente = ModelValue('service_order__client__is_gran_contribuyente')
+    service_order = ModelValue('service_order__id', allow_null=False)
+    service_order_number = ModelValue('service_order__order_number', allow_null=False)
+    purchase_order = ModelValue('service_order__purchase_order', allow_null=False)
+    status_display = ChoiceDisplay('status')
+    invoice_type_display = ChoiceDisplay('invoice_type')
+    days_overdue = Computed(_invoice_days_overdue, 'due_date', 'balance')
+    is_editable = Computed(lambda row, context: not row['is_dte_issued'], 'is_dte_issued')
+    can_delete = Computed(
+        lambda row, context: (
+            False if row['direct_cost_items_count'] > 0
+            else _invoice_can_delete_without_credit_note(row)
+        ),
+        'direct_cost_items_count', 'is_dte_issued', 'dte_issued_at',
+    )
+    delete_block_code = Computed(
+        _invoice_delete_block_code, 'direct_cost_items_count', 'is_dte_issued', 'dte_issued_at'
+    )
+    delete_block_reason = Computed(
+        lambda row, context: _INVOICE_DELETE_BLOCK_REASONS.get(_invoice_delete_block_code(row, context)),
+        'direct_cost_items_count', 'is_dte_issued', 'dte_issued_at',
+    )
+    direct_cost_items_count = Computed(
+        lambda row, context: int(row['direct_cost_items_count']), 'direct_cost_items_count'
+    )
+    requires_reverse_prefactura = Computed(
+        lambda row, context: bool(
+            row['direct_cost_items_count'] > 0 and
+            not row['is_dte_issued'] and
+            row['status'] != 'cancelled'
+        ),
+        'direct_cost_items_count', 'is_dte_issued', 'status',
+    )
+    payments = Nested(
+        InvoicePaymentValuesSerializer,
+        fk='invoice',
+        queryset=InvoicePayment.objects.filter(is_deleted=False),
+    )
+
+    class Meta:
+        model = Invoice
+        fields = InvoiceListSerializer.Meta.fields
@@ -6,7 +6,7 @@ from django.db.models import Sum
 from decimal import Decimal
 from .models import (
     ServiceOrder, OrderDocument, OrderCharge,
-    Invoice, InvoicePayment, OrderHistory, PaymentItemAllocation
+    Invoice, InvoicePayment, OrderHistory, OrderHistoryArchive, PaymentItemAllocation
 )
 from apps.transfers.models import Transfer
 from apps.catalogs.models import Service
@@ -711,12 +711,20 @@ class InvoiceCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """Crear factura y calcular totales automáticamente"""
         calculate_from_os = validated_data.pop('calculate_from_os', True)
+        record_history = validated_data.pop('record_history', True)
         request = self.context.get('request')
 
         if request and request.user:
             validated_data['created_by'] = request.user
 
-        invoice = super().create(validated_data)
+        if record_history:
+            invoice = super().create(validated_data)
+        else:
+            # El evento de historial lo registra quien arma la factura
+            # (invoice_assembly), ya con los items vinculados y totales finales
+            invoice = Invoice(**validated_data)
+            invoice._skip_history = True
+            invoice.save()
 
         if calculate_from_os:
             invoice.calculate_totals()
@@ -739,3 +747,14 @@ class OrderHistorySerializer(serializers.ModelSerializer):
             'created_at', 'timestamp', 'metadata'
         ]
         read_only_fields = ['id', 'created_at', 'timestamp', 'event_type_display', 'user_name', 'user_username']
+
+
+class OrderHistoryArchiveSerializer(OrderHistorySerializer):
+    """Eventos archivados (compactados) del historial de una OS"""
+
+    class Meta:
+        model = OrderHistoryArchive
+        fields = OrderHistorySerializer.Meta.fields + [
+            'occurrences', 'last_occurred_at'
+        ]
+        read_only_fields = fields
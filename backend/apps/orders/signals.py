@@ -4,6 +4,7 @@ from django.contrib.auth import get_user_model
 from .models import ServiceOrder, OrderCharge, OrderDocument, OrderHistory, InvoicePayment, Invoice, CreditNote
 from ..transfers.models import Transfer
 from apps.users.models import Notification
+from apps.core.history_writer import record
 
 User = get_user_model()
 
@@ -17,7 +18,8 @@ def log_service_order_events(sender, instance, created, **kwargs):
 
     # No crear historial si estamos en el proceso de creación inicial
     if created:
-        OrderHistory.objects.create(
+        record(
+            OrderHistory,
             service_order=instance,
             user=user,
             event_type='created',
@@ -32,7 +34,8 @@ def log_service_order_events(sender, instance, created, **kwargs):
     else:
         # 1. Detectar Soft Delete
         if instance.is_deleted and not getattr(instance, '_was_deleted', False):
-             OrderHistory.objects.create(
+             record(
+                OrderHistory,
                 service_order=instance,
                 user=user,
                 event_type='status_changed', # O crear uno nuevo 'order_deleted'
@@ -54,7 +57,8 @@ def log_service_order_events(sender, instance, created, **kwargs):
                 event_type = 'status_changed'
                 description = f'Estado cambiado de {instance._previous_status} a {instance.status}'
             
-            OrderHistory.objects.create(
+            record(
+                OrderHistory,
                 service_order=instance,
                 user=user,
                 event_type=event_type,
@@ -91,7 +95,8 @@ def log_service_order_events(sender, instance, created, **kwargs):
         else:
             # Actualización general (si no fue borrado ni cambio de estado)
             if not instance.is_deleted:
-                OrderHistory.objects.create(
+                record(
+                    OrderHistory,
                     service_order=instance,
                     user=user,
                     event_type='updated',
@@ -135,7 +140,8 @@ def log_charge_events(sender, instance, created, **kwargs):
     user = getattr(instance, '_current_user', None)
 
     if created:
-        OrderHistory.objects.create(
+        record(
+            OrderHistory,
             service_order=instance.service_order,
             user=user,
             event_type='charge_added',
@@ -150,7 +156,8 @@ def log_charge_events(sender, instance, created, **kwargs):
     else:
         # Detectar Soft Delete (transición de False a True)
         if instance.is_deleted and not getattr(instance, '_was_deleted', False):
-            OrderHistory.objects.create(
+            record(
+                OrderHistory,
                 service_order=instance.service_order,
                 user=user,
                 event_type='charge_deleted',
@@ -172,7 +179,8 @@ def log_charge_deletion(sender, instance, **kwargs):
     """
     # Evitar duplicar log si ya se hizo por soft delete (aunque post_delete no se llama en soft delete)
     if not instance.is_deleted: 
-        OrderHistory.objects.create(
+        record(
+            OrderHistory,
             service_order=instance.service_order,
             user=getattr(instance, '_current_user', None),
             event_type='charge_deleted',
@@ -195,7 +203,8 @@ def log_payment_events(sender, instance, created, **kwargs):
         return
     
     if created:
-        OrderHistory.objects.create(
+        record(
+            OrderHistory,
             service_order=instance.service_order,
             user=getattr(instance, '_current_user', None),
             event_type='payment_added',
@@ -220,7 +229,8 @@ def log_payment_events(sender, instance, created, **kwargs):
                 event_type = 'payment_updated'
                 description = f'Pago actualizado: {instance.provider.name if instance.provider else "N/A"}'
             
-            OrderHistory.objects.create(
+            record(
+                OrderHistory,
                 service_order=instance.service_order,
                 user=getattr(instance, '_current_user', None),
                 event_type=event_type,
@@ -243,6 +253,9 @@ def capture_previous_payment_status(sender, instance, **kwargs):
         try:
             previous = Transfer.objects.get(pk=instance.pk)
             instance._previous_status = previous.status
+            # Mes y factura anteriores (KPIs mensuales del dashboard)
+            instance._previous_transaction_date = previous.transaction_date
+            instance._previous_invoice_id = previous.invoice_id
         except Transfer.DoesNotExist:
             instance._previous_status = None
 
@@ -255,7 +268,8 @@ def log_payment_deletion(sender, instance, **kwargs):
     if not instance.service_order:
         return
     
-    OrderHistory.objects.create(
+    record(
+        OrderHistory,
         service_order=instance.service_order,
         user=getattr(instance, '_current_user', None),
         event_type='payment_deleted',
@@ -277,7 +291,8 @@ def log_document_upload(sender, instance, created, **kwargs):
         # Obtener el nombre del archivo del FileField
         file_name = instance.file.name.split('/')[-1] if instance.file else 'Sin nombre'
         
-        OrderHistory.objects.create(
+        record(
+            OrderHistory,
             service_order=instance.order,
             user=getattr(instance, '_current_user', instance.uploaded_by),
             event_type='document_uploaded',
@@ -298,7 +313,8 @@ def log_document_deletion(sender, instance, **kwargs):
     # Obtener el nombre del archivo del FileField
     file_name = instance.file.name.split('/')[-1] if instance.file else 'Sin nombre'
     
-    OrderHistory.objects.create(
+    record(
+        OrderHistory,
         service_order=instance.order,
         user=getattr(instance, '_current_user', None),
         event_type='document_deleted',
@@ -324,7 +340,8 @@ def notify_payment_received(sender, instance, created, **kwargs):
 
     if created and instance.amount > 0:
         # Registrar en historial de OS
-        OrderHistory.objects.create(
+        record(
+            OrderHistory,
             service_order=service_order,
             user=user,
             event_type='invoice_payment',
@@ -371,7 +388,8 @@ def log_payment_deletion(sender, instance, created, **kwargs):
     """AUDITORÍA #9: Registrar eliminación de pagos de cliente"""
     if not created and instance.is_deleted and not getattr(instance, '_was_deleted', False):
         if instance.invoice and instance.invoice.service_order:
-            OrderHistory.objects.create(
+            record(
+                OrderHistory,
                 service_order=instance.invoice.service_order,
                 user=getattr(instance, '_current_user', None),
                 event_type='invoice_payment_deleted',
@@ -389,13 +407,14 @@ def log_payment_deletion(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Invoice)
 def log_invoice_events(sender, instance, created, **kwargs):
     """AUDITORÍA #9: Registrar creación de facturas en historial de OS"""
-    if not instance.service_order:
+    if not instance.service_order or getattr(instance, '_skip_history', False):
         return
 
     user = getattr(instance, '_current_user', instance.created_by)
 
     if created:
-        OrderHistory.objects.create(
+        record(
+            OrderHistory,
             service_order=instance.service_order,
             user=user,
             event_type='invoice_generated',
@@ -420,7 +439,8 @@ def log_credit_note_events(sender, instance, created, **kwargs):
     user = getattr(instance, 'created_by', None)
 
     if created:
-        OrderHistory.objects.create(
+        record(
+            OrderHistory,
             service_order=instance.invoice.service_order,
             user=user,
             event_type='credit_note_added',
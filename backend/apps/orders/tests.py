@@ -1,16 +1,29 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from apps.catalogs.models import ShipmentType
 from apps.clients.models import Client
-from apps.orders.models import OrderDocument, ServiceOrder
+from apps.orders.models import Invoice, OrderDocument, ServiceOrder
 from apps.users.models import User
 
 
 class OrderDocumentSecurityTests(APITestCase):
 	def setUp(self):
+		media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+		self.enterContext(self.settings(MEDIA_ROOT=media_root))
+
 		self.user = User.objects.create_user(
 			username='doc_tester',
 			password='test1234',
@@ -75,3 +88,786 @@ class OrderDocumentSecurityTests(APITestCase):
 
 		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 		self.assertIn('order', response.data)
+
+
+class RenderInvoicePdfsCommandTests(TestCase):
+	def setUp(self):
+		media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+		self.enterContext(self.settings(MEDIA_ROOT=media_root))
+
+		client = Client.objects.create(name='Cliente PDF', payment_condition='credito')
+		shipment = ShipmentType.objects.create(name='Aereo PDF')
+		order = ServiceOrder.objects.create(client=client, shipment_type=shipment)
+
+		self.storage = Invoice._meta.get_field('pdf_file').storage
+		# Original subido por el usuario (DTE oficial)
+		self.present = Invoice.objects.create(
+			service_order=order,
+			total_amount=Decimal('100.00'),
+			pdf_file=SimpleUploadedFile('present.pdf', b'%PDF-1.4 original', content_type='application/pdf'),
+		)
+		self.missing = Invoice.objects.create(service_order=order, total_amount=Decimal('50.00'))
+		Invoice.objects.filter(pk=self.missing.pk).update(pdf_file='invoices/pdf/lost_in_storage_test.pdf')
+		self.without_pdf = Invoice.objects.create(service_order=order, total_amount=Decimal('25.00'))
+		# PDF generado por el sistema (ver InvoiceViewSet.download_pdf)
+		self.generated = Invoice.objects.create(
+			service_order=order,
+			total_amount=Decimal('75.00'),
+			pdf_file=SimpleUploadedFile('Invoice_GEN.pdf', b'%PDF-1.4 generado', content_type='application/pdf'),
+		)
+
+		checkpoint_dir = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, checkpoint_dir, ignore_errors=True)
+		self.checkpoint = os.path.join(checkpoint_dir, 'checkpoint.json')
+
+	def _run(self, *args, workers='0'):
+		call_command(
+			'render_invoice_pdfs', '--workers', workers, '--checkpoint', self.checkpoint, *args,
+			stdout=io.StringIO(), stderr=io.StringIO(),
+		)
+
+	def _read(self, invoice):
+		invoice.refresh_from_db()
+		with self.storage.open(invoice.pdf_file.name) as fh:
+			return fh.read()
+
+	def test_by_default_only_regenerates_lost_files(self):
+		self._run()
+
+		self.assertTrue(self._read(self.missing).startswith(b'%PDF'))
+		self.assertEqual(self._read(self.present), b'%PDF-1.4 original')
+		self.assertEqual(self._read(self.generated), b'%PDF-1.4 generado')
+
+		self.without_pdf.refresh_from_db()
+		self.assertFalse(self.without_pdf.pdf_file)
+		self.assertFalse(self.without_pdf.is_dte_issued)
+
+		with open(self.checkpoint) as fh:
+			state = json.load(fh)
+		self.assertEqual(state['rendered'], 1)
+		self.assertEqual(state['skipped'], 2)
+		self.assertEqual(state['last_id'], self.generated.pk)
+
+	def test_regenerate_never_touches_uploaded_originals(self):
+		old_generated = self.generated.pdf_file.name
+		uploaded = self.present.pdf_file.name
+
+		self._run('--regenerate')
+
+		self.present.refresh_from_db()
+		self.assertEqual(self.present.pdf_file.name, uploaded)
+		self.assertEqual(self._read(self.present), b'%PDF-1.4 original')
+
+		self.assertNotEqual(self._read(self.generated), b'%PDF-1.4 generado')
+		self.assertTrue(os.path.basename(self.generated.pdf_file.name).startswith('Invoice_'))
+		self.assertFalse(self.storage.exists(old_generated))
+
+	def test_process_pool_renders_missing_files(self):
+		self._run(workers='1')
+
+		self.assertTrue(self._read(self.missing).startswith(b'%PDF'))
+		with open(self.checkpoint) as fh:
+			self.assertEqual(json.load(fh)['errors'], 0)
+
+	def test_resume_skips_confirmed_batches(self):
+		self._run('--batch-size', '1')
+		with open(self.checkpoint) as fh:
+			self.assertEqual(json.load(fh)['rendered'], 1)
+
+		Invoice.objects.filter(pk=self.present.pk).update(pdf_file='invoices/pdf/lost_again_test.pdf')
+		self._run('--batch-size', '1', '--resume')
+		with open(self.checkpoint) as fh:
+			self.assertEqual(json.load(fh)['rendered'], 1)
+
+	def test_resume_retries_failed_invoices(self):
+		from unittest import mock
+
+		with mock.patch(
+			'apps.orders.management.commands.render_invoice_pdfs._render_invoice',
+			side_effect=lambda pk: (pk, None, 'render caído'),
+		):
+			self._run('--batch-size', '1')
+		with open(self.checkpoint) as fh:
+			state = json.load(fh)
+		self.assertEqual((state['failed'], state['errors']), ([self.missing.pk], 1))
+		self.assertEqual(state['last_id'], self.generated.pk)
+
+		self._run('--batch-size', '1', '--resume')
+
+		self.assertTrue(self._read(self.missing).startswith(b'%PDF'))
+		with open(self.checkpoint) as fh:
+			state = json.load(fh)
+		self.assertEqual((state['failed'], state['errors'], state['rendered']), ([], 0, 1))
+
+
+class ValuesListSerializerParityTests(APITestCase):
+	"""
+	Los listados de OS y facturas se sirven con serializers values()
+	(apps/core/values_serializers.py); deben producir exactamente el mismo JSON
+	que los serializers DRF originales.
+	"""
+
+	def setUp(self):
+		from datetime import date, timedelta
+		from django.utils import timezone
+		from apps.catalogs.models import Bank, Provider, Service, SubClient
+		from apps.orders.models import InvoicePayment, OrderCharge
+		from apps.transfers.models import DirectCostAllocation, ProviderInvoice, Transfer
+
+		self.user = User.objects.create_user(
+			username='parity_tester', password='x', role='admin',
+			first_name='Ana', last_name='Pérez',
+		)
+		self.client.force_authenticate(user=self.user)
+
+		client = Client.objects.create(name='Cliente Paridad', payment_condition='credito', is_gran_contribuyente=True)
+		sub_client = SubClient.objects.create(parent_client=client, name='Sub Paridad')
+		shipment = ShipmentType.objects.create(name='Marítimo Paridad')
+		provider = Provider.objects.create(name='Proveedor Paridad')
+		bank = Bank.objects.create(name='Banco Paridad')
+		service = Service.objects.create(name='Servicio Paridad', default_price=Decimal('100.00'))
+
+		order_full = ServiceOrder.objects.create(
+			client=client, sub_client=sub_client, shipment_type=shipment, provider=provider,
+			customs_agent=self.user, created_by=self.user, purchase_order='PO-1', eta=date(2026, 2, 1),
+		)
+		order_bare = ServiceOrder.objects.create(client=client, shipment_type=shipment)
+
+		charge = OrderCharge.objects.create(
+			service_order=order_full, service=service, quantity=2, unit_price=Decimal('50.00'),
+		)
+		Transfer.objects.create(
+			transfer_type='cargos', service_order=order_full, provider=provider,
+			amount=Decimal('30.00'), description='Gasto paridad', created_by=self.user,
+		)
+		Transfer.objects.create(
+			transfer_type='costos', service_order=order_full, provider=provider,
+			amount=Decimal('12.50'), description='Costo paridad',
+		)
+
+		invoice_locked = Invoice.objects.create(
+			service_order=order_full, total_amount=Decimal('113.00'), created_by=self.user,
+			due_date=timezone.localdate() - timedelta(days=10),
+		)
+		charge.invoice = invoice_locked
+		charge.billing_status = 'facturado'
+		charge.save(skip_order_validation=True)
+		provider_invoice = ProviderInvoice.objects.create(
+			invoice_number='PAR-001', provider=provider, service_order=order_full,
+			total_amount=Decimal('80.00'), created_by=self.user,
+		)
+		DirectCostAllocation.objects.create(
+			provider_invoice=provider_invoice, order_charge=charge, cost_amount=Decimal('80.00'),
+		)
+		InvoicePayment.objects.create(
+			invoice=invoice_locked, amount=Decimal('10.00'), payment_method='transferencia',
+			bank=bank, created_by=self.user,
+		)
+		InvoicePayment.objects.create(
+			invoice=invoice_locked, amount=Decimal('5.00'), payment_method='efectivo',
+		)
+
+		invoice_dte = Invoice.objects.create(service_order=order_bare, total_amount=Decimal('40.00'))
+		Invoice.objects.filter(pk=invoice_dte.pk).update(
+			is_dte_issued=True, dte_issued_at=timezone.now() - timedelta(days=3),
+			pdf_file='invoices/pdf/paridad.pdf',
+		)
+		invoice_recent = Invoice.objects.create(service_order=order_bare, total_amount=Decimal('0.00'))
+		Invoice.objects.filter(pk=invoice_recent.pk).update(
+			is_dte_issued=True, dte_issued_at=timezone.now(),
+		)
+
+	def _assert_parity(self, url, viewset):
+		from unittest import mock
+
+		fast = self.client.get(url)
+		with mock.patch.object(viewset, 'values_serializer_class', None):
+			drf = self.client.get(url)
+
+		self.assertEqual(fast.status_code, status.HTTP_200_OK)
+		self.assertEqual(drf.status_code, status.HTTP_200_OK)
+		self.assertTrue(drf.json())
+		self.assertEqual(fast.json(), drf.json())
+
+	def test_service_order_list_matches_drf_serializer(self):
+		from apps.orders.views import ServiceOrderViewSet
+		self._assert_parity('/api/orders/service-orders/', ServiceOrderViewSet)
+
+	def test_invoice_list_matches_drf_serializer(self):
+		from apps.orders.views_invoices import InvoiceViewSet
+		self._assert_parity('/api/orders/invoices/', InvoiceViewSet)
+		self._assert_parity('/api/orders/invoices/?ordering=-balance', InvoiceViewSet)
+
+	def test_invoice_summary_uses_constant_queries(self):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get('/api/orders/invoices/summary/')
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		summary_queries = [q for q in ctx.captured_queries if 'orders_invoice' in q['sql'] and 'SUM' in q['sql'].upper()]
+		self.assertEqual(len(summary_queries), 1)
+		self.assertEqual(Decimal(response.data['total_invoiced']), Decimal('153.00'))
+		self.assertEqual(response.data['total_invoices'], 3)
+		self.assertEqual(response.data['overdue_count'], 1)
+		self.assertEqual(Decimal(response.data['total_overdue']), Decimal('98.00'))
+		self.assertEqual(response.data['credit_notes_count'], 0)
+
+
+class InvoicePaymentItemsQueryTests(APITestCase):
+	"""
+	payment_items y add_payment leen los montos pagados por item con una
+	consulta agrupada: el número de queries no depende de cuántos items tenga
+	la factura ni de cuántas asignaciones traiga el pago.
+	"""
+
+	def setUp(self):
+		from apps.catalogs.models import Service
+
+		self.user = User.objects.create_user(username='items_tester', password='x', role='admin')
+		self.client.force_authenticate(user=self.user)
+
+		client = Client.objects.create(name='Cliente Items')
+		shipment = ShipmentType.objects.create(name='Aéreo Items')
+		self.order = ServiceOrder.objects.create(client=client, shipment_type=shipment)
+		self.service = Service.objects.create(name='Servicio Items', default_price=Decimal('100.00'))
+		self.invoice = Invoice.objects.create(service_order=self.order, total_amount=Decimal('5000.00'))
+		self.charges = []
+		self.expenses = []
+
+	def _add_items(self, count):
+		from apps.orders.models import OrderCharge
+		from apps.transfers.models import Transfer
+
+		for _ in range(count):
+			self.charges.append(OrderCharge.objects.create(
+				service_order=self.order, service=self.service, quantity=1,
+				unit_price=Decimal('100.00'), iva_type='exento', invoice=self.invoice,
+			))
+			expense = Transfer.objects.create(
+				transfer_type='cargos', service_order=self.order,
+				amount=Decimal('50.00'), description='Gasto items',
+			)
+			Transfer.objects.filter(pk=expense.pk).update(invoice=self.invoice)
+			self.expenses.append(expense)
+
+	def _allocations(self, amount):
+		return [
+			{'item_type': 'service', 'item_id': charge.id, 'amount': amount} for charge in self.charges
+		] + [
+			{'item_type': 'expense', 'item_id': str(expense.id), 'amount': amount} for expense in self.expenses
+		]
+
+	def _pay(self, amount):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+
+		allocations = self._allocations(amount)
+		total = sum(Decimal(amount) for _ in allocations)
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.post(
+				f'/api/orders/invoices/{self.invoice.pk}/add_payment/',
+				{'amount': str(total), 'payment_method': 'transferencia', 'payment_date': '2026-01-15', 'item_allocations': allocations},
+				format='json',
+			)
+		return response, len(ctx.captured_queries)
+
+	def _payment_items(self):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(f'/api/orders/invoices/{self.invoice.pk}/payment_items/')
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		return response, len(ctx.captured_queries)
+
+	def test_payment_queries_do_not_grow_with_items(self):
+		from apps.orders.models import PaymentItemAllocation
+
+		self._add_items(2)
+		response, few_items = self._pay('10.00')
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+		_, few_reads = self._payment_items()
+
+		self._add_items(4)
+		response, many_items = self._pay('5.00')
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+		self.assertEqual(len(response.data['item_allocations']), 12)
+		response, many_reads = self._payment_items()
+
+		self.assertEqual(few_items, many_items)
+		self.assertEqual(few_reads, many_reads)
+		self.assertEqual(PaymentItemAllocation.objects.count(), 16)
+
+		paid = {item['id']: Decimal(item['paid_allocated']) for item in response.data['items']}
+		self.assertEqual(paid[f'service_{self.charges[0].id}'], Decimal('15.00'))
+		self.assertEqual(paid[f'expense_{self.expenses[-1].id}'], Decimal('5.00'))
+
+	def test_repeated_item_cannot_exceed_its_pending(self):
+		self._add_items(1)
+		charge = self.charges[0]
+		response = self.client.post(
+			f'/api/orders/invoices/{self.invoice.pk}/add_payment/',
+			{
+				'amount': '120.00',
+				'payment_date': '2026-01-15',
+				'payment_method': 'transferencia',
+				'item_allocations': [
+					{'item_type': 'service', 'item_id': charge.id, 'amount': '60.00'},
+					{'item_type': 'service', 'item_id': charge.id, 'amount': '60.00'},
+				],
+			},
+			format='json',
+		)
+
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertIn('excede su pendiente', response.data['error'])
+		self.assertFalse(self.invoice.payments.exists())
+
+
+class InvoiceAssemblyTests(APITestCase):
+	"""
+	Crear una factura vincula servicios y gastos con un número fijo de
+	consultas, calcula los totales una vez y deja un solo evento en el historial.
+	"""
+
+	def setUp(self):
+		from apps.catalogs.models import Service
+
+		self.user = User.objects.create_user(username='assembly_tester', password='x', role='admin')
+		self.client.force_authenticate(user=self.user)
+
+		self.customer = Client.objects.create(name='Cliente Armado')
+		self.shipment = ShipmentType.objects.create(name='Terrestre Armado')
+		self.service = Service.objects.create(name='Servicio Armado', default_price=Decimal('100.00'))
+
+	def _order_with_items(self, count):
+		from apps.orders.models import OrderCharge
+		from apps.transfers.models import Transfer
+
+		order = ServiceOrder.objects.create(client=self.customer, shipment_type=self.shipment)
+		charges = [
+			OrderCharge.objects.create(
+				service_order=order, service=self.service, quantity=1,
+				unit_price=Decimal('100.00'), iva_type='exento',
+			)
+			for _ in range(count)
+		]
+		transfers = [
+			Transfer.objects.create(
+				transfer_type='cargos', service_order=order,
+				amount=Decimal('50.00'), description='Gasto armado',
+			)
+			for _ in range(count)
+		]
+		return order, charges, transfers
+
+	def _create_invoice(self, order, charges, transfers):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+
+		with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+			response = self.client.post('/api/orders/invoices/', {
+				'service_order': order.id,
+				'invoice_type': 'DTE',
+				'issue_date': '2026-03-01',
+				'total_amount': '1.00',
+				'charge_ids': [charge.id for charge in charges],
+				'transfer_ids': [','.join(str(transfer.id) for transfer in transfers)],
+			}, format='json')
+		return response, len(ctx.captured_queries)
+
+	def test_create_links_items_with_constant_queries(self):
+		from apps.orders.models import OrderCharge, OrderHistory
+		from apps.transfers.models import Transfer
+
+		# Primera factura: cachés (content types, contador del correlativo)
+		self._create_invoice(*self._order_with_items(1))
+
+		small_order, *small_items = self._order_with_items(2)
+		response, small_queries = self._create_invoice(small_order, *small_items)
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+
+		order, charges, transfers = self._order_with_items(6)
+		history_before = set(OrderHistory.objects.filter(service_order=order).values_list('id', flat=True))
+		response, queries = self._create_invoice(order, charges, transfers)
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+		self.assertEqual(small_queries, queries)
+
+		invoice = Invoice.objects.get(pk=response.data['id'])
+		self.assertEqual(invoice.total_services, Decimal('600.00'))
+		self.assertEqual(invoice.total_third_party, Decimal('300.00'))
+		self.assertEqual(invoice.total_amount, Decimal('900.00'))
+		self.assertEqual(invoice.balance, Decimal('900.00'))
+		self.assertEqual(
+			OrderCharge.objects.filter(invoice=invoice, billing_status='facturado').count(), 6
+		)
+		self.assertEqual(
+			Transfer.objects.filter(invoice=invoice, billing_status='facturado').count(), 6
+		)
+
+		order.refresh_from_db()
+		self.assertTrue(order.facturado)
+		new_events = OrderHistory.objects.filter(service_order=order).exclude(id__in=history_before)
+		self.assertEqual([event.event_type for event in new_events], ['invoice_generated'])
+		self.assertEqual(new_events[0].metadata['total_amount'], 900.0)
+		self.assertEqual(len(new_events[0].metadata['transfer_ids']), 6)
+
+	def test_create_rejects_items_from_another_order(self):
+		order, charges, transfers = self._order_with_items(1)
+		_, foreign_charges, _ = self._order_with_items(1)
+
+		response, _ = self._create_invoice(order, charges + foreign_charges, transfers)
+
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertIn(f'#{foreign_charges[0].id}', response.data['error'])
+		self.assertFalse(Invoice.objects.filter(service_order=order).exists())
+		charges[0].refresh_from_db()
+		self.assertIsNone(charges[0].invoice_id)
+
+
+class OrderHistoryRetentionTests(APITestCase):
+	"""
+	El historial de una OS se pagina por cursor y los eventos más antiguos que
+	la retención se mueven (compactados) a la tabla de archivo.
+	"""
+
+	def setUp(self):
+		self.user = User.objects.create_user(username='history_tester', password='x', role='admin')
+		self.client.force_authenticate(user=self.user)
+
+		customer = Client.objects.create(name='Cliente Historial')
+		shipment = ShipmentType.objects.create(name='Marítimo Historial')
+		self.order = ServiceOrder.objects.create(client=customer, shipment_type=shipment)
+
+	def _add_events(self, count, days_ago=0, **fields):
+		from datetime import timedelta
+		from django.utils import timezone
+		from apps.orders.models import OrderHistory
+
+		values = {
+			'event_type': 'updated',
+			'description': 'Orden actualizada',
+			'user': self.user,
+			'metadata': {'changes': ['eta'], 'note': None},
+		}
+		values.update(fields)
+		events = OrderHistory.objects.bulk_create([
+			OrderHistory(service_order=self.order, **values) for _ in range(count)
+		])
+		base = timezone.now() - timedelta(days=days_ago)
+		for index, event in enumerate(events):
+			OrderHistory.objects.filter(pk=event.pk).update(created_at=base + timedelta(seconds=index))
+		return events
+
+	def _history_url(self):
+		return f'/api/orders/service-orders/{self.order.id}/history/'
+
+	def test_history_is_paginated_with_cursor(self):
+		self.order.history.all().delete()
+		self._add_events(7)
+
+		response = self.client.get(self._history_url(), {'limit': 3})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data['total_events'], 7)
+		self.assertEqual(len(response.data['history']), 3)
+
+		seen = [event['id'] for event in response.data['history']]
+		cursor = response.data['next_cursor']
+		while cursor:
+			response = self.client.get(self._history_url(), {'limit': 3, 'cursor': cursor})
+			self.assertEqual(response.status_code, status.HTTP_200_OK)
+			self.assertIsNone(response.data['total_events'])
+			seen.extend(event['id'] for event in response.data['history'])
+			cursor = response.data['next_cursor']
+
+		expected = list(self.order.history.order_by('-created_at', '-id').values_list('id', flat=True))
+		self.assertEqual(seen, expected)
+
+	def test_history_page_queries_do_not_depend_on_history_size(self):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+
+		self._add_events(5)
+		self.client.get(self._history_url(), {'limit': 5})
+		with CaptureQueriesContext(connection) as small:
+			self.client.get(self._history_url(), {'limit': 5})
+
+		self._add_events(200)
+		with CaptureQueriesContext(connection) as large:
+			response = self.client.get(self._history_url(), {'limit': 5})
+
+		self.assertEqual(len(response.data['history']), 5)
+		self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+	def test_invalid_cursor_returns_400(self):
+		response = self.client.get(self._history_url(), {'cursor': 'no-es-un-cursor'})
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+	def test_archive_command_moves_and_compacts_old_events(self):
+		from apps.orders.models import OrderHistory, OrderHistoryArchive
+
+		self.order.history.all().delete()
+		old_repeated = self._add_events(4, days_ago=400)
+		self._add_events(1, days_ago=399, event_type='status_changed', description='Estado cambiado')
+		recent = self._add_events(2, days_ago=1)
+
+		call_command('clean_orphan_history', '--archive', '--days', '365', '--batch-size', '2', stdout=io.StringIO())
+
+		self.assertEqual(
+			set(OrderHistory.objects.filter(service_order=self.order).values_list('id', flat=True)),
+			{event.id for event in recent},
+		)
+		archived = list(OrderHistoryArchive.objects.filter(service_order=self.order).order_by('created_at'))
+		self.assertEqual(len(archived), 2)
+
+		# Las 4 actualizaciones idénticas quedan en una fila, aunque cruzan lotes
+		self.assertEqual(archived[0].occurrences, 4)
+		self.assertEqual(archived[0].original_id, old_repeated[0].id)
+		self.assertLess(archived[0].created_at, archived[0].last_occurred_at)
+		self.assertEqual(archived[0].metadata, {'changes': ['eta']})
+		self.assertEqual(archived[1].event_type, 'status_changed')
+		self.assertEqual(archived[1].occurrences, 1)
+
+		response = self.client.get(self._history_url(), {'archived': '1'})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data['archived_events'], 2)
+		self.assertEqual([event['occurrences'] for event in response.data['history']], [1, 4])
+
+	def test_archive_dry_run_does_not_modify_data(self):
+		from apps.orders.models import OrderHistory, OrderHistoryArchive
+
+		self._add_events(3, days_ago=400)
+		before = OrderHistory.objects.count()
+
+		out = io.StringIO()
+		call_command('clean_orphan_history', '--archive', '--dry-run', stdout=out)
+
+		self.assertEqual(OrderHistory.objects.count(), before)
+		self.assertFalse(OrderHistoryArchive.objects.exists())
+		self.assertIn('3 eventos archivados en 1 filas', out.getvalue())
+
+
+class InvoicePaymentDeltaTests(TestCase):
+	"""
+	Los pagos suman/restan su monto a la factura sin volver a leer todos los
+	abonos; la conciliación detecta y corrige los descuadres.
+	"""
+
+	def setUp(self):
+		from apps.orders.models import InvoicePayment
+
+		client = Client.objects.create(name='Cliente Abonos')
+		shipment = ShipmentType.objects.create(name='Marítimo Abonos')
+		self.order = ServiceOrder.objects.create(client=client, shipment_type=shipment)
+		self.invoice = Invoice.objects.create(service_order=self.order, total_amount=Decimal('100.00'))
+		self.Payment = InvoicePayment
+
+	def _pay(self, amount, invoice=None):
+		return self.Payment.objects.create(
+			invoice=invoice or self.invoice, amount=Decimal(amount), payment_method='transferencia',
+		)
+
+	def test_alta_y_anulacion_actualizan_saldo_y_estado(self):
+		payment = self._pay('40.00')
+		self.invoice.refresh_from_db()
+		self.assertEqual(self.invoice.paid_amount, Decimal('40.00'))
+		self.assertEqual(self.invoice.balance, Decimal('60.00'))
+		self.assertEqual(self.invoice.status, 'partial')
+
+		self._pay('60.00')
+		self.invoice.refresh_from_db()
+		self.assertEqual(self.invoice.balance, Decimal('0.00'))
+		self.assertEqual(self.invoice.status, 'paid')
+
+		payment.delete()
+		self.invoice.refresh_from_db()
+		self.assertEqual(self.invoice.paid_amount, Decimal('60.00'))
+		self.assertEqual(self.invoice.balance, Decimal('40.00'))
+		self.assertEqual(self.invoice.status, 'partial')
+
+	def test_el_objeto_cargado_refleja_el_nuevo_saldo(self):
+		payment = self.Payment(invoice=self.invoice, amount=Decimal('25.00'), payment_method='efectivo')
+		payment.save()
+		self.assertEqual(self.invoice.balance, Decimal('75.00'))
+
+	def test_consultas_no_dependen_de_la_cantidad_de_abonos(self):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+
+		self._pay('1.00')
+		with CaptureQueriesContext(connection) as ctx:
+			self._pay('1.00')
+		few = len(ctx.captured_queries)
+
+		self.Payment.objects.bulk_create([
+			self.Payment(invoice=self.invoice, amount=Decimal('0.01'), payment_method='efectivo')
+			for _ in range(200)
+		])
+		with CaptureQueriesContext(connection) as ctx:
+			self._pay('1.00')
+
+		self.assertEqual(len(ctx.captured_queries), few)
+
+	def test_conciliacion_corrige_descuadres(self):
+		self._pay('30.00')
+		Invoice.objects.filter(pk=self.invoice.pk).update(paid_amount=Decimal('10.00'))
+
+		out = io.StringIO()
+		call_command('reconcile_paid_amounts', stdout=out)
+		self.assertIn('Facturas (CxC): 1 documento(s) descuadrado(s)', out.getvalue())
+
+		call_command('reconcile_paid_amounts', '--fix', stdout=io.StringIO())
+		self.invoice.refresh_from_db()
+		self.assertEqual(self.invoice.paid_amount, Decimal('30.00'))
+		self.assertEqual(self.invoice.balance, Decimal('70.00'))
+
+
+class OrderItemsQueryTests(APITestCase):
+	"""
+	billable_items y all_documents declaran sus relaciones por adelantado: el
+	número de consultas no depende de cuántos cargos, gastos o documentos tenga
+	la OS.
+	"""
+
+	def setUp(self):
+		from apps.catalogs.models import Provider, Service
+
+		self.user = User.objects.create_user(
+			username='docs_tester', password='x', role='admin', first_name='Ana', last_name='Docs',
+		)
+		self.client.force_authenticate(user=self.user)
+
+		client = Client.objects.create(name='Cliente Documentos')
+		shipment = ShipmentType.objects.create(name='Terrestre Documentos')
+		self.provider = Provider.objects.create(name='Proveedor Documentos')
+		self.order = ServiceOrder.objects.create(client=client, shipment_type=shipment)
+		self.service = Service.objects.create(name='Servicio Documentos', default_price=Decimal('100.00'))
+		self.seq = 0
+
+	def _next(self):
+		self.seq += 1
+		return self.seq
+
+	def _add_billable(self, count):
+		from apps.orders.models import OrderCharge
+		from apps.transfers.models import DirectCostAllocation, ProviderInvoice, Transfer
+
+		for _ in range(count):
+			n = self._next()
+			provider_invoice = ProviderInvoice.objects.create(
+				invoice_number=f'CD-{n}', provider=self.provider,
+				service_order=self.order, total_amount=Decimal('40.00'),
+			)
+			charge = OrderCharge.objects.create(
+				service_order=self.order, service=self.service, quantity=1, unit_price=Decimal('100.00'),
+			)
+			DirectCostAllocation.objects.create(
+				provider_invoice=provider_invoice, order_charge=charge, cost_amount=Decimal('40.00'),
+			)
+			Transfer.objects.create(
+				transfer_type='cargos', service_order=self.order, provider=self.provider,
+				amount=Decimal('50.00'), description=f'Gasto {n}',
+			)
+
+	def _add_documents(self, count):
+		from apps.orders.models import CreditNote, InvoicePayment
+		from apps.transfers.models import ProviderCreditNote, ProviderInvoice, Transfer, TransferPayment
+
+		for _ in range(count):
+			n = self._next()
+			OrderDocument.objects.create(
+				order=self.order, document_type='tramite', file=f'orders/tramite_{n}.pdf',
+				uploaded_by=self.user,
+			)
+			invoice = Invoice.objects.create(
+				service_order=self.order, total_amount=Decimal('100.00'), created_by=self.user,
+			)
+			Invoice.objects.filter(pk=invoice.pk).update(
+				pdf_file=f'invoices/fac_{n}.pdf', dte_file=f'invoices/dte_{n}.json',
+			)
+			InvoicePayment.objects.bulk_create([InvoicePayment(
+				invoice=invoice, amount=Decimal('10.00'), payment_method='transferencia',
+				receipt_file=f'payments/rec_{n}.pdf', created_by=self.user,
+			)])
+			CreditNote.objects.bulk_create([CreditNote(
+				invoice=invoice, note_number=f'NC-{n}', amount=Decimal('5.00'), reason='Ajuste',
+				pdf_file=f'credit_notes/nc_{n}.pdf', created_by=self.user,
+			)])
+			ProviderInvoice.objects.create(
+				invoice_number=f'PI-{n}', provider=self.provider, service_order=self.order,
+				total_amount=Decimal('30.00'), invoice_file=f'provider_invoices/pi_{n}.pdf',
+				created_by=self.user,
+			)
+			transfer = Transfer.objects.create(
+				transfer_type='costos', service_order=self.order, provider=self.provider,
+				amount=Decimal('60.00'), description=f'Costo {n}', created_by=self.user,
+			)
+			Transfer.objects.filter(pk=transfer.pk).update(invoice_file=f'transfers/tr_{n}.pdf')
+			TransferPayment.objects.bulk_create([TransferPayment(
+				transfer=transfer, amount=Decimal('20.00'), payment_method='transferencia',
+				proof_file=f'transfers/proof_{n}.pdf', created_by=self.user,
+			)])
+			ProviderCreditNote.objects.bulk_create([ProviderCreditNote(
+				note_number=f'PNC-{n}', provider=self.provider, original_transfer=transfer,
+				amount=Decimal('5.00'), available_amount=Decimal('5.00'), issue_date='2026-01-15',
+				pdf_file=f'provider_credit_notes/pnc_{n}.pdf', created_by=self.user,
+			)])
+
+	def _get(self, action):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(f'/api/orders/service-orders/{self.order.pk}/{action}/')
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		return response, len(ctx.captured_queries)
+
+	def test_billable_items_queries_do_not_grow_with_items(self):
+		self._add_billable(1)
+		_, few = self._get('billable_items')
+
+		self._add_billable(5)
+		response, many = self._get('billable_items')
+
+		self.assertEqual(few, many)
+		self.assertEqual(response.data['summary']['services']['count'], 6)
+		self.assertEqual(response.data['summary']['expenses']['count'], 6)
+		service = next(item for item in response.data['items'] if item['type'] == 'service')
+		self.assertTrue(service['is_third_party_service'])
+		self.assertEqual(service['cost_amount'], 40.0)
+		self.assertEqual(service['profit'], 60.0)
+		self.assertEqual(service['margin_percentage'], 150.0)
+		self.assertTrue(service['is_editable'])
+
+	def test_all_documents_queries_do_not_grow_with_documents(self):
+		self._add_documents(1)
+		response, few = self._get('all_documents')
+		self.assertEqual(response.data['total_documents'], 9)
+
+		self._add_documents(4)
+		response, many = self._get('all_documents')
+
+		self.assertEqual(few, many)
+		self.assertEqual(response.data['total_documents'], 45)
+		summary = response.data['categories_summary']
+		for category in ('tramite', 'factura_venta', 'pago_cliente', 'nota_credito', 'costo_directo',
+				'factura_costo', 'pago_proveedor', 'nc_proveedor'):
+			self.assertIn(category, summary)
+		self.assertEqual(summary['factura_venta']['count'], 10)
+		self.assertEqual({doc['uploaded_by'] for doc in response.data['documents']}, {'Ana Docs'})
+
+	def test_all_documents_omits_deleted_payments_and_credit_notes(self):
+		from apps.orders.models import CreditNote, InvoicePayment
+		from apps.transfers.models import ProviderCreditNote, TransferPayment
+
+		self._add_documents(1)
+		for model in (InvoicePayment, CreditNote, TransferPayment, ProviderCreditNote):
+			model.all_objects.update(is_deleted=True)
+
+		response, _ = self._get('all_documents')
+
+		sources = {doc['source_model'] for doc in response.data['documents']}
+		self.assertEqual(sources, {'OrderDocument', 'Invoice', 'ProviderInvoice', 'Transfer'})
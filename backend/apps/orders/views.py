@@ -6,9 +6,14 @@ from django.core.exceptions import ValidationError
 from django.db import transaction
 from .models import ServiceOrder, OrderDocument, OrderCharge
 from apps.transfers.models import DirectCostAllocation
-from .serializers import ServiceOrderSerializer, ServiceOrderListSerializer, OrderDocumentSerializer
+from .serializers import (
+    ServiceOrderSerializer, ServiceOrderListSerializer, ServiceOrderListValuesSerializer, OrderDocumentSerializer
+)
 from .serializers_new import ServiceOrderDetailSerializer
 from apps.users.permissions import IsOperativo, IsOperativo2
+from apps.core.values_serializers import ValuesListMixin
+from apps.core.history_writer import record
+from apps.core.db_routing import read_replica
 import openpyxl
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
@@ -17,8 +22,10 @@ import io
 import os
 from datetime import datetime
 
-class ServiceOrderViewSet(viewsets.ModelViewSet):
+class ServiceOrderViewSet(ValuesListMixin, viewsets.ModelViewSet):
     serializer_class = ServiceOrderSerializer
+    # El listado se serializa vía values(); mismo JSON que ServiceOrderListSerializer
+    values_serializer_class = ServiceOrderListValuesSerializer
     permission_classes = [IsOperativo]
     filterset_fields = ['status', 'client', 'provider']
     search_fields = ['order_number', 'duca', 'purchase_order']
@@ -216,10 +223,12 @@ class ServiceOrderViewSet(viewsets.ModelViewSet):
         items = []
 
         # 1. Servicios (OrderCharge) - Calculadora de Servicios
+        # service_order (is_editable) y cost_allocation (get_cost/get_profit/
+        # get_margin_percentage) van en el mismo JOIN: sin consultas por cargo
         charges = order.charges.filter(
             invoice__isnull=True,
             is_deleted=False
-        ).select_related('service')
+        ).select_related('service', 'service_order', 'cost_allocation')
 
         for charge in charges:
             iva_type = getattr(charge, 'iva_type', 'gravado')
@@ -714,7 +723,8 @@ class ServiceOrderViewSet(viewsets.ModelViewSet):
 
                 # Registrar en historial de la OS si hubo cambios
                 if changes_log:
-                    OrderHistory.objects.create(
+                    record(
+                        OrderHistory,
                         service_order=order,
                         event_type='updated',
                         description=f'Actualizada configuración de {len(changes_log)} gasto(s) en Calculadora de Gastos',
@@ -746,6 +756,7 @@ class ServiceOrderViewSet(viewsets.ModelViewSet):
             )
 
     @action(detail=False, methods=['get'])
+    @read_replica
     def export_excel(self, request):
         """Exportar órdenes de servicio a Excel con formato profesional"""
         # Crear workbook
@@ -855,6 +866,7 @@ class ServiceOrderViewSet(viewsets.ModelViewSet):
         return response
 
     @action(detail=True, methods=['get'])
+    @read_replica
     def all_documents(self, request, pk=None):
         """
         Endpoint unificado que retorna TODOS los documentos relacionados a una OS:
@@ -870,13 +882,50 @@ class ServiceOrderViewSet(viewsets.ModelViewSet):
         from .models import Invoice, InvoicePayment, CreditNote
         from apps.transfers.models import Transfer, TransferPayment, ProviderCreditNote, ProviderInvoice
         
+        from django.db.models import Prefetch
+
         order = self.get_object()
         documents = []
-        
+
+        # Todas las fuentes se declaran aquí con sus relaciones: una consulta
+        # por fuente (más sus prefetch), sin importar cuántos documentos tenga la OS
+        order_documents = order.documents.filter(
+            document_type__in=['tramite', 'otros']
+        ).select_related('uploaded_by')
+        invoices = Invoice.objects.filter(service_order=order).select_related('created_by').prefetch_related(
+            Prefetch(
+                'payments',
+                queryset=InvoicePayment.objects.filter(is_deleted=False).select_related('created_by'),
+                to_attr='active_payments',
+            ),
+            Prefetch(
+                'credit_notes',
+                queryset=CreditNote.objects.filter(is_deleted=False).select_related('created_by'),
+                to_attr='active_credit_notes',
+            ),
+        )
+        provider_invoices = ProviderInvoice.objects.filter(
+            service_order=order, is_deleted=False
+        ).select_related('provider', 'created_by')
+        transfers = Transfer.objects.filter(
+            service_order=order, is_deleted=False
+        ).select_related('provider', 'created_by').prefetch_related(
+            Prefetch(
+                'payments',
+                queryset=TransferPayment.objects.filter(is_deleted=False).select_related('created_by'),
+                to_attr='active_payments',
+            ),
+            Prefetch(
+                'credit_notes',
+                queryset=ProviderCreditNote.objects.filter(is_deleted=False).select_related('created_by'),
+                to_attr='active_credit_notes',
+            ),
+        )
+
         # 1. Documentos directos de la OS (OrderDocument)
         # IMPORTANTE: Solo mostrar documentos de tipo 'tramite' u 'otros' aquí
         # Los documentos tipo 'factura_costo' se muestran desde Transfer model
-        for doc in order.documents.filter(document_type__in=['tramite', 'otros']):
+        for doc in order_documents:
             if doc.file:
                 documents.append({
                     'id': f'doc_{doc.id}',
@@ -897,7 +946,6 @@ class ServiceOrderViewSet(viewsets.ModelViewSet):
                 })
         
         # 2. Facturas emitidas al cliente (Invoice)
-        invoices = Invoice.objects.filter(service_order=order)
         for inv in invoices:
             if inv.pdf_file:
                 documents.append({
@@ -937,7 +985,7 @@ class ServiceOrderViewSet(viewsets.ModelViewSet):
                 })
             
             # 3. Comprobantes de pago de clientes (InvoicePayment)
-            for payment in inv.payments.filter(is_deleted=False):
+            for payment in inv.active_payments:
                 if payment.receipt_file:
                     documents.append({
                         'id': f'inv_pay_{payment.id}',
@@ -958,7 +1006,7 @@ class ServiceOrderViewSet(viewsets.ModelViewSet):
                     })
             
             # 4. Notas de crédito (CreditNote)
-            for cn in inv.credit_notes.filter(is_deleted=False):
+            for cn in inv.active_credit_notes:
                 if cn.pdf_file:
                     documents.append({
                         'id': f'cn_{cn.id}',
@@ -979,7 +1027,6 @@ class ServiceOrderViewSet(viewsets.ModelViewSet):
                     })
         
         # 5. Costos Directos (ProviderInvoice)
-        provider_invoices = ProviderInvoice.objects.filter(service_order=order, is_deleted=False)
         for pi in provider_invoices:
             if pi.invoice_file:
                 documents.append({
@@ -1001,7 +1048,6 @@ class ServiceOrderViewSet(viewsets.ModelViewSet):
                 })
         
         # 6. Facturas de proveedores / Gastos (Transfer)
-        transfers = Transfer.objects.filter(service_order=order, is_deleted=False)
         for tr in transfers:
             if tr.invoice_file:
                 documents.append({
@@ -1023,7 +1069,7 @@ class ServiceOrderViewSet(viewsets.ModelViewSet):
                 })
             
             # 7. Comprobantes de pago a proveedores (TransferPayment)
-            for tp in tr.payments.filter(is_deleted=False):
+            for tp in tr.active_payments:
                 if tp.proof_file:
                     documents.append({
                         'id': f'tr_pay_{tp.id}',
@@ -1044,12 +1090,8 @@ class ServiceOrderViewSet(viewsets.ModelViewSet):
                     })
 
             # 8. Notas de crédito de proveedores vinculadas a este Transfer
-            # Se buscan NC que tengan este transfer como original_transfer
-            provider_credit_notes = ProviderCreditNote.objects.filter(
-                original_transfer=tr,
-                is_deleted=False
-            )
-            for pcn in provider_credit_notes:
+            # (NC que tienen este transfer como original_transfer)
+            for pcn in tr.active_credit_notes:
                 if pcn.pdf_file:
                     documents.append({
                         'id': f'pcn_{pcn.id}',
@@ -1096,19 +1138,39 @@ class ServiceOrderViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def history(self, request, pk=None):
         """
-        Endpoint para obtener el historial de eventos de una orden de servicio.
-        Retorna todos los eventos ordenados por created_at descendente.
+        Endpoint para obtener el historial de eventos de una orden de servicio,
+        ordenado por created_at descendente y paginado por cursor.
+
+        Query params:
+            limit: eventos por página (por defecto 100, máximo 200)
+            cursor: valor de `next_cursor` de la página anterior
+            archived: 1 para recorrer los eventos archivados (compactados)
+
+        `total_events` y `archived_events` sólo se calculan en la primera
+        página (en las siguientes son null).
         """
-        from .serializers_new import OrderHistorySerializer
+        from apps.core.pagination import keyset_page
+        from .serializers_new import OrderHistorySerializer, OrderHistoryArchiveSerializer
 
         order = self.get_object()
-        history_entries = order.history.select_related('user').order_by('-created_at')
-        serializer = OrderHistorySerializer(history_entries, many=True)
+        archived = request.query_params.get('archived') in ('1', 'true', 'True')
+
+        if archived:
+            queryset = order.archived_history.select_related('user')
+            serializer_class = OrderHistoryArchiveSerializer
+        else:
+            queryset = order.history.select_related('user')
+            serializer_class = OrderHistorySerializer
+
+        entries, next_cursor = keyset_page(queryset, request, default_limit=100)
 
+        first_page = not request.query_params.get('cursor')
         return Response({
             'order_number': order.order_number,
-            'total_events': history_entries.count(),
-            'history': serializer.data
+            'total_events': order.history.count() if first_page else None,
+            'archived_events': order.archived_history.count() if first_page else None,
+            'next_cursor': next_cursor,
+            'history': serializer_class(entries, many=True).data
         })
 
 class OrderDocumentViewSet(viewsets.ModelViewSet):
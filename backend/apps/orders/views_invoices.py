@@ -1,7 +1,7 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Sum, Q, Count
+from django.db.models import Q, Count
 from django.http import HttpResponse
 from django.db import transaction
 from django.core.files.base import ContentFile
@@ -12,11 +12,14 @@ from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from .models import Invoice, InvoicePayment, ServiceOrder, CreditNote
 from apps.catalogs.models import Bank
-from .serializers import InvoiceListSerializer, InvoicePaymentSerializer, CreditNoteSerializer
+from .serializers import InvoiceListSerializer, InvoiceListValuesSerializer, InvoicePaymentSerializer, CreditNoteSerializer
 from .serializers_new import InvoiceDetailSerializer, InvoiceCreateSerializer
 from apps.orders.pdf_generator import generate_invoice_pdf
 from apps.core.storage import stage_upload
+from apps.core.history_writer import record
 from apps.users.permissions import IsOperativo, IsOperativo2
+from apps.core.values_serializers import ValuesListMixin
+from apps.core.db_routing import ReplicaReadMixin, read_replica
 
 # Import distributed lock utilities (only active when Redis is configured)
 try:
@@ -28,10 +31,20 @@ except ImportError:
     LockAcquisitionError = Exception
 
 
-class InvoiceViewSet(viewsets.ModelViewSet):
+def _as_pk(value):
+    """ID de item recibido en JSON/FormData (int o str) como clave de in_bulk()."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class InvoiceViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """ViewSet for managing invoices (CXC)"""
     permission_classes = [IsOperativo]
     serializer_class = InvoiceDetailSerializer
+    # El listado se serializa vía values(); mismo JSON que InvoiceListSerializer
+    values_serializer_class = InvoiceListValuesSerializer
     filterset_fields = ['status']
     search_fields = ['invoice_number', 'service_order__client__name', 'ccf']
     ordering_fields = ['issue_date', 'due_date', 'total_amount', 'balance', 'dte_number', 'issue_year', 'invoice_number']
@@ -244,117 +257,29 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             if dte_file:
                 invoice_data['dte_file'] = dte_file
 
-            invoice = serializer.save(**invoice_data)
+            # Los totales y el evento de historial se calculan una sola vez, al
+            # terminar de vincular los items (assemble_invoice)
+            invoice = serializer.save(**invoice_data, calculate_from_os=False, record_history=False)
 
             # La integridad del archivo ya se verificó antes de abrir la
             # transacción (check_staged_storage_integrity), de modo que aquí no
             # se hace ninguna llamada a S3 con la factura bloqueada.
 
-            # 1. Link selected MANUAL charges to this invoice
-            # Use getlist() for FormData arrays, fallback to get() for JSON
-            charge_ids_raw = self.request.data.getlist('charge_ids', []) if hasattr(self.request.data, 'getlist') else self.request.data.get('charge_ids', [])
-
-            # Debug logging
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.info(f"Raw charge_ids received: {charge_ids_raw}")
-
-            # Convert to integers, filtering out empty strings and None
-            charge_ids = []
-            if charge_ids_raw:
-                from .models import OrderCharge
-                for id_val in charge_ids_raw:
-                    # Handle potential list if nested (shouldn't happen but defensive)
-                    if isinstance(id_val, list):
-                        for sub_val in id_val:
-                            if sub_val and str(sub_val).strip():
-                                try:
-                                    # Handle comma-separated strings
-                                    if isinstance(sub_val, str) and ',' in sub_val:
-                                        for part in sub_val.split(','):
-                                            if part.strip():
-                                                charge_ids.append(int(part.strip()))
-                                    else:
-                                        charge_ids.append(int(sub_val))
-                                except (ValueError, TypeError):
-                                    logger.warning(f"Invalid charge_id: {sub_val}")
-                    # Handle single value
-                    elif id_val and str(id_val).strip():
-                        try:
-                            # Handle comma-separated strings
-                            if isinstance(id_val, str) and ',' in id_val:
-                                for part in id_val.split(','):
-                                    if part.strip():
-                                        charge_ids.append(int(part.strip()))
-                            else:
-                                charge_ids.append(int(id_val))
-                        except (ValueError, TypeError):
-                            logger.warning(f"Invalid charge_id: {id_val}")
-
-                logger.info(f"Processed charge_ids: {charge_ids}")
-
-                if charge_ids:
-                    updated = OrderCharge.objects.filter(
-                        id__in=charge_ids,
-                        service_order=service_order,
-                        invoice__isnull=True
-                    ).update(invoice=invoice, billing_status='facturado')
-                    logger.info(f"Updated {updated} charges with invoice {invoice.id}")
-
-            # 2. Link selected TRANSFERS (Expenses) directly to invoice (without creating OrderCharges)
-            # Los gastos se quedan en su tabla, solo se marcan como facturados
+            # Vincular los servicios (charge_ids) y gastos (transfer_ids)
+            # seleccionados, calcular totales y registrar el historial.
             # Use getlist() for FormData arrays, fallback to get() for JSON
-            transfer_ids_raw = self.request.data.getlist('transfer_ids', []) if hasattr(self.request.data, 'getlist') else self.request.data.get('transfer_ids', [])
-
-            logger.info(f"Raw transfer_ids received: {transfer_ids_raw}")
+            from .invoice_assembly import assemble_invoice, parse_item_ids
 
-            # Convert to integers, filtering out empty strings and None
-            transfer_ids = []
-            if transfer_ids_raw:
-                from apps.transfers.models import Transfer
-                for id_val in transfer_ids_raw:
-                    # Handle potential list
-                    if isinstance(id_val, list):
-                        for sub_val in id_val:
-                            if sub_val and str(sub_val).strip():
-                                try:
-                                    if isinstance(sub_val, str) and ',' in sub_val:
-                                        for part in sub_val.split(','):
-                                            if part.strip():
-                                                transfer_ids.append(int(part.strip()))
-                                    else:
-                                        transfer_ids.append(int(sub_val))
-                                except (ValueError, TypeError):
-                                    logger.warning(f"Invalid transfer_id: {sub_val}")
-                    # Handle single value
-                    elif id_val and str(id_val).strip():
-                        try:
-                            if isinstance(id_val, str) and ',' in id_val:
-                                for part in id_val.split(','):
-                                    if part.strip():
-                                        transfer_ids.append(int(part.strip()))
-                            else:
-                                transfer_ids.append(int(id_val))
-                        except (ValueError, TypeError):
-                            logger.warning(f"Invalid transfer_id: {id_val}")
-
-                logger.info(f"Processed transfer_ids: {transfer_ids}")
-
-                if transfer_ids:
-                    # Marcar los transfers como facturados (sin moverlos a OrderCharge)
-                    updated = Transfer.objects.filter(
-                        id__in=transfer_ids,
-                        service_order=service_order,
-                        invoice__isnull=True  # Solo los no facturados
-                    ).update(invoice=invoice, billing_status='facturado')
-                    logger.info(f"Updated {updated} transfers with invoice {invoice.id}")
-
-            # Recalculate totals based on linked charges AND transfers
-            invoice.calculate_totals()
-
-            # Mark service order as invoiced (billing started)
-            service_order.facturado = True
-            service_order.save()
+            data = self.request.data
+            charge_ids = parse_item_ids(
+                data.getlist('charge_ids', []) if hasattr(data, 'getlist') else data.get('charge_ids', []),
+                'charge_id',
+            )
+            transfer_ids = parse_item_ids(
+                data.getlist('transfer_ids', []) if hasattr(data, 'getlist') else data.get('transfer_ids', []),
+                'transfer_id',
+            )
+            assemble_invoice(invoice, service_order, charge_ids, transfer_ids, user=self.request.user)
 
             return invoice
 
@@ -630,7 +555,8 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 service_order.facturado = False
                 service_order.save()
 
-            OrderHistory.objects.create(
+            record(
+                OrderHistory,
                 service_order=service_order,
                 event_type='updated',
                 description=f'Pre-factura {invoice_number} revertida de forma controlada.',
@@ -820,7 +746,8 @@ class InvoiceViewSet(viewsets.ModelViewSet):
 
                 # 5. Registrar en historial de la OS
                 from .models import OrderHistory
-                OrderHistory.objects.create(
+                record(
+                    OrderHistory,
                     service_order=inv.service_order,
                     event_type='updated',
                     description=f'Factura {inv.invoice_number} ANULADA. Motivo: {void_reason}',
@@ -1350,115 +1277,96 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         """Obtener el historial de ediciones de una factura"""
         invoice = self.get_object()
         
-        from .models import InvoiceEditHistory
+        from .models import InvoiceEditHistory, InvoiceEditHistoryArchive
         history = InvoiceEditHistory.objects.filter(invoice=invoice).select_related('user')
+        # Las ediciones archivadas (más antiguas que la retención) van al final
+        archived = InvoiceEditHistoryArchive.objects.filter(invoice=invoice).select_related('user')
         
         data = []
-        for h in history:
-            data.append({
-                'id': h.id,
-                'edit_type': h.edit_type,
-                'edit_type_display': h.get_edit_type_display(),
-                'description': h.description,
-                'previous_values': h.previous_values,
-                'new_values': h.new_values,
-                'user': h.user.get_full_name() if h.user else 'Sistema',
-                'created_at': h.created_at.isoformat()
-            })
+        for is_archived, entries in ((False, history), (True, archived)):
+            for h in entries:
+                data.append({
+                    'id': h.original_id if is_archived else h.id,
+                    'edit_type': h.edit_type,
+                    'edit_type_display': h.get_edit_type_display(),
+                    'description': h.description,
+                    'previous_values': h.previous_values,
+                    'new_values': h.new_values,
+                    'user': h.user.get_full_name() if h.user else 'Sistema',
+                    'created_at': h.created_at.isoformat(),
+                    'archived': is_archived,
+                })
         
         return Response(data)
 
     @action(detail=False, methods=['get'])
+    @read_replica
     def summary(self, request):
         """Get invoicing summary statistics with enhanced KPIs"""
-        queryset = self.get_queryset()
-        # Exclude cancelled invoices from KPIs to ensure mathematical consistency
-        # Total Facturado should only reflect valid, active invoices.
-        active_queryset = queryset.exclude(status='cancelled')
-        
+        from datetime import timedelta
         from django.utils import timezone
-        today = timezone.now().date()
+        from apps.core.summary import SummaryBuilder
 
-        # Basic totals
-        total_invoiced = active_queryset.aggregate(
-            total=Sum('total_amount')
-        )['total'] or Decimal('0')
+        queryset = self.get_queryset()
+        today = timezone.now().date()
+        week_end = today + timedelta(days=7)
 
-        total_pending = active_queryset.filter(balance__gt=0).aggregate(
-            total=Sum('balance')
-        )['total'] or Decimal('0')
+        # Exclude cancelled invoices from KPIs to ensure mathematical consistency
+        # Total Facturado should only reflect valid, active invoices.
+        active = ~Q(status='cancelled')
+        pending = active & Q(balance__gt=0)
+        overdue = pending & Q(due_date__lt=today)
+
+        # Todas las métricas en un solo aggregate con filtros condicionales
+        summary = SummaryBuilder()
+        summary.sum('total_invoiced', 'total_amount', active)
+        summary.sum('total_pending', 'balance', pending)
+        summary.sum('paid', 'paid_amount', active)
+        summary.sum('credited', 'credited_amount', active)
+        summary.sum('retained', 'retencion', active)
+        summary.sum('services', 'total_services', active)
+        summary.sum('expenses', 'total_third_party', active)
+        summary.sum('total_overdue', 'balance', overdue)
+        summary.count('overdue_count', overdue)
+        summary.count('pending_count', pending)
+        summary.count('paid_count', active & Q(status='paid'))
+        summary.count('partial_count', active & Q(status='partial'))
+        summary.count('cancelled_count', Q(status='cancelled'))
+        summary.count('due_this_week', pending & Q(due_date__gte=today, due_date__lte=week_end))
+        summary.count('total_invoices', active)
+        totals = summary.aggregate(queryset)
 
         # Para que Recuperado + Por Cobrar ≈ Total Facturado, debemos sumar
         # Paid Amount + Credited Amount + Retencion.
-        # Si solo sumamos Paid Amount, faltan las NC y Retenciones.
-        totals = active_queryset.aggregate(
-            paid=Sum('paid_amount'),
-            credited=Sum('credited_amount'),
-            retained=Sum('retencion'),
-            services=Sum('total_services'),
-            expenses=Sum('total_third_party')
-        )
-        
         # "Recuperado" = Pagado + Acreditado + Retenido (lo que ya no se debe)
-        total_paid_real = (totals['paid'] or Decimal('0'))
-        total_credited = totals['credited'] or Decimal('0')
-        total_retained = totals['retained'] or Decimal('0')
-        
-        total_collected = total_paid_real + total_credited + total_retained
-
-        # Overdue invoices
-        overdue_queryset = active_queryset.filter(
-            due_date__lt=today,
-            balance__gt=0
-        )
-        total_overdue = overdue_queryset.aggregate(
-            total=Sum('balance')
-        )['total'] or Decimal('0')
-        overdue_count = overdue_queryset.count()
-
-        # Status counts
-        pending_count = active_queryset.filter(balance__gt=0).count()
-        paid_count = active_queryset.filter(status='paid').count()
-        partial_count = active_queryset.filter(status='partial').count()
-        cancelled_count = queryset.filter(status='cancelled').count() # Keep using original queryset to count cancelled
-
-        # Additional KPIs
-        from datetime import timedelta
-        week_end = today + timedelta(days=7)
-        due_this_week = active_queryset.filter(
-            due_date__gte=today,
-            due_date__lte=week_end,
-            balance__gt=0
-        ).count()
-
-        total_services = totals['services'] or Decimal('0')
-        total_third_party_expenses = totals['expenses'] or Decimal('0')
+        total_collected = totals['paid'] + totals['credited'] + totals['retained']
 
         # Contar notas de crédito
         credit_notes_count = CreditNote.objects.filter(
-            invoice__in=active_queryset,
+            invoice__in=queryset.filter(active).values('pk'),
             is_deleted=False
         ).count()
 
         return Response({
-            'total_invoiced': str(total_invoiced),
-            'total_pending': str(total_pending),
+            'total_invoiced': str(totals['total_invoiced']),
+            'total_pending': str(totals['total_pending']),
             'total_collected': str(total_collected), # Now includes Credited + Retained
-            'total_overdue': str(total_overdue),
-            'total_services': str(total_services),
-            'total_third_party_expenses': str(total_third_party_expenses),
-            'total_credited': str(total_credited),
+            'total_overdue': str(totals['total_overdue']),
+            'total_services': str(totals['services']),
+            'total_third_party_expenses': str(totals['expenses']),
+            'total_credited': str(totals['credited']),
             'credit_notes_count': credit_notes_count,
-            'pending_count': pending_count,
-            'paid_count': paid_count,
-            'partial_count': partial_count,
-            'overdue_count': overdue_count,
-            'cancelled_count': cancelled_count,
-            'due_this_week': due_this_week,
-            'total_invoices': active_queryset.count(),
+            'pending_count': totals['pending_count'],
+            'paid_count': totals['paid_count'],
+            'partial_count': totals['partial_count'],
+            'overdue_count': totals['overdue_count'],
+            'cancelled_count': totals['cancelled_count'],
+            'due_this_week': totals['due_this_week'],
+            'total_invoices': totals['total_invoices'],
         })
 
     @action(detail=False, methods=['get'], permission_classes=[IsOperativo])
+    @read_replica
     def export_excel(self, request):
         """Export invoices to Excel with professional formatting"""
         from django.utils import timezone
@@ -1783,7 +1691,19 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                         f'con el monto del pago (${amount})'
                     )
                 
-                # Validar que cada item exista y pertenezca a la factura
+                # Validar que cada item exista y pertenezca a la factura.
+                # Items y montos ya pagados se leen en consultas fijas (no una
+                # por asignación) para no alargar el lock sobre la factura.
+                service_ids = [_as_pk(a.get('item_id')) for a in item_allocations_data if a.get('item_type') == 'service']
+                expense_ids = [_as_pk(a.get('item_id')) for a in item_allocations_data if a.get('item_type') == 'expense']
+                charges_by_id = OrderCharge.objects.filter(
+                    id__in=service_ids, invoice=inv
+                ).select_related('service').in_bulk() if service_ids else {}
+                expenses_by_id = Transfer.objects.filter(
+                    id__in=expense_ids, invoice=inv
+                ).in_bulk() if expense_ids else {}
+                charge_paid, expense_paid = PaymentItemAllocation.paid_totals_for_invoice(inv)
+
                 for alloc in item_allocations_data:
                     item_type = alloc.get('item_type')
                     item_id = alloc.get('item_id')
@@ -1792,44 +1712,38 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                     if alloc_amount <= 0:
                         raise ValueError(f'El monto de asignación debe ser mayor a cero')
                     
+                    alloc_rounded = alloc_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
                     if item_type == 'service':
-                        try:
-                            charge = OrderCharge.objects.get(id=item_id, invoice=inv)
-                            # Calcular pendiente del item
-                            item_paid = PaymentItemAllocation.objects.filter(
-                                charge=charge,
-                                payment__is_deleted=False,
-                                is_deleted=False
-                            ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-                            item_pending = (charge.total - item_paid).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                            alloc_rounded = alloc_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                            if alloc_rounded > item_pending:
-                                raise ValueError(
-                                    f'El monto asignado al servicio "{charge.service.name}" '
-                                    f'(${alloc_rounded}) excede su pendiente (${item_pending})'
-                                )
-                        except OrderCharge.DoesNotExist:
+                        charge = charges_by_id.get(_as_pk(item_id))
+                        if charge is None:
                             raise ValueError(f'Servicio #{item_id} no encontrado en esta factura')
-                    
+                        # Calcular pendiente del item
+                        item_paid = charge_paid.get(charge.id, Decimal('0.00'))
+                        item_pending = (charge.total - item_paid).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                        if alloc_rounded > item_pending:
+                            raise ValueError(
+                                f'El monto asignado al servicio "{charge.service.name}" '
+                                f'(${alloc_rounded}) excede su pendiente (${item_pending})'
+                            )
+                        # Un mismo item repetido en la solicitud consume su pendiente
+                        charge_paid[charge.id] = item_paid + alloc_amount
+                        alloc['item_id'] = charge.id
+
                     elif item_type == 'expense':
-                        try:
-                            expense = Transfer.objects.get(id=item_id, invoice=inv)
-                            # Calcular pendiente del item
-                            item_paid = PaymentItemAllocation.objects.filter(
-                                expense=expense,
-                                payment__is_deleted=False,
-                                is_deleted=False
-                            ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-                            item_total = expense.get_customer_total()
-                            item_pending = (item_total - item_paid).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                            alloc_rounded = alloc_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                            if alloc_rounded > item_pending:
-                                raise ValueError(
-                                    f'El monto asignado al gasto "{expense.description[:30]}" '
-                                    f'(${alloc_rounded}) excede su pendiente (${item_pending})'
-                                )
-                        except Transfer.DoesNotExist:
+                        expense = expenses_by_id.get(_as_pk(item_id))
+                        if expense is None:
                             raise ValueError(f'Gasto #{item_id} no encontrado en esta factura')
+                        # Calcular pendiente del item
+                        item_paid = expense_paid.get(expense.id, Decimal('0.00'))
+                        item_total = expense.get_customer_total()
+                        item_pending = (item_total - item_paid).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                        if alloc_rounded > item_pending:
+                            raise ValueError(
+                                f'El monto asignado al gasto "{expense.description[:30]}" '
+                                f'(${alloc_rounded}) excede su pendiente (${item_pending})'
+                            )
+                        expense_paid[expense.id] = item_paid + alloc_amount
+                        alloc['item_id'] = expense.id
                     else:
                         raise ValueError(f'Tipo de item inválido: {item_type}')
 
@@ -1893,32 +1807,32 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 created_by=request.user
             )
 
-            # Crear asignaciones por item si se proporcionaron
+            # Crear asignaciones por item si se proporcionaron.
+            # Ya validadas arriba contra el pendiente de cada item, se insertan
+            # en bloque (save() repetiría full_clean() con una consulta por item).
             allocations_created = []
             if item_allocations_data:
+                allocations = []
                 for alloc in item_allocations_data:
                     item_type = alloc.get('item_type')
                     item_id = alloc.get('item_id')
-                    alloc_amount = Decimal(str(alloc.get('amount', 0)))
-                    alloc_notes = alloc.get('notes', '')
-                    
-                    allocation_data = {
-                        'payment': payment,
-                        'amount': alloc_amount,
-                        'notes': alloc_notes
-                    }
-                    
-                    if item_type == 'service':
-                        allocation_data['charge_id'] = item_id
-                    elif item_type == 'expense':
-                        allocation_data['expense_id'] = item_id
-                    
-                    allocation = PaymentItemAllocation.objects.create(**allocation_data)
+                    allocations.append(PaymentItemAllocation(
+                        payment=payment,
+                        amount=Decimal(str(alloc.get('amount', 0))),
+                        notes=alloc.get('notes', ''),
+                        charge_id=item_id if item_type == 'service' else None,
+                        expense_id=item_id if item_type == 'expense' else None,
+                    ))
+
+                for allocation, alloc in zip(
+                    PaymentItemAllocation.objects.bulk_create(allocations),
+                    item_allocations_data,
+                ):
                     allocations_created.append({
                         'id': allocation.id,
-                        'item_type': item_type,
-                        'item_id': item_id,
-                        'amount': str(alloc_amount)
+                        'item_type': alloc.get('item_type'),
+                        'item_id': alloc.get('item_id'),
+                        'amount': str(allocation.amount)
                     })
 
             # El modelo InvoicePayment.save() ya actualiza paid_amount de la factura
@@ -1979,15 +1893,14 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         
         invoice = self.get_object()
         items = []
+
+        # Montos asignados de todos los items en una sola consulta agrupada
+        charge_paid, expense_paid = PaymentItemAllocation.paid_totals_for_invoice(invoice)
         
         # Obtener servicios (cargos)
         charges = invoice.charges.filter(is_deleted=False).select_related('service')
         for charge in charges:
-            paid_allocated = PaymentItemAllocation.objects.filter(
-                charge=charge,
-                payment__is_deleted=False,
-                is_deleted=False
-            ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+            paid_allocated = charge_paid.get(charge.id, Decimal('0.00'))
             
             items.append({
                 'id': f'service_{charge.id}',
@@ -2006,11 +1919,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         for transfer in transfers:
             total = transfer.get_customer_total()
             base_price = transfer.get_customer_base_price()
-            paid_allocated = PaymentItemAllocation.objects.filter(
-                expense=transfer,
-                payment__is_deleted=False,
-                is_deleted=False
-            ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+            paid_allocated = expense_paid.get(transfer.id, Decimal('0.00'))
             
             items.append({
                 'id': f'expense_{transfer.id}',
@@ -2214,33 +2123,9 @@ class InvoicePaymentViewSet(viewsets.ModelViewSet):
             )
 
         try:
-            # CORREGIDO: Usar transaccion atomica con select_for_update para prevenir race conditions
+            # El soft delete resta el monto del pago con la factura bloqueada
+            # (ver InvoicePayment.save y apps/core/balances.py)
             with transaction.atomic():
-                # Re-fetch invoice with lock
-                invoice = Invoice.objects.select_for_update().get(pk=payment.invoice_id)
-
-                # Recalcular paid_amount desde los pagos activos (excluyendo el que se elimina)
-                from django.db.models import Sum
-                remaining_payments = invoice.payments.filter(is_deleted=False).exclude(pk=payment.pk)
-                new_paid_amount = remaining_payments.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-
-                invoice.paid_amount = new_paid_amount
-                
-                # CORRECCIÓN: Usar la misma lógica que el modelo (total - pagado - notas_credito)
-                # La retención se maneja como un pago aparte, no se resta del balance base.
-                invoice.balance = invoice.total_amount - invoice.paid_amount - invoice.credited_amount
-
-                # Actualizar estado
-                if invoice.balance <= 0:
-                    invoice.status = 'paid'
-                elif invoice.paid_amount > 0:
-                    invoice.status = 'partial'
-                else:
-                    invoice.status = 'pending'
-
-                invoice.save()
-
-                # Delete payment (soft delete)
                 payment.delete()
 
             return Response(status=status.HTTP_204_NO_CONTENT)
@@ -2252,6 +2137,7 @@ class InvoicePaymentViewSet(viewsets.ModelViewSet):
             )
 
     @action(detail=False, methods=['get'], permission_classes=[IsOperativo])
+    @read_replica
     def export_excel(self, request):
         """Exportar listado de pagos a Excel con formato profesional"""
         from datetime import datetime
@@ -2376,7 +2262,7 @@ from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
 
-class RetentionControlView(APIView):
+class RetentionControlView(ReplicaReadMixin, APIView):
     """
     Vista para el Control de Retenciones F-910.
     Proporciona KPIs y lista de facturas con retención para grandes contribuyentes.
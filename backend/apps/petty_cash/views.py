@@ -10,6 +10,7 @@ from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from .models import PettyCashTransaction, CashCount
 from .serializers import PettyCashTransactionSerializer, CashCountSerializer
+from apps.core.db_routing import read_replica
 
 class PettyCashTransactionViewSet(viewsets.ModelViewSet):
     queryset = PettyCashTransaction.objects.all()
@@ -66,6 +67,7 @@ class PettyCashTransactionViewSet(viewsets.ModelViewSet):
         })
 
     @action(detail=False, methods=['get'])
+    @read_replica
     def export_excel(self, request):
         """Exportar movimientos de caja chica a Excel con formato profesional"""
         queryset = self.get_queryset()
@@ -301,6 +303,7 @@ class CashCountViewSet(viewsets.ModelViewSet):
 
 
     @action(detail=False, methods=['get'])
+    @read_replica
     def export_excel(self, request):
         """Exportar arqueos de caja chica a Excel con formato profesional"""
         queryset = self.get_queryset().order_by('-date')
@@ -401,6 +404,7 @@ class CashCountViewSet(viewsets.ModelViewSet):
         return response
 
     @action(detail=True, methods=['get'])
+    @read_replica
     def export_denomination_detail(self, request, pk=None):
         """Exportar detalle de denominaciones de un arqueo específico para depósito bancario"""
         cash_count = self.get_object()
@@ -0,0 +1,266 @@
+"""
+Registro de pagos agrupados (BatchPayment) a proveedores.
+
+Antes, BatchPaymentViewSet.create_batch_payment procesaba cada factura por
+separado: una consulta para leer el gasto y un ``TransferPayment.save()`` por
+asignación, que a su vez ejecutaba ``full_clean()``, bloqueaba el gasto y, al
+cambiar de estado, llamaba a ``Transfer.save()`` con sus lecturas previas y
+señales. Un pago a 50 facturas costaba cientos de consultas, y dos lotes
+concurrentes que compartían facturas las bloqueaban en distinto orden (riesgo
+de deadlock en PostgreSQL).
+
+``register_batch_payment`` hace el registro completo con un número fijo de
+consultas, sin importar cuántas facturas incluya el lote:
+
+1. Bloquea TODOS los gastos del lote con un único ``SELECT ... FOR UPDATE``
+   ordenado por id: dos lotes que comparten facturas las bloquean en el mismo
+   orden, así que uno espera al otro en lugar de bloquearse mutuamente.
+2. Valida en memoria (existencia, mismo proveedor, estado y saldo) sobre las
+   filas ya bloqueadas; si algo no cumple, se rechaza el lote completo.
+3. Crea el BatchPayment, inserta los pagos con ``bulk_create`` y actualiza
+   saldos y estados con un solo ``bulk_update`` (``settle_transfers``, misma
+   regla que ``Transfer.apply_payment_state()``; también lo usa la aplicación
+   de notas de crédito, apps/transfers/credit_notes.py).
+4. Ejecuta los efectos secundarios una vez por lote: historial de las OS,
+   notificaciones de gastos pagados, comprobante en los documentos de las OS
+   y refresco de alertas del dashboard.
+
+Los totales de las facturas de venta no dependen de lo pagado al proveedor,
+por eso no se recalculan (``Transfer.save()`` lo hacía en cada pago).
+"""
+
+import logging
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core.history_writer import record
+
+from .models import BatchPayment, Transfer, TransferPayment
+
+logger = logging.getLogger(__name__)
+
+PAYABLE_STATUSES = ('aprobado', 'parcial', 'pagado')
+
+
+def parse_allocations(allocations):
+    """
+    Normaliza ``[{"transfer_id": 1, "amount": "150.00"}, ...]``.
+
+    Ignora montos cero o negativos y suma las asignaciones repetidas a un mismo
+    gasto. Lanza ValueError si un monto no es numérico.
+
+    Returns:
+        OrderedDict ``{transfer_id: monto}`` en el orden recibido.
+    """
+    amounts = OrderedDict()
+    for item in allocations:
+        transfer_id = item.get('transfer_id')
+        try:
+            amount = Decimal(str(item.get('amount', 0)))
+            transfer_id = int(transfer_id)
+        except (InvalidOperation, TypeError, ValueError):
+            raise ValueError(f'Monto inválido para factura ID {transfer_id}')
+        if not amount.is_finite():
+            raise ValueError(f'Monto inválido para factura ID {transfer_id}')
+        if amount <= 0:
+            continue  # Ignorar montos 0 o negativos
+        amounts[transfer_id] = amounts.get(transfer_id, Decimal('0.00')) + amount
+    return amounts
+
+
+def lock_transfers(transfer_ids):
+    """
+    Gastos del lote bloqueados en orden de id (una consulta). Debe llamarse
+    dentro de una transacción.
+    """
+    return list(
+        Transfer.objects.select_related('provider', 'service_order')
+        .select_for_update(of=('self',))
+        .filter(id__in=transfer_ids)
+        .order_by('id')
+    )
+
+
+def _validate(transfers, amounts):
+    """Validaciones del lote sobre los gastos ya bloqueados. Lanza ValueError."""
+    missing = sorted(set(amounts) - {transfer.id for transfer in transfers})
+    if missing:
+        raise ValueError(f'Factura ID {missing[0]} no encontrada')
+
+    if len({transfer.provider_id for transfer in transfers}) > 1:
+        raise ValueError('Todas las facturas deben ser del mismo proveedor')
+
+    for transfer in transfers:
+        amount = amounts[transfer.id]
+        if transfer.status not in PAYABLE_STATUSES:
+            raise ValueError(
+                f'No se puede registrar un pago para un gasto en estado "{transfer.get_status_display()}" '
+                f'(factura {transfer.invoice_number or transfer.id}). Debe estar APROBADO.'
+            )
+        if amount > transfer.balance:
+            raise ValueError(
+                f'El monto ${amount} excede el saldo pendiente (${transfer.balance}) '
+                f'de la factura {transfer.invoice_number or transfer.id}'
+            )
+
+
+def register_batch_payment(allocations, payment_method, payment_date, user=None, bank_id=None,
+                           reference_number='', notes='', proof_file=None):
+    """
+    Registra un pago agrupado repartido entre varios gastos de un proveedor.
+
+    Args:
+        allocations: dict ``{transfer_id: monto}`` (ver ``parse_allocations``).
+
+    Returns:
+        tuple ``(batch_payment, payments)``.
+
+    Raises:
+        ValueError si el lote no es válido (no se registra nada).
+        ValidationError si algún pago no pasa las validaciones del modelo.
+    """
+    total_amount = sum(allocations.values(), Decimal('0.00'))
+    if not allocations or total_amount <= 0:
+        raise ValueError('El monto total a pagar debe ser mayor a cero')
+
+    with transaction.atomic():
+        transfers = lock_transfers(list(allocations))
+        _validate(transfers, allocations)
+
+        batch_payment = BatchPayment(
+            provider_id=transfers[0].provider_id,
+            total_amount=total_amount,
+            payment_method=payment_method,
+            payment_date=payment_date,
+            bank_id=bank_id,
+            reference_number=reference_number,
+            notes=notes,
+            created_by=user,
+        )
+        if proof_file:
+            batch_payment.proof_file = proof_file
+        # Los documentos se sincronizan al final, con los pagos ya creados
+        batch_payment._skip_document_sync = True
+        batch_payment.save()
+
+        payments = []
+        for transfer in transfers:
+            payment = TransferPayment(
+                transfer=transfer,
+                batch_payment=batch_payment,
+                amount=allocations[transfer.id],
+                payment_date=payment_date,
+                payment_method=payment_method,
+                reference_number=reference_number,
+                notes=f"Pago agrupado {batch_payment.batch_number}",
+                created_by=user,
+            )
+            if batch_payment.proof_file:
+                payment.proof_file = batch_payment.proof_file
+            # Las FK ya se validaron con los gastos bloqueados (sin consultas)
+            payment.full_clean(exclude=['transfer', 'batch_payment', 'created_by'])
+            payments.append(payment)
+        TransferPayment.objects.bulk_create(payments)
+
+        settle_transfers(transfers, allocations, user)
+
+        from .signals import sync_batch_documents
+        service_orders = list({
+            transfer.service_order_id: transfer.service_order
+            for transfer in transfers if transfer.service_order_id
+        }.values())
+        sync_batch_documents(batch_payment, service_orders)
+
+    logger.info(
+        f"Batch payment {batch_payment.batch_number} registered: "
+        f"{len(payments)} payments, total {total_amount}"
+    )
+    return batch_payment, payments
+
+
+def settle_transfers(transfers, amounts, user=None):
+    """
+    Suma ``amounts[transfer.id]`` (negativo para revertir) al pagado de cada
+    gasto bloqueado, recalcula saldo y estado con ``apply_payment_state()`` y
+    guarda todo con un ``bulk_update``. Registra los cambios de estado en el
+    historial, notifica los gastos pagados y refresca las alertas.
+
+    Returns:
+        lista de gastos cuyo estado cambió.
+    """
+    now = timezone.now()
+    previous_status = {}
+    for transfer in transfers:
+        previous_status[transfer.id] = transfer.status
+        transfer.paid_amount += amounts[transfer.id]
+        transfer.apply_payment_state()
+        transfer.updated_at = now
+    Transfer.objects.bulk_update(
+        transfers,
+        ['paid_amount', 'balance', 'status', 'amount_locked', 'payment_date', 'updated_at'],
+    )
+
+    changed = [transfer for transfer in transfers if transfer.status != previous_status[transfer.id]]
+    _record_status_changes(changed, previous_status, user)
+    _notify_paid(changed)
+
+    from apps.dashboard.alerts import SOURCE_TRANSFER, schedule_refresh
+    for transfer in transfers:
+        schedule_refresh(SOURCE_TRANSFER, transfer.id)
+    return changed
+
+
+def _record_status_changes(transfers, previous_status, user):
+    """Eventos de historial de OS por cambio de estado (como log_payment_events)."""
+    from apps.orders.models import OrderHistory
+
+    for transfer in transfers:
+        if not transfer.service_order_id:
+            continue
+        provider_name = transfer.provider.name if transfer.provider else "N/A"
+        if transfer.status == 'pagado':
+            event_type = 'payment_paid'
+            description = f'Pago ejecutado: {provider_name}'
+        else:
+            event_type = 'payment_updated'
+            description = f'Pago actualizado: {provider_name}'
+        record(
+            OrderHistory,
+            service_order=transfer.service_order,
+            user=user,
+            event_type=event_type,
+            description=description,
+            metadata={
+                'provider': transfer.provider.name if transfer.provider else None,
+                'amount': float(transfer.amount),
+                'previous_status': previous_status[transfer.id],
+                'new_status': transfer.status,
+            }
+        )
+
+
+def _notify_paid(transfers):
+    """Notifica al solicitante de cada gasto que quedó pagado (un solo INSERT)."""
+    from django.contrib.contenttypes.models import ContentType
+    from apps.users.models import Notification
+
+    content_type = ContentType.objects.get_for_model(Transfer)
+    notifications = []
+    for transfer in transfers:
+        if transfer.status != 'pagado' or not transfer.created_by_id:
+            continue
+        os_info = f" en OS {transfer.service_order.order_number}" if transfer.service_order else ""
+        notifications.append(Notification(
+            user_id=transfer.created_by_id,
+            title="Pago Realizado",
+            message=f"El pago a {transfer.provider.name if transfer.provider else 'Proveedor'}{os_info} por ${transfer.amount} ya fue realizado.",
+            notification_type='success',
+            category='payment',
+            content_type=content_type,
+            object_id=transfer.pk,
+        ))
+    if notifications:
+        Notification.objects.bulk_create(notifications)
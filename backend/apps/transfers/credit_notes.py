@@ -0,0 +1,272 @@
+"""
+Aplicación y reversión en bloque de notas de crédito de proveedor.
+
+Antes, ProviderCreditNoteViewSet.apply validaba cada gasto por separado y
+cada ``CreditNoteApplication.save()`` guardaba la NC, creaba un
+``TransferPayment`` (con toda la cascada de guardado del pago y del gasto) y
+disparaba ``sync_application_document``. ``revert()`` volvía a sumar en Python
+todos los pagos del gasto. Aplicar una NC a N facturas costaba O(N)
+consultas.
+
+``apply_credit_note`` y ``revert_applications`` procesan N aplicaciones con un
+número fijo de consultas:
+
+1. Bloquean la NC (una fila) y los gastos afectados en orden de id
+   (``lock_transfers``).
+2. Validan en memoria; si algo no cumple no se registra nada.
+3. Insertan/anulan aplicaciones y pagos ``nota_credito`` en bloque y ajustan
+   los gastos con ``settle_transfers`` (apps/transfers/batch_payments.py).
+4. Guardan la NC una sola vez y sincronizan los documentos de las OS en bloque.
+
+Las filas resultantes (aplicaciones y pagos) son las mismas que produce
+``CreditNoteApplication.save()``, que sigue disponible para uso individual.
+"""
+
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.core.history_writer import record
+
+from .batch_payments import PAYABLE_STATUSES, lock_transfers, settle_transfers
+from .models import CreditNoteApplication, ProviderCreditNote, TransferPayment
+
+logger = logging.getLogger(__name__)
+
+CREDIT_NOTE_PAYMENT_METHOD = 'nota_credito'
+
+
+def _lock_credit_note(credit_note):
+    return ProviderCreditNote.objects.select_related('provider', 'original_transfer').select_for_update(
+        of=('self',)
+    ).get(pk=credit_note.pk)
+
+
+def apply_credit_note(credit_note, applications, user=None):
+    """
+    Aplica ``credit_note`` a varios gastos del mismo proveedor.
+
+    Args:
+        applications: ``[{'transfer_id': 1, 'amount': Decimal, 'notes': ''}, ...]``
+
+    Returns:
+        tuple ``(credit_note, aplicaciones creadas)`` con la NC actualizada.
+
+    Raises:
+        ValidationError con la lista de errores (no se registra nada).
+    """
+    with transaction.atomic():
+        credit_note = _lock_credit_note(credit_note)
+        if not credit_note.can_apply():
+            raise ValidationError(
+                f'Esta nota de crédito no puede aplicarse. Estado: {credit_note.get_status_display()}. '
+                f'Saldo disponible: ${credit_note.available_amount}'
+            )
+
+        try:
+            requested = [
+                (int(app['transfer_id']), Decimal(str(app['amount'])), app.get('notes', '') or '')
+                for app in applications
+            ]
+        except (TypeError, ValueError, ArithmeticError):
+            raise ValidationError('Aplicaciones inválidas: transfer_id y amount deben ser numéricos.')
+        total = sum((amount for _, amount, _ in requested), Decimal('0.00'))
+        if total > credit_note.available_amount:
+            raise ValidationError(
+                f'Intentando aplicar ${total}, pero solo hay ${credit_note.available_amount} disponibles.'
+            )
+
+        transfers = {transfer.id: transfer for transfer in lock_transfers({tid for tid, _, _ in requested})}
+        per_transfer = defaultdict(lambda: Decimal('0.00'))
+        errors = []
+        for transfer_id, amount, _ in requested:
+            transfer = transfers.get(transfer_id)
+            if transfer is None:
+                errors.append(f"Factura #{transfer_id} no encontrada")
+                continue
+            if transfer.provider_id != credit_note.provider_id:
+                errors.append(f"Factura #{transfer_id} no pertenece al proveedor {credit_note.provider.name}")
+                continue
+            if transfer.status not in PAYABLE_STATUSES:
+                errors.append(
+                    f"Factura #{transfer_id}: no se puede aplicar a un gasto en estado "
+                    f"\"{transfer.get_status_display()}\". Debe estar APROBADO."
+                )
+                continue
+            per_transfer[transfer_id] += amount
+            if per_transfer[transfer_id] > transfer.balance:
+                errors.append(f"Factura #{transfer_id}: monto ${amount} excede saldo pendiente ${transfer.balance}")
+        if errors:
+            raise ValidationError(errors)
+
+        created = CreditNoteApplication.objects.bulk_create([
+            CreditNoteApplication(
+                credit_note=credit_note,
+                transfer=transfers[transfer_id],
+                amount=amount,
+                applied_by=user,
+                notes=notes,
+            )
+            for transfer_id, amount, notes in requested
+        ])
+        TransferPayment.objects.bulk_create([
+            TransferPayment(
+                transfer=application.transfer,
+                amount=application.amount,
+                payment_date=credit_note.issue_date,
+                payment_method=CREDIT_NOTE_PAYMENT_METHOD,
+                reference_number=credit_note.note_number,
+                notes=f"Aplicación de NC: {credit_note.note_number}",
+                created_by=user,
+            )
+            for application in created
+        ])
+
+        locked = [transfers[transfer_id] for transfer_id in sorted(per_transfer)]
+        settle_transfers(locked, per_transfer, user)
+
+        credit_note.applied_amount += total
+        credit_note.save()
+
+        _sync_application_documents(credit_note, created, user)
+
+    logger.info(f"Credit note {credit_note.note_number} applied to {len(created)} transfer(s), total {total}")
+    return credit_note, created
+
+
+def revert_applications(credit_note, applications=None, user=None, save=True):
+    """
+    Revierte aplicaciones de ``credit_note`` (todas las activas si
+    ``applications`` es None): anula sus pagos ``nota_credito``, restituye el
+    saldo de los gastos y descuenta lo aplicado de la NC.
+
+    Args:
+        save: si es False, la NC queda actualizada en memoria pero sin guardar
+            (``ProviderCreditNote.void`` la guarda junto con la anulación).
+
+    Returns:
+        la NC bloqueada y actualizada.
+    """
+    with transaction.atomic():
+        credit_note = _lock_credit_note(credit_note)
+        active = CreditNoteApplication.objects.filter(credit_note=credit_note, is_deleted=False)
+        if applications is not None:
+            active = active.filter(pk__in=[application.pk for application in applications])
+        active = list(active.order_by('id'))
+        if not active:
+            return credit_note
+
+        transfers = {transfer.id: transfer for transfer in lock_transfers({a.transfer_id for a in active})}
+
+        # Pagos nota_credito de esta NC, emparejados uno a uno con cada
+        # aplicación por gasto y monto
+        available = defaultdict(list)
+        for payment in TransferPayment.objects.filter(
+            transfer_id__in=list(transfers),
+            payment_method=CREDIT_NOTE_PAYMENT_METHOD,
+            reference_number=credit_note.note_number,
+            is_deleted=False,
+        ).order_by('id'):
+            available[(payment.transfer_id, payment.amount)].append(payment.pk)
+
+        payment_ids = []
+        per_transfer = defaultdict(lambda: Decimal('0.00'))
+        for application in active:
+            matches = available[(application.transfer_id, application.amount)]
+            if matches and application.transfer_id in transfers:
+                payment_ids.append(matches.pop(0))
+                per_transfer[application.transfer_id] -= application.amount
+
+        now = timezone.now()
+        TransferPayment.all_objects.filter(pk__in=payment_ids).update(is_deleted=True, deleted_at=now)
+        CreditNoteApplication.all_objects.filter(pk__in=[a.pk for a in active]).update(
+            is_deleted=True, deleted_at=now,
+        )
+
+        locked = [transfers[transfer_id] for transfer_id in sorted(per_transfer)]
+        settle_transfers(locked, per_transfer, user)
+
+        credit_note.applied_amount -= sum((a.amount for a in active), Decimal('0.00'))
+        if save:
+            credit_note.save()
+
+    return credit_note
+
+
+def _sync_application_documents(credit_note, applications, user):
+    """
+    Documento de la NC en la OS de cada gasto aplicado (como
+    ``sync_application_document``), con una consulta de existentes y un
+    ``bulk_create``.
+    """
+    from apps.orders.models import OrderDocument, OrderHistory
+
+    if not credit_note.pdf_file:
+        return
+
+    targets = {}
+    for application in applications:
+        transfer = application.transfer
+        if not transfer.service_order_id or transfer.id == credit_note.original_transfer_id:
+            continue
+        # Descripción única con delimitadores
+        key = f"[AppNC:{credit_note.note_number}:{transfer.id}]"
+        targets[key] = (
+            transfer,
+            f"Aplicación NC {credit_note.note_number} a Factura {transfer.invoice_number} - "
+            f"Aplicado: ${application.amount} {key}",
+        )
+    if not targets:
+        return
+
+    try:
+        # Savepoint propio: un error de base aquí no deja inutilizable la
+        # transacción de apply_credit_note (la aplicación se conserva)
+        with transaction.atomic():
+            lookup = Q()
+            for key in targets:
+                lookup |= Q(description__contains=key)
+            existing = {}
+            for doc in OrderDocument.objects.filter(lookup).order_by('id'):
+                for key in targets:
+                    if key in doc.description and doc.order_id == targets[key][0].service_order_id:
+                        existing.setdefault(key, doc)
+
+            new_docs = []
+            for key, (transfer, description) in targets.items():
+                doc = existing.get(key)
+                if doc is None:
+                    new_docs.append(OrderDocument(
+                        order=transfer.service_order,
+                        document_type='factura_costo',
+                        file=credit_note.pdf_file,
+                        description=description,
+                        uploaded_by=user,
+                    ))
+                elif doc.file != credit_note.pdf_file:
+                    doc.file = credit_note.pdf_file
+                    doc.description = description
+                    doc.save()
+
+            OrderDocument.objects.bulk_create(new_docs)
+            # Mismo evento que log_document_upload (bulk_create no envía señales)
+            for doc in new_docs:
+                record(
+                    OrderHistory,
+                    service_order=doc.order,
+                    user=user,
+                    event_type='document_uploaded',
+                    description=f'Documento subido: {doc.description}',
+                    metadata={
+                        'document_type': doc.document_type,
+                        'file_name': doc.file.name.split('/')[-1],
+                        'description': doc.description,
+                    }
+                )
+    except Exception as e:
+        logger.error(f"Error al sincronizar documentos de aplicación de NC: {e}")
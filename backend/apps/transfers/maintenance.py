@@ -0,0 +1,116 @@
+"""
+Tareas de mantenimiento por lotes sobre gastos y costos directos (ver
+apps/core/maintenance.py).
+
+- ``TransferStatusTask`` (``fix_transfer_status``): saldo y estado de los
+  gastos según ``paid_amount``.
+- ``OrphanAllocationTask`` / ``OrphanChargeTask``
+  (``fix_orphan_third_party_charges``): asignaciones activas cuya factura de
+  proveedor fue eliminada y cargos tercerizados sin asignación activa.
+"""
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from apps.core.maintenance import MaintenanceTask
+from apps.orders.models import OrderCharge
+
+from .models import DirectCostAllocation, Transfer
+
+
+class TransferStatusTask(MaintenanceTask):
+    name = 'fix_transfer_status'
+    label = 'Estados de gastos'
+    model = Transfer
+    fields = ('balance', 'status')
+
+    def candidates(self):
+        return Transfer.objects.all()
+
+    def describe(self, obj):
+        return f'Transfer #{obj.pk} (Pagado: ${obj.paid_amount})'
+
+    def recompute(self, rows):
+        for transfer in rows:
+            transfer.balance = transfer.amount - transfer.paid_amount
+
+            if transfer.balance <= 0 and transfer.amount > 0:
+                transfer.status = 'pagado'
+            elif transfer.paid_amount > 0 and transfer.balance > 0:
+                transfer.status = 'parcial'
+            elif transfer.status == 'pagado' and transfer.balance > 0:
+                transfer.status = 'parcial' if transfer.paid_amount > 0 else 'aprobado'
+            elif transfer.paid_amount == 0 and transfer.status == 'parcial':
+                transfer.status = 'pendiente'
+
+    def after_update(self, rows):
+        from apps.dashboard.alerts import SOURCE_TRANSFER, schedule_refresh
+
+        for transfer in rows:
+            schedule_refresh(SOURCE_TRANSFER, transfer.pk)
+
+
+class OrphanAllocationTask(MaintenanceTask):
+    name = 'fix_orphan_allocations'
+    label = 'Asignaciones activas con factura de proveedor eliminada'
+    model = DirectCostAllocation
+    fields = ('is_deleted', 'deleted_at')
+
+    def __init__(self, service_order_id=None):
+        self.service_order_id = service_order_id
+        if service_order_id:
+            self.name = f'{self.name}:{service_order_id}'
+
+    def candidates(self):
+        queryset = DirectCostAllocation.objects.filter(provider_invoice__is_deleted=True)
+        if self.service_order_id:
+            queryset = queryset.filter(order_charge__service_order_id=self.service_order_id)
+        return queryset
+
+    def describe(self, obj):
+        return (
+            f'Allocation #{obj.pk} | Charge #{obj.order_charge_id} | '
+            f'ProviderInvoice #{obj.provider_invoice_id} (eliminada)'
+        )
+
+    def recompute(self, rows):
+        now = timezone.now()
+        for allocation in rows:
+            allocation.is_deleted = True
+            allocation.deleted_at = now
+
+
+class OrphanChargeTask(MaintenanceTask):
+    name = 'fix_orphan_third_party_charges'
+    label = 'Cargos tercerizados sin asignación activa'
+    model = OrderCharge
+    fields = ('is_third_party_service',)
+
+    def __init__(self, service_order_id=None):
+        self.service_order_id = service_order_id
+        if service_order_id:
+            self.name = f'{self.name}:{service_order_id}'
+
+    def candidates(self):
+        active_allocation = DirectCostAllocation.objects.filter(
+            order_charge_id=OuterRef('pk'),
+            is_deleted=False,
+            provider_invoice__is_deleted=False,
+        )
+        queryset = OrderCharge.objects.filter(is_third_party_service=True).filter(
+            ~Exists(active_allocation)
+        ).select_related('service_order', 'service')
+        if self.service_order_id:
+            queryset = queryset.filter(service_order_id=self.service_order_id)
+        return queryset
+
+    def describe(self, obj):
+        invoice_info = f'Factura #{obj.invoice_id}' if obj.invoice_id else 'Sin factura'
+        return (
+            f'Charge #{obj.pk} | OS {obj.service_order.order_number} | '
+            f'Servicio: {obj.service.name} | {invoice_info}'
+        )
+
+    def recompute(self, rows):
+        for charge in rows:
+            charge.is_third_party_service = False
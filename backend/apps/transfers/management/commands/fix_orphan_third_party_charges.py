@@ -1,23 +1,32 @@
-from django.core.management.base import BaseCommand
-from django.db.models import Exists, OuterRef
-from django.utils import timezone
+"""
+Django Management Command: Corregir cargos tercerizados huérfanos
 
-from apps.orders.models import OrderCharge
-from apps.transfers.models import DirectCostAllocation
+Desactiva las asignaciones de costo directo activas cuya factura de proveedor
+fue eliminada y desmarca como tercerizados los cargos que quedan sin
+asignación activa (apps/transfers/maintenance.py).
 
+USO:
+    # Vista previa:
+    python manage.py fix_orphan_third_party_charges
 
-class Command(BaseCommand):
+    # Aplicar los cambios:
+    python manage.py fix_orphan_third_party_charges --apply
+    python manage.py fix_orphan_third_party_charges --apply --service-order-id 123 --limit 500
+"""
+
+from apps.core.management.maintenance import MaintenanceCommand
+from apps.transfers.maintenance import OrphanAllocationTask, OrphanChargeTask
+
+
+class Command(MaintenanceCommand):
     help = (
         "Corrige cargos marcados como tercerizados sin asignacion activa "
         "de costo directo (huerfanos historicos)."
     )
+    apply_by_default = False
 
     def add_arguments(self, parser):
-        parser.add_argument(
-            "--apply",
-            action="store_true",
-            help="Aplica los cambios. Sin esta bandera solo muestra vista previa.",
-        )
+        super().add_arguments(parser)
         parser.add_argument(
             "--service-order-id",
             type=int,
@@ -28,119 +37,11 @@ class Command(BaseCommand):
             "--limit",
             type=int,
             default=0,
-            help="Limita la cantidad de registros a procesar (0 = sin limite).",
-        )
-
-    def handle(self, *args, **options):
-        apply_changes = options["apply"]
-        service_order_id = options["service_order_id"]
-        limit = max(0, int(options["limit"] or 0))
-
-        orphan_allocations_qs = DirectCostAllocation.objects.filter(
-            is_deleted=False,
-            provider_invoice__is_deleted=True,
-        )
-        if service_order_id:
-            orphan_allocations_qs = orphan_allocations_qs.filter(
-                order_charge__service_order_id=service_order_id
-            )
-        if limit:
-            orphan_allocations_qs = orphan_allocations_qs[:limit]
-
-        orphan_allocations = list(orphan_allocations_qs)
-
-        if orphan_allocations:
-            self.stdout.write(
-                self.style.WARNING(
-                    f"Se detectaron {len(orphan_allocations)} asignacion(es) activa(s) con factura de proveedor eliminada."
-                )
-            )
-
-            for alloc in orphan_allocations:
-                self.stdout.write(
-                    f"  - Allocation #{alloc.id} | Charge #{alloc.order_charge_id} | ProviderInvoice #{alloc.provider_invoice_id} (eliminada)"
-                )
-
-            if apply_changes:
-                now = timezone.now()
-                DirectCostAllocation.objects.filter(
-                    id__in=[alloc.id for alloc in orphan_allocations]
-                ).update(is_deleted=True, deleted_at=now)
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f"Asignaciones huérfanas por factura eliminada desactivadas: {len(orphan_allocations)}."
-                    )
-                )
-            else:
-                self.stdout.write(
-                    self.style.WARNING(
-                        "Vista previa: estas asignaciones se desactivarán al usar --apply."
-                    )
-                )
-
-        active_allocation = DirectCostAllocation.objects.filter(
-            order_charge_id=OuterRef("pk"),
-            is_deleted=False,
-            provider_invoice__is_deleted=False,
-        )
-
-        queryset = (
-            OrderCharge.objects.filter(
-                is_deleted=False,
-                is_third_party_service=True,
-            )
-            .annotate(has_active_allocation=Exists(active_allocation))
-            .filter(has_active_allocation=False)
-            .select_related("service_order", "invoice", "service")
-            .order_by("id")
+            help="Limita la cantidad de registros a procesar por tarea (0 = sin limite).",
         )
 
-        if service_order_id:
-            queryset = queryset.filter(service_order_id=service_order_id)
-
-        if limit:
-            queryset = queryset[:limit]
-
-        orphan_charges = list(queryset)
-
-        if not orphan_charges:
-            self.stdout.write(
-                self.style.SUCCESS(
-                    "No se encontraron cargos tercerizados huerfanos."
-                )
-            )
-            return
-
-        self.stdout.write(
-            self.style.WARNING(
-                f"Se detectaron {len(orphan_charges)} cargo(s) tercerizado(s) sin asignacion activa."
-            )
-        )
-
-        for charge in orphan_charges:
-            invoice_info = f"Factura #{charge.invoice_id}" if charge.invoice_id else "Sin factura"
-            self.stdout.write(
-                f"  - Charge #{charge.id} | OS {charge.service_order.order_number} | "
-                f"Servicio: {charge.service.name} | {invoice_info}"
-            )
-
-        if not apply_changes:
-            self.stdout.write(
-                self.style.WARNING(
-                    "Vista previa completada. Use --apply para ejecutar la correccion."
-                )
-            )
-            return
-
-        updated = 0
-        for charge in orphan_charges:
-            OrderCharge.objects.filter(pk=charge.pk).update(
-                is_third_party_service=False
-            )
-            updated += 1
-
-        self.stdout.write(
-            self.style.SUCCESS(
-                f"Correccion aplicada. Cargos normalizados: {updated}."
-            )
-        )
+    def get_tasks(self, options):
+        return [
+            OrphanAllocationTask(options["service_order_id"]),
+            OrphanChargeTask(options["service_order_id"]),
+        ]
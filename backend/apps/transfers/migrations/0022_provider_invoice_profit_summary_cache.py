@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfers', '0021_add_provider_invoice_payment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='providerinvoice',
+            name='profit_summary_cache',
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name='Resumen de Rentabilidad'),
+        ),
+    ]
@@ -7,6 +7,7 @@ from apps.orders.models import ServiceOrder
 from apps.catalogs.models import Provider, Bank
 from apps.validators import validate_document_file
 from apps.core.models import SoftDeleteModel
+from apps.core.sequences import next_number, register_series
 
 # Constantes fiscales El Salvador
 IVA_RATE = Decimal('0.13')
@@ -148,6 +149,14 @@ class ProviderInvoice(SoftDeleteModel):
     # Notas
     notes = models.TextField(blank=True, verbose_name="Notas")
 
+    # Resumen de rentabilidad precalculado (ver get_profit_summary)
+    profit_summary_cache = models.JSONField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Resumen de Rentabilidad"
+    )
+
     # Auditoría
     created_by = models.ForeignKey(
         'users.User',
@@ -172,15 +181,26 @@ class ProviderInvoice(SoftDeleteModel):
     def __str__(self):
         return f"{self.invoice_number} - {self.provider.name} - ${self.total_amount}"
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, allocation_stats=None, **kwargs):
+        """
+        Recalcula saldo sin asignar, estado de asignación y el resumen de
+        rentabilidad con UNA consulta anotada (``allocation_stats()``), en vez
+        de recargar la fila y recorrer las asignaciones una por una.
+
+        Args:
+            allocation_stats: resultado de ``allocation_stats()`` ya leído
+                (``recalculate_allocated`` lo pasa para no repetir la consulta).
+        """
+        stats = allocation_stats
+        if stats is None and self.pk:
+            stats = self.allocation_stats()
+
         # Bloquear cambios en el monto si ya hay servicios facturados
-        if self.pk:
-            old_instance = ProviderInvoice.objects.get(pk=self.pk)
-            if old_instance.total_amount != self.total_amount:
-                if self.status == 'facturado' or self.allocations.filter(is_deleted=False, order_charge__invoice__isnull=False).exists():
-                    raise ValidationError(
-                        "No se puede modificar el monto de una factura de proveedor con servicios ya facturados al cliente."
-                    )
+        if stats is not None and stats['total_amount'] != self.total_amount:
+            if self.status == 'facturado' or stats['invoiced_count']:
+                raise ValidationError(
+                    "No se puede modificar el monto de una factura de proveedor con servicios ya facturados al cliente."
+                )
 
         # Calcular monto sin asignar
         self.unallocated_amount = self.total_amount - self.allocated_amount
@@ -190,18 +210,25 @@ class ProviderInvoice(SoftDeleteModel):
             self.status = 'pendiente'
         elif self.allocated_amount < self.total_amount:
             self.status = 'parcial'
+        elif stats is not None:
+            # Facturado si todos los servicios vinculados ya se facturaron al cliente
+            all_billed = stats['allocations_count'] and stats['billed_count'] == stats['allocations_count']
+            self.status = 'facturado' if all_billed else 'asignado'
         else:
-            # Verificar si los servicios vinculados ya fueron facturados al cliente
-            if hasattr(self, 'pk') and self.pk:
-                all_billed = all(
-                    alloc.order_charge.billing_status == 'facturado'
-                    for alloc in self.allocations.filter(is_deleted=False)
-                )
-                self.status = 'facturado' if all_billed and self.allocations.exists() else 'asignado'
-            else:
-                self.status = 'asignado'
+            self.status = 'asignado'
+
+        if stats is not None:
+            self.profit_summary_cache = build_profit_summary(stats['total_cost'], stats['total_sale'])
+
+        self.apply_payment_state()
+
+        super().save(*args, **kwargs)
+
+    # Campos que dependen de paid_amount (ver apps.core.balances)
+    PAYMENT_STATE_FIELDS = ('payment_status',)
 
-        # Actualizar estado de pago
+    def apply_payment_state(self):
+        """Recalcula el estado de pago a partir de paid_amount."""
         if self.paid_amount >= self.total_amount:
             self.payment_status = 'pagado'
         elif self.paid_amount > Decimal('0.00'):
@@ -209,8 +236,6 @@ class ProviderInvoice(SoftDeleteModel):
         else:
             self.payment_status = 'pendiente'
 
-        super().save(*args, **kwargs)
-
     def delete(self, *args, **kwargs):
         """
         Bloquea la eliminación si la factura ya tiene servicios facturados al cliente.
@@ -244,35 +269,72 @@ class ProviderInvoice(SoftDeleteModel):
 
         super().delete(*args, **kwargs)
 
+    def allocation_stats(self):
+        """
+        Totales de las asignaciones activas en una sola consulta agregada:
+        costo, venta (subtotal de los servicios), cantidad, cuántas tienen el
+        servicio facturado y cuántas están vinculadas a una factura de cliente.
+        Incluye ``total_amount`` tal como está guardado.
+        """
+        from django.db.models import Count, DecimalField, Q, Sum, Value
+        from django.db.models.functions import Coalesce
+
+        active = Q(allocations__is_deleted=False)
+        money = DecimalField(max_digits=15, decimal_places=2)
+        return ProviderInvoice._base_manager.filter(pk=self.pk).annotate(
+            total_cost=Coalesce(Sum('allocations__cost_amount', filter=active), Value(Decimal('0.00')), output_field=money),
+            total_sale=Coalesce(Sum('allocations__order_charge__subtotal', filter=active), Value(Decimal('0.00')), output_field=money),
+            allocations_count=Count('allocations', filter=active),
+            billed_count=Count('allocations', filter=active & Q(allocations__order_charge__billing_status='facturado')),
+            invoiced_count=Count('allocations', filter=active & Q(allocations__order_charge__invoice__isnull=False)),
+        ).values(
+            'total_amount', 'total_cost', 'total_sale', 'allocations_count', 'billed_count', 'invoiced_count'
+        ).first()
+
     def recalculate_allocated(self):
         """Recalcula el monto asignado desde las asignaciones"""
-        from django.db.models import Sum
-        total = self.allocations.filter(is_deleted=False).aggregate(
-            total=Sum('cost_amount')
-        )['total'] or Decimal('0.00')
-        self.allocated_amount = total
-        self.save()
+        stats = self.allocation_stats()
+        self.allocated_amount = stats['total_cost']
+        self.save(allocation_stats=stats)
 
     def get_profit_summary(self):
-        """Retorna resumen de rentabilidad de esta factura"""
-        total_cost = Decimal('0.00')
-        total_sale = Decimal('0.00')
-
-        for alloc in self.allocations.filter(is_deleted=False):
-            total_cost += alloc.cost_amount
-            if alloc.order_charge:
-                total_sale += alloc.order_charge.subtotal
-
-        profit = total_sale - total_cost
-        margin = (profit / total_cost * 100) if total_cost > 0 else Decimal('0.00')
-
-        return {
-            'total_cost': float(total_cost),
-            'total_sale': float(total_sale),
-            'profit': float(profit),
-            'margin_percentage': float(margin),
-            'unallocated': float(self.unallocated_amount)
-        }
+        """
+        Retorna resumen de rentabilidad de esta factura.
+
+        Se guarda en ``profit_summary_cache`` al recalcular la factura y se
+        invalida cuando cambia el subtotal de un servicio vinculado
+        (``invalidate_profit_summaries``); si está vacío se recalcula aquí.
+        """
+        summary = self.profit_summary_cache
+        if summary is None and self.pk:
+            stats = self.allocation_stats()
+            summary = build_profit_summary(stats['total_cost'], stats['total_sale'])
+            ProviderInvoice._base_manager.filter(pk=self.pk).update(profit_summary_cache=summary)
+            self.profit_summary_cache = summary
+        elif summary is None:
+            summary = build_profit_summary(Decimal('0.00'), Decimal('0.00'))
+
+        return {**summary, 'unallocated': float(self.unallocated_amount)}
+
+
+def build_profit_summary(total_cost, total_sale):
+    """Costo, venta, ganancia y margen (sin ``unallocated``, que vive en la fila)."""
+    profit = total_sale - total_cost
+    margin = (profit / total_cost * 100) if total_cost > 0 else Decimal('0.00')
+
+    return {
+        'total_cost': float(total_cost),
+        'total_sale': float(total_sale),
+        'profit': float(profit),
+        'margin_percentage': float(margin),
+    }
+
+
+def invalidate_profit_summaries(order_charge_ids):
+    """Vacía el resumen de rentabilidad de las facturas con esos servicios vinculados."""
+    ProviderInvoice._base_manager.filter(
+        allocations__order_charge_id__in=order_charge_ids,
+    ).update(profit_summary_cache=None)
 
 
 class DirectCostAllocation(SoftDeleteModel):
@@ -368,14 +430,15 @@ class DirectCostAllocation(SoftDeleteModel):
         is_new = not self.pk
         super().save(*args, **kwargs)
 
-        # Actualizar el monto asignado en la factura de proveedor
-        self.provider_invoice.recalculate_allocated()
-
         # Marcar el OrderCharge como servicio tercerizado
         if self.order_charge and not self.order_charge.is_third_party_service:
             self.order_charge.is_third_party_service = True
             self.order_charge.save(skip_order_validation=True)
 
+        # Actualizar el monto asignado (y el resumen de rentabilidad) en la
+        # factura de proveedor
+        self.provider_invoice.recalculate_allocated()
+
     def delete(self, *args, **kwargs):
         """Al eliminar, actualizar factura y desmarcar servicio"""
         order_charge = self.order_charge
@@ -485,30 +548,12 @@ class ProviderInvoicePayment(SoftDeleteModel):
         return f"Pago ${self.amount} - {self.provider_invoice.invoice_number}"
 
     def save(self, *args, **kwargs):
-        from django.db import transaction
-        from django.db.models import Sum
-
-        with transaction.atomic():
-            super().save(*args, **kwargs)
-            pi = ProviderInvoice.objects.select_for_update().get(pk=self.provider_invoice_id)
-            total_paid = pi.invoice_payments.filter(is_deleted=False).aggregate(
-                total=Sum('amount')
-            )['total'] or Decimal('0.00')
-            pi.paid_amount = total_paid
-            pi.save()
-
-    def delete(self, *args, **kwargs):
-        from django.db import transaction
-        from django.db.models import Sum
+        """Suma/resta solo este pago al total pagado (ver apps/core/balances.py)."""
+        from apps.core.balances import update_parent_paid_amount
 
-        with transaction.atomic():
-            super().delete(*args, **kwargs)
-            pi = ProviderInvoice.objects.select_for_update().get(pk=self.provider_invoice_id)
-            total_paid = pi.invoice_payments.filter(is_deleted=False).aggregate(
-                total=Sum('amount')
-            )['total'] or Decimal('0.00')
-            pi.paid_amount = total_paid
-            pi.save()
+        update_parent_paid_amount(
+            self, 'provider_invoice', lambda: super(ProviderInvoicePayment, self).save(*args, **kwargs)
+        )
 
 
 class Transfer(SoftDeleteModel):
@@ -784,6 +829,17 @@ class Transfer(SoftDeleteModel):
         else:
             self.billing_status = 'disponible'
 
+        self.apply_payment_state()
+
+        super().save(*args, **kwargs)
+
+    # Campos que dependen de paid_amount (ver apps.core.balances). Un cambio
+    # de estado se guarda con save() para que se disparen las notificaciones.
+    PAYMENT_STATE_FIELDS = ('balance', 'status', 'amount_locked', 'payment_date')
+    PAYMENT_SIGNAL_FIELDS = ('status',)
+
+    def apply_payment_state(self):
+        """Recalcula saldo, estado y bloqueo de monto a partir de paid_amount."""
         # Bloquear monto si ya tiene pagos registrados
         if self.paid_amount > 0:
             self.amount_locked = True
@@ -811,8 +867,6 @@ class Transfer(SoftDeleteModel):
         elif self.paid_amount == 0 and self.status == 'parcial':
             self.status = 'pendiente'
 
-        super().save(*args, **kwargs)
-
     # Métodos de cálculo para Calculadora de Gastos Reembolsables
     def get_customer_base_price(self):
         """
@@ -967,35 +1021,19 @@ class TransferPayment(SoftDeleteModel):
                     })
 
     def save(self, *args, **kwargs):
-        from django.db import transaction
-        from django.db.models import Sum
+        """
+        Actualiza el total pagado del gasto sumando/restando solo este pago,
+        con la fila del gasto bloqueada (ver apps/core/balances.py). El soft
+        delete también pasa por aquí.
+        """
+        from apps.core.balances import update_parent_paid_amount
 
         # Ejecutar validaciones
         self.full_clean()
 
-        with transaction.atomic():
-            super().save(*args, **kwargs)
-            # Actualizar total pagado en la transferencia con lock para prevenir race conditions
-            transfer = Transfer.objects.select_for_update().get(pk=self.transfer_id)
-            total_paid = transfer.payments.filter(is_deleted=False).aggregate(
-                total=Sum('amount')
-            )['total'] or Decimal('0.00')
-            transfer.paid_amount = total_paid
-            transfer.save()
-
-    def delete(self, *args, **kwargs):
-        from django.db import transaction
-        from django.db.models import Sum
-
-        with transaction.atomic():
-            super().delete(*args, **kwargs)
-            # Actualizar total pagado en la transferencia con lock
-            transfer = Transfer.objects.select_for_update().get(pk=self.transfer_id)
-            total_paid = transfer.payments.filter(is_deleted=False).aggregate(
-                total=Sum('amount')
-            )['total'] or Decimal('0.00')
-            transfer.paid_amount = total_paid
-            transfer.save()
+        update_parent_paid_amount(
+            self, 'transfer', lambda: super(TransferPayment, self).save(*args, **kwargs)
+        )
 
 
 class BatchPayment(SoftDeleteModel):
@@ -1090,27 +1128,11 @@ class BatchPayment(SoftDeleteModel):
     def save(self, *args, **kwargs):
         # Generar número de lote automático: BP-YYYY-NNNN
         if not self.batch_number:
-            from django.db.models import Max
-            from apps.core.sequences import next_number
-
             current_year = timezone.now().year
 
             # Correlativo reservado sobre la fila contador de la serie, sin
             # bloquear los lotes ya existentes (ver apps/core/sequences.py).
-            def _current_max_batch_number():
-                result = BatchPayment.all_objects.filter(
-                    batch_number__regex=rf'^BP-{current_year}-\d{{4}}$'
-                ).aggregate(
-                    max_num=Max('batch_number')
-                )
-                if not result['max_num']:
-                    return 0
-                try:
-                    return int(result['max_num'].split('-')[-1])
-                except (ValueError, IndexError):
-                    return 0
-
-            new_num = next_number(f'batch_payment:{current_year}', _current_max_batch_number)
+            new_num = next_number(f'batch_payment:{current_year}')
             self.batch_number = f'BP-{current_year}-{new_num:04d}'
 
         super().save(*args, **kwargs)
@@ -1128,6 +1150,25 @@ class BatchPayment(SoftDeleteModel):
         ).distinct()
 
 
+
+def current_max_batch_number(year):
+    """Mayor correlativo de lote de pago (BP-YYYY-NNNN) del año."""
+    from django.db.models import Max
+
+    result = BatchPayment.all_objects.filter(
+        batch_number__regex=rf'^BP-{year}-\d{{4}}$'
+    ).aggregate(max_num=Max('batch_number'))
+    if not result['max_num']:
+        return 0
+    try:
+        return int(result['max_num'].split('-')[-1])
+    except (ValueError, IndexError):
+        return 0
+
+
+register_series('batch_payment', current_max_batch_number)
+
+
 class ProviderCreditNote(SoftDeleteModel):
     """
     Notas de Crédito de Proveedores - Sistema ERP Profesional
@@ -1334,12 +1375,13 @@ class ProviderCreditNote(SoftDeleteModel):
             user: Usuario que anula
             reason: Motivo de anulación
         """
+        from .credit_notes import revert_applications
+
         if self.status == 'anulada':
             raise ValidationError("Esta nota de crédito ya está anulada")
 
-        # Revertir todas las aplicaciones
-        for application in self.applications.filter(is_deleted=False):
-            application.revert()
+        # Revertir todas las aplicaciones en bloque (apps/transfers/credit_notes.py)
+        revert_applications(self, user=user, save=False)
 
         # Marcar como anulada
         self.status = 'anulada'
@@ -1448,27 +1490,16 @@ class CreditNoteApplication(SoftDeleteModel):
             )
 
     def revert(self):
-        """Revierte esta aplicación"""
-        # Buscar y eliminar el TransferPayment asociado
-        TransferPayment.objects.filter(
-            transfer=self.transfer,
-            payment_method='nota_credito',
-            reference_number=self.credit_note.note_number,
-            amount=self.amount,
-            is_deleted=False
-        ).update(is_deleted=True, deleted_at=timezone.now())
-
-        # Actualizar el Transfer
-        self.transfer.refresh_from_db()
-        payments = self.transfer.payments.filter(is_deleted=False)
-        self.transfer.paid_amount = sum(p.amount for p in payments)
-        self.transfer.save()
-
-        # Actualizar la NC
-        self.credit_note.applied_amount -= self.amount
-        self.credit_note.save()
-
-        # Marcar como eliminada
+        """
+        Revierte esta aplicación: anula su pago ``nota_credito``, restituye el
+        saldo del gasto y descuenta el monto de la NC (ver
+        apps/transfers/credit_notes.py).
+        """
+        from .credit_notes import revert_applications
+
+        credit_note = revert_applications(self.credit_note, [self])
+        self.credit_note.applied_amount = credit_note.applied_amount
+        self.credit_note.available_amount = credit_note.available_amount
+        self.credit_note.status = credit_note.status
         self.is_deleted = True
-        self.deleted_at = timezone.now()
-        super(SoftDeleteModel, self).save(update_fields=['is_deleted', 'deleted_at'])
\ No newline at end of file
+        self.deleted_at = timezone.now()
\ No newline at end of file
@@ -1,8 +1,13 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from decimal import Decimal
+from apps.core.prefetch import PrefetchAwareSerializerMixin
+from apps.core.values_serializers import ValuesSerializer, ModelValue, ChoiceDisplay, Computed, Nested, CachedLookup
+from apps.catalogs.cache import names_of
+from apps.catalogs.models import Bank, Provider
 from .models import (
     Transfer, TransferPayment, BatchPayment, ProviderCreditNote,
-    CreditNoteApplication, ProviderInvoice, DirectCostAllocation
+    CreditNoteApplication, ProviderInvoice, DirectCostAllocation, build_profit_summary
 )
 
 
@@ -93,8 +98,11 @@ class ProviderInvoiceListSerializer(serializers.ModelSerializer):
         return len(obj.allocations.all())
 
     def get_profit_summary(self, obj):
-        # Calcular sobre las asignaciones prefetcheadas para evitar
-        # las consultas por fila de obj.get_profit_summary()
+        # Resumen guardado en la fila; si fue invalidado se calcula sobre las
+        # asignaciones prefetcheadas (sin consultas por fila)
+        if obj.profit_summary_cache is not None:
+            return {**obj.profit_summary_cache, 'unallocated': float(obj.unallocated_amount)}
+
         total_cost = Decimal('0.00')
         total_sale = Decimal('0.00')
         for alloc in obj.allocations.all():
@@ -102,14 +110,8 @@ class ProviderInvoiceListSerializer(serializers.ModelSerializer):
             if alloc.order_charge:
                 total_sale += alloc.order_charge.subtotal
 
-        profit = total_sale - total_cost
-        margin = (profit / total_cost * 100) if total_cost > 0 else Decimal('0.00')
-
         return {
-            'total_cost': float(total_cost),
-            'total_sale': float(total_sale),
-            'profit': float(profit),
-            'margin_percentage': float(margin),
+            **build_profit_summary(total_cost, total_sale),
             'unallocated': float(obj.unallocated_amount)
         }
 
@@ -228,7 +230,7 @@ class DirectCostAllocationCreateSerializer(serializers.ModelSerializer):
             validated_data['created_by'] = request.user
         return super().create(validated_data)
 
-class TransferSerializer(serializers.ModelSerializer):
+class TransferSerializer(PrefetchAwareSerializerMixin, serializers.ModelSerializer):
     service_order_number = serializers.CharField(source='service_order.order_number', read_only=True, allow_null=True)
     purchase_order = serializers.CharField(source='service_order.purchase_order', read_only=True, allow_null=True)
     client_name = serializers.CharField(source='service_order.client.name', read_only=True, allow_null=True)
@@ -261,6 +263,7 @@ class TransferSerializer(serializers.ModelSerializer):
             'created_by', 'created_by_username', 'created_by_name',
             'created_at', 'updated_at'
         ]
+        select_related = ('service_order', 'service_order__client', 'provider', 'bank', 'created_by')
     
     def get_created_by_name(self, obj):
         if obj.created_by:
@@ -275,7 +278,7 @@ class TransferSerializer(serializers.ModelSerializer):
             validated_data['created_by'] = request.user
         return super().create(validated_data)
 
-class TransferListSerializer(serializers.ModelSerializer):
+class TransferListSerializer(PrefetchAwareSerializerMixin, serializers.ModelSerializer):
     """Serializer simplificado para listados"""
     service_order_number = serializers.CharField(source='service_order.order_number', read_only=True, allow_null=True)
     purchase_order = serializers.CharField(source='service_order.purchase_order', read_only=True, allow_null=True)
@@ -305,6 +308,14 @@ class TransferListSerializer(serializers.ModelSerializer):
                   'amount_locked', 'billing_status',
                   'invoice_id', 'invoice_number_client', 'is_billed', 'credit_notes_applied',
                   'transaction_date', 'payment_date', 'created_at', 'created_by', 'created_by_username', 'created_by_name']
+        select_related = ('service_order', 'provider', 'bank', 'created_by', 'invoice')
+        prefetch_related = (
+            Prefetch(
+                'credit_notes',
+                queryset=ProviderCreditNote.objects.exclude(status='anulada'),
+                to_attr='active_credit_notes',
+            ),
+        )
 
     def get_created_by_name(self, obj):
         if obj.created_by:
@@ -318,8 +329,8 @@ class TransferListSerializer(serializers.ModelSerializer):
 
     def get_credit_notes_applied(self, obj):
         """Retorna las NC de proveedores vinculadas a esta factura"""
-        # Usar datos prefetcheados por el ViewSet cuando estén disponibles
-        # para evitar consultas N+1 en el listado
+        # En listados llega precargado (Meta.prefetch_related); la consulta
+        # solo queda como respaldo al serializar un objeto suelto
         credit_notes = getattr(obj, 'active_credit_notes', None)
         if credit_notes is None:
             credit_notes = list(
@@ -343,6 +354,52 @@ class TransferListSerializer(serializers.ModelSerializer):
         } for nc in credit_notes]
 
 
+class _AppliedCreditNoteValuesSerializer(ValuesSerializer):
+    """Forma de cada NC en TransferListSerializer.get_credit_notes_applied"""
+    amount = Computed(lambda row, context: str(row['amount']), 'amount')
+    status_display = ChoiceDisplay('status')
+    reason = ChoiceDisplay('reason')
+
+    class Meta:
+        model = ProviderCreditNote
+        fields = ['id', 'note_number', 'amount', 'status', 'status_display', 'reason', 'issue_date']
+
+
+class TransferListValuesSerializer(ValuesSerializer):
+    """
+    Equivalente values() de TransferListSerializer para el listado
+    (ver apps/core/values_serializers.py).
+    """
+    transfer_type_display = ChoiceDisplay('transfer_type')
+    status_display = ChoiceDisplay('status')
+    service_order_number = ModelValue('service_order__order_number')
+    purchase_order = ModelValue('service_order__purchase_order')
+    provider_name = CachedLookup('provider_id', names_of(Provider))
+    bank_name = CachedLookup('bank_id', names_of(Bank))
+    created_by_username = ModelValue('created_by__username')
+    created_by_name = Computed(
+        lambda row, context: (
+            (f"{row['created_by__first_name']} {row['created_by__last_name']}".strip()
+             or row['created_by__username'])
+            if row['created_by__id'] is not None else None
+        ),
+        'created_by__id', 'created_by__first_name', 'created_by__last_name', 'created_by__username',
+    )
+    invoice_id = ModelValue('invoice__id')
+    invoice_number_client = ModelValue('invoice__invoice_number')
+    is_billed = Computed(lambda row, context: row['invoice__id'] is not None, 'invoice__id')
+    credit_notes_applied = Nested(
+        _AppliedCreditNoteValuesSerializer,
+        fk='original_transfer',
+        queryset=ProviderCreditNote.objects.exclude(status='anulada'),
+        null_if_empty=True,
+    )
+
+    class Meta:
+        model = Transfer
+        fields = TransferListSerializer.Meta.fields
+
+
 class TransferPaymentSerializer(serializers.ModelSerializer):
     """Serializer para pagos individuales (actualizado con batch_payment)"""
     transfer_description = serializers.CharField(source='transfer.description', read_only=True)
@@ -362,7 +419,18 @@ class TransferPaymentSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
 
 
-class BatchPaymentSerializer(serializers.ModelSerializer):
+def _active_transfer_payments_prefetch():
+    """Pagos activos del lote con su gasto y OS, en orden de registro"""
+    return Prefetch(
+        'transfer_payments',
+        queryset=TransferPayment.objects.select_related(
+            'transfer', 'transfer__service_order', 'transfer__provider'
+        ).order_by('id'),
+        to_attr='active_transfer_payments',
+    )
+
+
+class BatchPaymentSerializer(PrefetchAwareSerializerMixin, serializers.ModelSerializer):
     """Serializer básico para listar BatchPayments"""
     provider_name = serializers.CharField(source='provider.name', read_only=True)
     bank_name = serializers.CharField(source='bank.name', read_only=True, allow_null=True)
@@ -383,6 +451,8 @@ class BatchPaymentSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['batch_number', 'created_at', 'updated_at']
+        select_related = ('provider', 'bank', 'created_by')
+        prefetch_related = (_active_transfer_payments_prefetch(),)
 
     def get_created_by_name(self, obj):
         if obj.created_by:
@@ -391,15 +461,31 @@ class BatchPaymentSerializer(serializers.ModelSerializer):
         return None
 
     def get_transfers_count(self, obj):
-        return obj.get_transfers_count()
+        payments = getattr(obj, 'active_transfer_payments', None)
+        if payments is None:
+            return obj.get_transfers_count()
+        return len(payments)
 
     def get_service_orders(self, obj):
         """Retorna lista de números de OS afectadas"""
-        orders = obj.get_service_orders()
-        return [os.order_number for os in orders]
+        payments = getattr(obj, 'active_transfer_payments', None)
+        if payments is None:
+            return [os.order_number for os in obj.get_service_orders()]
+
+        # Mismo resultado que BatchPayment.get_service_orders(): OS únicas,
+        # no eliminadas, en el orden por defecto de ServiceOrder (-created_at)
+        orders = {
+            p.transfer.service_order.pk: p.transfer.service_order
+            for p in payments
+            if p.transfer.service_order and not p.transfer.service_order.is_deleted
+        }
+        return [
+            os.order_number
+            for os in sorted(orders.values(), key=lambda os: os.created_at, reverse=True)
+        ]
 
 
-class BatchPaymentDetailSerializer(serializers.ModelSerializer):
+class BatchPaymentDetailSerializer(PrefetchAwareSerializerMixin, serializers.ModelSerializer):
     """Serializer con detalles completos incluyendo pagos individuales"""
     provider_name = serializers.CharField(source='provider.name', read_only=True)
     bank_name = serializers.CharField(source='bank.name', read_only=True, allow_null=True)
@@ -418,6 +504,8 @@ class BatchPaymentDetailSerializer(serializers.ModelSerializer):
             'proof_file', 'notes', 'payments',
             'created_by', 'created_by_name', 'created_at', 'updated_at'
         ]
+        select_related = ('provider', 'bank', 'created_by')
+        prefetch_related = (_active_transfer_payments_prefetch(),)
 
     def get_created_by_name(self, obj):
         if obj.created_by:
@@ -427,10 +515,12 @@ class BatchPaymentDetailSerializer(serializers.ModelSerializer):
 
     def get_payments(self, obj):
         """Retorna lista de pagos individuales con información del Transfer"""
-        payments = TransferPayment.objects.filter(
-            batch_payment=obj,
-            is_deleted=False
-        ).select_related('transfer', 'transfer__service_order', 'transfer__provider').order_by('id')
+        payments = getattr(obj, 'active_transfer_payments', None)
+        if payments is None:
+            payments = TransferPayment.objects.filter(
+                batch_payment=obj,
+                is_deleted=False
+            ).select_related('transfer', 'transfer__service_order', 'transfer__provider').order_by('id')
 
         return [{
             'id': p.id,
@@ -12,6 +12,7 @@ from .models import (
 )
 from apps.orders.models import OrderDocument
 from apps.users.models import Notification
+from apps.core.history_writer import record
 import os
 import logging
 from decimal import Decimal
@@ -40,7 +41,8 @@ def _create_order_history_event(service_order, actor, event_type, description, m
 
     from apps.orders.models import OrderHistory
 
-    OrderHistory.objects.create(
+    record(
+        OrderHistory,
         service_order=service_order,
         user=actor,
         event_type=event_type,
@@ -358,28 +360,37 @@ def sync_batch_payment_documents(sender, instance, created, **kwargs):
     Cuando se crea o actualiza un BatchPayment con comprobante,
     sincroniza el archivo con los OrderDocuments de todas las OS afectadas.
     """
-    if not instance.proof_file:
+    # El motor de lotes (apps/transfers/batch_payments.py) sincroniza una vez
+    # que los pagos individuales ya existen.
+    if not instance.proof_file or getattr(instance, '_skip_document_sync', False):
         return
+    sync_batch_documents(instance, instance.get_service_orders())
 
-    try:
-        # Obtener todas las OS únicas afectadas por este pago agrupado
-        service_orders = instance.get_service_orders()
 
+def sync_batch_documents(batch_payment, service_orders):
+    """Crea o actualiza el documento ``[Lote:...]`` en cada OS de ``service_orders``."""
+    if not batch_payment.proof_file:
+        return
+
+    try:
         # Usar clave exacta con delimitadores
-        description_key = f"[Lote:{instance.batch_number}]"
+        description_key = f"[Lote:{batch_payment.batch_number}]"
+        description = f"Comprobante Pago {description_key} - {batch_payment.provider.name} - ${batch_payment.total_amount}"
 
-        for service_order in service_orders:
-            # Buscar si ya existe un documento para este lote
-            existing_doc = OrderDocument.objects.filter(
-                order=service_order,
-                description__contains=description_key
-            ).first()
+        # Documentos existentes de este lote en una sola consulta
+        existing_docs = {}
+        for doc in OrderDocument.objects.filter(
+            order__in=service_orders,
+            description__contains=description_key
+        ).order_by('id'):
+            existing_docs.setdefault(doc.order_id, doc)
 
-            description = f"Comprobante Pago {description_key} - {instance.provider.name} - ${instance.total_amount}"
+        for service_order in service_orders:
+            existing_doc = existing_docs.get(service_order.pk)
 
             if existing_doc:
                 # Actualizar si el archivo cambió
-                if existing_doc.file != instance.proof_file:
+                if existing_doc.file != batch_payment.proof_file:
                     # Eliminar archivo antiguo
                     if existing_doc.file:
                         try:
@@ -388,7 +399,7 @@ def sync_batch_payment_documents(sender, instance, created, **kwargs):
                         except:
                             pass
 
-                    existing_doc.file = instance.proof_file
+                    existing_doc.file = batch_payment.proof_file
                     existing_doc.description = description
                     existing_doc.save()
             else:
@@ -396,9 +407,9 @@ def sync_batch_payment_documents(sender, instance, created, **kwargs):
                 OrderDocument.objects.create(
                     order=service_order,
                     document_type='factura_costo',
-                    file=instance.proof_file,
+                    file=batch_payment.proof_file,
                     description=description,
-                    uploaded_by=instance.created_by
+                    uploaded_by=batch_payment.created_by
                 )
     except Exception as e:
         logger.error(f"Error al sincronizar documentos del pago agrupado: {e}")
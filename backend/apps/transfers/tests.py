@@ -1,18 +1,23 @@
 from decimal import Decimal
 import io
+import shutil
+import tempfile
 import zipfile
+from unittest import skipUnless
 
 from django.core.management import call_command
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from rest_framework import status
+from django.db import connection
+from django.test import TransactionTestCase
 from rest_framework.test import APITestCase
 
 from apps.catalogs.models import Provider, ShipmentType, Service
 from apps.clients.models import Client
 from apps.orders.models import Invoice, OrderCharge, OrderHistory, ServiceOrder
-from apps.transfers.models import DirectCostAllocation, ProviderInvoice, ProviderInvoicePayment, Transfer, TransferPayment
+from apps.transfers.models import BatchPayment, DirectCostAllocation, ProviderInvoice, ProviderInvoicePayment, Transfer, TransferPayment
 from apps.users.models import User
 
 
@@ -307,6 +312,10 @@ class DirectCostSecurityRegressionTests(APITestCase):
 
 class TransferDocumentExportTests(APITestCase):
     def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+
         self.user = User.objects.create_user(
             username='export_docs_user',
             password='test1234',
@@ -511,9 +520,11 @@ class TransferDeletionAuditHistoryTests(APITestCase):
             created_by=self.user,
         )
 
-        response = self.client.delete(
-            reverse('transfer-detail', kwargs={'pk': transfer.id})
-        )
+        # El historial se escribe al hacer commit (apps.core.history_writer)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(
+                reverse('transfer-detail', kwargs={'pk': transfer.id})
+            )
 
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
@@ -553,9 +564,11 @@ class TransferDeletionAuditHistoryTests(APITestCase):
             created_by=self.user,
         )
 
-        response = self.client.delete(
-            reverse('transfer-payment-detail', kwargs={'pk': payment.id})
-        )
+        # El historial se escribe al hacer commit (apps.core.history_writer)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(
+                reverse('transfer-payment-detail', kwargs={'pk': payment.id})
+            )
 
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
@@ -650,6 +663,8 @@ class ListEndpointQueryCountTests(APITestCase):
         return len(ctx.captured_queries)
 
     def _assert_constant_queries(self, url, create_more):
+        # Primera llamada: carga los catálogos cacheados (apps.catalogs.cache)
+        self.client.get(url)
         first_count = self._count_queries(url)
         create_more()
         second_count = self._count_queries(url)
@@ -698,3 +713,602 @@ class ListEndpointQueryCountTests(APITestCase):
                 self._create_invoice(provider, 200 + i)
 
         self._assert_constant_queries('/api/catalogs/providers/', create_more)
+
+    def test_provider_account_statement_has_no_n_plus_one(self):
+        for i in range(3):
+            self._create_transfer(self.provider_a, i)
+            self._create_invoice(self.provider_a, i)
+
+        url = f'/api/catalogs/providers/{self.provider_a.id}/account_statement/?year=2026'
+
+        def create_more():
+            for i in range(3):
+                self._create_transfer(self.provider_a, 100 + i)
+                self._create_invoice(self.provider_a, 100 + i)
+
+        self._assert_constant_queries(url, create_more)
+
+    def test_provider_account_statement_aging_and_history(self):
+        from datetime import date, timedelta
+        today = date.today()
+        recent = self._create_transfer(self.provider_a, 1)
+        Transfer.objects.filter(pk=recent.pk).update(transaction_date=today - timedelta(days=5))
+        old = self._create_transfer(self.provider_a, 2)
+        Transfer.objects.filter(pk=old.pk).update(transaction_date=today - timedelta(days=200))
+        invoice = self._create_invoice(self.provider_a, 1)
+        ProviderInvoice.objects.filter(pk=invoice.pk).update(
+            issue_date=today - timedelta(days=45), paid_amount=Decimal('50.00'), payment_status='parcial'
+        )
+
+        response = self.client.get(
+            f'/api/catalogs/providers/{self.provider_a.id}/account_statement/?year='
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        recent.refresh_from_db()
+        old.refresh_from_db()
+        self.assertEqual(data['aging']['current'], recent.balance)
+        self.assertEqual(data['aging']['1-30'], Decimal('150.00'))
+        self.assertEqual(data['aging']['90+'], old.balance)
+        self.assertEqual(data['total_debt'], recent.balance + old.balance + Decimal('150.00'))
+        self.assertEqual(data['transfers_count'], 3)
+        self.assertEqual(
+            [(row['source'], row['id']) for row in data['transfers']],
+            [('transfer', recent.id), ('provider_invoice', invoice.id), ('transfer', old.id)],
+        )
+        self.assertEqual(data['transfers'][1]['balance'], Decimal('150.00'))
+        self.assertEqual(data['transfers'][1]['type'], 'Costo Directo')
+
+        page = self.client.get(
+            f'/api/catalogs/providers/{self.provider_a.id}/account_statement/?year=&limit=1&offset=1'
+        ).data
+        self.assertEqual([row['id'] for row in page['transfers']], [invoice.id])
+        self.assertEqual(page['transfers_count'], 3)
+
+    def _create_batch_payment(self, provider, idx):
+        from datetime import date
+        from apps.transfers.models import BatchPayment
+        batch = BatchPayment.objects.create(
+            provider=provider,
+            total_amount=Decimal('40.00'),
+            payment_method='transferencia',
+            payment_date=date(2026, 2, 1),
+            created_by=self.admin,
+        )
+        for n in range(2):
+            transfer = Transfer.objects.create(
+                transfer_type='cargos',
+                status='aprobado',
+                provider=provider,
+                service_order=self.service_order,
+                amount=Decimal('100.00'),
+                description=f'Gasto lote {idx}-{n}',
+                transaction_date=date(2026, 1, 15),
+                created_by=self.admin,
+            )
+            TransferPayment.objects.create(
+                transfer=transfer,
+                batch_payment=batch,
+                amount=Decimal('20.00'),
+                payment_method='transferencia',
+                created_by=self.admin,
+            )
+        return batch
+
+    def test_batch_payments_list_has_no_n_plus_one(self):
+        for i in range(3):
+            self._create_batch_payment(self.provider_a, i)
+
+        self._assert_constant_queries(
+            '/api/transfers/batch-payments/',
+            lambda: [self._create_batch_payment(self.provider_b, 100 + i) for i in range(3)],
+        )
+
+        response = self.client.get('/api/transfers/batch-payments/')
+        row = response.data[0]
+        self.assertEqual(row['transfers_count'], 2)
+        self.assertEqual(row['service_orders'], [self.service_order.order_number])
+
+        detail = self.client.get(f"/api/transfers/batch-payments/{row['id']}/")
+        self.assertEqual(detail.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(detail.data['payments']), 2)
+
+    def test_serializer_query_guard_rejects_missing_prefetch(self):
+        from django.test import override_settings
+        from apps.core.prefetch import SerializerQueryError, apply_serializer_prefetches
+        from apps.transfers.models import BatchPayment
+        from apps.transfers.serializers import BatchPaymentSerializer
+
+        self._create_batch_payment(self.provider_a, 1)
+
+        with override_settings(SERIALIZER_QUERY_GUARD=True):
+            with self.assertRaisesMessage(SerializerQueryError, 'BatchPaymentSerializer.'):
+                BatchPaymentSerializer(BatchPayment.objects.all(), many=True).data
+
+            queryset = apply_serializer_prefetches(BatchPayment.objects.all(), BatchPaymentSerializer)
+            data = BatchPaymentSerializer(queryset, many=True).data
+            self.assertEqual(data[0]['transfers_count'], 2)
+
+            # Un objeto suelto puede seguir consultando (no hay N+1 posible)
+            single = BatchPaymentSerializer(BatchPayment.objects.get()).data
+            self.assertEqual(single['transfers_count'], 2)
+
+    def test_transfers_values_list_matches_drf_serializer(self):
+        from datetime import date
+        from unittest import mock
+        from apps.transfers.models import ProviderCreditNote
+        from apps.transfers.views import TransferViewSet
+
+        with_note = self._create_transfer(self.provider_a, 1)
+        voided = self._create_transfer(self.provider_b, 2)
+        ProviderCreditNote.objects.filter(original_transfer=voided).update(status='anulada')
+        Transfer.objects.create(
+            transfer_type='cargos',
+            service_order=self.service_order,
+            amount=Decimal('55.55'),
+            description='Gasto con OS',
+            transaction_date=date(2026, 1, 10),
+        )
+        invoice = Invoice.objects.create(service_order=self.service_order, total_amount=Decimal('10.00'))
+        Transfer.objects.filter(pk=with_note.pk).update(invoice=invoice, invoice_file='transfers/paridad.pdf')
+
+        fast = self.client.get('/api/transfers/transfers/')
+        with mock.patch.object(TransferViewSet, 'values_serializer_class', None):
+            drf = self.client.get('/api/transfers/transfers/')
+
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(drf.json()), 3)
+        self.assertEqual(fast.json(), drf.json())
+
+    def test_transfers_summary_is_a_single_aggregate(self):
+        for i in range(3):
+            self._create_transfer(self.provider_a, i)
+        Transfer.objects.create(
+            transfer_type='cargos',
+            service_order=self.service_order,
+            amount=Decimal('50.00'),
+            description='Gasto cliente',
+        )
+
+        url = '/api/transfers/transfers/summary/'
+        first_count = self._count_queries(url)
+        self._create_transfer(self.provider_b, 10)
+        self.assertEqual(self._count_queries(url), first_count)
+
+        data = self.client.get(url).json()
+        self.assertEqual(data['total_transfers'], 5)
+        self.assertEqual(data['total_amount'], 450.0)
+        self.assertEqual(data['by_type']['admin']['count'], 4)
+        self.assertEqual(data['by_type']['admin']['amount'], 400.0)
+        self.assertEqual(data['by_type']['cargos']['label'], 'Cargos a Clientes (Reembolso)')
+        self.assertEqual(data['by_type']['cargos']['amount'], 50.0)
+        self.assertEqual(sum(item['count'] for item in data['by_status'].values()), 5)
+
+
+class TransferPaymentDeltaTests(APITestCase):
+    def setUp(self):
+        self.provider = Provider.objects.create(name='Proveedor Abonos')
+        self.transfer = Transfer.objects.create(
+            transfer_type='admin',
+            provider=self.provider,
+            amount=Decimal('100.00'),
+            description='Gasto con abonos',
+            status='aprobado',
+        )
+
+    def _pay(self, amount):
+        return TransferPayment.objects.create(
+            transfer=self.transfer, amount=Decimal(amount), payment_method='transferencia'
+        )
+
+    def test_payments_update_balance_and_status(self):
+        first = self._pay('30.00')
+        self.transfer.refresh_from_db()
+        self.assertEqual(self.transfer.paid_amount, Decimal('30.00'))
+        self.assertEqual(self.transfer.balance, Decimal('70.00'))
+        self.assertEqual(self.transfer.status, 'parcial')
+        self.assertTrue(self.transfer.amount_locked)
+
+        self._pay('70.00')
+        self.transfer.refresh_from_db()
+        self.assertEqual(self.transfer.status, 'pagado')
+        self.assertIsNotNone(self.transfer.payment_date)
+
+        first.delete()
+        self.transfer.refresh_from_db()
+        self.assertEqual(self.transfer.paid_amount, Decimal('70.00'))
+        self.assertEqual(self.transfer.balance, Decimal('30.00'))
+        self.assertEqual(self.transfer.status, 'parcial')
+
+    def test_editing_amount_applies_only_the_difference(self):
+        payment = self._pay('20.00')
+        payment.amount = Decimal('45.00')
+        payment.save()
+
+        self.transfer.refresh_from_db()
+        self.assertEqual(self.transfer.paid_amount, Decimal('45.00'))
+        self.assertEqual(self.transfer.balance, Decimal('55.00'))
+
+
+class BatchPaymentEngineTests(APITestCase):
+    url = '/api/transfers/batch-payments/create_batch_payment/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='batch_engine_user', password='x', role='admin')
+        self.requester = User.objects.create_user(username='batch_requester', password='x', role='operativo')
+        self.provider = Provider.objects.create(name='Proveedor Lotes')
+        self.client_company = Client.objects.create(name='Cliente Lotes')
+        self.shipment_type = ShipmentType.objects.create(name='Terrestre Lotes')
+        self.service_order = ServiceOrder.objects.create(
+            client=self.client_company,
+            shipment_type=self.shipment_type,
+            created_by=self.user,
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def _transfers(self, count, provider=None):
+        return [
+            Transfer.objects.create(
+                transfer_type='cargos',
+                status='aprobado',
+                provider=provider or self.provider,
+                service_order=self.service_order,
+                amount=Decimal('100.00'),
+                description=f'Gasto lote {i}',
+                created_by=self.requester,
+            )
+            for i in range(count)
+        ]
+
+    def _post(self, allocations):
+        return self.client.post(self.url, {
+            'allocations': [{'transfer_id': t.id, 'amount': amount} for t, amount in allocations],
+            'payment_method': 'transferencia',
+            'payment_date': '2026-03-01',
+            'reference_number': 'TRX-1',
+        }, format='json')
+
+    def test_batch_updates_balances_statuses_and_notifies(self):
+        from apps.users.models import Notification
+
+        full, partial = self._transfers(2)
+        response = self._post([(partial, '40.00'), (full, '100.00')])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(len(response.data['batch_payment']['payments']), 2)
+
+        full.refresh_from_db()
+        partial.refresh_from_db()
+        self.assertEqual((full.status, full.balance), ('pagado', Decimal('0.00')))
+        self.assertEqual((partial.status, partial.balance), ('parcial', Decimal('60.00')))
+        self.assertTrue(partial.amount_locked)
+        self.assertEqual(
+            list(Notification.objects.filter(user=self.requester).values_list('object_id', flat=True)),
+            [full.id],
+        )
+
+    def test_invalid_allocation_rejects_whole_batch(self):
+        first, second = self._transfers(2)
+        other = self._transfers(1, provider=Provider.objects.create(name='Otro Proveedor'))[0]
+
+        over = self._post([(first, '50.00'), (second, '150.00')])
+        mixed = self._post([(first, '50.00'), (other, '10.00')])
+
+        self.assertEqual(over.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('excede el saldo pendiente', over.data['error'])
+        self.assertEqual(mixed.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(TransferPayment.objects.exists())
+        first.refresh_from_db()
+        self.assertEqual(first.paid_amount, Decimal('0.00'))
+
+    def test_query_count_does_not_grow_with_allocations(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def count(transfers):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self._post([(t, '30.00') for t in transfers])
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+            return len(ctx.captured_queries)
+
+        # El primer lote crea el contador de la serie y llena cachés
+        count(self._transfers(1))
+        self.assertEqual(count(self._transfers(3)), count(self._transfers(15)))
+
+
+class BatchPaymentConcurrencyTests(TransactionTestCase):
+    """Dos lotes que comparten facturas no deben sobrepagar ni quedar a medias."""
+
+    # Sin select_for_update (SQLite) la serialización depende del bloqueo de
+    # toda la base, no de register_batch_payment
+    @skipUnless(connection.features.has_select_for_update, 'requiere SELECT ... FOR UPDATE')
+    def test_overlapping_batches(self):
+        import threading
+        from django.db import connections
+        from apps.transfers.batch_payments import register_batch_payment
+
+        provider = Provider.objects.create(name='Proveedor Concurrencia')
+        a, b, c = [
+            Transfer.objects.create(
+                transfer_type='admin',
+                status='aprobado',
+                provider=provider,
+                amount=Decimal('100.00'),
+                description=f'Gasto concurrente {i}',
+            )
+            for i in range(3)
+        ]
+        # Ambos lotes tocan "a" (en distinto orden) y juntos exceden su saldo
+        batches = {
+            'uno': {c.id: Decimal('60.00'), a.id: Decimal('60.00')},
+            'dos': {a.id: Decimal('60.00'), b.id: Decimal('60.00')},
+        }
+        results = {}
+        barrier = threading.Barrier(len(batches))
+
+        def run(name):
+            try:
+                barrier.wait()
+                register_batch_payment(batches[name], payment_method='transferencia', payment_date='2026-03-01')
+                results[name] = 'ok'
+            except Exception as e:
+                results[name] = e
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run, args=(name,)) for name in batches]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        succeeded = [name for name, result in results.items() if result == 'ok']
+        self.assertEqual(len(succeeded), 1, results)
+        # El perdedor falla por saldo (ve el pago del ganador), no por otro error
+        (rejected,) = [result for result in results.values() if result != 'ok']
+        self.assertIsInstance(rejected, ValueError)
+        self.assertIn('excede el saldo pendiente', str(rejected))
+
+        # El lote rechazado no dejó pagos ni saldos a medias
+        for transfer in (a, b, c):
+            transfer.refresh_from_db()
+            paid = sum(p.amount for p in TransferPayment.objects.filter(transfer=transfer))
+            self.assertEqual(transfer.paid_amount, paid)
+            self.assertGreaterEqual(transfer.balance, Decimal('0.00'))
+        self.assertEqual(a.paid_amount, Decimal('60.00'))
+        self.assertEqual(BatchPayment.objects.count(), 1)
+        self.assertEqual(TransferPayment.objects.count(), 2)
+
+
+class ProviderInvoiceAllocationStateTests(APITestCase):
+    def setUp(self):
+        self.provider = Provider.objects.create(name='Proveedor Desglose')
+        self.service = Service.objects.create(name='Servicio Desglose', default_price=Decimal('100.00'))
+        self.service_order = ServiceOrder.objects.create(
+            client=Client.objects.create(name='Cliente Desglose'),
+            shipment_type=ShipmentType.objects.create(name='Aéreo Desglose'),
+        )
+
+    def _provider_invoice(self, charges, cost='50.00'):
+        provider_invoice = ProviderInvoice.objects.create(
+            invoice_number=f'CD-{ProviderInvoice.objects.count() + 1}',
+            provider=self.provider,
+            service_order=self.service_order,
+            total_amount=Decimal(cost) * charges,
+        )
+        created = []
+        for _ in range(charges):
+            charge = OrderCharge.objects.create(
+                service_order=self.service_order,
+                service=self.service,
+                quantity=1,
+                unit_price=Decimal('80.00'),
+            )
+            DirectCostAllocation.objects.create(
+                provider_invoice=provider_invoice,
+                order_charge=charge,
+                cost_amount=Decimal(cost),
+            )
+            created.append(charge)
+        provider_invoice.refresh_from_db()
+        return provider_invoice, created
+
+    def test_status_becomes_facturado_when_every_service_is_billed(self):
+        provider_invoice, charges = self._provider_invoice(2)
+        self.assertEqual(provider_invoice.status, 'asignado')
+
+        invoice = Invoice.objects.create(service_order=self.service_order, total_amount=Decimal('180.80'))
+        for charge in charges:
+            charge.invoice = invoice
+            charge.save(skip_order_validation=True)
+        provider_invoice.save()
+
+        self.assertEqual(provider_invoice.status, 'facturado')
+        provider_invoice.total_amount = Decimal('200.00')
+        with self.assertRaises(ValidationError):
+            provider_invoice.save()
+
+    def test_save_query_count_does_not_depend_on_allocations(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        counts = []
+        for charges in (1, 8):
+            provider_invoice, _ = self._provider_invoice(charges)
+            with CaptureQueriesContext(connection) as ctx:
+                provider_invoice.save()
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_profit_summary_is_cached_and_invalidated_by_charge_changes(self):
+        provider_invoice, charges = self._provider_invoice(2)
+
+        with self.assertNumQueries(0):
+            summary = provider_invoice.get_profit_summary()
+        self.assertEqual(summary['total_cost'], 100.0)
+        self.assertEqual(summary['total_sale'], 160.0)
+        self.assertEqual(summary['profit'], 60.0)
+
+        charges[0].unit_price = Decimal('120.00')
+        charges[0].save()
+        provider_invoice.refresh_from_db()
+        self.assertIsNone(provider_invoice.profit_summary_cache)
+
+        summary = provider_invoice.get_profit_summary()
+        self.assertEqual(summary['total_sale'], 200.0)
+        provider_invoice.refresh_from_db()
+        self.assertEqual(provider_invoice.profit_summary_cache['profit'], 100.0)
+
+
+class CreditNoteApplicationEngineTests(APITestCase):
+    def setUp(self):
+        from apps.transfers.models import ProviderCreditNote
+
+        self.ProviderCreditNote = ProviderCreditNote
+        self.user = User.objects.create_user(username='nc_engine_user', password='x', role='admin')
+        self.provider = Provider.objects.create(name='Proveedor NC')
+        self.client.force_authenticate(user=self.user)
+
+    def _transfers(self, count):
+        return Transfer.objects.bulk_create([
+            Transfer(
+                transfer_type='admin',
+                status='aprobado',
+                provider=self.provider,
+                amount=Decimal('100.00'),
+                balance=Decimal('100.00'),
+                description=f'Gasto NC {i}',
+                mes='ENERO',
+            )
+            for i in range(count)
+        ])
+
+    def _credit_note(self, amount='5000.00'):
+        from datetime import date
+        return self.ProviderCreditNote.objects.create(
+            note_number=f'NC-{self.ProviderCreditNote.all_objects.count() + 1}',
+            provider=self.provider,
+            amount=Decimal(amount),
+            issue_date=date(2026, 2, 1),
+            created_by=self.user,
+        )
+
+    def _apply(self, credit_note, transfers, amount='10.00'):
+        return self.client.post(
+            f'/api/transfers/provider-credit-notes/{credit_note.id}/apply/',
+            {'applications': [{'transfer_id': t.id, 'amount': amount} for t in transfers]},
+            format='json',
+        )
+
+    @staticmethod
+    def _statement(query):
+        import re
+        table = re.search(r'(?:FROM|INTO|UPDATE) "(\w+)"', query['sql'])
+        return (query['sql'].split()[0], table.group(1) if table else None)
+
+    def test_query_count_is_constant_for_1_10_and_100_applications(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self._apply(self._credit_note(), self._transfers(1))
+
+        statements = []
+        for size in (1, 10, 100):
+            credit_note = self._credit_note()
+            transfers = self._transfers(size)
+            with CaptureQueriesContext(connection) as ctx:
+                response = self._apply(credit_note, transfers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+            self.assertEqual(len(response.data['applications']), size)
+            # SQLite parte un bulk_create grande en lotes (límite de parámetros):
+            # los INSERT consecutivos a la misma tabla cuentan como uno
+            keys = []
+            for key in map(self._statement, ctx.captured_queries):
+                if not (key[0] == 'INSERT' and keys and keys[-1] == key):
+                    keys.append(key)
+            statements.append(keys)
+
+        self.assertEqual(statements[0], statements[1])
+        self.assertEqual(statements[1], statements[2])
+
+    def test_bulk_apply_produces_the_same_ledger_rows_as_save(self):
+        from apps.transfers.models import CreditNoteApplication
+
+        bulk_transfer, legacy_transfer = self._transfers(2)
+        bulk_note, legacy_note = self._credit_note('60.00'), self._credit_note('60.00')
+
+        self.assertEqual(self._apply(bulk_note, [bulk_transfer], '60.00').status_code, status.HTTP_200_OK)
+        CreditNoteApplication(
+            credit_note=legacy_note, transfer=legacy_transfer, amount=Decimal('60.00'), applied_by=self.user,
+        ).save()
+
+        def ledger(transfer, credit_note):
+            transfer.refresh_from_db()
+            credit_note.refresh_from_db()
+            payment = TransferPayment.objects.values(
+                'amount', 'payment_date', 'payment_method', 'notes', 'created_by', 'is_deleted',
+            ).get(transfer=transfer)
+            payment['notes'] = payment['notes'].replace(credit_note.note_number, 'NC')
+            return (
+                payment,
+                (transfer.paid_amount, transfer.balance, transfer.status, transfer.amount_locked),
+                (credit_note.applied_amount, credit_note.available_amount, credit_note.status),
+            )
+
+        self.assertEqual(ledger(bulk_transfer, bulk_note), ledger(legacy_transfer, legacy_note))
+
+    def test_void_reverts_every_application_in_bulk(self):
+        from apps.transfers.models import CreditNoteApplication
+
+        transfers = self._transfers(3)
+        credit_note = self._credit_note('300.00')
+        self._apply(credit_note, transfers, '40.00')
+        # Dos aplicaciones iguales al mismo gasto anulan un pago cada una
+        self._apply(credit_note, transfers[:1], '40.00')
+
+        single = CreditNoteApplication.objects.filter(transfer=transfers[0]).first()
+        single.revert()
+        transfers[0].refresh_from_db()
+        self.assertEqual(transfers[0].paid_amount, Decimal('40.00'))
+
+        response = self.client.post(
+            f'/api/transfers/provider-credit-notes/{credit_note.id}/void/', {'reason': 'Error'}, format='json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        credit_note.refresh_from_db()
+        self.assertEqual((credit_note.status, credit_note.applied_amount), ('anulada', Decimal('0.00')))
+        self.assertFalse(TransferPayment.objects.filter(payment_method='nota_credito').exists())
+        self.assertFalse(CreditNoteApplication.objects.exists())
+        for transfer in transfers:
+            transfer.refresh_from_db()
+            self.assertEqual((transfer.paid_amount, transfer.balance), (Decimal('0.00'), Decimal('100.00')))
+            self.assertEqual(transfer.status, 'pendiente')
+
+    def test_document_sync_failure_rolls_back_only_its_savepoint(self):
+        from unittest import mock
+        from django.db import IntegrityError
+        from apps.orders.models import OrderDocument
+        from apps.transfers.models import CreditNoteApplication
+
+        service_order = ServiceOrder.objects.create(
+            client=Client.objects.create(name='Cliente NC', payment_condition='credito'),
+            shipment_type=ShipmentType.objects.create(name='Aereo'),
+            created_by=self.user,
+        )
+        transfers = self._transfers(2)
+        Transfer.objects.filter(pk__in=[t.pk for t in transfers]).update(service_order=service_order)
+        credit_note = self._credit_note()
+        credit_note.pdf_file.name = 'credit_notes/nc.pdf'
+        credit_note.save(update_fields=['pdf_file'])
+
+        # Falla de base después del bulk_create de los documentos
+        with mock.patch('apps.transfers.credit_notes.record', side_effect=IntegrityError('historial')):
+            response = self._apply(credit_note, transfers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(CreditNoteApplication.objects.filter(credit_note=credit_note).count(), 2)
+        self.assertFalse(OrderDocument.objects.filter(order=service_order).exists())
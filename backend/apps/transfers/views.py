@@ -4,18 +4,22 @@ from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.core.exceptions import ValidationError
 from django.db.models import Q, Sum, Prefetch
-from django.db import transaction
+from django.db import OperationalError, transaction
 from django.http import HttpResponse, FileResponse
 from django.utils.text import slugify
 from django_filters import rest_framework as filters
-from .models import Transfer, TransferPayment, BatchPayment, ProviderCreditNote, CreditNoteApplication, ProviderInvoicePayment
+from .models import Transfer, TransferPayment, BatchPayment, ProviderCreditNote, ProviderInvoicePayment
 from .serializers import (
-    TransferSerializer, TransferListSerializer, TransferPaymentSerializer,
+    TransferSerializer, TransferListSerializer, TransferListValuesSerializer, TransferPaymentSerializer,
     BatchPaymentSerializer, BatchPaymentDetailSerializer,
     ProviderCreditNoteListSerializer, ProviderCreditNoteDetailSerializer,
     ProviderCreditNoteCreateSerializer, ApplyCreditNoteSerializer, CreditNoteApplicationSerializer
 )
 from apps.users.permissions import IsAnyOperativo, IsOperativo2OrAdmin, TransferApprovalPermission, IsOperativo
+from apps.core.prefetch import PrefetchAwareViewSetMixin
+from apps.core.values_serializers import ValuesListMixin
+from apps.core.history_writer import record
+from apps.core.db_routing import read_replica
 import openpyxl
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
@@ -38,7 +42,9 @@ class TransferFilter(filters.FilterSet):
         model = Transfer
         fields = ['transfer_type', 'status', 'service_order', 'provider', 'payment_method']
 
-class TransferViewSet(viewsets.ModelViewSet):
+class TransferViewSet(ValuesListMixin, PrefetchAwareViewSetMixin, viewsets.ModelViewSet):
+    # Las precargas que necesita cada serializer (p. ej. las NC activas del
+    # listado) las declara el propio serializer; ver apps.core.prefetch
     queryset = Transfer.objects.select_related(
         'service_order',
         'service_order__client',
@@ -46,14 +52,10 @@ class TransferViewSet(viewsets.ModelViewSet):
         'bank',
         'created_by',
         'invoice'
-    ).prefetch_related(
-        Prefetch(
-            'credit_notes',
-            queryset=ProviderCreditNote.objects.exclude(status='anulada'),
-            to_attr='active_credit_notes'
-        )
     ).all()
     serializer_class = TransferSerializer
+    # El listado se serializa vía values(); mismo JSON que TransferListSerializer
+    values_serializer_class = TransferListValuesSerializer
     permission_classes = [IsAnyOperativo]
     parser_classes = (MultiPartParser, FormParser, JSONParser)
     filterset_class = TransferFilter
@@ -501,6 +503,7 @@ class TransferViewSet(viewsets.ModelViewSet):
         )
 
     @action(detail=False, methods=['get'], permission_classes=[IsAnyOperativo])
+    @read_replica
     def export_excel(self, request):
         """Exportar transfers y provider_invoices a Excel con formato profesional"""
         from .models import ProviderInvoice
@@ -784,38 +787,20 @@ class TransferViewSet(viewsets.ModelViewSet):
         return response
 
     @action(detail=False, methods=['get'])
+    @read_replica
     def summary(self, request):
-        """Resumen de transfers por tipo y estado"""
+        """Resumen de transfers por tipo y estado (una sola consulta)"""
+        from apps.core.summary import SummaryBuilder
+
         queryset = self.filter_queryset(self.get_queryset())
-        
-        summary = {
-            'total_transfers': queryset.count(),
-            'total_amount': queryset.aggregate(Sum('amount'))['amount__sum'] or 0,
-            'by_type': {},
-            'by_status': {}
-        }
-        
-        # Por tipo
-        for type_choice in Transfer.TYPE_CHOICES:
-            type_code = type_choice[0]
-            type_data = queryset.filter(transfer_type=type_code)
-            summary['by_type'][type_code] = {
-                'label': type_choice[1],
-                'count': type_data.count(),
-                'amount': type_data.aggregate(Sum('amount'))['amount__sum'] or 0
-            }
-        
-        # Por estado
-        for status_choice in Transfer.STATUS_CHOICES:
-            status_code = status_choice[0]
-            status_data = queryset.filter(status=status_code)
-            summary['by_status'][status_code] = {
-                'label': status_choice[1],
-                'count': status_data.count(),
-                'amount': status_data.aggregate(Sum('amount'))['amount__sum'] or 0
-            }
-        
-        return Response(summary)
+
+        summary = SummaryBuilder()
+        summary.count('total_transfers')
+        summary.sum('total_amount', 'amount')
+        summary.by_choices('by_type', 'transfer_type', Transfer.TYPE_CHOICES, amount='amount')
+        summary.by_choices('by_status', 'status', Transfer.STATUS_CHOICES, amount='amount')
+
+        return Response(summary.aggregate(queryset))
     
     @action(detail=True, methods=['get'], permission_classes=[IsOperativo])
     def download_invoice(self, request, pk=None):
@@ -1102,7 +1087,7 @@ class TransferViewSet(viewsets.ModelViewSet):
         return Response(transfer_data)
 
 
-class BatchPaymentViewSet(viewsets.ModelViewSet):
+class BatchPaymentViewSet(PrefetchAwareViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar pagos agrupados a proveedores.
 
@@ -1143,8 +1128,7 @@ class BatchPaymentViewSet(viewsets.ModelViewSet):
             "proof_file": <archivo>
         }
         """
-        from django.db import transaction
-        from decimal import Decimal
+        from .batch_payments import parse_allocations, register_batch_payment
         import json
 
         # Parsear allocations
@@ -1163,107 +1147,40 @@ class BatchPaymentViewSet(viewsets.ModelViewSet):
         if not payment_method or not payment_date:
             return Response({'error': 'Método de pago y fecha son requeridos'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Validar y preparar datos
-        valid_allocations = []
-        total_payment_amount = Decimal('0.00')
-        provider_id = None
-        service_orders_affected = set()
-
         # Manejo robusto de bank_id (convertir '' a None)
         bank_id = request.data.get('bank')
         if bank_id == '' or bank_id == 'null' or bank_id == 'undefined':
             bank_id = None
 
-        for item in allocations:
-            transfer_id = item.get('transfer_id')
-            amount_str = str(item.get('amount', 0))
-            
-            try:
-                amount = Decimal(amount_str)
-                if amount <= 0:
-                    continue # Ignorar montos 0 o negativos
-            except:
-                return Response({'error': f'Monto inválido para factura ID {transfer_id}'}, status=status.HTTP_400_BAD_REQUEST)
-
-            try:
-                transfer = Transfer.objects.select_related('provider', 'service_order').get(id=transfer_id)
-            except Transfer.DoesNotExist:
-                return Response({'error': f'Factura ID {transfer_id} no encontrada'}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Validar proveedor único
-            if provider_id is None:
-                provider_id = transfer.provider_id
-            elif provider_id != transfer.provider_id:
-                return Response({'error': 'Todas las facturas deben ser del mismo proveedor'}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Validar saldo
-            if amount > transfer.balance:
-                return Response({
-                    'error': f'El monto ${amount} excede el saldo pendiente (${transfer.balance}) de la factura {transfer.invoice_number or transfer.id}'
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            valid_allocations.append({
-                'transfer': transfer,
-                'amount': amount
-            })
-            total_payment_amount += amount
-            if transfer.service_order:
-                service_orders_affected.add(transfer.service_order)
-
-        if total_payment_amount <= 0:
-            return Response({'error': 'El monto total a pagar debe ser mayor a cero'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Crear registros
+        # Bloqueo ordenado de los gastos, validación en memoria e inserción en
+        # bloque (ver apps/transfers/batch_payments.py)
         try:
-            with transaction.atomic():
-                # 1. Crear BatchPayment
-                batch_payment = BatchPayment(
-                    provider_id=provider_id,
-                    total_amount=total_payment_amount,
-                    payment_method=payment_method,
-                    payment_date=payment_date,
-                    bank_id=bank_id,
-                    reference_number=request.data.get('reference_number', ''),
-                    notes=request.data.get('notes', ''),
-                    created_by=request.user
-                )
-
-                if 'proof_file' in request.FILES:
-                    batch_payment.proof_file = request.FILES['proof_file']
-
-                batch_payment.save()
-
-                # 2. Crear TransferPayments individuales
-                payments_created = []
-                for alloc in valid_allocations:
-                    transfer_payment = TransferPayment(
-                        transfer=alloc['transfer'],
-                        batch_payment=batch_payment,
-                        amount=alloc['amount'],
-                        payment_date=payment_date,
-                        payment_method=payment_method,
-                        reference_number=request.data.get('reference_number', ''),
-                        notes=f"Pago agrupado {batch_payment.batch_number}",
-                        created_by=request.user
-                    )
-                    
-                    if batch_payment.proof_file:
-                        transfer_payment.proof_file = batch_payment.proof_file
-                        
-                    transfer_payment.save()
-                    payments_created.append(transfer_payment)
-
-                # 3. Documentos en Service Orders: ya gestionado por signal sync_batch_payment_documents
-
-                serializer = BatchPaymentDetailSerializer(batch_payment)
-                return Response({
-                    'message': f'Pago agrupado registrado exitosamente. Total: ${total_payment_amount}',
-                    'batch_payment': serializer.data
-                }, status=status.HTTP_201_CREATED)
-
+            batch_payment, _ = register_batch_payment(
+                parse_allocations(allocations),
+                payment_method=payment_method,
+                payment_date=payment_date,
+                user=request.user,
+                bank_id=bank_id,
+                reference_number=request.data.get('reference_number', ''),
+                notes=request.data.get('notes', ''),
+                proof_file=request.FILES.get('proof_file'),
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ValidationError as e:
+            return Response({'error': e.messages}, status=status.HTTP_400_BAD_REQUEST)
+        except OperationalError:
+            # Contención de bloqueos: custom_exception_handler responde 409
+            raise
         except Exception as e:
             return Response({'error': f'Error al procesar el pago: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        serializer = BatchPaymentDetailSerializer(batch_payment)
+        return Response({
+            'message': f'Pago agrupado registrado exitosamente. Total: ${batch_payment.total_amount}',
+            'batch_payment': serializer.data
+        }, status=status.HTTP_201_CREATED)
+
     def destroy(self, request, *args, **kwargs):
         """
         Elimina un pago agrupado y revierte todos los pagos individuales asociados.
@@ -1282,7 +1199,8 @@ class BatchPaymentViewSet(viewsets.ModelViewSet):
                 # Registrar auditoría explícita por cada OS impactada.
                 from apps.orders.models import OrderHistory
                 for service_order in service_orders_affected:
-                    OrderHistory.objects.create(
+                    record(
+                        OrderHistory,
                         service_order=service_order,
                         user=request.user,
                         event_type='payment_deleted',
@@ -1453,83 +1371,24 @@ class ProviderCreditNoteViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Validar cada Transfer y recopilar errores
-        transfers_to_apply = []
-        errors = []
-
-        for i, app_data in enumerate(applications_data):
-            transfer_id = app_data['transfer_id']
-            amount = Decimal(str(app_data['amount']))
-
-            try:
-                transfer = Transfer.objects.get(id=transfer_id, is_deleted=False)
-            except Transfer.DoesNotExist:
-                errors.append(f"Factura #{transfer_id} no encontrada")
-                continue
-
-            # Validar mismo proveedor
-            if transfer.provider_id != credit_note.provider_id:
-                errors.append(f"Factura #{transfer_id} no pertenece al proveedor {credit_note.provider.name}")
-                continue
-
-            # Validar saldo disponible en el Transfer
-            if amount > transfer.balance:
-                errors.append(f"Factura #{transfer_id}: monto ${amount} excede saldo pendiente ${transfer.balance}")
-                continue
-
-            transfers_to_apply.append({
-                'transfer': transfer,
-                'amount': amount,
-                'notes': app_data.get('notes', '')
-            })
+        # Bloqueo de la NC y de los gastos, validación en memoria e inserción
+        # en bloque (ver apps/transfers/credit_notes.py)
+        from .credit_notes import apply_credit_note
 
-        if errors:
+        try:
+            credit_note, applications = apply_credit_note(credit_note, applications_data, user=request.user)
+        except ValidationError as e:
             return Response(
                 {
                     'error': 'Errores en las aplicaciones.',
-                    'detail': errors,
+                    'detail': e.messages,
                     'code': 'VALIDATION_ERRORS'
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-        # Aplicar todas las NC en una transacción
-        try:
-            with transaction.atomic():
-                applications_created = []
-
-                for app_data in transfers_to_apply:
-                    application = CreditNoteApplication(
-                        credit_note=credit_note,
-                        transfer=app_data['transfer'],
-                        amount=app_data['amount'],
-                        applied_by=request.user,
-                        notes=app_data['notes']
-                    )
-                    application.save()
-                    applications_created.append({
-                        'id': application.id,
-                        'transfer_id': app_data['transfer'].id,
-                        'transfer_invoice': app_data['transfer'].invoice_number,
-                        'amount': str(app_data['amount'])
-                    })
-
-                # Refrescar la NC para obtener valores actualizados
-                credit_note.refresh_from_db()
-
-                return Response({
-                    'message': f'Nota de crédito aplicada exitosamente a {len(applications_created)} factura(s).',
-                    'credit_note': {
-                        'id': credit_note.id,
-                        'note_number': credit_note.note_number,
-                        'status': credit_note.status,
-                        'status_display': credit_note.get_status_display(),
-                        'applied_amount': str(credit_note.applied_amount),
-                        'available_amount': str(credit_note.available_amount)
-                    },
-                    'applications': applications_created
-                }, status=status.HTTP_200_OK)
-
+        except OperationalError:
+            # Contención de bloqueos: custom_exception_handler responde 409
+            raise
         except Exception as e:
             return Response(
                 {
@@ -1540,6 +1399,26 @@ class ProviderCreditNoteViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        applications_created = [{
+            'id': application.id,
+            'transfer_id': application.transfer_id,
+            'transfer_invoice': application.transfer.invoice_number,
+            'amount': str(application.amount)
+        } for application in applications]
+
+        return Response({
+            'message': f'Nota de crédito aplicada exitosamente a {len(applications_created)} factura(s).',
+            'credit_note': {
+                'id': credit_note.id,
+                'note_number': credit_note.note_number,
+                'status': credit_note.status,
+                'status_display': credit_note.get_status_display(),
+                'applied_amount': str(credit_note.applied_amount),
+                'available_amount': str(credit_note.available_amount)
+            },
+            'applications': applications_created
+        }, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'], permission_classes=[IsOperativo2OrAdmin])
     def void(self, request, pk=None):
         """
@@ -1615,6 +1494,7 @@ class ProviderCreditNoteViewSet(viewsets.ModelViewSet):
             )
 
     @action(detail=False, methods=['get'], permission_classes=[IsOperativo])
+    @read_replica
     def summary(self, request):
         """
         Resumen estadístico de notas de crédito.
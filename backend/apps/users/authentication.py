@@ -0,0 +1,114 @@
+"""
+Autenticación JWT con el usuario cacheado.
+
+``JWTAuthentication`` de simplejwt consulta la fila de ``User`` en cada
+petición autenticada. ``CachedJWTAuthentication`` guarda en caché una
+proyección mínima del usuario (rol, estado, versión de tokens y los datos de
+nombre que usan las vistas) y construye con ella la instancia de ``User``:
+
+- La autorización (``request.user.role``, ``is_active``...) no consulta la BD.
+- Los campos fuera de la proyección (password, last_login, date_joined) quedan
+  diferidos: Django los carga sólo si una vista los lee, y ``save()`` de una
+  instancia diferida actualiza únicamente los campos cargados.
+- La proyección se invalida al guardar o eliminar el usuario (ver
+  ``apps.users.signals``) y al revocar sus tokens. Un ``update()`` masivo
+  sobre usuarios no dispara señales: llamar a ``invalidate_cached_user``.
+
+Revocación: el token lleva el claim ``token_version``; si no coincide con el
+del usuario (``User.revoke_tokens()``) se rechaza. Los tokens emitidos antes de
+existir el claim equivalen a la versión 0.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION_CLAIM = 'token_version'
+
+# Campos de la proyección cacheada (sólo tipos simples, legibles con
+# cualquier serializador de caché)
+CACHED_USER_FIELDS = (
+    'id', 'username', 'first_name', 'last_name', 'email', 'role',
+    'is_active', 'is_staff', 'is_superuser', 'token_version',
+)
+
+
+def _cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    try:
+        cache.delete(_cache_key(user_id))
+    except Exception as e:
+        logger.warning(f"Could not invalidate cached user {user_id}: {e}")
+
+
+def get_user_projection(user_id):
+    """
+    Proyección del usuario (dict con CACHED_USER_FIELDS) desde la caché, o
+    desde la BD si no está. None si el usuario no existe.
+    """
+    key = _cache_key(user_id)
+    try:
+        projection = cache.get(key)
+    except Exception as e:
+        logger.warning(f"User cache unavailable: {e}")
+        projection = None
+    if projection is not None:
+        return projection
+
+    projection = User.objects.filter(pk=user_id).values(*CACHED_USER_FIELDS).first()
+    if projection is not None:
+        timeout = getattr(settings, 'CACHE_TIMEOUTS', {}).get('user_auth', 300)
+        try:
+            cache.set(key, projection, timeout)
+        except Exception as e:
+            logger.warning(f"Could not cache user {user_id}: {e}")
+    return projection
+
+
+def user_from_projection(projection):
+    """Instancia de User con los campos de la proyección; el resto, diferido."""
+    # from_db() espera los valores en el orden de los campos del modelo
+    field_names = [
+        field.attname for field in User._meta.concrete_fields
+        if field.attname in CACHED_USER_FIELDS
+    ]
+    return User.from_db(
+        DEFAULT_DB_ALIAS,
+        field_names,
+        [projection[field] for field in field_names],
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication que resuelve el usuario desde la caché."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        projection = get_user_projection(user_id)
+        if projection is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not projection['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if validated_token.get(TOKEN_VERSION_CLAIM, 0) != projection['token_version']:
+            raise AuthenticationFailed('El token fue revocado. Inicie sesión nuevamente.', code='token_revoked')
+
+        return user_from_projection(projection)
@@ -12,10 +12,21 @@ class User(AbstractUser):
         ('admin', 'Administrador'),
     )
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='operativo')
+    # Los JWT llevan esta versión; al incrementarla se invalidan todos los
+    # tokens emitidos antes (ver apps.users.authentication).
+    token_version = models.PositiveIntegerField(default=0, verbose_name="Versión de tokens")
 
     def __str__(self):
         return f"{self.username} - {self.get_role_display()}"
 
+    def revoke_tokens(self):
+        """Invalida los tokens de acceso y refresco emitidos hasta ahora."""
+        User.objects.filter(pk=self.pk).update(token_version=models.F('token_version') + 1)
+        self.refresh_from_db(fields=['token_version'])
+        # update() no dispara post_save: limpiar la proyección cacheada aquí
+        from .authentication import invalidate_cached_user
+        invalidate_cached_user(self.pk)
+
 
 class AuditLog(models.Model):
     """Registro de auditoría de acciones del sistema"""
@@ -60,8 +71,10 @@ class AuditLog(models.Model):
 
 # Utilidad para registrar auditoría
 def create_audit_log(user, action, model_name, object_id=None, object_repr='', ip_address=None, details=None):
-    """Función helper para crear registros de auditoría fácilmente"""
-    AuditLog.objects.create(
+    """Función helper para crear registros de auditoría fácilmente (se insertan al hacer commit)"""
+    from apps.core.history_writer import record
+    record(
+        AuditLog,
         user=user,
         action=action,
         model_name=model_name,
@@ -130,6 +130,34 @@ ACTION_PERMISSIONS = {
 }
 
 
+def _build_role_permissions(role):
+    """Mapa de permisos de un rol (módulos, acciones y atajos para el frontend)."""
+    return {
+        'modules': {
+            module: role in roles
+            for module, roles in MODULE_PERMISSIONS.items()
+        },
+        'actions': {
+            action: role in roles
+            for action, roles in ACTION_PERMISSIONS.items()
+        },
+        'role': role,
+        'is_admin': role == 'admin',
+        'can_approve_payments': role in ['admin', 'operativo2'],
+        'can_register_payments': role in ['admin', 'operativo2'],
+        'can_manage_users': role == 'admin',
+        'can_access_finance': role in ['admin', 'operativo2'],
+    }
+
+
+# Permisos precalculados por rol al cargar el módulo: autorizar no requiere
+# recorrer MODULE_PERMISSIONS/ACTION_PERMISSIONS ni consultar la BD.
+ROLES = ('admin', 'operativo2', 'operativo')
+ROLE_PERMISSIONS = {role: _build_role_permissions(role) for role in ROLES}
+MODULE_ROLES = {module: frozenset(roles) for module, roles in MODULE_PERMISSIONS.items()}
+ACTION_ROLES = {action: frozenset(roles) for action, roles in ACTION_PERMISSIONS.items()}
+
+
 def user_has_module_access(user, module_name):
     """
     Verifica si un usuario tiene acceso a un módulo específico.
@@ -138,8 +166,7 @@ def user_has_module_access(user, module_name):
     if not user or not user.is_authenticated:
         return False
     
-    allowed_roles = MODULE_PERMISSIONS.get(module_name, [])
-    return user.role in allowed_roles
+    return user.role in MODULE_ROLES.get(module_name, ())
 
 
 def user_can_perform_action(user, action_name):
@@ -149,8 +176,7 @@ def user_can_perform_action(user, action_name):
     if not user or not user.is_authenticated:
         return False
     
-    allowed_roles = ACTION_PERMISSIONS.get(action_name, [])
-    return user.role in allowed_roles
+    return user.role in ACTION_ROLES.get(action_name, ())
 
 
 def get_user_permissions(user):
@@ -165,29 +191,16 @@ def get_user_permissions(user):
             'role': None,
         }
     
-    user_role = user.role
-    
-    # Permisos de módulos
-    modules = {
-        module: user_role in roles 
-        for module, roles in MODULE_PERMISSIONS.items()
-    }
-    
-    # Permisos de acciones
-    actions = {
-        action: user_role in roles 
-        for action, roles in ACTION_PERMISSIONS.items()
-    }
+    permissions_map = ROLE_PERMISSIONS.get(user.role)
+    if permissions_map is None:
+        # Rol desconocido: todo denegado
+        permissions_map = _build_role_permissions(user.role)
     
+    # Copia de los dicts anidados: quien la reciba puede modificarla
     return {
-        'modules': modules,
-        'actions': actions,
-        'role': user_role,
-        'is_admin': user_role == 'admin',
-        'can_approve_payments': user_role in ['admin', 'operativo2'],
-        'can_register_payments': user_role in ['admin', 'operativo2'],
-        'can_manage_users': user_role == 'admin',
-        'can_access_finance': user_role in ['admin', 'operativo2'],
+        **permissions_map,
+        'modules': dict(permissions_map['modules']),
+        'actions': dict(permissions_map['actions']),
     }
 
 
@@ -13,6 +13,13 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         'no_active_account': 'Credenciales incorrectas. Por favor, verifique su usuario y contraseña.',
     }
 
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # Permite revocar los tokens del usuario (ver apps.users.authentication)
+        token['token_version'] = user.token_version
+        return token
+
     def validate(self, attrs):
         try:
             return super().validate(attrs)
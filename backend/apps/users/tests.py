@@ -1,3 +1,126 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from .models import User
+from .permissions import ROLE_PERMISSIONS, get_user_permissions, user_can_perform_action
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    """El usuario del JWT se resuelve desde la caché y se invalida al cambiar."""
+
+    url = '/api/users/notifications/unread_count/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='jwt_tester', password='Clave-Segura-123', role='operativo',
+            first_name='Ana', last_name='Pérez',
+        )
+
+    def _authenticate(self, user=None):
+        token = AccessToken.for_user(user or self.user)
+        token['token_version'] = (user or self.user).token_version
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def _user_queries(self, ctx):
+        return [q['sql'] for q in ctx.captured_queries if 'users_user' in q['sql']]
+
+    def test_authenticated_requests_do_not_query_user_table(self):
+        self._authenticate()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._user_queries(ctx), [])
+
+    def test_cached_user_matches_database_row(self):
+        from .authentication import get_user_projection, user_from_projection
+
+        user = user_from_projection(get_user_projection(self.user.pk))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(user.role, 'operativo')
+            self.assertEqual(user.get_full_name(), 'Ana Pérez')
+            self.assertTrue(user.is_authenticated)
+        # Los campos fuera de la proyección se cargan al leerlos
+        self.assertEqual(user.date_joined, self.user.date_joined)
+
+    def test_deactivated_user_is_rejected_immediately(self):
+        self._authenticate()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_role_change_invalidates_cached_projection(self):
+        self._authenticate()
+        self.assertEqual(self.client.get('/api/users/').status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.role = 'admin'
+        self.user.save()
+
+        self.assertEqual(self.client.get('/api/users/').status_code, status.HTTP_200_OK)
+
+    def test_revoked_tokens_are_rejected(self):
+        self._authenticate()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+        self.user.revoke_tokens()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self._authenticate()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_login_token_carries_token_version(self):
+        self.user.revoke_tokens()
+        response = self.client.post('/api/users/token/', {
+            'username': 'jwt_tester', 'password': 'Clave-Segura-123',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(AccessToken(response.data['access'])['token_version'], 1)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_me_returns_full_profile(self):
+        self._authenticate()
+        response = self.client.get('/api/users/me/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['first_name'], 'Ana')
+        self.assertEqual(response.data['role'], 'operativo')
+        self.assertIsNotNone(response.data['date_joined'])
+        self.assertFalse(response.data['permissions']['modules']['users'])
+
+
+class RolePermissionMapTests(TestCase):
+    """Los mapas de permisos se calculan una vez por rol."""
+
+    def test_permissions_come_from_precomputed_map_without_queries(self):
+        user = User(username='mapa', role='operativo2')
+
+        with self.assertNumQueries(0):
+            permissions = get_user_permissions(user)
+
+        self.assertEqual(permissions, ROLE_PERMISSIONS['operativo2'])
+        self.assertTrue(permissions['modules']['invoicing'])
+        self.assertFalse(permissions['modules']['users'])
+        self.assertTrue(permissions['can_approve_payments'])
+        self.assertTrue(user_can_perform_action(user, 'export_data'))
+        self.assertFalse(user_can_perform_action(user, 'manage_users'))
+
+    def test_returned_map_is_a_copy(self):
+        permissions = get_user_permissions(User(username='copia', role='operativo'))
+        permissions['modules']['users'] = True
+
+        self.assertFalse(ROLE_PERMISSIONS['operativo']['modules']['users'])
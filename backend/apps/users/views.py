@@ -52,13 +52,18 @@ class UserViewSet(viewsets.ModelViewSet):
         GET: Obtener información del usuario autenticado
         PATCH: Actualizar perfil (first_name, last_name, email)
         """
+        # request.user viene de la proyección cacheada del JWT; el perfil
+        # incluye campos diferidos (date_joined, last_login), así que se lee
+        # la fila completa en una sola consulta.
+        user = User.objects.get(pk=request.user.pk)
+
         if request.method == 'GET':
-            serializer = UserProfileSerializer(request.user)
+            serializer = UserProfileSerializer(user)
             return Response(serializer.data)
 
         elif request.method == 'PATCH':
             serializer = UserProfileSerializer(
-                request.user,
+                user,
                 data=request.data,
                 partial=True,
                 context={'request': request}
@@ -108,6 +113,8 @@ class UserViewSet(viewsets.ModelViewSet):
         
         user.set_password(new_password)
         user.save()
+        # Cerrar las sesiones abiertas con la contraseña anterior
+        user.revoke_tokens()
         
         return Response({'message': f'Contraseña reseteada para {user.username}'})
 
@@ -100,6 +100,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.core.db_routing.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -170,6 +171,29 @@ else:
             }
         }
 
+# Réplica de lectura opcional para reportes, resúmenes y exportaciones
+# (ver apps/core/db_routing.py). Si el retraso supera READ_REPLICA_MAX_LAG
+# segundos o no responde, se lee de la principal.
+if os.getenv('READ_REPLICA_URL'):
+    DATABASES['replica'] = dj_database_url.parse(
+        os.getenv('READ_REPLICA_URL'),
+        conn_max_age=600,
+        conn_health_checks=True,
+        ssl_require=os.getenv('READ_REPLICA_SSL', 'True') == 'True',
+    )
+    DATABASES['replica']['OPTIONS'] = {'connect_timeout': 5}
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    READ_REPLICA_ALIAS = 'replica'
+else:
+    READ_REPLICA_ALIAS = None
+
+DATABASE_ROUTERS = ['apps.core.db_routing.ReadReplicaRouter']
+READ_REPLICA_MAX_LAG = float(os.getenv('READ_REPLICA_MAX_LAG', '30'))
+READ_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('READ_REPLICA_LAG_CHECK_INTERVAL', '5'))
+
+# Agrega la réplica de pruebas del enrutador (ver apps/core/test_runner.py)
+TEST_RUNNER = 'apps.core.test_runner.TestRunner'
+
 # ============================================
 # REDIS CONFIGURATION (Cache, Sessions, Locks)
 # ============================================
@@ -192,10 +216,16 @@ if REDIS_ENABLED:
                     'max_connections': 50,
                     'retry_on_timeout': True,
                 },
-                # Serialización eficiente
-                'SERIALIZER': 'django_redis.serializers.json.JSONSerializer',
+                # msgpack/pickle con tipos Decimal/date y compresión de los
+                # payloads grandes (ver apps.core.cache_serializers)
+                'SERIALIZER': os.getenv('CACHE_SERIALIZER', 'apps.core.cache_serializers.CompactSerializer'),
+                'COMPRESS_MIN_LENGTH': int(os.getenv('CACHE_COMPRESS_MIN_LENGTH', '1024')),
+                'COMPRESSION': os.getenv('CACHE_COMPRESSION', 'zlib'),
             },
             'KEY_PREFIX': 'gpro',
+            # 2: CompactSerializer. Las claves escritas con JSONSerializer
+            # (versión 1) no se leen y expiran solas
+            'VERSION': 2,
         },
         # Cache separado para locks distribuidos (sin timeout)
         'locks': {
@@ -244,7 +274,9 @@ CACHE_TIMEOUTS = {
     'dashboard_metrics': 60 * 5,      # 5 minutos - métricas del dashboard
     'client_list': 60 * 10,           # 10 minutos - lista de clientes
     'service_list': 60 * 15,          # 15 minutos - catálogo de servicios
+    'catalogs': 60 * 60,              # 1 hora - catálogos (LRU local + Redis, ver apps.catalogs.cache)
     'user_permissions': 60 * 30,      # 30 minutos - permisos de usuario
+    'user_auth': 60 * 5,              # 5 minutos - usuario resuelto desde el JWT
     'exchange_rate': 60 * 60,         # 1 hora - tasa de cambio
     'reports': 60 * 60 * 2,           # 2 horas - reportes pesados
 }
@@ -280,7 +312,8 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWT con el usuario cacheado (ver apps.users.authentication)
+        'apps.users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -291,6 +324,11 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # JSON vía orjson cuando está instalado (misma salida que el renderer de DRF)
+    'DEFAULT_RENDERER_CLASSES': (
+        'apps.core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     # Paginación desactivada - frontend espera arrays directos
     # Activar por ViewSet individual cuando se implemente en frontend
     'DEFAULT_PAGINATION_CLASS': None,
@@ -308,6 +346,36 @@ REST_FRAMEWORK = {
     },
 }
 
+# Falla ruidosamente si un serializer consulta la BD por fila dentro de un
+# many=True (ver apps.core.prefetch). El runner de tests fuerza DEBUG=False,
+# por eso se detecta el comando `test` aparte.
+SERIALIZER_QUERY_GUARD = DEBUG or (len(sys.argv) > 1 and sys.argv[1] == 'test')
+
+# Historial (OrderHistory) y auditoría (AuditLog) se insertan en bloque al
+# hacer commit (ver apps.core.history_writer). Con HISTORY_WRITER_BACKGROUND
+# la inserción la hace un hilo local, fuera de la petición.
+HISTORY_WRITER_BACKGROUND = os.getenv('HISTORY_WRITER_BACKGROUND', 'False') == 'True'
+HISTORY_WRITER_BATCH_SIZE = int(os.getenv('HISTORY_WRITER_BATCH_SIZE', '500'))
+
+# Retención del historial: los eventos más antiguos se mueven a las tablas de
+# archivo con `manage.py clean_orphan_history --archive` (ver
+# apps.orders.history_archive).
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', '365'))
+
+# Alertas del dashboard: segundos entre barridos completos de AlertSnapshot
+# (los cambios de OS, facturas y gastos se reflejan al instante; el barrido
+# actualiza las reglas que dependen de la fecha). Lo usa
+# ``manage.py refresh_alerts --if-due`` (cron). Ver apps.dashboard.alerts.
+ALERTS_SWEEP_INTERVAL = int(os.getenv('ALERTS_SWEEP_INTERVAL', '900'))
+
+# Series de correlativos que admiten huecos (por ejemplo 'batch_payment'). En
+# PostgreSQL usan un SEQUENCE nativo en lugar de la fila contador bloqueante.
+# Las OS y pre-facturas deben quedar fuera: su numeración es correlativa.
+# Ver apps.core.sequences.
+DOCUMENT_SEQUENCES_ALLOW_GAPS = tuple(
+    s.strip() for s in os.getenv('DOCUMENT_SEQUENCES_ALLOW_GAPS', '').split(',') if s.strip()
+)
+
 # Configuración de JWT Segura
 from datetime import timedelta
 
@@ -218,6 +218,14 @@ const HistoryTab = ({ orderId }) => {
     const [loading, setLoading] = useState(true);
     const [filterType, setFilterType] = useState("all");
     const [expandedEvents, setExpandedEvents] = useState({});
+    const [nextCursor, setNextCursor] = useState(null);
+    const [totalEvents, setTotalEvents] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+
+    const sortEvents = (events) =>
+        [...events].sort(
+            (a, b) => new Date(b.timestamp) - new Date(a.timestamp),
+        );
 
     const fetchHistory = useCallback(async () => {
         if (!orderId) return;
@@ -227,18 +235,39 @@ const HistoryTab = ({ orderId }) => {
                 `/orders/service-orders/${orderId}/history/`,
             );
             const events = response.data?.history || response.data || [];
-            const sortedEvents = [...events].sort(
-                (a, b) => new Date(b.timestamp) - new Date(a.timestamp),
-            );
-            setHistory(sortedEvents);
+            setHistory(sortEvents(events));
+            setNextCursor(response.data?.next_cursor || null);
+            setTotalEvents(response.data?.total_events ?? null);
         } catch (error) {
             console.error("Error fetching history:", error);
             setHistory([]);
+            setNextCursor(null);
+            setTotalEvents(null);
         } finally {
             setLoading(false);
         }
     }, [orderId]);
 
+    // El historial se pagina por cursor: cada página trae los eventos
+    // anteriores al último cargado.
+    const loadMoreHistory = useCallback(async () => {
+        if (!orderId || !nextCursor) return;
+        try {
+            setLoadingMore(true);
+            const response = await axios.get(
+                `/orders/service-orders/${orderId}/history/`,
+                { params: { cursor: nextCursor } },
+            );
+            const events = response.data?.history || [];
+            setHistory((prev) => sortEvents([...prev, ...events]));
+            setNextCursor(response.data?.next_cursor || null);
+        } catch (error) {
+            console.error("Error fetching more history:", error);
+        } finally {
+            setLoadingMore(false);
+        }
+    }, [orderId, nextCursor]);
+
     useEffect(() => {
         fetchHistory();
     }, [fetchHistory]);
@@ -452,7 +481,7 @@ const HistoryTab = ({ orderId }) => {
                             Historial de Auditoría
                         </h3>
                         <span className="text-xs text-slate-500 bg-slate-100 px-2 py-0.5 rounded-full font-medium">
-                            {history.length} eventos
+                            {totalEvents ?? history.length} eventos
                         </span>
                     </div>
                     <Button
@@ -720,6 +749,20 @@ const HistoryTab = ({ orderId }) => {
                             );
                         })}
                     </div>
+                    {nextCursor && (
+                        <div className="flex justify-center pt-4">
+                            <Button
+                                variant="outline"
+                                size="sm"
+                                onClick={loadMoreHistory}
+                                disabled={loadingMore}
+                            >
+                                {loadingMore
+                                    ? "Cargando..."
+                                    : "Cargar más eventos"}
+                            </Button>
+                        </div>
+                    )}
                 </div>
             ) : (
                 <div className="bg-white border border-slate-200 rounded-lg py-12">